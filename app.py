@@ -1,33 +1,94 @@
 import os
 from datetime import datetime, timedelta
-from flask import Flask, render_template, jsonify, request, redirect, url_for, flash
+from flask import Blueprint, Flask, Response, render_template, jsonify, request, redirect, url_for, flash, send_file, stream_with_context
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
-import openai
-import json
-from database import db
-from models import User, Goal, Task, Habit, HabitLog, VoiceNote, UserAnalytics, AIInsight
-from services.analytics import AnalyticsService
-from config.settings import AUTH_REQUIRED
-
-app = Flask(__name__)
-app.secret_key = os.environ.get("FLASK_SECRET_KEY", "development_key")
-app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL")
-app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
-    "pool_recycle": 300,
-    "pool_pre_ping": True,
-}
-app.config['MAX_CONTENT_LENGTH'] = 10 * 1024 * 1024  # 10MB max file size
-db.init_app(app)
-
-# Set OpenAI API key
-openai.api_key = os.environ.get("OPENAI_API_KEY")
+from werkzeug.formparser import parse_form_data
+from werkzeug.exceptions import RequestEntityTooLarge
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import selectinload, joinedload, undefer
+import click
+from database import db, use_primary, engine_options, replica_binds, init_read_replicas, dispose_engines_after_fork
+from migrations import upgrade_schema
+from models import User, Goal, Task, Habit, HabitLog, VoiceNote, UserAnalytics, AIInsight, TranscriptionJob
+from services.analytics import AnalyticsService, TREND_BUCKETS
+from services.batch_analytics import BatchAnalyticsService
+from services.llm import chat_completion, response_cache
+from services.suggestions import TaskSuggestionService, SUGGEST_TASKS_PROMPT, SSE_HEADERS
+from services.timezones import DEFAULT_TIMEZONE, is_valid_timezone
+from services.pagination import paginated_response, paginated_list, parse_bool, parse_date, conditional
+from services.serializers import serialize_goal, serialize_task
+from services.query_budget import init_query_budget
+from services.compression import init_compression
+from services.dashboard import DashboardService
+from services.instrumentation import init_instrumentation, token_required
+from services.task_bulk import TaskBulkService
+from services.habits import HabitService
+from services.focus import FocusSessionService
+from services.audio_storage import audio_storage, audio_extension, AudioTooLarge
+from services.transcription import TranscriptionService
+from services.search import SearchService, SOURCES as SEARCH_TYPES, init_search_index
+from services.rollups import PriorityRollupService, init_priority_rollups
+from services.user_cache import (
+    user_cache, invalidate as invalidate_user_cache, invalidate_all as invalidate_all_user_caches, init_user_cache
+)
+from services.identity import identity_cache, init_identity_cache
+from services.retention import RetentionService, POLICIES as RETENTION_POLICIES, CLEANUPS as RETENTION_CLEANUPS
+from config.settings import AUTH_REQUIRED, BULK_MAX_OPERATIONS, FOCUS_BATCH_MAX, AUDIO_MAX_BYTES, DATABASE_REPLICA_URLS
+
+# Columns returned by the list endpoints by default, and those selectable through ?fields=
+GOAL_LIST_FIELDS = ['id', 'title', 'progress', 'category']
+GOAL_FIELDS = GOAL_LIST_FIELDS + ['description', 'target_date', 'created_at']
+TASK_LIST_FIELDS = ['id', 'title', 'priority', 'completed']
+TASK_FIELDS = TASK_LIST_FIELDS + ['description', 'due_date', 'created_at', 'completed_at', 'goal_id']
+HABIT_LIST_FIELDS = ['id', 'title', 'current_streak', 'best_streak', 'frequency', 'last_completed_at']
+HABIT_FIELDS = HABIT_LIST_FIELDS + ['description', 'created_at']
+VOICE_NOTE_LIST_FIELDS = ['id', 'transcription', 'note_type', 'created_at']
+VOICE_NOTE_FIELDS = VOICE_NOTE_LIST_FIELDS + ['task_id', 'audio_path']
+
+bp = Blueprint('main', __name__, cli_group=None)
 
 login_manager = LoginManager()
-login_manager.init_app(app)
-login_manager.login_view = 'login'
+login_manager.login_view = 'main.login'
+
+def create_app(config=None):
+    """Build the Flask app.
+
+    Neither importing this module nor calling create_app() touches the
+    database or the OpenAI client, so a pre-forking server can load the app
+    once in its master (gunicorn --preload 'app:create_app()') and workers
+    boot without racing each other. The schema is managed separately, once
+    per deploy: flask --app app upgrade-db
+    """
+    app = Flask(__name__)
+    app.secret_key = os.environ.get("FLASK_SECRET_KEY", "development_key")
+    app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL")
+    # GET requests read from these when set; see database.RoutingSession
+    app.config["SQLALCHEMY_BINDS"] = replica_binds(DATABASE_REPLICA_URLS)
+    app.config['MAX_CONTENT_LENGTH'] = AUDIO_MAX_BYTES  # 10MB max file size
+    app.config.update(config or {})
+    app.config.setdefault("SQLALCHEMY_ENGINE_OPTIONS", engine_options(app.config["SQLALCHEMY_DATABASE_URI"]))
+    db.init_app(app)
+    dispose_engines_after_fork(app)
+    init_read_replicas(app)
+    init_compression(app)  # Registered first so it runs after every other after_request hook
+    init_query_budget(app)
+    init_instrumentation(app, span_classes=(AnalyticsService,))
+    init_search_index(app)
+    init_priority_rollups(app)
+    init_user_cache(app)
+    init_identity_cache(app)
+    login_manager.init_app(app)
+    app.register_blueprint(bp)
+    return app
 
 def get_or_create_test_user():
+    cached = identity_cache.get_by_email('test@example.com')
+    # The cache can outlive the row (the data may have been reset), so confirm it by primary key
+    if cached is not None and db.session.get(User, cached.id) is not None:
+        return cached
+    use_primary()  # A replica that has not seen the user yet would make us insert a duplicate
     test_user = User.query.filter_by(email='test@example.com').first()
     if not test_user:
         test_user = User(
@@ -37,7 +98,7 @@ def get_or_create_test_user():
         )
         db.session.add(test_user)
         db.session.commit()
-    return test_user
+    return identity_cache.put(test_user)
 
 def login_required_if_enabled(f):
     if AUTH_REQUIRED:
@@ -52,9 +113,10 @@ def login_required_if_enabled(f):
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    # Usually answered from the identity cache or the session without a query
+    return identity_cache.load(int(user_id))
 
-@app.route('/login', methods=['GET', 'POST'])
+@bp.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
         email = request.form.get('email')
@@ -64,12 +126,12 @@ def login():
         if user and check_password_hash(user.password_hash, password):
             login_user(user)
             flash('Logged in successfully!', 'success')
-            return redirect(url_for('dashboard'))
+            return redirect(url_for('main.dashboard'))
         else:
             flash('Invalid email or password', 'error')
     return render_template('login.html')
 
-@app.route('/register', methods=['GET', 'POST'])
+@bp.route('/register', methods=['GET', 'POST'])
 def register():
     if request.method == 'POST':
         username = request.form.get('username')
@@ -84,68 +146,77 @@ def register():
             flash('Email already registered', 'error')
             return render_template('register.html')
         
+        timezone = request.form.get('timezone')
         user = User(
             username=username,
             email=email,
-            password_hash=generate_password_hash(password)
+            password_hash=generate_password_hash(password),
+            timezone=timezone if is_valid_timezone(timezone) else DEFAULT_TIMEZONE
         )
         db.session.add(user)
         db.session.commit()
         
         login_user(user)
         flash('Registration successful!', 'success')
-        return redirect(url_for('dashboard'))
+        return redirect(url_for('main.dashboard'))
     return render_template('register.html')
 
-@app.route('/logout')
+@bp.route('/logout')
 @login_required
 def logout():
     logout_user()
     flash('You have been logged out', 'success')
-    return redirect(url_for('login'))
+    return redirect(url_for('main.login'))
 
-@app.route('/profile')
+@bp.route('/profile')
 @login_required
 def profile():
     return render_template('profile.html')
 
-@app.route('/')
+@bp.route('/')
 @login_required_if_enabled
 def dashboard():
-    # Generate fresh analytics before showing dashboard
-    AnalyticsService.calculate_daily_analytics(current_user.id)
-    insights = AnalyticsService.get_user_insights(current_user.id)
-    return render_template('dashboard.html', insights=insights)
+    # Inline the dashboard data so first paint needs no follow-up requests
+    return render_template('dashboard.html', dashboard=DashboardService.get_dashboard(current_user.id))
+
+@bp.route('/api/dashboard', methods=['GET'])
+@login_required_if_enabled
+def get_dashboard():
+    return conditional(jsonify(DashboardService.get_dashboard(current_user.id)))
 
-@app.route('/goals')
+@bp.route('/goals')
 @login_required_if_enabled
 def goals():
     return render_template('goals.html')
 
-@app.route('/tasks')
+@bp.route('/tasks')
 @login_required_if_enabled
 def tasks():
     return render_template('tasks.html')
 
-@app.route('/habits')
+@bp.route('/habits')
 @login_required_if_enabled
 def habits():
     return render_template('habits.html')
 
-@app.route('/analytics')
+@bp.route('/analytics')
 @login_required_if_enabled
 def analytics():
     return render_template('analytics.html')
 
-@app.route('/api/goals/<int:goal_id>', methods=['GET', 'DELETE', 'PUT'])
+@bp.route('/api/goals/<int:goal_id>', methods=['GET', 'DELETE', 'PUT'])
 @login_required_if_enabled
 def manage_goal(goal_id):
-    goal = Goal.query.get_or_404(goal_id)
+    query = Goal.query
+    if request.method == 'GET':
+        query = query.options(selectinload(Goal.tasks))
+    goal = query.get_or_404(goal_id)
     if goal.user_id != current_user.id:
         return jsonify({'error': 'Unauthorized'}), 403
     
     if request.method == 'DELETE':
         db.session.delete(goal)
+        AnalyticsService.mark_analytics_dirty(current_user.id)
         db.session.commit()
         return jsonify({'status': 'success'})
     
@@ -155,62 +226,39 @@ def manage_goal(goal_id):
         goal.description = data['description']
         goal.category = data['category']
         goal.target_date = datetime.strptime(data['target_date'], '%Y-%m-%d')
+        AnalyticsService.mark_analytics_dirty(current_user.id)
         db.session.commit()
         return jsonify({'status': 'success'})
     
     # GET method
-    return jsonify({
-        'id': goal.id,
-        'title': goal.title,
-        'description': goal.description,
-        'progress': goal.progress,
-        'category': goal.category,
-        'created_at': goal.created_at.isoformat(),
-        'target_date': goal.target_date.isoformat(),
-        'tasks': [{
-            'id': task.id,
-            'title': task.title,
-            'description': task.description,
-            'priority': task.priority,
-            'completed': task.completed,
-            'due_date': task.due_date.isoformat() if task.due_date else None
-        } for task in goal.tasks]
-    })
+    return jsonify(serialize_goal(goal))
 
-@app.route('/api/goals/suggest-tasks', methods=['POST'])
+@bp.route('/api/goals/suggest-tasks', methods=['POST'])
 @login_required_if_enabled
 def suggest_tasks():
+    # Also served without holding a worker thread by the async entry point (asgi.py)
     data = request.get_json()
-    goal_title = data.get('title', '')
-    goal_description = data.get('description', '')
     
     try:
-        completion = openai.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are a goal planning assistant. Generate 5 specific, actionable tasks that will help achieve the goal. Format your response as a JSON array where each task has 'title' (short, action-oriented) and 'description' (detailed explanation) fields."},
-                {"role": "user", "content": f"Generate specific, actionable tasks for this goal: {goal_title}. Additional context: {goal_description}"}
-            ]
+        tasks = TaskSuggestionService.parse(
+            chat_completion(SUGGEST_TASKS_PROMPT, TaskSuggestionService.user_content(data))
         )
-        
-        tasks_str = completion.choices[0].message.content.strip()
-        # Handle cases where response might include markdown code blocks
-        if '```json' in tasks_str:
-            tasks_str = tasks_str.split('```json')[1].split('```')[0]
-        elif '```' in tasks_str:
-            tasks_str = tasks_str.split('```')[1].split('```')[0]
-            
-        tasks = json.loads(tasks_str)
-        # Ensure response is an array
-        if not isinstance(tasks, list):
-            tasks = tasks.get('tasks', [])
-            
         return jsonify(tasks)
     except Exception as e:
         print(f"Error generating tasks: {str(e)}")
         return jsonify({'error': 'Failed to generate tasks'}), 500
 
-@app.route('/api/goals', methods=['GET', 'POST'])
+@bp.route('/api/goals/suggest-tasks/stream', methods=['POST'])
+@login_required_if_enabled
+def suggest_tasks_stream():
+    """Suggested tasks as server-sent events: a 'task' event per task as the model writes it, then 'done'"""
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Invalid request body'}), 400
+    return Response(stream_with_context(TaskSuggestionService.stream(data)),
+                    mimetype='text/event-stream', headers=SSE_HEADERS)
+
+@bp.route('/api/goals', methods=['GET', 'POST'])
 @login_required_if_enabled
 def handle_goals():
     if request.method == 'POST':
@@ -238,26 +286,36 @@ def handle_goals():
             db.session.add(goal)
             db.session.flush()  # This gives us the goal.id
             
-            # Create associated tasks
-            if 'tasks' in data:
-                for task_data in data['tasks']:
-                    if not isinstance(task_data, dict) or 'title' not in task_data:
-                        raise ValueError('Invalid task data structure')
-                        
-                    task = Task(
-                        title=task_data['title'],
-                        description=task_data.get('description', ''),
-                        priority=task_data.get('priority', 'normal'),
-                        due_date=target_date,  # Default to goal target date
-                        user_id=current_user.id,
-                        goal_id=goal.id
-                    )
-                    db.session.add(task)
+            # Create associated tasks in one bulk INSERT
+            task_rows = []
+            for task_data in data.get('tasks', []):
+                if not isinstance(task_data, dict) or 'title' not in task_data:
+                    raise ValueError('Invalid task data structure')
+                    
+                task_rows.append({
+                    'title': task_data['title'],
+                    'description': task_data.get('description', ''),
+                    'priority': task_data.get('priority', 'normal'),
+                    'due_date': target_date,  # Default to goal target date
+                    'user_id': current_user.id,
+                    'goal_id': goal.id
+                })
+            if task_rows:
+                db.session.execute(insert(Task), task_rows)
+                SearchService.index_where('task', Task.goal_id == goal.id)
+                invalidate_user_cache(current_user.id, 'tasks')
+                PriorityRollupService.record_created(
+                    current_user.id,
+                    AnalyticsService.get_user_timezone(current_user.id),
+                    [row['priority'] for row in task_rows]
+                )
             
+            goal_id = goal.id
+            AnalyticsService.mark_analytics_dirty(current_user.id)
             db.session.commit()
             return jsonify({
                 'status': 'success',
-                'goal_id': goal.id
+                'goal_id': goal_id
             })
             
         except ValueError as e:
@@ -274,15 +332,17 @@ def handle_goals():
                 'message': 'An error occurred while creating the goal'
             }), 500
     
-    goals = Goal.query.filter_by(user_id=current_user.id).all()
-    return jsonify([{
-        'id': g.id,
-        'title': g.title,
-        'progress': g.progress,
-        'category': g.category
-    } for g in goals])
-
-@app.route('/api/tasks', methods=['GET', 'POST'])
+    try:
+        query = Goal.query.filter_by(user_id=current_user.id)
+        if request.args.get('category'):
+            query = query.filter(Goal.category == request.args['category'])
+        return user_cache.response(
+            current_user.id, 'goals', lambda: paginated_list(query, Goal, GOAL_LIST_FIELDS, GOAL_FIELDS)
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+@bp.route('/api/tasks', methods=['GET', 'POST'])
 @login_required_if_enabled
 def handle_tasks():
     if request.method == 'POST':
@@ -295,28 +355,80 @@ def handle_tasks():
             user_id=current_user.id
         )
         db.session.add(task)
+        AnalyticsService.record_task_created(current_user.id)
         db.session.commit()
         return jsonify({'status': 'success'})
     
-    tasks = Task.query.filter_by(user_id=current_user.id).all()
-    return jsonify([{
-        'id': t.id,
-        'title': t.title,
-        'priority': t.priority,
-        'completed': t.completed
-    } for t in tasks])
-
-@app.route('/api/tasks/<int:task_id>', methods=['GET', 'DELETE', 'PUT'])
+    try:
+        query = Task.query.filter_by(user_id=current_user.id)
+        completed = parse_bool(request.args.get('completed'))
+        if completed is not None:
+            query = query.filter(Task.completed == completed)
+        if request.args.get('priority'):
+            query = query.filter(Task.priority == request.args['priority'])
+        if request.args.get('goal_id'):
+            query = query.filter(Task.goal_id == int(request.args['goal_id']))
+        created_after = parse_date(request.args.get('created_after'))
+        if created_after:
+            query = query.filter(Task.created_at >= created_after)
+        created_before = parse_date(request.args.get('created_before'))
+        if created_before:
+            query = query.filter(Task.created_at < created_before)
+        due_after = parse_date(request.args.get('due_after'))
+        if due_after:
+            query = query.filter(Task.due_date >= due_after)
+        due_before = parse_date(request.args.get('due_before'))
+        if due_before:
+            query = query.filter(Task.due_date < due_before)
+        return user_cache.response(
+            current_user.id, 'tasks', lambda: paginated_list(query, Task, TASK_LIST_FIELDS, TASK_FIELDS)
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+@bp.route('/api/tasks/bulk', methods=['POST'])
+@login_required_if_enabled
+def bulk_tasks():
+    data = request.get_json(silent=True)
+    operations = data.get('operations') if isinstance(data, dict) else data
+    if not isinstance(operations, list) or not operations:
+        return jsonify({'error': 'Expected a non-empty list of operations'}), 400
+    if len(operations) > BULK_MAX_OPERATIONS:
+        return jsonify({'error': f'At most {BULK_MAX_OPERATIONS} operations per request'}), 400
+    atomic = isinstance(data, dict) and bool(data.get('atomic'))
+    
+    try:
+        results = TaskBulkService.apply(current_user.id, operations)
+        failed = sum(1 for r in results if r['status'] == 'error')
+        if atomic and failed:
+            db.session.rollback()
+            return jsonify({'status': 'error', 'results': results}), 400
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error applying bulk task operations: {str(e)}")
+        return jsonify({'error': 'Failed to apply operations'}), 500
+    
+    return jsonify({
+        'status': 'partial' if failed else 'success',
+        'results': results
+    })
+
+@bp.route('/api/tasks/<int:task_id>', methods=['GET', 'DELETE', 'PUT'])
 @login_required_if_enabled
 def manage_task(task_id):
     try:
-        task = Task.query.get(task_id)
+        query = Task.query
+        if request.method == 'GET':
+            query = query.options(joinedload(Task.goal).load_only(Goal.title))
+        task = query.get(task_id)
         if not task:
             return jsonify({'error': 'Task not found'}), 404
         if task.user_id != current_user.id:
             return jsonify({'error': 'Unauthorized'}), 403
         
         if request.method == 'DELETE':
+            AnalyticsService.record_task_deleted(current_user.id, task)
             db.session.delete(task)
             db.session.commit()
             return jsonify({'status': 'success', 'message': 'Task deleted successfully'})
@@ -347,34 +459,25 @@ def manage_task(task_id):
                 return jsonify({'error': str(e)}), 500
         
         # GET method
-        return jsonify({
-            'id': task.id,
-            'title': task.title,
-            'description': task.description,
-            'priority': task.priority,
-            'completed': task.completed,
-            'created_at': task.created_at.isoformat(),
-            'due_date': task.due_date.isoformat() if task.due_date else None,
-            'completed_at': task.completed_at.isoformat() if task.completed_at else None,
-            'goal_id': task.goal_id,
-            'goal_title': task.goal.title if task.goal_id else None
-        })
+        return jsonify(serialize_task(task))
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/tasks/<int:task_id>/toggle', methods=['POST'])
+@bp.route('/api/tasks/<int:task_id>/toggle', methods=['POST'])
 @login_required_if_enabled
 def toggle_task(task_id):
     task = Task.query.get_or_404(task_id)
     if task.user_id != current_user.id:
         return jsonify({'error': 'Unauthorized'}), 403
     
+    previous_completed_at = task.completed_at
     task.completed = not task.completed
     task.completed_at = datetime.utcnow() if task.completed else None
+    AnalyticsService.record_task_toggled(current_user.id, task, previous_completed_at)
     db.session.commit()
     return jsonify({'status': 'success'})
 
-@app.route('/api/habits', methods=['GET', 'POST'])
+@bp.route('/api/habits', methods=['GET', 'POST'])
 @login_required_if_enabled
 def handle_habits():
     if request.method == 'POST':
@@ -386,44 +489,156 @@ def handle_habits():
             user_id=current_user.id
         )
         db.session.add(habit)
+        AnalyticsService.mark_analytics_dirty(current_user.id)
         db.session.commit()
         return jsonify({'status': 'success'})
     
-    habits = Habit.query.filter_by(user_id=current_user.id).all()
-    return jsonify([{
-        'id': h.id,
-        'title': h.title,
-        'current_streak': h.current_streak,
-        'best_streak': h.best_streak
-    } for h in habits])
-
-@app.route('/api/analytics/insights', methods=['GET'])
+    try:
+        query = Habit.query.filter_by(user_id=current_user.id)
+        if request.args.get('frequency'):
+            query = query.filter(Habit.frequency == request.args['frequency'])
+        return user_cache.response(
+            current_user.id, 'habits', lambda: paginated_list(query, Habit, HABIT_LIST_FIELDS, HABIT_FIELDS)
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+@bp.route('/api/habits/<int:habit_id>/check-in', methods=['POST'])
 @login_required_if_enabled
-def get_insights():
-    # Generate fresh insights
-    AnalyticsService.generate_insights(current_user.id)
-    insights = AnalyticsService.get_user_insights(current_user.id)
+def check_in_habit(habit_id):
+    habit = Habit.query.get_or_404(habit_id)
+    if habit.user_id != current_user.id:
+        return jsonify({'error': 'Unauthorized'}), 403
     
-    return jsonify([{
-        'id': i.id,
-        'type': i.insight_type,
-        'content': i.content,
-        'recommendations': i.recommendations,
-        'created_at': i.created_at.isoformat()
-    } for i in insights])
-
-@app.route('/api/analytics/trends', methods=['GET'])
+    tz_name = AnalyticsService.get_user_timezone(current_user.id)
+    checked_in = HabitService.check_in(habit, tz_name)
+    if checked_in:
+        AnalyticsService.mark_analytics_dirty(current_user.id)
+    db.session.commit()
+    return jsonify({
+        'status': 'success',
+        'checked_in': checked_in,
+        'current_streak': habit.current_streak,
+        'best_streak': habit.best_streak,
+        'last_completed_at': habit.last_completed_at.isoformat()
+    })
+
+@bp.route('/api/focus-sessions', methods=['POST'])
 @login_required_if_enabled
-def get_analytics_trends():
-    trends = AnalyticsService.get_productivity_trends(current_user.id)
-    completion_rates = AnalyticsService.get_completion_rate_by_priority(current_user.id)
+def ingest_focus_sessions():
+    data = request.get_json(silent=True)
+    sessions = data.get('sessions') if isinstance(data, dict) else data
+    if not isinstance(sessions, list) or not sessions:
+        return jsonify({'error': 'Expected a non-empty list of sessions'}), 400
+    if len(sessions) > FOCUS_BATCH_MAX:
+        return jsonify({'error': f'At most {FOCUS_BATCH_MAX} sessions per request'}), 400
     
+    for attempt in range(2):
+        try:
+            results = FocusSessionService.ingest(current_user.id, sessions)
+            db.session.commit()
+            break
+        except IntegrityError:
+            # Another upload of the same buffer won the race; replay to pick up its rows as duplicates
+            db.session.rollback()
+            if attempt:
+                return jsonify({'error': 'Conflicting concurrent upload, retry later'}), 409
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error ingesting focus sessions: {str(e)}")
+            return jsonify({'error': 'Failed to store focus sessions'}), 500
+    
+    failed = sum(1 for r in results if r['status'] == 'error')
     return jsonify({
-        'productivity': trends,
-        'completion_rates': completion_rates
+        'status': 'partial' if failed else 'success',
+        'accepted': sum(1 for r in results if r['status'] == 'success'),
+        'duplicates': sum(1 for r in results if r['status'] == 'duplicate'),
+        'results': results
     })
 
-@app.route('/api/voice-notes', methods=['GET', 'POST'])
+@bp.route('/api/search', methods=['GET'])
+@login_required_if_enabled
+def search():
+    """Ranked full-text search; every term matches as a prefix, so it also serves typeahead"""
+    query = request.args.get('q', '')
+    types = [t for t in request.args.get('types', '').split(',') if t]
+    unknown = [t for t in types if t not in SEARCH_TYPES]
+    if unknown:
+        return jsonify({'error': f'Unknown types: {", ".join(unknown)}'}), 400
+    limit = max(1, min(request.args.get('limit', type=int) or 20, 50))
+    
+    try:
+        results = SearchService.search(current_user.id, query, types=types or None, limit=limit)
+    except Exception as e:
+        print(f"Error searching: {str(e)}")
+        return jsonify({'error': 'Search failed'}), 500
+    return conditional(jsonify(results))
+
+@bp.route('/api/analytics/insights', methods=['GET'])
+@login_required_if_enabled
+def get_insights():
+    # Fresh insights are generated in the background; serve what we have now
+    pending = AnalyticsService.request_insights(current_user.id)
+    response = jsonify(AnalyticsService.get_user_insights(current_user.id))
+    response.headers['X-Insights-Pending'] = '1' if pending else '0'
+    return response
+
+@bp.route('/api/llm/cache-stats', methods=['GET'])
+@token_required
+def llm_cache_stats():
+    return jsonify(response_cache.stats())
+
+@bp.route('/api/identity-cache/stats', methods=['GET'])
+@token_required
+def identity_cache_stats():
+    return jsonify(identity_cache.stats())
+
+@bp.route('/api/user-cache/stats', methods=['GET'])
+@token_required
+def user_cache_stats():
+    return jsonify(user_cache.stats())
+
+@bp.route('/api/analytics/trends', methods=['GET'])
+@login_required_if_enabled
+def get_analytics_trends():
+    days = request.args.get('days', 30)
+    bucket = request.args.get('bucket', 'day')
+    try:
+        days = int(days)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'days must be an integer'}), 400
+    if not 1 <= days <= 365:
+        return jsonify({'error': 'days must be between 1 and 365'}), 400
+    if bucket not in TREND_BUCKETS:
+        return jsonify({'error': f"bucket must be one of: {', '.join(TREND_BUCKETS)}"}), 400
+    
+    # Without ?days= the completion rate summary keeps its original 7-day window
+    rate_days = days if 'days' in request.args else 7
+    
+    start_date, end_date = AnalyticsService.get_trend_window(current_user.id, days)
+    return conditional(jsonify({
+        'window': {'days': days, 'bucket': bucket, 'completion_rate_days': rate_days,
+                   'start': start_date.isoformat(), 'end': end_date.isoformat()},
+        'productivity': AnalyticsService.get_productivity_trends(current_user.id, days, bucket),
+        'completion_rates': AnalyticsService.get_completion_rate_by_priority(current_user.id, rate_days),
+        'completion_by_priority': AnalyticsService.get_completion_rate_by_priority(current_user.id, days, bucket)
+    }))
+
+@bp.route('/api/archive/<kind>', methods=['GET'])
+@login_required_if_enabled
+def get_archive(kind):
+    """Rows moved out of the live tables by the retention job (see `flask purge-data`)"""
+    if kind not in RETENTION_POLICIES:
+        return jsonify({'error': f"kind must be one of: {', '.join(RETENTION_POLICIES)}"}), 400
+    try:
+        after = parse_date(request.args.get('after'))
+        before = parse_date(request.args.get('before'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    limit = max(1, min(request.args.get('limit', type=int) or 500, 5000))
+    return jsonify(RetentionService.get_archived(current_user.id, kind, after, before, limit))
+
+@bp.route('/api/voice-notes', methods=['GET', 'POST'])
 @login_required_if_enabled
 def handle_voice_notes():
     if request.method == 'POST':
@@ -433,27 +648,206 @@ def handle_voice_notes():
             note_type=data['note_type'],
             user_id=current_user.id
         )
+        if data.get('transcription_id'):
+            # Keep the recording by reference to the file the transcription used
+            job = db.session.get(TranscriptionJob, data['transcription_id'])
+            if job is None or job.user_id != current_user.id:
+                return jsonify({'error': 'Transcription not found'}), 404
+            voice_note.audio_path = job.audio_path
         db.session.add(voice_note)
         db.session.commit()
         return jsonify({'status': 'success', 'id': voice_note.id})
     
-    voice_notes = VoiceNote.query.filter_by(user_id=current_user.id).all()
-    return jsonify([{
-        'id': n.id,
-        'transcription': n.transcription,
-        'note_type': n.note_type,
-        'created_at': n.created_at.isoformat()
-    } for n in voice_notes])
-
-@app.route('/api/reset-data', methods=['POST'])
+    try:
+        query = VoiceNote.query.filter_by(user_id=current_user.id)
+        if request.args.get('note_type'):
+            query = query.filter(VoiceNote.note_type == request.args['note_type'])
+        created_after = parse_date(request.args.get('created_after'))
+        if created_after:
+            query = query.filter(VoiceNote.created_at >= created_after)
+        created_before = parse_date(request.args.get('created_before'))
+        if created_before:
+            query = query.filter(VoiceNote.created_at < created_before)
+        return paginated_response(query, VoiceNote, VOICE_NOTE_LIST_FIELDS, VOICE_NOTE_FIELDS)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+@bp.route('/api/voice-notes/<int:note_id>/audio', methods=['GET'])
+@login_required_if_enabled
+def get_voice_note_audio(note_id):
+    voice_note = VoiceNote.query.get_or_404(note_id)
+    if voice_note.user_id != current_user.id:
+        return jsonify({'error': 'Unauthorized'}), 403
+    if not voice_note.audio_path:
+        return jsonify({'error': 'No audio stored for this note'}), 404
+    try:
+        return send_file(audio_storage.open(voice_note.audio_path), mimetype='application/octet-stream',
+                         download_name=voice_note.audio_path.rsplit('/', 1)[-1], conditional=False)
+    except FileNotFoundError:
+        return jsonify({'error': 'Audio file is missing'}), 404
+
+@bp.route('/api/transcribe', methods=['POST'])
+@login_required_if_enabled
+def transcribe_audio():
+    """Accept audio as multipart ``audio`` field or as a raw audio/* body.
+
+    The body is streamed to a temporary file in chunks (never held in memory),
+    stored by path, and transcribed on a worker thread. Poll the returned URL
+    for the text.
+    """
+    upload = None
+    try:
+        if request.mimetype == 'multipart/form-data':
+            _, _, files = parse_form_data(
+                request.environ, stream_factory=audio_storage.new_upload, max_content_length=AUDIO_MAX_BYTES
+            )
+            audio = files.get('audio')
+            # Parts that were not the audio still got a temporary file
+            for _, part in files.items(multi=True):
+                if part is not audio:
+                    audio_storage.discard(part.stream)
+            if audio is None or not audio.filename:
+                return jsonify({'error': 'No audio file provided'}), 400
+            upload = audio.stream
+            extension = audio_extension(audio.filename, audio.mimetype)
+        elif request.mimetype.startswith('audio/') or request.mimetype == 'application/octet-stream':
+            upload = audio_storage.copy_stream(request.stream, AUDIO_MAX_BYTES)
+            extension = audio_extension(content_type=request.mimetype)
+        else:
+            return jsonify({'error': 'Send audio as multipart/form-data or an audio/* body'}), 415
+
+        if upload.seek(0, os.SEEK_END) == 0:
+            audio_storage.discard(upload)
+            return jsonify({'error': 'Empty audio file'}), 400
+        audio_path = audio_storage.commit(upload, current_user.id, extension)
+    except (RequestEntityTooLarge, AudioTooLarge):
+        if upload is not None:
+            audio_storage.discard(upload)
+        return jsonify({'error': f'Audio exceeds {AUDIO_MAX_BYTES // (1024 * 1024)}MB'}), 413
+    except Exception as e:
+        if upload is not None:
+            audio_storage.discard(upload)
+        print(f"Error storing audio upload: {str(e)}")
+        return jsonify({'error': 'Failed to store audio'}), 500
+
+    job = TranscriptionService.submit(current_user.id, audio_path)
+    status_url = url_for('main.get_transcription', job_id=job.id)
+    response = jsonify({'id': job.id, 'status': job.status, 'url': status_url})
+    response.headers['Location'] = status_url
+    return response, 202
+
+@bp.route('/api/transcribe/<int:job_id>', methods=['GET'])
+@login_required_if_enabled
+def get_transcription(job_id):
+    job = TranscriptionJob.query.get_or_404(job_id)
+    if job.user_id != current_user.id:
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    status = TranscriptionService.get_status(job)
+    if status == 'failed':
+        return jsonify({'id': job.id, 'status': status, 'error': job.error})
+    if status == 'pending':
+        response = jsonify({'id': job.id, 'status': status})
+        response.headers['Retry-After'] = '1'
+        return response
+    return jsonify({'id': job.id, 'status': status, 'text': job.text})
+
+@bp.route('/api/reset-data', methods=['POST'])
 @login_required_if_enabled
 def reset_data():
-    with app.app_context():
-        db.drop_all()
-        db.create_all()
-        get_or_create_test_user()
+    db.drop_all(bind_key=None)  # Only the primary; replicas follow it
+    db.create_all(bind_key=None)
+    identity_cache.clear()  # Cached identities point at rows that no longer exist
+    invalidate_all_user_caches()  # Missing version stamps read as 0 again, so keys from before would match
+    SearchService.rebuild()
+    get_or_create_test_user()
     return jsonify({'status': 'success'})
 
-with app.app_context():
-    db.create_all()
-    get_or_create_test_user()
+@bp.cli.command('upgrade-db')
+def upgrade_db_command():
+    """Add missing tables, columns and indexes to an existing database."""
+    upgrade_schema(log=click.echo)
+    click.echo('Schema is up to date')
+
+@bp.cli.command('recompute-analytics')
+@click.option('--start', 'start_date', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+              help="First day to build (YYYY-MM-DD, defaults to each user's local today).")
+@click.option('--end', 'end_date', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+              help='Last day to build, inclusive (defaults to --start).')
+@click.option('--user-id', 'user_ids', type=int, multiple=True, help='Limit to these users.')
+@click.option('--chunk-size', default=500, show_default=True, help='Users per batch.')
+@click.option('--workers', default=1, show_default=True, help='Chunks processed in parallel.')
+def recompute_analytics_command(start_date, end_date, user_ids, chunk_size, workers):
+    """Rebuild UserAnalytics rows for all users over a range of days."""
+    stats = BatchAnalyticsService.recompute(
+        start_date=start_date.date() if start_date else None,
+        end_date=end_date.date() if end_date else None,
+        user_ids=list(user_ids) or None,
+        chunk_size=chunk_size,
+        workers=workers
+    )
+    click.echo(
+        f"Rebuilt analytics for {stats['users']} users over {stats['days']} days: "
+        f"{stats['inserted']} inserted, {stats['updated']} updated in {stats['seconds']}s"
+    )
+
+@bp.cli.command('rebuild-habit-streaks')
+@click.option('--batch-size', default=1000, show_default=True, help='Rows per fetch and per UPDATE batch.')
+def rebuild_habit_streaks_command(batch_size):
+    """Recompute every habit's current and best streak from its check-in log."""
+    stats = HabitService.rebuild_streaks(batch_size=batch_size)
+    click.echo(
+        f"Rebuilt streaks for {stats['habits']} habits from {stats['logs']} check-ins "
+        f"({stats['reset']} without check-ins reset) in {stats['seconds']}s"
+    )
+
+@bp.cli.command('rebuild-search-index')
+def rebuild_search_index_command():
+    """Rebuild the full-text search index from tasks, goals and voice notes."""
+    SearchService.rebuild()
+    click.echo('Search index rebuilt')
+
+@bp.cli.command('rebuild-priority-rollups')
+@click.option('--chunk-size', default=500, show_default=True, help='Users per chunk.')
+def rebuild_priority_rollups_command(chunk_size):
+    """Recompute the per-priority task completion rollups from the task table."""
+    users = PriorityRollupService.rebuild(chunk_size=chunk_size)
+    click.echo(f'Rebuilt priority rollups for {users} users')
+
+@bp.cli.command('purge-data')
+@click.option('--only', 'kinds', multiple=True,
+              type=click.Choice(list(RETENTION_POLICIES) + list(RETENTION_CLEANUPS)),
+              help='Policy to apply (repeatable; defaults to all).')
+@click.option('--batch-size', default=None, type=int, help='Rows per transaction (defaults to RETENTION_BATCH_SIZE).')
+@click.option('--max-batches', default=None, type=int, help='Stop each policy after this many batches.')
+@click.option('--dry-run', is_flag=True, help='Count what would be purged without changing anything.')
+def purge_data_command(kinds, batch_size, max_batches, dry_run):
+    """Archive and delete data past its retention period, in small batches."""
+    options = {'max_batches': max_batches, 'dry_run': dry_run}
+    if batch_size:
+        options['batch_size'] = batch_size
+    for stats in RetentionService.run(list(kinds) or None, **options):
+        kind = stats.pop('kind')
+        click.echo(f"{kind}: " + ', '.join(f'{name}={value}' for name, value in stats.items()))
+
+@bp.cli.command('move-voice-audio')
+@click.option('--batch-size', default=100, show_default=True, help='Voice notes per commit.')
+def move_voice_audio_command(batch_size):
+    """Move audio stored inline in voice_note rows to audio storage."""
+    moved = 0
+    last_id = 0
+    while True:
+        ids = [row.id for row in db.session.query(VoiceNote.id).filter(
+            VoiceNote.id > last_id,
+            VoiceNote.audio_data.isnot(None)
+        ).order_by(VoiceNote.id).limit(batch_size)]
+        if not ids:
+            break
+        for note in VoiceNote.query.options(undefer(VoiceNote.audio_data)).filter(VoiceNote.id.in_(ids)):
+            if not note.audio_path:
+                note.audio_path = audio_storage.save_bytes(note.audio_data, note.user_id)
+            note.audio_data = None
+            moved += 1
+        db.session.commit()
+        last_id = ids[-1]
+    click.echo(f'Moved audio for {moved} voice notes')
@@ -0,0 +1,114 @@
+"""ASGI entry point: LLM-bound routes run on the event loop, everything else on a thread pool.
+
+    pip install -e '.[asgi]'      # or: uv sync --extra asgi
+    flask --app app upgrade-db    # once per deploy
+    uvicorn asgi:application --host 0.0.0.0 --port 5000
+
+A sync worker serving /api/goals/suggest-tasks is held for the whole OpenAI
+call. Here that route awaits the async OpenAI client instead, so any number
+of in-flight completions share one event loop while the ASGI_THREADS pool
+keeps serving the regular Flask routes. The async handler reuses Flask for
+everything but the wait: the session, login and LLM cache are checked in a
+request context on the pool, and any request it does not expect (not
+logged in, invalid body) is passed to the sync route unchanged. The
+streamed variant (/api/goals/suggest-tasks/stream) sends each task as a
+server-sent event as soon as the model has written it.
+"""
+import io
+from flask import request, session
+from flask_login import current_user
+from app import create_app
+from services.asgi_bridge import WSGIBridge, AsyncRouter, build_environ, read_body, send_json
+from services.llm import cached_completion, store_completion, async_chat_completion, async_stream_chat_completion
+from services.suggestions import TaskSuggestionService, SuggestionEvents, SUGGEST_TASKS_PROMPT, SSE_HEADERS
+from config.settings import ASGI_THREADS, ASGI_ASYNC_ROUTES
+
+app = create_app()
+bridge = WSGIBridge(app, threads=ASGI_THREADS)
+
+
+def _session_cookies():
+    """Set-Cookie headers for a session the request context modified (the identity cache refreshes it)"""
+    if not session.modified:
+        return []
+    response = app.response_class()
+    app.session_interface.save_session(app, session._get_current_object(), response)
+    return [('set-cookie', value) for value in response.headers.getlist('Set-Cookie')]
+
+
+def _prepare_suggestion(environ):
+    with app.request_context(environ):
+        if not current_user.is_authenticated:
+            return None
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return None
+        user_content = TaskSuggestionService.user_content(data)
+        key, cached = cached_completion(SUGGEST_TASKS_PROMPT, user_content)
+        return user_content, key, cached, _session_cookies()
+
+
+def _store(key, content):
+    with app.app_context():
+        store_completion(key, content)
+
+
+async def suggest_tasks(scope, receive, send):
+    body = await read_body(receive)
+    prepared = await bridge.run(_prepare_suggestion, build_environ(scope, io.BytesIO(body)))
+    if prepared is None:
+        return await bridge(scope, receive, send, body=body)
+    user_content, key, cached, cookies = prepared
+
+    try:
+        content = cached
+        if content is None:
+            content = await async_chat_completion(SUGGEST_TASKS_PROMPT, user_content)
+            await bridge.run(_store, key, content)
+        tasks = TaskSuggestionService.parse(content)
+    except Exception as e:
+        print(f"Error generating tasks: {str(e)}")
+        return await send_json(send, 500, {'error': 'Failed to generate tasks'}, cookies)
+    await send_json(send, 200, tasks, cookies)
+
+
+async def suggest_tasks_stream(scope, receive, send):
+    body = await read_body(receive)
+    prepared = await bridge.run(_prepare_suggestion, build_environ(scope, io.BytesIO(body)))
+    if prepared is None:
+        return await bridge(scope, receive, send, body=body)
+    user_content, key, cached, cookies = prepared
+
+    headers = [('content-type', 'text/event-stream; charset=utf-8')] + [(k.lower(), v) for k, v in SSE_HEADERS.items()]
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [(name.encode('latin-1'), value.encode('latin-1')) for name, value in headers + cookies],
+    })
+
+    async def emit(events):
+        for event in events:
+            await send({'type': 'http.response.body', 'body': event.encode('utf-8'), 'more_body': True})
+
+    events = SuggestionEvents()
+    try:
+        if cached is not None:
+            await emit(events.feed(cached))
+        else:
+            async for piece in async_stream_chat_completion(SUGGEST_TASKS_PROMPT, user_content):
+                await emit(events.feed(piece))
+        await emit(events.finish())
+        if cached is None:
+            await bridge.run(_store, key, events.text)
+    except Exception as e:
+        print(f"Error streaming tasks: {str(e)}")
+        await emit([events.error()])
+    await send({'type': 'http.response.body', 'body': b''})
+
+
+ROUTES = {
+    ('POST', '/api/goals/suggest-tasks'): suggest_tasks,
+    ('POST', '/api/goals/suggest-tasks/stream'): suggest_tasks_stream,
+}
+
+application = AsyncRouter(bridge, ROUTES if ASGI_ASYNC_ROUTES else {})
@@ -0,0 +1,56 @@
+"""Boot-time benchmark for the app factory.
+
+Imports app and calls create_app() in fresh interpreters, as a worker does
+at boot, and reports the median import and create_app() times. Exits
+non-zero when the median is over --budget seconds.
+
+    python -m benchmarks.boot_time
+    python -m benchmarks.boot_time --budget 0.8 --runs 9
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BOOT = '''
+import json, time
+started = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+create_app()
+created = time.perf_counter()
+print(json.dumps({'import_s': imported - started, 'create_s': created - imported}))
+'''
+
+
+def boot(workdir):
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'boot.db')}")
+    output = subprocess.run([sys.executable, '-c', BOOT], env=env, check=True, capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--budget', type=float, default=1.0, help='Seconds allowed for import plus create_app().')
+    parser.add_argument('--runs', type=int, default=5, help='Fresh interpreters to time.')
+    args = parser.parse_args()
+    os.environ.setdefault('LLM_BACKEND', 'stub')
+
+    workdir = tempfile.mkdtemp(prefix='lifetune-boot-')
+    runs = [boot(workdir) for _ in range(args.runs)]
+    median = statistics.median(run['import_s'] + run['create_s'] for run in runs)
+    print(f"boot: median {median * 1000:.0f} ms (import {statistics.median(r['import_s'] for r in runs) * 1000:.0f} ms, "
+          f"create_app {statistics.median(r['create_s'] for r in runs) * 1000:.0f} ms) over {args.runs} runs, "
+          f"budget {args.budget * 1000:.0f} ms")
+    if median > args.budget:
+        print(f'Boot took {median:.3f}s, over the {args.budget:.3f}s budget')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,44 @@
+"""Shared helpers for the benchmark scripts.
+
+Benchmarks run against a throwaway SQLite database unless DATABASE_URL is
+already set, so they can be run from a fresh checkout:
+
+    python -m benchmarks.goal_prediction
+"""
+import os
+import tempfile
+from contextlib import contextmanager
+from sqlalchemy import event
+
+
+def load_app():
+    """Create the Flask app and its schema, on a temporary database if none is configured"""
+    if not os.environ.get('DATABASE_URL'):
+        path = os.path.join(tempfile.mkdtemp(prefix='lifetune-bench-'), 'bench.db')
+        os.environ['DATABASE_URL'] = f'sqlite:///{path}'
+    from app import create_app
+    from migrations import upgrade_schema
+    app = create_app()
+    with app.app_context():
+        upgrade_schema(log=print)
+    return app
+
+
+class QueryCounter:
+    """Counts SQL statements executed on an engine"""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+
+@contextmanager
+def count_queries(engine):
+    counter = QueryCounter()
+    event.listen(engine, 'before_cursor_execute', counter)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, 'before_cursor_execute', counter)
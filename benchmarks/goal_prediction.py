@@ -0,0 +1,65 @@
+"""Query count and latency of AnalyticsService.predict_goal_completion by goal count.
+
+The prediction must issue a constant number of queries however many goals a
+user has. Exits non-zero if the count grows.
+"""
+import sys
+import time
+from datetime import datetime, timedelta
+from benchmarks.common import load_app, count_queries
+
+GOAL_COUNTS = [1, 10, 50, 200]
+REPEAT = 20
+
+
+def main():
+    app = load_app()
+    from database import db
+    from models import User, Goal, UserAnalytics
+    from services.analytics import AnalyticsService
+
+    results = []
+    with app.app_context():
+        now = datetime.utcnow()
+        for n in GOAL_COUNTS:
+            user = User(username=f'bench_goals_{n}', email=f'bench_goals_{n}@example.com')
+            db.session.add(user)
+            db.session.flush()
+            user_id = user.id
+            db.session.add_all([
+                Goal(
+                    title=f'Goal {i}',
+                    target_date=now + timedelta(days=10 + i % 60),
+                    created_at=now - timedelta(days=1 + i % 30),
+                    progress=i % 100,
+                    user_id=user_id
+                )
+                for i in range(n)
+            ])
+            db.session.add_all([
+                UserAnalytics(user_id=user_id, date=(now - timedelta(days=d)).date(), goals_progress=40 - d)
+                for d in range(7)
+            ])
+            db.session.commit()
+            db.session.expunge_all()
+
+            with count_queries(db.engine) as counter:
+                AnalyticsService.predict_goal_completion(user_id)
+            started = time.perf_counter()
+            for _ in range(REPEAT):
+                AnalyticsService.predict_goal_completion(user_id)
+            elapsed_ms = (time.perf_counter() - started) / REPEAT * 1000
+            results.append((n, counter.count, elapsed_ms))
+
+    print(f"{'goals':>6} {'queries':>8} {'ms/call':>8}")
+    for n, queries, elapsed_ms in results:
+        print(f'{n:>6} {queries:>8} {elapsed_ms:>8.2f}')
+
+    if len({queries for _, queries, _ in results}) != 1:
+        print('FAIL: query count grows with the number of goals')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
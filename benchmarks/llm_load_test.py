@@ -0,0 +1,219 @@
+"""Load test for the async serving mode (asgi.py) against a delayed OpenAI stub.
+
+Starts a local server that answers /v1/chat/completions after --delay
+seconds, then serves the app with uvicorn pointed at it (OPENAI_BASE_URL)
+and fires --llm-requests concurrent POST /api/goals/suggest-tasks while
+--crud-clients clients keep calling GET /api/tasks. Reports how long the
+completions took and the CRUD latency while they were in flight.
+
+    python -m benchmarks.llm_load_test                 # async and sync modes, compared
+    python -m benchmarks.llm_load_test --mode async --llm-requests 2000
+
+The sync mode is the same server with ASGI_ASYNC_ROUTES=0, so every request
+needs one of the --threads pool threads, as under sync WSGI workers.
+Needs uvicorn (pip install uvicorn).
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlencode
+from benchmarks.load_test import percentile
+
+HOST = '127.0.0.1'
+STUB_CONTENT = json.dumps([{'title': f'Step {i}', 'description': f'Suggested step {i}.'} for i in range(1, 6)])
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind((HOST, 0))
+        return sock.getsockname()[1]
+
+
+async def _stub_connection(reader, writer, delay):
+    """One keep-alive connection to the stub: every request gets a canned chat completion after delay"""
+    try:
+        while True:
+            head = await reader.readuntil(b'\r\n\r\n')
+            length = 0
+            for line in head.split(b'\r\n'):
+                if line.lower().startswith(b'content-length:'):
+                    length = int(line.split(b':', 1)[1])
+            request = json.loads(await reader.readexactly(length) or b'{}')
+            await asyncio.sleep(delay)
+            body = json.dumps({
+                'id': 'chatcmpl-stub', 'object': 'chat.completion', 'created': int(time.time()),
+                'model': request.get('model', 'stub'),
+                'choices': [{'index': 0, 'finish_reason': 'stop',
+                             'message': {'role': 'assistant', 'content': STUB_CONTENT}}],
+                'usage': {'prompt_tokens': 1, 'completion_tokens': 1, 'total_tokens': 2},
+            }).encode()
+            writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n'
+                         + f'Content-Length: {len(body)}\r\n\r\n'.encode() + body)
+            await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+def start_stub(port, delay):
+    """Run the delayed OpenAI stub on its own event loop in a daemon thread"""
+    ready = threading.Event()
+
+    def serve():
+        loop = asyncio.new_event_loop()
+        loop.run_until_complete(asyncio.start_server(
+            lambda r, w: _stub_connection(r, w, delay), HOST, port, backlog=4096))
+        ready.set()
+        loop.run_forever()
+
+    threading.Thread(target=serve, daemon=True).start()
+    ready.wait()
+
+
+async def http(port, method, path, body=b'', headers=None):
+    """Minimal HTTP/1.1 request on a fresh connection; returns (status, headers, body)"""
+    reader, writer = await asyncio.open_connection(HOST, port)
+    lines = [f'{method} {path} HTTP/1.1', f'Host: {HOST}:{port}', 'Connection: close',
+             f'Content-Length: {len(body)}'] + [f'{k}: {v}' for k, v in (headers or {}).items()]
+    writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode() + body)
+    await writer.drain()
+    data = await reader.read()
+    writer.close()
+    head, _, content = data.partition(b'\r\n\r\n')
+    head_lines = head.decode('latin-1').split('\r\n')
+    response_headers = [tuple(part.strip() for part in line.split(':', 1)) for line in head_lines[1:]]
+    return int(head_lines[0].split(' ', 2)[1]), response_headers, content
+
+
+def start_app(port, stub_port, mode, threads, workdir):
+    env = dict(
+        os.environ,
+        DATABASE_URL=f"sqlite:///{os.path.join(workdir, f'{mode}.db')}",
+        LLM_BACKEND='openai',
+        OPENAI_API_KEY='stub',
+        OPENAI_BASE_URL=f'http://{HOST}:{stub_port}/v1',
+        LLM_CACHE_ENABLED='0',
+        ASGI_THREADS=str(threads),
+        ASGI_ASYNC_ROUTES='1' if mode == 'async' else '0',
+    )
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    subprocess.run([sys.executable, '-m', 'flask', '--app', 'app', 'upgrade-db'],
+                   env=env, cwd=root, check=True, stdout=subprocess.DEVNULL)
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'asgi:application', '--host', HOST, '--port', str(port),
+         '--no-access-log', '--log-level', 'warning', '--backlog', '4096'],
+        env=env, cwd=root
+    )
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'uvicorn exited with {process.returncode}')
+        try:
+            socket.create_connection((HOST, port), timeout=0.5).close()
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError('uvicorn did not start')
+
+
+async def run_load(port, llm_requests, crud_clients):
+    form = urlencode({'username': 'llm_load', 'email': 'llm_load@example.com', 'password': 'load'}).encode()
+    _, headers, _ = await http(port, 'POST', '/register', form,
+                               {'Content-Type': 'application/x-www-form-urlencoded'})
+    cookie = '; '.join(v.split(';', 1)[0] for k, v in headers if k.lower() == 'set-cookie')
+    auth = {'Cookie': cookie}
+    body = json.dumps({'title': 'Run a marathon', 'description': 'In under four hours'}).encode()
+
+    llm_latencies, llm_errors = [], 0
+    crud_latencies, crud_errors = [], 0
+    done = asyncio.Event()
+
+    async def suggest():
+        nonlocal llm_errors
+        started = time.perf_counter()
+        try:
+            status, _, content = await http(port, 'POST', '/api/goals/suggest-tasks', body,
+                                            dict(auth, **{'Content-Type': 'application/json'}))
+            ok = status == 200 and isinstance(json.loads(content), list)
+        except (OSError, ValueError):
+            ok = False
+        if ok:
+            llm_latencies.append(time.perf_counter() - started)
+        else:
+            llm_errors += 1
+
+    async def crud():
+        nonlocal crud_errors
+        while not done.is_set():
+            started = time.perf_counter()
+            try:
+                status, _, _ = await http(port, 'GET', '/api/tasks', headers=auth)
+            except OSError:
+                status = None
+            if status == 200:
+                crud_latencies.append(time.perf_counter() - started)
+            else:
+                crud_errors += 1
+
+    probes = [asyncio.create_task(crud()) for _ in range(crud_clients)]
+    started = time.perf_counter()
+    await asyncio.gather(*(suggest() for _ in range(llm_requests)))
+    elapsed = time.perf_counter() - started
+    done.set()
+    await asyncio.gather(*probes)
+
+    def ms(values, pct):
+        value = percentile(sorted(values), pct)
+        return round(value * 1000, 1) if value is not None else None
+
+    return {
+        'llm': {'requests': llm_requests, 'errors': llm_errors, 'elapsed_s': round(elapsed, 2),
+                'throughput_rps': round(len(llm_latencies) / elapsed, 1),
+                'p50_ms': ms(llm_latencies, 50), 'p95_ms': ms(llm_latencies, 95)},
+        'crud': {'requests': len(crud_latencies), 'errors': crud_errors,
+                 'p50_ms': ms(crud_latencies, 50), 'p95_ms': ms(crud_latencies, 95),
+                 'max_ms': ms(crud_latencies, 100)},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mode', choices=['async', 'sync', 'both'], default='both')
+    parser.add_argument('--llm-requests', type=int, default=200, help='Concurrent task suggestion requests.')
+    parser.add_argument('--crud-clients', type=int, default=4, help='Clients calling GET /api/tasks meanwhile.')
+    parser.add_argument('--delay', type=float, default=1.0, help='Seconds the stub takes per completion.')
+    parser.add_argument('--threads', type=int, default=8, help='ASGI_THREADS for the app server.')
+    args = parser.parse_args()
+
+    stub_port = free_port()
+    start_stub(stub_port, args.delay)
+    workdir = tempfile.mkdtemp(prefix='lifetune-llm-load-')
+    results = {}
+    for mode in (['async', 'sync'] if args.mode == 'both' else [args.mode]):
+        port = free_port()
+        process = start_app(port, stub_port, mode, args.threads, workdir)
+        try:
+            results[mode] = asyncio.run(run_load(port, args.llm_requests, args.crud_clients))
+        finally:
+            process.terminate()
+            process.wait()
+        llm, crud = results[mode]['llm'], results[mode]['crud']
+        print(f"{mode:>5}: {llm['requests']} completions in {llm['elapsed_s']}s "
+              f"({llm['throughput_rps']}/s, p95 {llm['p95_ms']} ms, {llm['errors']} errors); "
+              f"GET /api/tasks meanwhile p50 {crud['p50_ms']} ms, p95 {crud['p95_ms']} ms "
+              f"over {crud['requests']} requests, {crud['errors']} errors")
+    print(json.dumps(results, indent=2))
+    return 1 if any(r['llm']['errors'] or r['crud']['errors'] for r in results.values()) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
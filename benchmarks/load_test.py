@@ -0,0 +1,242 @@
+"""Latency and throughput benchmark over a synthetic dataset.
+
+Seeds the database with benchmarks.synthetic, logs in as the generated users
+and measures the hot paths with the stub LLM backend:
+
+* GET / (dashboard), GET /api/dashboard, GET /api/tasks, GET /api/goals/<id>, GET /api/analytics/trends
+* AnalyticsService.calculate_daily_analytics, called directly
+
+Each target first gets a warm-up pass, then a sequential run for latency
+percentiles and a concurrent run (--concurrency threads, each with its own
+logged-in client) for throughput. Results are written as JSON together with
+the commit, dataset size and settings, so runs can be compared across commits:
+
+    python -m benchmarks.load_test --scale medium --output before.json
+    python -m benchmarks.load_test --scale medium --compare before.json
+
+With --compare the run exits non-zero when any p95 regressed by more than
+--tolerance (default 20%).
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+from benchmarks.common import load_app
+from benchmarks.synthetic import PASSWORD, add_arguments, scale_from_args
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an ascending list"""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def summarize(latencies, errors, queries, elapsed=None, requests=None):
+    """Latency percentiles in milliseconds, plus throughput when a concurrent run is given"""
+    values = sorted(latencies)
+    summary = {
+        'samples': len(values),
+        'errors': errors,
+        'mean_ms': round(sum(values) / len(values) * 1000, 3) if values else None,
+        'max_ms': round(values[-1] * 1000, 3) if values else None,
+    }
+    for pct in PERCENTILES:
+        value = percentile(values, pct)
+        summary[f'p{pct}_ms'] = round(value * 1000, 3) if value is not None else None
+    if queries:
+        summary['queries_per_call'] = round(sum(queries) / len(queries), 2)
+    if elapsed:
+        summary['throughput_rps'] = round(requests / elapsed, 1)
+    return summary
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def _login(app, email):
+    client = app.test_client()
+    response = client.post('/login', data={'email': email, 'password': PASSWORD})
+    if response.status_code != 302:
+        raise RuntimeError(f'Could not log in as {email}')
+    return client
+
+
+def http_target(app, path_for):
+    """A callable (client, user) -> (ok, queries) issuing one GET"""
+    def call(client, user):
+        response = client.get(path_for(user))
+        response.get_data()
+        return response.status_code == 200, int(response.headers.get('X-Query-Count', 0))
+    return call
+
+
+def analytics_target(app):
+    """A callable recomputing one user's daily analytics inside an app context"""
+    from database import db
+    from services.analytics import AnalyticsService
+
+    def call(client, user):
+        with app.app_context():
+            AnalyticsService.calculate_daily_analytics(user['id'])
+            db.session.remove()
+        return True, None
+    return call
+
+
+def measure(target, sessions, iterations, concurrency, rng):
+    """Warm up, then time a sequential run and a concurrent run of the target"""
+    for client, user in sessions:
+        target(client, user)
+
+    latencies, queries, errors = [], [], 0
+    for _ in range(iterations):
+        client, user = rng.choice(sessions)
+        started = time.perf_counter()
+        ok, count = target(client, user)
+        latencies.append(time.perf_counter() - started)
+        errors += 0 if ok else 1
+        if count is not None:
+            queries.append(count)
+
+    # Each thread drives its own sessions, since a test client keeps cookies per instance
+    per_thread = max(1, iterations // concurrency)
+    failures = []
+    lock = threading.Lock()
+
+    def worker(thread_sessions):
+        local_rng = random.Random(id(thread_sessions))
+        for _ in range(per_thread):
+            client, user = local_rng.choice(thread_sessions)
+            ok, _ = target(client, user)
+            if not ok:
+                with lock:
+                    failures.append(1)
+
+    groups = [sessions[i::concurrency] or sessions for i in range(concurrency)]
+    threads = [threading.Thread(target=worker, args=(group,)) for group in groups]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    summary = summarize(latencies, errors + len(failures), queries, elapsed, per_thread * concurrency)
+    summary['concurrency'] = concurrency
+    return summary
+
+
+def compare(results, baseline, tolerance):
+    """Print p95 changes against a previous results file; returns the number of regressions"""
+    regressions = 0
+    print(f"\n{'target':<48} {'base p95':>10} {'p95':>10} {'change':>8}", file=sys.stderr)
+    for name, summary in results['results'].items():
+        before = baseline.get('results', {}).get(name, {}).get('p95_ms')
+        after = summary['p95_ms']
+        if not before or after is None:
+            print(f'{name:<48} {"-":>10} {after:>10}', file=sys.stderr)
+            continue
+        change = (after - before) / before
+        flag = ''
+        if change > tolerance:
+            regressions += 1
+            flag = '  REGRESSED'
+        print(f'{name:<48} {before:>10.2f} {after:>10.2f} {change:>+7.0%}{flag}', file=sys.stderr)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    add_arguments(parser)
+    parser.add_argument('--iterations', type=int, default=200, help='Timed calls per target.')
+    parser.add_argument('--concurrency', type=int, default=4, help='Threads for the throughput run.')
+    parser.add_argument('--sessions', type=int, default=8, help='Logged-in users to rotate through.')
+    parser.add_argument('--output', help='Write results JSON here (default: stdout).')
+    parser.add_argument('--compare', help='Previous results JSON to compare p95 latencies against.')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed p95 increase with --compare.')
+    args = parser.parse_args()
+
+    os.environ.setdefault('LLM_BACKEND', 'stub')
+    app = load_app()
+    from database import db
+    from models import User, Goal
+    from benchmarks.synthetic import generate
+
+    scale = scale_from_args(args)
+    rng = random.Random(args.seed)
+    with app.app_context():
+        started = time.perf_counter()
+        dataset = generate(db, seed=args.seed, **scale)
+        seed_seconds = time.perf_counter() - started
+        chosen = rng.sample(dataset.pop('user_ids'), min(args.sessions, dataset['users']))
+        users = []
+        for user_id in chosen:
+            email = db.session.get(User, user_id).email
+            goal_ids = [row[0] for row in db.session.query(Goal.id).filter(Goal.user_id == user_id)]
+            users.append({'id': user_id, 'email': email, 'goal_ids': goal_ids})
+
+    sessions = [(_login(app, user['email']), user) for user in users]
+    targets = {
+        'GET /': http_target(app, lambda user: '/'),
+        'GET /api/dashboard': http_target(app, lambda user: '/api/dashboard'),
+        'GET /api/tasks': http_target(app, lambda user: '/api/tasks'),
+        'GET /api/goals/<id>': http_target(app, lambda user: f"/api/goals/{rng.choice(user['goal_ids'])}"),
+        'GET /api/analytics/trends': http_target(app, lambda user: '/api/analytics/trends'),
+        'GET /api/analytics/trends?days=365&bucket=week': http_target(
+            app, lambda user: '/api/analytics/trends?days=365&bucket=week'
+        ),
+        'calculate_daily_analytics': analytics_target(app),
+    }
+
+    results = {
+        'meta': {
+            'commit': _git_commit(),
+            'timestamp': datetime.utcnow().isoformat() + 'Z',
+            'python': platform.python_version(),
+            'database': app.config['SQLALCHEMY_DATABASE_URI'].split(':', 1)[0],
+            'dataset': dataset,
+            'seed_seconds': round(seed_seconds, 2),
+            'seed': args.seed,
+            'iterations': args.iterations,
+            'concurrency': args.concurrency,
+            'sessions': len(sessions),
+        },
+        'results': {}
+    }
+    for name, target in targets.items():
+        results['results'][name] = measure(target, sessions, args.iterations, args.concurrency, rng)
+        summary = results['results'][name]
+        print(f"{name:<48} p50 {summary['p50_ms']:>8.2f} ms  p95 {summary['p95_ms']:>8.2f} ms  "
+              f"{summary['throughput_rps']:>8.1f} req/s  errors {summary['errors']}", file=sys.stderr)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+    failures = sum(summary['errors'] for summary in results['results'].values())
+    if args.compare:
+        with open(args.compare) as f:
+            failures += compare(results, json.load(f), args.tolerance)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,181 @@
+"""Synthetic dataset generator for benchmarks and load tests.
+
+Seeds the configured database (a throwaway SQLite file unless DATABASE_URL
+is set, so Postgres works too) with users spread over several timezones and
+their goals, tasks, habits, habit check-ins and voice notes. Rows go in with
+bulk INSERTs; the derived tables (search index, priority rollups, habit
+streaks and daily analytics) are then rebuilt the way the CLI commands do.
+The same seed always produces the same data.
+
+    python -m benchmarks.synthetic --scale medium
+    python -m benchmarks.synthetic --users 500 --tasks-per-goal 20 --days 180
+"""
+import argparse
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import insert, func
+from werkzeug.security import generate_password_hash
+from benchmarks.common import load_app
+
+SCALES = {
+    'small': dict(users=10, goals_per_user=3, tasks_per_goal=5, habits_per_user=3,
+                  voice_notes_per_user=5, days=30),
+    'medium': dict(users=50, goals_per_user=8, tasks_per_goal=12, habits_per_user=5,
+                   voice_notes_per_user=20, days=90),
+    'large': dict(users=200, goals_per_user=15, tasks_per_goal=25, habits_per_user=8,
+                  voice_notes_per_user=60, days=365),
+}
+PASSWORD = 'benchmark'
+TIMEZONES = ['UTC', 'America/New_York', 'America/Los_Angeles', 'Europe/Berlin', 'Asia/Kolkata', 'Australia/Sydney']
+CATEGORIES = ['health', 'career', 'learning', 'personal', 'finance']
+PRIORITIES = ['urgent', 'important', 'normal']
+WORDS = (
+    'plan review write read run call email budget study practice meeting report design '
+    'exercise journal project deadline draft refactor schedule groceries water meditate'
+).split()
+BATCH_SIZE = 1000
+
+
+def _text(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize()
+
+
+def _bulk_insert(db, model, rows):
+    for i in range(0, len(rows), BATCH_SIZE):
+        db.session.execute(insert(model), rows[i:i + BATCH_SIZE])
+
+
+def generate(db, users=10, goals_per_user=3, tasks_per_goal=5, habits_per_user=3,
+             voice_notes_per_user=5, days=30, habit_density=0.7, seed=17, prefix='bench'):
+    """Insert a synthetic dataset and rebuild derived tables; returns row counts and user ids.
+
+    Users are named ``{prefix}_user_{n}`` with password PASSWORD. Call inside an
+    app context.
+    """
+    from models import User, Goal, Task, Habit, HabitLog, VoiceNote
+    from services.search import SearchService
+    from services.rollups import PriorityRollupService
+    from services.habits import HabitService
+    from services.batch_analytics import BatchAnalyticsService
+
+    rng = random.Random(seed)
+    now = datetime.utcnow().replace(microsecond=0)
+    start = now - timedelta(days=days)
+    password_hash = generate_password_hash(PASSWORD)
+
+    def moment():
+        return start + timedelta(seconds=rng.randrange(days * 86400))
+
+    first_user = (db.session.query(func.max(User.id)).scalar() or 0) + 1
+    _bulk_insert(db, User, [
+        {'username': f'{prefix}_user_{n}', 'email': f'{prefix}_user_{n}@example.com',
+         'password_hash': password_hash, 'timezone': TIMEZONES[n % len(TIMEZONES)]}
+        for n in range(first_user, first_user + users)
+    ])
+    user_ids = [row[0] for row in db.session.query(User.id).filter(
+        User.username.like(f'{prefix}_user_%'), User.id >= first_user
+    ).order_by(User.id)]
+
+    _bulk_insert(db, Goal, [
+        {'title': _text(rng, 3), 'description': _text(rng, 12), 'category': rng.choice(CATEGORIES),
+         'progress': rng.randrange(101), 'created_at': moment(),
+         'target_date': now + timedelta(days=rng.randrange(1, 180)), 'user_id': user_id}
+        for user_id in user_ids for _ in range(goals_per_user)
+    ])
+    goals = db.session.query(Goal.id, Goal.user_id).filter(Goal.user_id.in_(user_ids)).all()
+
+    tasks = []
+    for goal_id, user_id in goals:
+        for _ in range(tasks_per_goal):
+            created_at = moment()
+            completed = rng.random() < 0.55
+            tasks.append({
+                'title': _text(rng, 4), 'description': _text(rng, 15), 'priority': rng.choice(PRIORITIES),
+                'created_at': created_at, 'due_date': created_at + timedelta(days=rng.randrange(1, 30)),
+                'completed': completed,
+                'completed_at': min(now, created_at + timedelta(hours=rng.randrange(1, 240))) if completed else None,
+                'user_id': user_id, 'goal_id': goal_id
+            })
+    _bulk_insert(db, Task, tasks)
+
+    _bulk_insert(db, Habit, [
+        {'title': _text(rng, 2), 'description': _text(rng, 8), 'frequency': rng.choice(['daily', 'daily', 'weekly']),
+         'created_at': start, 'user_id': user_id}
+        for user_id in user_ids for _ in range(habits_per_user)
+    ])
+    habits = db.session.query(Habit.id, Habit.frequency).filter(Habit.user_id.in_(user_ids)).all()
+
+    logs = []
+    for habit_id, frequency in habits:
+        step = 7 if frequency == 'weekly' else 1
+        for day in range(0, days, step):
+            if rng.random() < habit_density:
+                logs.append({'habit_id': habit_id,
+                             'completed_at': start + timedelta(days=day, seconds=rng.randrange(86400))})
+    _bulk_insert(db, HabitLog, logs)
+
+    _bulk_insert(db, VoiceNote, [
+        {'transcription': _text(rng, rng.randrange(8, 40)), 'note_type': rng.choice(['task', 'journal']),
+         'created_at': moment(), 'user_id': user_id}
+        for user_id in user_ids for _ in range(voice_notes_per_user)
+    ])
+    db.session.commit()
+
+    SearchService.rebuild()
+    PriorityRollupService.rebuild()
+    HabitService.rebuild_streaks(now=now)
+    BatchAnalyticsService.recompute(start_date=start.date(), end_date=now.date(), user_ids=user_ids)
+
+    return {
+        'user_ids': user_ids,
+        'users': len(user_ids),
+        'goals': len(goals),
+        'tasks': len(tasks),
+        'habits': len(habits),
+        'habit_logs': len(logs),
+        'voice_notes': len(user_ids) * voice_notes_per_user,
+        'days': days,
+    }
+
+
+def add_arguments(parser):
+    parser.add_argument('--scale', choices=sorted(SCALES), default='small', help='Preset dataset size.')
+    parser.add_argument('--users', type=int)
+    parser.add_argument('--goals-per-user', type=int)
+    parser.add_argument('--tasks-per-goal', type=int)
+    parser.add_argument('--habits-per-user', type=int)
+    parser.add_argument('--voice-notes-per-user', type=int)
+    parser.add_argument('--days', type=int, help='History length in days.')
+    parser.add_argument('--seed', type=int, default=17)
+
+
+def scale_from_args(args):
+    """The preset for --scale with any explicit counts applied on top"""
+    scale = dict(SCALES[args.scale])
+    for name in scale:
+        value = getattr(args, name)
+        if value is not None:
+            scale[name] = value
+    return scale
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    add_arguments(parser)
+    args = parser.parse_args()
+    app = load_app()
+    from database import db
+
+    with app.app_context():
+        started = time.perf_counter()
+        counts = generate(db, seed=args.seed, **scale_from_args(args))
+    counts.pop('user_ids')
+    print(', '.join(f'{value} {name}' for name, value in counts.items())
+          + f' generated in {time.perf_counter() - started:.1f}s')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,2 +1,103 @@
+import os
+
 # Authentication Settings
 AUTH_REQUIRED = True  # Set to True to enable authentication
+
+# LLM Settings
+LLM_BACKEND = os.environ.get("LLM_BACKEND", "openai")  # 'openai' or 'stub' for offline runs
+LLM_MODEL = os.environ.get("LLM_MODEL", "gpt-3.5-turbo")
+
+# Background insight generation
+INSIGHT_WORKERS = int(os.environ.get("INSIGHT_WORKERS", 2))
+INSIGHT_REFRESH_MINUTES = int(os.environ.get("INSIGHT_REFRESH_MINUTES", 60))  # Minimum age before regenerating
+
+# LLM response cache
+LLM_CACHE_ENABLED = os.environ.get("LLM_CACHE_ENABLED", "1") == "1"
+LLM_CACHE_BACKEND = os.environ.get("LLM_CACHE_BACKEND", "memory")  # 'memory' or 'database' (shared across workers)
+LLM_CACHE_SIZE = int(os.environ.get("LLM_CACHE_SIZE", 1024))  # In-process entries
+LLM_CACHE_TTL = int(os.environ.get("LLM_CACHE_TTL", 24 * 60 * 60))  # Seconds
+
+# List API pagination
+API_PAGE_SIZE_DEFAULT = int(os.environ.get("API_PAGE_SIZE_DEFAULT", 100))
+API_PAGE_SIZE_MAX = int(os.environ.get("API_PAGE_SIZE_MAX", 500))
+
+# Per-request SQL statement budgets (see services/query_budget.py)
+QUERY_BUDGET_DEFAULT = int(os.environ.get("QUERY_BUDGET_DEFAULT", 8))
+QUERY_BUDGETS = {
+    'main.dashboard': 22,  # Full analytics recompute when today's row is missing or dirty, plus the inlined lists
+    'main.get_dashboard': 22,
+    'main.bulk_tasks': 16,  # Mixed batch: lookups, insert, one update per column set, deletes, index, rollup, analytics
+    'main.ingest_focus_sessions': 12,  # Dedupe and insert, plus one or two analytics updates per day the batch covers
+    'main.search': 2,  # One ranked index query, plus the user load on an identity cache miss
+}
+QUERY_BUDGET_STRICT = os.environ.get("QUERY_BUDGET_STRICT", "0") == "1"  # Fail requests over budget
+
+# Bulk task API
+BULK_MAX_OPERATIONS = int(os.environ.get("BULK_MAX_OPERATIONS", 1000))
+
+# Focus session ingestion
+FOCUS_BATCH_MAX = int(os.environ.get("FOCUS_BATCH_MAX", 500))  # Sessions per upload
+
+# Voice transcription
+TRANSCRIPTION_BACKEND = os.environ.get("TRANSCRIPTION_BACKEND", LLM_BACKEND)  # 'openai' or 'stub'
+TRANSCRIPTION_MODEL = os.environ.get("TRANSCRIPTION_MODEL", "whisper-1")
+TRANSCRIPTION_WORKERS = int(os.environ.get("TRANSCRIPTION_WORKERS", 2))
+TRANSCRIPTION_TIMEOUT = int(os.environ.get("TRANSCRIPTION_TIMEOUT", 300))  # Seconds without a heartbeat before a pending job is failed
+TRANSCRIPTION_HEARTBEAT = int(os.environ.get("TRANSCRIPTION_HEARTBEAT", 30))  # Seconds between heartbeats for held jobs
+AUDIO_STORAGE_DIR = os.environ.get(
+    "AUDIO_STORAGE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "instance", "audio")
+)
+AUDIO_MAX_BYTES = int(os.environ.get("AUDIO_MAX_BYTES", 10 * 1024 * 1024))
+AUDIO_UPLOAD_CHUNK_SIZE = int(os.environ.get("AUDIO_UPLOAD_CHUNK_SIZE", 64 * 1024))
+
+# Instrumentation (see services/instrumentation.py)
+INSTRUMENTATION_ENABLED = os.environ.get("INSTRUMENTATION_ENABLED", "0") == "1"  # Metrics, spans and request logs
+INSTRUMENTATION_TOKEN = os.environ.get("INSTRUMENTATION_TOKEN")  # Bearer token for /metrics, /api/instrumentation and the cache stats endpoints; all are disabled when unset
+INSTRUMENTATION_LOG_REQUESTS = os.environ.get("INSTRUMENTATION_LOG_REQUESTS", "1") == "1"  # One JSON log line per request
+SLOW_QUERY_MS = float(os.environ.get("SLOW_QUERY_MS", 100))
+SLOW_QUERY_SAMPLES = int(os.environ.get("SLOW_QUERY_SAMPLES", 50))  # Most recent slow statements kept per process
+PROFILER_SAMPLE_PERCENT = float(os.environ.get("PROFILER_SAMPLE_PERCENT", 0))  # Requests profiled; adjustable at runtime
+PROFILER_INTERVAL_MS = float(os.environ.get("PROFILER_INTERVAL_MS", 5))
+PROFILER_KEEP = int(os.environ.get("PROFILER_KEEP", 20))  # Most recent request profiles kept per process
+
+# Per-user API payload cache (see services/user_cache.py)
+USER_CACHE_ENABLED = os.environ.get("USER_CACHE_ENABLED", "1") == "1"
+USER_CACHE_BACKEND = os.environ.get("USER_CACHE_BACKEND", "memory")  # 'memory' or 'database' (shared across workers)
+USER_CACHE_SIZE = int(os.environ.get("USER_CACHE_SIZE", 2048))  # In-process entries
+USER_CACHE_TTL = int(os.environ.get("USER_CACHE_TTL", 600))  # Seconds; writes invalidate immediately regardless
+
+# Cached user identity (see services/identity.py)
+IDENTITY_CACHE_ENABLED = os.environ.get("IDENTITY_CACHE_ENABLED", "1") == "1"
+IDENTITY_CACHE_SIZE = int(os.environ.get("IDENTITY_CACHE_SIZE", 4096))  # In-process entries
+IDENTITY_CACHE_TTL = int(os.environ.get("IDENTITY_CACHE_TTL", 60))  # Seconds; bounds how long another worker's profile change goes unseen
+
+# Async serving (see asgi.py)
+ASGI_THREADS = int(os.environ.get("ASGI_THREADS", 32))  # Threads serving the sync Flask routes
+ASGI_ASYNC_ROUTES = os.environ.get("ASGI_ASYNC_ROUTES", "1") == "1"  # 0 sends LLM routes through the threads too
+
+# Response compression (see services/compression.py)
+COMPRESSION_ENABLED = os.environ.get("COMPRESSION_ENABLED", "1") == "1"
+COMPRESSION_LEVEL = int(os.environ.get("COMPRESSION_LEVEL", 6))  # gzip level, 1 (fastest) to 9 (smallest)
+COMPRESSION_MIN_BYTES = int(os.environ.get("COMPRESSION_MIN_BYTES", 1024))  # Smaller bodies are sent as is
+
+# Data retention (see services/retention.py); 0 disables a policy
+RETENTION_ANALYTICS_DAYS = int(os.environ.get("RETENTION_ANALYTICS_DAYS", 400))  # Keep above the longest trends window (365 days)
+RETENTION_INSIGHT_DAYS = int(os.environ.get("RETENTION_INSIGHT_DAYS", 90))
+RETENTION_COMPLETED_TASK_DAYS = int(os.environ.get("RETENTION_COMPLETED_TASK_DAYS", 365))  # Since completion
+RETENTION_TRANSCRIPTION_DAYS = int(os.environ.get("RETENTION_TRANSCRIPTION_DAYS", 7))  # Finished jobs and audio no voice note kept
+RETENTION_UPLOAD_TMP_HOURS = int(os.environ.get("RETENTION_UPLOAD_TMP_HOURS", 24))  # Abandoned partial uploads
+RETENTION_BATCH_SIZE = int(os.environ.get("RETENTION_BATCH_SIZE", 500))  # Rows archived and deleted per transaction
+RETENTION_PAUSE_MS = int(os.environ.get("RETENTION_PAUSE_MS", 50))  # Pause between batches so other writers get the lock
+ARCHIVE_DIR = os.environ.get(
+    "ARCHIVE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "instance", "archive")
+)
+
+# Database connections (see database.py); pool sizes are per engine and per worker process
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 5))  # Connections kept open
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", 10))  # Extra connections opened under load, closed when returned
+DB_POOL_TIMEOUT = int(os.environ.get("DB_POOL_TIMEOUT", 30))  # Seconds to wait for a free connection
+DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", 300))  # Seconds before a connection is replaced
+DATABASE_REPLICA_URLS = [url.strip() for url in os.environ.get("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+REPLICA_STICKY_SECONDS = int(os.environ.get("REPLICA_STICKY_SECONDS", 10))  # Reads stay on the primary this long after a user's write
@@ -1,7 +1,122 @@
+import os
+import random
+import time
+from flask import has_request_context, request, session
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.sql import Select, CompoundSelect
+from sqlalchemy.sql.dml import UpdateBase
+from config.settings import (
+    DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE, REPLICA_STICKY_SECONDS
+)
+
+REPLICA_BIND_PREFIX = 'replica_'
+STICKY_KEY = '_primary_until'  # Session cookie key: reads go to the primary until this time
+READ_METHODS = ('GET', 'HEAD')
 
 class Base(DeclarativeBase):
     pass
 
-db = SQLAlchemy(model_class=Base)
+class RoutingSession(Session):
+    """Session that sends a request's reads to a read replica and everything else to the primary.
+
+    A statement goes to a replica only when it is a plain SELECT issued while
+    serving a GET or HEAD request, before this session has written anything,
+    and outside the user's read-your-writes window (see REPLICA_STICKY_SECONDS).
+    Writes, SELECT ... FOR UPDATE, raw SQL, CLI commands and background jobs
+    always use the primary, as do read paths that call use_primary() before
+    saving what they read. A session keeps to one replica, and the user
+    cache reads its version stamps through it, so cached payloads are keyed
+    by the snapshot they were built from even while a replica lags.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self._reads_from_replica(clause):
+            return self._db.engines[self._replica_key()]
+        if isinstance(clause, UpdateBase):
+            self.info['primary'] = self.info['wrote'] = True  # Bulk INSERT/UPDATE/DELETE, outside a flush
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _replica_key(self):
+        key = self.info.get('replica')
+        if key is None:
+            keys = [k for k in self._db.engines if k and k.startswith(REPLICA_BIND_PREFIX)]
+            key = self.info['replica'] = random.choice(keys) if keys else False
+        return key
+
+    def _reads_from_replica(self, clause):
+        if self._flushing or self.info.get('primary'):
+            return False
+        if not isinstance(clause, (Select, CompoundSelect)) or getattr(clause, '_for_update_arg', None) is not None:
+            return False
+        if not has_request_context() or request.method not in READ_METHODS:
+            return False
+        if not self._replica_key():
+            return False
+        return session.get(STICKY_KEY, 0) < time.time()
+
+db = SQLAlchemy(model_class=Base, session_options={'class_': RoutingSession})
+
+def use_primary():
+    """Send the rest of this session's statements to the primary.
+
+    For read paths that go on to write what they read (recomputes, get or
+    create): rows already loaded from a replica are expired, so they are read
+    again from the primary and the flush diffs against current values.
+    """
+    session_ = db.session()
+    if session_.info.get('primary'):
+        return
+    session_.info['primary'] = True
+    if session_.info.get('replica'):
+        session_.flush()
+        session_.expire_all()
+
+def engine_options(url):
+    """Engine options for a database URL: pool sizing from settings, except for in-memory SQLite"""
+    options = {'pool_recycle': DB_POOL_RECYCLE, 'pool_pre_ping': True}
+    if url:
+        parsed = make_url(url)
+        if not (parsed.get_backend_name() == 'sqlite' and parsed.database in (None, '', ':memory:')):
+            options.update(pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW, pool_timeout=DB_POOL_TIMEOUT)
+    return options
+
+def replica_binds(urls):
+    """SQLALCHEMY_BINDS entries for read replicas"""
+    return {f'{REPLICA_BIND_PREFIX}{i}': dict(engine_options(url), url=url) for i, url in enumerate(urls)}
+
+def _mark_flush(session_, flush_context):
+    # Later reads in this session must see the write
+    session_.info['primary'] = session_.info['wrote'] = True
+
+def _start_sticky_window(session_):
+    if session_.info.pop('wrote', False) and has_request_context() and session_._replica_key():
+        session[STICKY_KEY] = time.time() + REPLICA_STICKY_SECONDS
+
+def _discard_write(session_):
+    session_.info.pop('wrote', None)
+
+def init_read_replicas(app):
+    """Keep a user's reads on the primary for a while after they commit a write (read-your-writes)"""
+    if not event.contains(RoutingSession, 'after_flush', _mark_flush):
+        event.listen(RoutingSession, 'after_flush', _mark_flush)
+        event.listen(RoutingSession, 'after_commit', _start_sticky_window)
+        event.listen(RoutingSession, 'after_rollback', _discard_write)
+
+def dispose_engines_after_fork(app):
+    """Give each forked worker its own connection pool.
+
+    Connections a pre-fork master opened are left to the master rather than
+    shared with (and closed by) its children.
+    """
+    with app.app_context():
+        engines = list(db.engines.values())
+
+    def reset_pools():
+        for engine in engines:
+            engine.dispose(close=False)
+
+    os.register_at_fork(after_in_child=reset_pools)
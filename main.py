@@ -1,4 +1,10 @@
-from app import app
+from app import create_app
+from migrations import upgrade_schema
+
+app = create_app()
 
 if __name__ == "__main__":
+    # The development server is a single process, so it can bring the schema up to date itself
+    with app.app_context():
+        upgrade_schema(log=print)
     app.run(host="0.0.0.0", port=5000)
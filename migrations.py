@@ -0,0 +1,65 @@
+from sqlalchemy import inspect, literal, text
+from database import db
+from services.search import SearchService
+from services.rollups import PriorityRollupService
+
+
+def _column_ddl(column, dialect):
+    ddl = f'{dialect.identifier_preparer.quote(column.name)} {column.type.compile(dialect=dialect)}'
+    default = column.default
+    if default is not None and default.is_scalar:
+        value = literal(default.arg).compile(dialect=dialect, compile_kwargs={'literal_binds': True})
+        ddl += f' DEFAULT {value}'
+    return ddl
+
+
+def _dedupe_user_analytics(connection):
+    """Keep the newest row per (user_id, date) so the unique index can be built"""
+    result = connection.execute(text(
+        'DELETE FROM user_analytics WHERE id NOT IN '
+        '(SELECT MAX(id) FROM user_analytics GROUP BY user_id, date)'
+    ))
+    return result.rowcount
+
+
+def upgrade_schema(log=print):
+    """Bring an existing database up to the current models.
+
+    Creates missing tables, adds missing columns (nullable, with their scalar
+    default), creates missing indexes and the full-text search index, and
+    backfills derived tables created by this run. Safe to run repeatedly.
+    """
+    engine = db.engine
+    existing_tables = set(inspect(engine).get_table_names())
+    db.create_all(bind_key=None)  # Replicas get the schema by replication
+    inspector = inspect(engine)
+    # Reserved words such as "user" must be quoted, as in SQLAlchemy's own DDL
+    preparer = engine.dialect.identifier_preparer
+
+    with engine.begin() as connection:
+        for table in db.metadata.sorted_tables:
+            existing_columns = {c['name'] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing_columns:
+                    connection.execute(text(
+                        f'ALTER TABLE {preparer.format_table(table)} ADD COLUMN {_column_ddl(column, engine.dialect)}'
+                    ))
+                    log(f'Added column {table.name}.{column.name}')
+
+            existing_indexes = {i['name'] for i in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name in existing_indexes:
+                    continue
+                if index.unique and table.name == 'user_analytics':
+                    removed = _dedupe_user_analytics(connection)
+                    if removed:
+                        log(f'Removed {removed} duplicate user_analytics rows')
+                index.create(connection)
+                log(f'Created index {index.name}')
+
+        if SearchService.ensure_schema(connection):
+            log('Created and filled the full-text search index')
+
+    if 'task_priority_rollup' not in existing_tables and existing_tables:
+        users = PriorityRollupService.rebuild()
+        log(f'Backfilled priority rollups for {users} users')
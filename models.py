@@ -7,6 +7,7 @@ class User(UserMixin, db.Model):
     username = db.Column(db.String(64), unique=True, nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
     password_hash = db.Column(db.String(256))
+    timezone = db.Column(db.String(64), default='UTC')  # IANA name; analytics days follow the user's local day
     goals = db.relationship('Goal', backref='user', lazy=True)
     tasks = db.relationship('Task', backref='user', lazy=True)
     habits = db.relationship('Habit', backref='user', lazy=True)
@@ -21,7 +22,7 @@ class Goal(db.Model):
     progress = db.Column(db.Integer, default=0)  # 0-100
     category = db.Column(db.String(50))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
     tasks = db.relationship('Task', backref='goal', lazy=True)
 
 class Task(db.Model):
@@ -34,7 +35,13 @@ class Task(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     completed_at = db.Column(db.DateTime)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    goal_id = db.Column(db.Integer, db.ForeignKey('goal.id'), nullable=True)
+    goal_id = db.Column(db.Integer, db.ForeignKey('goal.id'), nullable=True, index=True)
+
+    __table_args__ = (
+        # Leading user_id serves plain per-user lookups as well as the date ranges
+        db.Index('ix_task_user_created_at', 'user_id', 'created_at'),
+        db.Index('ix_task_user_completed_at', 'user_id', 'completed_at'),
+    )
 
 class Habit(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -43,24 +50,55 @@ class Habit(db.Model):
     frequency = db.Column(db.String(20))  # daily, weekly
     current_streak = db.Column(db.Integer, default=0)
     best_streak = db.Column(db.Integer, default=0)
+    last_completed_at = db.Column(db.DateTime)  # latest check-in, drives O(1) streak updates
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
 
 class HabitLog(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     habit_id = db.Column(db.Integer, db.ForeignKey('habit.id'), nullable=False)
     completed_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        db.Index('ix_habit_log_habit_completed_at', 'habit_id', 'completed_at'),
+    )
+
 class VoiceNote(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     transcription = db.Column(db.Text, nullable=False)
-    audio_data = db.Column(db.LargeBinary, nullable=True)  # For storing small audio clips if needed
+    audio_data = db.deferred(db.Column(db.LargeBinary, nullable=True))  # Legacy inline audio, see flask move-voice-audio
+    audio_path = db.Column(db.String(255), nullable=True)  # Key in services.audio_storage
     note_type = db.Column(db.String(20))  # 'task', 'journal'
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    task_id = db.Column(db.Integer, db.ForeignKey('task.id'), nullable=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    task_id = db.Column(db.Integer, db.ForeignKey('task.id'), nullable=True, index=True)
     task = db.relationship('Task', backref='voice_notes', lazy=True, foreign_keys=[task_id])
 
+class TranscriptionJob(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    audio_path = db.Column(db.String(255), nullable=False)
+    status = db.Column(db.String(20), default='pending')  # pending, done, failed
+    text = db.Column(db.Text)
+    error = db.Column(db.String(255))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    completed_at = db.Column(db.DateTime)
+    heartbeat_at = db.Column(db.DateTime)  # Refreshed by the worker process holding the job
+
+class FocusSession(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    client_id = db.Column(db.String(64), nullable=False)  # Generated by the timer, makes uploads idempotent
+    started_at = db.Column(db.DateTime, nullable=False)
+    ended_at = db.Column(db.DateTime, nullable=False)
+    duration_seconds = db.Column(db.Integer, nullable=False)  # Time actually focused, excluding pauses
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('uq_focus_session_user_client', 'user_id', 'client_id', unique=True),
+        db.Index('ix_focus_session_user_started_at', 'user_id', 'started_at'),
+    )
+
 class UserAnalytics(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -73,8 +111,30 @@ class UserAnalytics(db.Model):
     task_efficiency_score = db.Column(db.Float, default=0.0)  # 0-100
     habit_impact_score = db.Column(db.Float, default=0.0)  # 0-100
     goal_completion_prediction = db.Column(db.Float, default=0.0)  # 0-100
+    tasks_created = db.Column(db.Integer, default=0)  # Denominator for the daily completion rate
+    total_habits = db.Column(db.Integer, default=0)
+    is_dirty = db.Column(db.Boolean, default=False)  # Set when a change needs a full recompute
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        # One row per user per day; also serves every (user_id, date range) lookup
+        db.Index('uq_user_analytics_user_date', 'user_id', 'date', unique=True),
+    )
+
+class TaskPriorityRollup(db.Model):
+    # Tasks created per user, local creation day and priority, and how many of those are completed.
+    # Maintained on every task write (services/rollups.py) so trends never scan raw tasks.
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    date = db.Column(db.Date, nullable=False)
+    priority = db.Column(db.String(20), nullable=False)
+    tasks_created = db.Column(db.Integer, default=0, nullable=False)
+    tasks_completed = db.Column(db.Integer, default=0, nullable=False)
+
+    __table_args__ = (
+        db.Index('uq_task_priority_rollup_user_date_priority', 'user_id', 'date', 'priority', unique=True),
+    )
+
 class AIInsight(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -83,3 +143,26 @@ class AIInsight(db.Model):
     recommendations = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     is_acknowledged = db.Column(db.Boolean, default=False)
+
+    __table_args__ = (
+        db.Index('ix_ai_insight_user_ack_created_at', 'user_id', 'is_acknowledged', 'created_at'),
+    )
+
+class LLMCacheEntry(db.Model):
+    key = db.Column(db.String(64), primary_key=True)  # sha256 of model, system prompt and user payload
+    model = db.Column(db.String(50))
+    response = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+class UserCacheVersion(db.Model):
+    """Current version stamp of one user's cached payloads per scope (see services/user_cache.py)"""
+    user_id = db.Column(db.Integer, primary_key=True, autoincrement=False)  # 0 holds the global epoch
+    scope = db.Column(db.String(20), primary_key=True)  # goals, tasks, habits, insights
+    version = db.Column(db.BigInteger, nullable=False)
+
+class UserPayloadCacheEntry(db.Model):
+    key = db.Column(db.String(64), primary_key=True)  # sha256 of user, scope, versions and request variant
+    user_id = db.Column(db.Integer, nullable=False)
+    payload = db.Column(db.Text, nullable=False)  # JSON
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
@@ -1,51 +1,120 @@
 import os
 from datetime import datetime, timedelta
-from sqlalchemy import func, desc, and_
-import openai
-from models import Task, Goal, Habit, UserAnalytics, AIInsight, HabitLog
-from database import db
+from sqlalchemy import func, desc, and_, case, update, inspect as sa_inspect
+from sqlalchemy.exc import IntegrityError
+from models import User, Task, Goal, Habit, UserAnalytics, AIInsight, HabitLog, FocusSession
+from database import db, use_primary
+from services.timezones import DEFAULT_TIMEZONE, local_today, local_date, day_bounds
+from services.habits import HabitService
+from services.rollups import PriorityRollupService, PRIORITIES
+from services.jobs import BackgroundJobQueue
+from services.llm import chat_completion
+from services.user_cache import user_cache
+from services.identity import identity_cache
+from config.settings import INSIGHT_WORKERS, INSIGHT_REFRESH_MINUTES
+
+insight_queue = BackgroundJobQueue(max_workers=INSIGHT_WORKERS, name='insights')
+
+INSIGHTS_PROMPT = """You are an advanced productivity and personal development analyst. 
+                    Analyze the user's performance data and provide detailed insights and actionable recommendations.
+                    Focus on patterns, trends, and areas for improvement. Include specific suggestions for improving productivity,
+                    maintaining habits, and achieving goals. Consider task efficiency, habit impact, and goal completion predictions
+                    in your analysis."""
+
+# Productivity trend columns in query order, and whether buckets sum (True) or average them
+TREND_SERIES = [
+    ('productivity_scores', False),
+    ('tasks_completed', True),
+    ('active_habits', False),
+    ('focus_time', True),
+    ('goals_progress', False),
+    ('task_efficiency', False),
+    ('habit_impact', False),
+    ('goal_predictions', False),
+]
+TREND_BUCKETS = ('day', 'week', 'month')
+
+
+def bucket_start(day, bucket):
+    """First day of the day, ISO week or month containing day"""
+    if bucket == 'week':
+        return day - timedelta(days=day.weekday())
+    if bucket == 'month':
+        return day.replace(day=1)
+    return day
+
 
 class AnalyticsService:
+    @staticmethod
+    def get_user_timezone(user_id):
+        """IANA timezone name for a user (served from the identity cache when warm)"""
+        user = identity_cache.get(user_id)
+        if user is None:
+            user = db.session.get(User, user_id)
+            if user is not None:
+                user = identity_cache.put(user)
+        return (user.timezone if user else None) or DEFAULT_TIMEZONE
+
+    @staticmethod
+    def get_user_today(user_id):
+        """The user's current local date, which keys their UserAnalytics rows"""
+        return local_today(AnalyticsService.get_user_timezone(user_id))
+
+    @staticmethod
+    def get_daily_analytics(user_id):
+        """Return today's analytics row, recomputing only when missing or dirty"""
+        today = AnalyticsService.get_user_today(user_id)
+        analytics = UserAnalytics.query.filter_by(
+            user_id=user_id,
+            date=today
+        ).first()
+        
+        if analytics is None or analytics.is_dirty:
+            return AnalyticsService.calculate_daily_analytics(user_id)
+        return analytics
+
     @staticmethod
     def calculate_daily_analytics(user_id):
         """Calculate comprehensive daily analytics for a user"""
-        today = datetime.utcnow().date()
+        use_primary()  # The result is saved, so it must not be built from a lagging replica
+        tz_name = AnalyticsService.get_user_timezone(user_id)
+        today = local_today(tz_name)
+        day_start, day_end = day_bounds(today, tz_name)
         
         # Get completed tasks count and completion rate
         total_tasks = Task.query.filter(
             Task.user_id == user_id,
-            func.date(Task.created_at) == today
+            Task.created_at >= day_start,
+            Task.created_at < day_end
         ).count()
         
         completed_tasks = Task.query.filter(
             Task.user_id == user_id,
             Task.completed == True,
-            func.date(Task.completed_at) == today
+            Task.completed_at >= day_start,
+            Task.completed_at < day_end
         ).count()
         
-        task_completion_rate = (completed_tasks / total_tasks * 100) if total_tasks > 0 else 0
-        
         # Calculate average goals progress and trend
         goals = Goal.query.filter_by(user_id=user_id).all()
         goals_progress = sum(goal.progress for goal in goals) / len(goals) if goals else 0
         
-        # Calculate habit consistency and streaks
+        # Calculate habit consistency and streaks (streaks that missed a period count as broken)
+        HabitService.expire_lapsed_streaks(user_id, tz_name)
         habits = Habit.query.filter_by(user_id=user_id).all()
         active_habits = sum(1 for habit in habits if habit.current_streak > 0)
-        avg_streak = sum(habit.current_streak for habit in habits) / len(habits) if habits else 0
         
-        # Calculate focus time (from Pomodoro sessions)
-        focus_time = UserAnalytics.query.filter_by(
+        analytics = UserAnalytics.query.filter_by(
             user_id=user_id,
             date=today
-        ).with_entities(func.sum(UserAnalytics.focus_time)).scalar() or 0
+        ).first()
         
-        # Calculate productivity score with weighted factors
-        productivity_score = (
-            (task_completion_rate * 0.3) +
-            (goals_progress * 0.3) +
-            (min((active_habits / max(len(habits), 1)) * 100, 100) * 0.2) +
-            (min((focus_time / 240) * 100, 100) * 0.2)  # 240 minutes (4 hours) as target
+        # Focus time is rebuilt from the day's Pomodoro sessions
+        focus_time = AnalyticsService.calculate_focus_time(user_id, day_start, day_end)
+        
+        productivity_score = AnalyticsService.calculate_productivity_score(
+            completed_tasks, total_tasks, goals_progress,
+            active_habits, len(habits), focus_time
         )
         
         # Calculate goal completion prediction
@@ -58,64 +127,207 @@ class AnalyticsService:
         habit_impact = AnalyticsService.calculate_habit_impact(user_id)
         
         # Create or update analytics record
-        analytics = UserAnalytics.query.filter_by(
-            user_id=user_id,
-            date=today
-        ).first()
-        
         if not analytics:
             analytics = UserAnalytics(
                 user_id=user_id,
-                date=today,
-                tasks_completed=completed_tasks,
-                goals_progress=goals_progress,
-                active_habits=active_habits,
-                focus_time=focus_time,
-                productivity_score=min(productivity_score, 100),
-                goal_completion_prediction=goals_prediction,
-                task_efficiency_score=task_efficiency,
-                habit_impact_score=habit_impact
+                date=today
             )
             db.session.add(analytics)
-        else:
-            analytics.tasks_completed = completed_tasks
-            analytics.goals_progress = goals_progress
-            analytics.active_habits = active_habits
-            analytics.focus_time = focus_time
-            analytics.productivity_score = min(productivity_score, 100)
-            analytics.goal_completion_prediction = goals_prediction
-            analytics.task_efficiency_score = task_efficiency
-            analytics.habit_impact_score = habit_impact
         
-        db.session.commit()
+        analytics.focus_time = focus_time
+        analytics.tasks_completed = completed_tasks
+        analytics.tasks_created = total_tasks
+        analytics.goals_progress = goals_progress
+        analytics.active_habits = active_habits
+        analytics.total_habits = len(habits)
+        analytics.productivity_score = productivity_score
+        analytics.goal_completion_prediction = goals_prediction
+        analytics.task_efficiency_score = task_efficiency
+        analytics.habit_impact_score = habit_impact
+        analytics.is_dirty = False
+        
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # A concurrent request inserted today's row first; update it instead
+            db.session.rollback()
+            return AnalyticsService.calculate_daily_analytics(user_id)
         return analytics
 
+    @staticmethod
+    def calculate_productivity_score(tasks_completed, tasks_created, goals_progress,
+                                     active_habits, total_habits, focus_time):
+        """Weighted productivity score (0-100) from the daily counters"""
+        task_completion_rate = (tasks_completed / tasks_created * 100) if tasks_created > 0 else 0
+        productivity_score = (
+            (task_completion_rate * 0.3) +
+            (goals_progress * 0.3) +
+            (min((active_habits / max(total_habits, 1)) * 100, 100) * 0.2) +
+            (min((focus_time / 240) * 100, 100) * 0.2)  # 240 minutes (4 hours) as target
+        )
+        return min(productivity_score, 100)
+
+    @staticmethod
+    def apply_analytics_delta(user_id, tasks_created=0, tasks_completed=0, focus_time=0, day=None):
+        """Apply counter deltas to today's (or the given day's) analytics row.
+        
+        The counters are incremented in SQL, so concurrent writes for the same
+        user all count; the row lock taken by the UPDATE is held until commit,
+        so the score is computed from the counters it returned. The caller owns
+        the transaction; the change is committed with the write that caused it.
+        A missing or dirty row is left alone because the next full recompute
+        will pick the change up anyway. Returns the updated counters, or None.
+        """
+        day = day or AnalyticsService.get_user_today(user_id)
+
+        def bumped(column, delta):
+            value = func.coalesce(column, 0) + delta
+            return case((value < 0, 0), else_=value)
+
+        row = db.session.execute(
+            update(UserAnalytics)
+            .where(
+                UserAnalytics.user_id == user_id,
+                UserAnalytics.date == day,
+                UserAnalytics.is_dirty.is_not(True)
+            )
+            .values(
+                tasks_created=bumped(UserAnalytics.tasks_created, tasks_created),
+                tasks_completed=bumped(UserAnalytics.tasks_completed, tasks_completed),
+                focus_time=bumped(UserAnalytics.focus_time, focus_time)
+            )
+            .returning(
+                UserAnalytics.id, UserAnalytics.tasks_created, UserAnalytics.tasks_completed,
+                UserAnalytics.focus_time, UserAnalytics.goals_progress,
+                UserAnalytics.active_habits, UserAnalytics.total_habits
+            )
+            .execution_options(synchronize_session=False)
+        ).first()
+        if row is None:
+            return None
+
+        db.session.execute(
+            update(UserAnalytics)
+            .where(UserAnalytics.id == row.id)
+            .values(productivity_score=AnalyticsService.calculate_productivity_score(
+                row.tasks_completed, row.tasks_created, row.goals_progress or 0,
+                row.active_habits or 0, row.total_habits or 0, row.focus_time
+            ))
+            .execution_options(synchronize_session=False)
+        )
+        # A row this session already loaded would otherwise keep the old counters
+        loaded = db.session.identity_map.get(sa_inspect(UserAnalytics).identity_key_from_primary_key((row.id,)))
+        if loaded is not None:
+            db.session.expire(loaded)
+        return row
+
+    @staticmethod
+    def record_task_created(user_id, count=1):
+        """Account for tasks created today"""
+        return AnalyticsService.apply_analytics_delta(user_id, tasks_created=count)
+
+    @staticmethod
+    def record_task_toggled(user_id, task, previous_completed_at):
+        """Account for a task completion toggle; call after the task is updated"""
+        tz_name = AnalyticsService.get_user_timezone(user_id)
+        today = local_today(tz_name)
+        delta = 0
+        if task.completed and task.completed_at and local_date(task.completed_at, tz_name) == today:
+            delta += 1
+        if previous_completed_at and local_date(previous_completed_at, tz_name) == today:
+            delta -= 1
+        if delta:
+            return AnalyticsService.apply_analytics_delta(user_id, tasks_completed=delta)
+        return None
+
+    @staticmethod
+    def record_task_deleted(user_id, task):
+        """Account for a task that is about to be deleted"""
+        tz_name = AnalyticsService.get_user_timezone(user_id)
+        today = local_today(tz_name)
+        created = -1 if task.created_at and local_date(task.created_at, tz_name) == today else 0
+        completed = -1 if task.completed and task.completed_at and local_date(task.completed_at, tz_name) == today else 0
+        if created or completed:
+            return AnalyticsService.apply_analytics_delta(
+                user_id, tasks_created=created, tasks_completed=completed
+            )
+        return None
+
+    @staticmethod
+    def record_focus_time(user_id, minutes, day=None):
+        """Add focus minutes to the analytics row of a local day (today by default)"""
+        return AnalyticsService.apply_analytics_delta(user_id, focus_time=minutes, day=day)
+
+    @staticmethod
+    def calculate_focus_time(user_id, start, end):
+        """Focused minutes of sessions started in [start, end), whole minutes per session"""
+        return int(db.session.query(
+            func.coalesce(func.sum(FocusSession.duration_seconds // 60), 0)
+        ).filter(
+            FocusSession.user_id == user_id,
+            FocusSession.started_at >= start,
+            FocusSession.started_at < end
+        ).scalar())
+
+    @staticmethod
+    def mark_analytics_dirty(user_id):
+        """Flag today's row for a full recompute (goal and habit changes)"""
+        today = AnalyticsService.get_user_today(user_id)
+        UserAnalytics.query.filter_by(
+            user_id=user_id,
+            date=today
+        ).update({'is_dirty': True}, synchronize_session=False)
+
     @staticmethod
     def predict_goal_completion(user_id):
         """Predict likelihood of completing current goals on time"""
-        goals = Goal.query.filter_by(user_id=user_id).all()
+        goals = db.session.query(
+            Goal.progress, Goal.created_at, Goal.target_date
+        ).filter(Goal.user_id == user_id).all()
         if not goals:
             return 0
         
-        completion_likelihood = 0
-        for goal in goals:
-            days_left = (goal.target_date - datetime.utcnow()).days
-            if days_left <= 0:
-                continue
-                
-            daily_progress_needed = (100 - goal.progress) / max(days_left, 1)
-            # Calculate average daily progress from past week
-            week_ago = datetime.utcnow() - timedelta(days=7)
-            analytics = UserAnalytics.query.filter(
-                UserAnalytics.user_id == user_id,
-                UserAnalytics.date >= week_ago
-            ).all()
-            
-            avg_daily_progress = sum(a.goals_progress for a in analytics) / len(analytics) if analytics else 0
-            goal_likelihood = min((avg_daily_progress / daily_progress_needed) * 100, 100) if daily_progress_needed > 0 else 100
-            completion_likelihood += goal_likelihood
-            
-        return completion_likelihood / len(goals)
+        # One history query for all goals
+        week_ago = AnalyticsService.get_user_today(user_id) - timedelta(days=7)
+        history = db.session.query(
+            UserAnalytics.date, UserAnalytics.goals_progress
+        ).filter(
+            UserAnalytics.user_id == user_id,
+            UserAnalytics.date >= week_ago
+        ).order_by(UserAnalytics.date.asc()).all()
+        
+        return AnalyticsService.estimate_goal_completion(goals, history, datetime.utcnow())
+
+    @staticmethod
+    def estimate_goal_completion(goals, history, now):
+        """Average on-time likelihood (0-100) across goals.
+        
+        goals is a sequence of (progress, created_at, target_date) and history a
+        date-ordered sequence of (date, goals_progress). Each goal's velocity is
+        its own progress per day since creation; goals with no progress yet fall
+        back to the slope of the user's average goal progress over the history.
+        """
+        if not goals:
+            return 0
+        
+        fallback_velocity = 0
+        if len(history) > 1:
+            span = max((history[-1][0] - history[0][0]).days, 1)
+            fallback_velocity = max(((history[-1][1] or 0) - (history[0][1] or 0)) / span, 0)
+        
+        progress = [min(max(p or 0, 0), 100) for p, _, _ in goals]
+        days_active = [max((now - created).days, 1) if created else 1 for _, created, _ in goals]
+        days_left = [(target - now).days for _, _, target in goals]
+        
+        velocity = [p / d if p > 0 else fallback_velocity for p, d in zip(progress, days_active)]
+        needed = [(100 - p) / max(left, 1) for p, left in zip(progress, days_left)]
+        likelihood = [
+            100 if p >= 100 else
+            0 if left <= 0 else
+            min(v / n * 100, 100)
+            for p, left, v, n in zip(progress, days_left, velocity, needed)
+        ]
+        return sum(likelihood) / len(likelihood)
 
     @staticmethod
     def calculate_task_efficiency(user_id):
@@ -138,7 +350,7 @@ class AnalyticsService:
                 'normal': 7
             }.get(task.priority, 7))
             
-            score = min((expected_time / completion_time).total_seconds() * 100, 100) if completion_time > timedelta(0) else 100
+            score = min((expected_time / completion_time) * 100, 100) if completion_time > timedelta(0) else 100
             efficiency_scores.append(score)
             
         return sum(efficiency_scores) / len(efficiency_scores)
@@ -169,7 +381,7 @@ class AnalyticsService:
     def generate_insights(user_id):
         """Generate comprehensive AI-driven insights based on user's data"""
         # Get user's analytics for the past week
-        week_ago = datetime.utcnow().date() - timedelta(days=7)
+        week_ago = AnalyticsService.get_user_today(user_id) - timedelta(days=7)
         analytics = UserAnalytics.query.filter(
             UserAnalytics.user_id == user_id,
             UserAnalytics.date >= week_ago
@@ -215,20 +427,11 @@ class AnalyticsService:
         
         # Generate insights using OpenAI
         try:
-            completion = openai.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": """You are an advanced productivity and personal development analyst. 
-                    Analyze the user's performance data and provide detailed insights and actionable recommendations.
-                    Focus on patterns, trends, and areas for improvement. Include specific suggestions for improving productivity,
-                    maintaining habits, and achieving goals. Consider task efficiency, habit impact, and goal completion predictions
-                    in your analysis."""},
-                    {"role": "user", "content": f"Weekly analytics data: {analytics_data}"}
-                ]
+            insight_content = chat_completion(
+                INSIGHTS_PROMPT,
+                f"Weekly analytics data: {analytics_data}"
             )
             
-            insight_content = completion.choices[0].message.content
-            
             # Parse recommendations and insights
             parts = insight_content.split('\n\nRecommendations:')
             analysis = parts[0]
@@ -302,51 +505,113 @@ class AnalyticsService:
             print(f"Error generating insights: {str(e)}")
             return None
 
+    @staticmethod
+    def request_insights(user_id):
+        """Queue background insight generation unless fresh insights exist.
+        
+        Returns True if a job is queued or already running for the user.
+        """
+        key = ('insights', user_id)
+        if insight_queue.is_pending(key):
+            return True
+        
+        latest = db.session.query(func.max(AIInsight.created_at)).filter(
+            AIInsight.user_id == user_id
+        ).scalar()
+        if latest and latest > datetime.utcnow() - timedelta(minutes=INSIGHT_REFRESH_MINUTES):
+            return False
+        
+        insight_queue.submit(key, AnalyticsService.generate_insights, user_id)
+        return True
+
     @staticmethod
     def get_user_insights(user_id, limit=5):
-        """Get recent insights for a user"""
-        return AIInsight.query.filter_by(
-            user_id=user_id,
-            is_acknowledged=False
-        ).order_by(AIInsight.created_at.desc()).limit(limit).all()
+        """Recent unacknowledged insights for a user as JSON-ready dicts, from the user cache"""
+        def load():
+            insights = AIInsight.query.filter_by(
+                user_id=user_id,
+                is_acknowledged=False
+            ).order_by(AIInsight.created_at.desc()).limit(limit).all()
+            return [{
+                'id': i.id,
+                'type': i.insight_type,
+                'content': i.content,
+                'recommendations': i.recommendations,
+                'created_at': i.created_at.isoformat()
+            } for i in insights]
+        return user_cache.fetch(user_id, 'insights', limit, load)
 
     @staticmethod
-    def get_productivity_trends(user_id, days=30):
-        """Get detailed productivity trends for visualization"""
-        start_date = datetime.utcnow().date() - timedelta(days=days)
-        analytics = UserAnalytics.query.filter(
+    def get_trend_window(user_id, days):
+        """First and last local day of a window of days ending today"""
+        today = AnalyticsService.get_user_today(user_id)
+        return today - timedelta(days=days - 1), today
+
+    @staticmethod
+    def get_productivity_trends(user_id, days=30, bucket='day'):
+        """Productivity series as columns, one entry per day, ISO week or month.
+
+        Scores are averaged over each bucket, task and focus counts summed.
+        """
+        start_date, end_date = AnalyticsService.get_trend_window(user_id, days)
+        rows = db.session.query(
+            UserAnalytics.date, UserAnalytics.productivity_score, UserAnalytics.tasks_completed,
+            UserAnalytics.active_habits, UserAnalytics.focus_time, UserAnalytics.goals_progress,
+            UserAnalytics.task_efficiency_score, UserAnalytics.habit_impact_score,
+            UserAnalytics.goal_completion_prediction
+        ).filter(
             UserAnalytics.user_id == user_id,
-            UserAnalytics.date >= start_date
+            UserAnalytics.date >= start_date,
+            UserAnalytics.date <= end_date
         ).order_by(UserAnalytics.date.asc()).all()
         
-        return {
-            'dates': [a.date.strftime('%Y-%m-%d') for a in analytics],
-            'productivity_scores': [a.productivity_score for a in analytics],
-            'tasks_completed': [a.tasks_completed for a in analytics],
-            'active_habits': [a.active_habits for a in analytics],
-            'focus_time': [a.focus_time for a in analytics],
-            'goals_progress': [a.goals_progress for a in analytics],
-            'task_efficiency': [a.task_efficiency_score for a in analytics],
-            'habit_impact': [a.habit_impact_score for a in analytics],
-            'goal_predictions': [a.goal_completion_prediction for a in analytics]
-        }
+        buckets = {}
+        for date, *values in rows:
+            key = bucket_start(date, bucket)
+            totals = buckets.setdefault(key, [0] * (len(TREND_SERIES) + 1))
+            totals[0] += 1
+            for i, value in enumerate(values, 1):
+                totals[i] += value or 0
+        
+        trends = {'dates': [key.isoformat() for key in buckets]}
+        for i, (name, summed) in enumerate(TREND_SERIES, 1):
+            trends[name] = [
+                round(totals[i] if summed else totals[i] / totals[0], 1) for totals in buckets.values()
+            ]
+        return trends
 
     @staticmethod
-    def get_completion_rate_by_priority(user_id, days=7):
-        """Get task completion rates grouped by priority"""
-        start_date = datetime.utcnow().date() - timedelta(days=days)
-        tasks = Task.query.filter(
-            Task.user_id == user_id,
-            Task.created_at >= start_date
-        ).all()
+    def get_completion_rate_by_priority(user_id, days=7, bucket=None):
+        """Completion rate (%) per priority of tasks created in the window, from the rollup table.
+
+        Without a bucket the whole window is summarised as {priority: rate};
+        with one, a columnar series of rates per bucket is returned, None where
+        no tasks of that priority were created.
+        """
+        start_date, end_date = AnalyticsService.get_trend_window(user_id, days)
+        rows = PriorityRollupService.get_series(user_id, start_date, end_date)
+        
+        if bucket is None:
+            totals = {priority: [0, 0] for priority in PRIORITIES}
+            for _, priority, created, completed in rows:
+                if priority in totals:
+                    totals[priority][0] += created
+                    totals[priority][1] += completed
+            return {
+                priority: (completed / created) * 100 if created else 0
+                for priority, (created, completed) in totals.items()
+            }
         
-        completion_rates = {}
-        for priority in ['urgent', 'important', 'normal']:
-            priority_tasks = [t for t in tasks if t.priority == priority]
-            if priority_tasks:
-                completed = len([t for t in priority_tasks if t.completed])
-                completion_rates[priority] = (completed / len(priority_tasks)) * 100
-            else:
-                completion_rates[priority] = 0
-                
-        return completion_rates
+        buckets = {}
+        for date, priority, created, completed in rows:
+            totals = buckets.setdefault(bucket_start(date, bucket), {p: [0, 0] for p in PRIORITIES})
+            if priority in totals:
+                totals[priority][0] += created
+                totals[priority][1] += completed
+        series = {'dates': [key.isoformat() for key in buckets]}
+        for priority in PRIORITIES:
+            series[priority] = [
+                round(totals[priority][1] / totals[priority][0] * 100, 1) if totals[priority][0] else None
+                for totals in buckets.values()
+            ]
+        return series
@@ -0,0 +1,186 @@
+import asyncio
+import io
+import json
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+_END = object()
+# The ASGI server sets these itself; passing the app's copies through would send them twice
+SERVER_HEADERS = {'server', 'date'}
+
+
+class _RequestBody(io.RawIOBase):
+    """Blocking reader over an ASGI receive channel, for WSGI code running in a worker thread"""
+
+    def __init__(self, receive, loop, body=b'', more_body=True):
+        self._receive = receive
+        self._loop = loop
+        self._buffer = body
+        self._more = more_body
+
+    def readable(self):
+        return True
+
+    def readinto(self, target):
+        while not self._buffer and self._more:
+            message = asyncio.run_coroutine_threadsafe(self._receive(), self._loop).result()
+            if message['type'] == 'http.disconnect':
+                self._more = False
+                break
+            self._buffer = message.get('body', b'')
+            self._more = message.get('more_body', False)
+        count = min(len(target), len(self._buffer))
+        target[:count] = self._buffer[:count]
+        self._buffer = self._buffer[count:]
+        return count
+
+
+async def read_body(receive):
+    """The whole request body of an ASGI HTTP request"""
+    chunks = []
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            break
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body', False):
+            break
+    return b''.join(chunks)
+
+
+def build_environ(scope, body_stream):
+    """WSGI environ for an ASGI HTTP scope (PEP 3333 strings are latin-1 decoded bytes)"""
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': str(server[0]),
+        'SERVER_PORT': str(server[1] or 80),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body_stream,
+        'wsgi.input_terminated': True,  # The stream ends with the body, so chunked uploads need no Content-Length
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    if scope.get('client'):
+        environ['REMOTE_ADDR'], environ['REMOTE_PORT'] = scope['client'][0], str(scope['client'][1])
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').lower()
+        value = value.decode('latin-1')
+        if name == 'content-type':
+            environ['CONTENT_TYPE'] = value
+        elif name == 'content-length':
+            environ['CONTENT_LENGTH'] = value
+        else:
+            key = 'HTTP_' + name.upper().replace('-', '_')
+            environ[key] = f'{environ[key]},{value}' if key in environ else value
+    return environ
+
+
+async def send_json(send, status, payload, headers=()):
+    body = json.dumps(payload).encode('utf-8')
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())]
+                   + [(name.encode('latin-1'), value.encode('latin-1')) for name, value in headers],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+class WSGIBridge:
+    """Serves a WSGI app to an ASGI server from a fixed thread pool.
+
+    The pool plays the part of sync workers: it bounds how many WSGI requests
+    run at once, while coroutines on the event loop (see AsyncRouter) wait on
+    slow upstream calls without occupying it. Request bodies are read from
+    the ASGI channel on demand and response bodies are sent as the app yields
+    them, so uploads and server-sent events stream as they do under WSGI.
+    """
+
+    def __init__(self, wsgi_app, threads=32):
+        self.wsgi_app = wsgi_app
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='wsgi')
+
+    async def run(self, func, *args):
+        """Run blocking code (database access, the Flask app) on the bridge's pool"""
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    async def __call__(self, scope, receive, send, body=None):
+        loop = asyncio.get_running_loop()
+        stream = io.BufferedReader(
+            _RequestBody(receive, loop, body or b'', more_body=body is None)
+        )
+        environ = build_environ(scope, stream)
+        started = {}
+        written = []
+
+        def start_response(status, headers, exc_info=None):
+            if exc_info and started.get('sent'):
+                raise exc_info[1].with_traceback(exc_info[2])
+            started['status'] = int(status.split(' ', 1)[0])
+            started['headers'] = [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in headers
+                                  if k.lower() not in SERVER_HEADERS]
+            return write
+
+        def write(data):
+            # Legacy imperative writes are kept in order and sent ahead of the next chunk of the iterable
+            written.append(bytes(data))
+
+        async def send_body(chunk):
+            if not started.get('sent'):
+                await send({'type': 'http.response.start', 'status': started['status'],
+                            'headers': started['headers']})
+                started['sent'] = True
+            if chunk:
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+
+        iterable = await self.run(self.wsgi_app, environ, start_response)
+        try:
+            # Plain responses are already in memory; generators may block, so step them on the pool
+            in_memory = isinstance(iterable, (list, tuple))
+            iterator = iter(iterable)
+            while True:
+                chunk = next(iterator, _END) if in_memory else await self.run(next, iterator, _END)
+                while written:
+                    await send_body(written.pop(0))
+                if chunk is _END:
+                    break
+                await send_body(chunk)
+        finally:
+            if hasattr(iterable, 'close'):
+                await self.run(iterable.close)
+        if not started.get('sent'):
+            await send({'type': 'http.response.start', 'status': started['status'], 'headers': started['headers']})
+        await send({'type': 'http.response.body', 'body': b''})
+
+
+class AsyncRouter:
+    """ASGI app that serves a few (method, path) routes with coroutines and everything else through a WSGIBridge"""
+
+    def __init__(self, bridge, routes=None):
+        self.bridge = bridge
+        self.routes = dict(routes or {})
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            while True:
+                message = await receive()
+                if message['type'] == 'lifespan.startup':
+                    await send({'type': 'lifespan.startup.complete'})
+                elif message['type'] == 'lifespan.shutdown':
+                    self.bridge.executor.shutdown(wait=False)
+                    await send({'type': 'lifespan.shutdown.complete'})
+                    return
+        if scope['type'] != 'http':
+            return
+        handler = self.routes.get((scope['method'], scope['path']))
+        if handler is None:
+            return await self.bridge(scope, receive, send)
+        return await handler(scope, receive, send)
@@ -0,0 +1,138 @@
+import os
+import tempfile
+import time
+import uuid
+from config.settings import AUDIO_STORAGE_DIR, AUDIO_UPLOAD_CHUNK_SIZE
+
+AUDIO_EXTENSIONS = {'.wav', '.webm', '.ogg', '.oga', '.mp3', '.mpga', '.mpeg', '.m4a', '.mp4', '.flac'}
+DEFAULT_EXTENSION = '.webm'
+
+
+class AudioTooLarge(ValueError):
+    pass
+
+
+def audio_extension(filename=None, content_type=None):
+    """Whitelisted file extension for an upload, from its filename or MIME type"""
+    ext = os.path.splitext(filename or '')[1].lower()
+    if ext in AUDIO_EXTENSIONS:
+        return ext
+    subtype = (content_type or '').split(';')[0].split('/')[-1].strip().lower()
+    if f'.{subtype}' in AUDIO_EXTENSIONS:
+        return f'.{subtype}'
+    return DEFAULT_EXTENSION
+
+
+class LocalAudioStorage:
+    """Audio files on local disk, addressed by a relative key such as ``12/3f2a....webm``.
+
+    Rows store only the key, so audio is never loaded with a query. Uploads
+    are written to a temporary file under the root and moved into place once
+    complete, so readers never see a partial file. Another store (for example
+    an object store) only needs the same methods.
+    """
+
+    def __init__(self, root=AUDIO_STORAGE_DIR):
+        self.root = root
+
+    def _path(self, key):
+        path = os.path.normpath(os.path.join(self.root, key))
+        if not path.startswith(os.path.normpath(self.root) + os.sep):
+            raise ValueError('Invalid audio key')
+        return path
+
+    def new_upload(self, *args, **kwargs):
+        """Writable temporary file for an incoming upload.
+
+        Accepts and ignores werkzeug's stream_factory arguments so it can be
+        handed to the multipart parser directly.
+        """
+        upload_dir = os.path.join(self.root, 'tmp')
+        os.makedirs(upload_dir, exist_ok=True)
+        return tempfile.NamedTemporaryFile('wb+', dir=upload_dir, suffix='.part', delete=False)
+
+    def copy_stream(self, stream, max_bytes, chunk_size=AUDIO_UPLOAD_CHUNK_SIZE):
+        """Write a raw request body to a temporary upload in chunks; returns the open file"""
+        upload = self.new_upload()
+        try:
+            size = 0
+            while True:
+                chunk = stream.read(chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise AudioTooLarge(f'Audio exceeds {max_bytes} bytes')
+                upload.write(chunk)
+        except Exception:
+            self.discard(upload)
+            raise
+        return upload
+
+    def commit(self, upload, user_id, extension=DEFAULT_EXTENSION):
+        """Move a finished upload into place and return its storage key"""
+        upload.close()
+        key = f'{user_id}/{uuid.uuid4().hex}{extension}'
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(upload.name, path)
+        return key
+
+    def discard(self, upload):
+        upload.close()
+        try:
+            os.unlink(upload.name)
+        except FileNotFoundError:
+            pass
+
+    def save_bytes(self, data, user_id, extension=DEFAULT_EXTENSION):
+        upload = self.new_upload()
+        upload.write(data)
+        return self.commit(upload, user_id, extension)
+
+    def open(self, key):
+        return open(self._path(key), 'rb')
+
+    def size(self, key):
+        return os.path.getsize(self._path(key))
+
+    def delete(self, key):
+        try:
+            os.unlink(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def iter_keys(self, older_than_seconds=0):
+        """Keys of stored audio last modified more than older_than_seconds ago"""
+        cutoff = time.time() - older_than_seconds
+        for directory, dirnames, filenames in os.walk(self.root):
+            if directory == self.root and 'tmp' in dirnames:
+                dirnames.remove('tmp')
+            for name in filenames:
+                path = os.path.join(directory, name)
+                try:
+                    if os.path.getmtime(path) < cutoff:
+                        yield os.path.relpath(path, self.root).replace(os.sep, '/')
+                except FileNotFoundError:
+                    pass
+
+    def purge_stale_uploads(self, max_age_seconds):
+        """Delete temporary uploads older than max_age_seconds (left by aborted requests); returns the count"""
+        upload_dir = os.path.join(self.root, 'tmp')
+        cutoff = time.time() - max_age_seconds
+        removed = 0
+        try:
+            entries = list(os.scandir(upload_dir))
+        except FileNotFoundError:
+            return 0
+        for entry in entries:
+            try:
+                if entry.is_file() and entry.stat().st_mtime < cutoff:
+                    os.unlink(entry.path)
+                    removed += 1
+            except FileNotFoundError:
+                pass
+        return removed
+
+
+audio_storage = LocalAudioStorage()
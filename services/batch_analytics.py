@@ -0,0 +1,353 @@
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, date, timedelta
+from flask import current_app
+from sqlalchemy import func, case, update, literal
+from models import User, Task, Goal, Habit, UserAnalytics, FocusSession
+from database import db
+from services.analytics import AnalyticsService
+from services.rollups import UPSERTS
+from services.timezones import DEFAULT_TIMEZONE, local_date, local_today, day_bounds
+
+# Columns counted from dated events (task timestamps, focus sessions); the rest are
+# snapshots of the user's current state and only describe today
+EVENT_COLUMNS = ('tasks_created', 'tasks_completed', 'focus_time')
+
+# Expected completion time per priority, mirrors calculate_task_efficiency
+EXPECTED_SECONDS = {
+    'urgent': 1 * 86400,
+    'important': 3 * 86400,
+    'normal': 7 * 86400,
+}
+
+
+def _as_date(value):
+    """func.date() returns a string on SQLite and a date on Postgres"""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+def _date_range(start_date, end_date):
+    day = start_date
+    while day <= end_date:
+        yield day
+        day += timedelta(days=1)
+
+
+class BatchAnalyticsService:
+    @staticmethod
+    def recompute(start_date=None, end_date=None, user_ids=None, chunk_size=500, workers=1):
+        """Build UserAnalytics rows for every user and every day in [start_date, end_date]
+
+        Without a start_date each user's own local today is rebuilt. Users are processed
+        in id-ordered chunks; each chunk issues a fixed number of grouped queries
+        regardless of how many users or days it covers, and writes its rows back with
+        bulk UPDATEs and upserts.
+        """
+        if start_date is None and end_date is not None:
+            raise ValueError('end_date needs a start_date')
+        end_date = end_date or start_date
+        if start_date is not None and end_date < start_date:
+            raise ValueError('end_date must not be before start_date')
+
+        started = time.perf_counter()
+        stats = {'users': 0, 'inserted': 0, 'updated': 0}
+
+        if workers <= 1:
+            for chunk in BatchAnalyticsService.iter_user_chunks(chunk_size, user_ids):
+                BatchAnalyticsService._merge_stats(
+                    stats, BatchAnalyticsService.process_chunk(chunk, start_date, end_date)
+                )
+        else:
+            app = current_app._get_current_object()
+
+            def run(chunk):
+                with app.app_context():
+                    return BatchAnalyticsService.process_chunk(chunk, start_date, end_date)
+
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = [
+                    executor.submit(run, chunk)
+                    for chunk in BatchAnalyticsService.iter_user_chunks(chunk_size, user_ids)
+                ]
+                for future in futures:
+                    BatchAnalyticsService._merge_stats(stats, future.result())
+
+        stats['days'] = (end_date - start_date).days + 1 if start_date else 1
+        stats['seconds'] = round(time.perf_counter() - started, 3)
+        return stats
+
+    @staticmethod
+    def _merge_stats(stats, chunk_stats):
+        for key, value in chunk_stats.items():
+            stats[key] += value
+
+    @staticmethod
+    def iter_user_chunks(chunk_size, user_ids=None):
+        """Yield lists of user ids using keyset pagination over the primary key"""
+        if user_ids is not None:
+            user_ids = sorted(user_ids)
+            for i in range(0, len(user_ids), chunk_size):
+                yield user_ids[i:i + chunk_size]
+            return
+
+        last_id = 0
+        while True:
+            chunk = [row[0] for row in db.session.query(User.id).filter(
+                User.id > last_id
+            ).order_by(User.id).limit(chunk_size)]
+            if not chunk:
+                return
+            yield chunk
+            last_id = chunk[-1]
+
+    @staticmethod
+    def _daily_task_counts(user_ids, start_date, end_date, tz_name, column, *criteria):
+        """Count tasks per (user_id, local day) on column within the date range.
+
+        UTC users are bucketed with GROUP BY in SQL. Other timezones cannot be
+        bucketed portably in SQL across DST changes, so their timestamps are
+        read column-only over the sargable range and bucketed in Python.
+        """
+        range_start, range_end = day_bounds(start_date, tz_name, days=(end_date - start_date).days + 1)
+        query_filter = [
+            Task.user_id.in_(user_ids),
+            column >= range_start,
+            column < range_end,
+            *criteria
+        ]
+        if tz_name == DEFAULT_TIMEZONE:
+            day = func.date(column)
+            return {
+                (user_id, _as_date(value)): count
+                for user_id, value, count in db.session.query(
+                    Task.user_id, day, func.count(Task.id)
+                ).filter(*query_filter).group_by(Task.user_id, day)
+            }
+
+        counts = defaultdict(int)
+        for user_id, value in db.session.query(Task.user_id, column).filter(*query_filter):
+            counts[(user_id, local_date(value, tz_name))] += 1
+        return counts
+
+    @staticmethod
+    def _daily_focus_minutes(user_ids, start_date, end_date, tz_name):
+        """Focused minutes per (user_id, local day), bucketed like _daily_task_counts"""
+        range_start, range_end = day_bounds(start_date, tz_name, days=(end_date - start_date).days + 1)
+        query_filter = [
+            FocusSession.user_id.in_(user_ids),
+            FocusSession.started_at >= range_start,
+            FocusSession.started_at < range_end
+        ]
+        minutes = FocusSession.duration_seconds // 60
+        if tz_name == DEFAULT_TIMEZONE:
+            day = func.date(FocusSession.started_at)
+            return {
+                (user_id, _as_date(value)): int(total or 0)
+                for user_id, value, total in db.session.query(
+                    FocusSession.user_id, day, func.sum(minutes)
+                ).filter(*query_filter).group_by(FocusSession.user_id, day)
+            }
+
+        totals = defaultdict(int)
+        for user_id, started_at, value in db.session.query(
+            FocusSession.user_id, FocusSession.started_at, minutes
+        ).filter(*query_filter):
+            totals[(user_id, local_date(started_at, tz_name))] += int(value)
+        return totals
+
+    @staticmethod
+    def process_chunk(user_ids, start_date=None, end_date=None):
+        """Recompute and upsert analytics for one chunk of users.
+
+        Counters are rebuilt for every day from dated events. Goal progress,
+        habit counts, the prediction and the efficiency and impact scores only
+        describe the present, so they are written to each user's local today;
+        rows of other days keep theirs, and their score is recomputed from them.
+        Without a start_date only each user's local today is built.
+        """
+        users_by_timezone = defaultdict(list)
+        for user_id, tz_name in db.session.query(User.id, User.timezone).filter(User.id.in_(user_ids)):
+            users_by_timezone[tz_name or DEFAULT_TIMEZONE].append(user_id)
+        user_ids = sorted(uid for tz_users in users_by_timezone.values() for uid in tz_users)
+        if not user_ids:
+            return {'users': 0, 'inserted': 0, 'updated': 0}
+
+        now = datetime.utcnow()
+        today_by_timezone = {tz_name: local_today(tz_name, now) for tz_name in users_by_timezone}
+        range_by_timezone = {
+            tz_name: (start_date or today, end_date or today) for tz_name, today in today_by_timezone.items()
+        }
+        first_day = min(first for first, _ in range_by_timezone.values())
+        last_day = max(last for _, last in range_by_timezone.values())
+
+        # Per-day task counters and focus minutes, grouped by (user_id, local day)
+        tasks_created = {}
+        tasks_completed = {}
+        focus_minutes = {}
+        for tz_name, tz_users in users_by_timezone.items():
+            tz_start, tz_end = range_by_timezone[tz_name]
+            tasks_created.update(BatchAnalyticsService._daily_task_counts(
+                tz_users, tz_start, tz_end, tz_name, Task.created_at
+            ))
+            tasks_completed.update(BatchAnalyticsService._daily_task_counts(
+                tz_users, tz_start, tz_end, tz_name, Task.completed_at, Task.completed == True
+            ))
+            focus_minutes.update(BatchAnalyticsService._daily_focus_minutes(
+                tz_users, tz_start, tz_end, tz_name
+            ))
+
+        # Current-state aggregates (GROUP BY user_id)
+        habit_counts = {
+            user_id: (total or 0, active or 0)
+            for user_id, total, active in db.session.query(
+                Habit.user_id,
+                func.count(Habit.id),
+                func.sum(case((Habit.current_streak > 0, 1), else_=0))
+            ).filter(Habit.user_id.in_(user_ids)).group_by(Habit.user_id)
+        }
+
+        task_efficiency = BatchAnalyticsService._task_efficiency(user_ids)
+        habit_impact = BatchAnalyticsService._habit_impact(user_ids)
+
+        goals_by_user = defaultdict(list)
+        for user_id, progress, created_at, target_date in db.session.query(
+            Goal.user_id, Goal.progress, Goal.created_at, Goal.target_date
+        ).filter(Goal.user_id.in_(user_ids)):
+            goals_by_user[user_id].append((progress, created_at, target_date))
+        goals_progress = {
+            user_id: sum(g[0] or 0 for g in goals) / len(goals)
+            for user_id, goals in goals_by_user.items()
+        }
+
+        history = defaultdict(list)
+        existing = {}
+        for row_id, user_id, day, goals_prog, active_habits, total_habits in db.session.query(
+            UserAnalytics.id, UserAnalytics.user_id, UserAnalytics.date, UserAnalytics.goals_progress,
+            UserAnalytics.active_habits, UserAnalytics.total_habits
+        ).filter(
+            UserAnalytics.user_id.in_(user_ids),
+            UserAnalytics.date >= first_day - timedelta(days=7),
+            UserAnalytics.date <= last_day
+        ).order_by(UserAnalytics.date.asc()):
+            history[user_id].append((day, goals_prog or 0))
+            if day >= first_day:
+                existing[(user_id, day)] = (row_id, goals_prog or 0, active_habits or 0, total_habits or 0)
+
+        inserts = []
+        updates = []
+        for tz_name, tz_users in users_by_timezone.items():
+            today = today_by_timezone[tz_name]
+            tz_start, tz_end = range_by_timezone[tz_name]
+            for day in _date_range(tz_start, tz_end):
+                reference = min(now, datetime.combine(day + timedelta(days=1), datetime.min.time()))
+                for user_id in tz_users:
+                    row = existing.get((user_id, day))
+                    values = {
+                        'tasks_created': tasks_created.get((user_id, day), 0),
+                        'tasks_completed': tasks_completed.get((user_id, day), 0),
+                        'focus_time': focus_minutes.get((user_id, day), 0),
+                    }
+                    if day == today:
+                        progress = float(goals_progress.get(user_id) or 0)
+                        total_habits, active_habits = habit_counts.get(user_id, (0, 0))
+                        values.update({
+                            'goals_progress': progress,
+                            'active_habits': active_habits,
+                            'total_habits': total_habits,
+                            'goal_completion_prediction': AnalyticsService.estimate_goal_completion(
+                                goals_by_user.get(user_id, []),
+                                [(d, p) for d, p in history.get(user_id, []) if day - timedelta(days=7) <= d <= day],
+                                reference
+                            ),
+                            'task_efficiency_score': task_efficiency.get(user_id, 0),
+                            'habit_impact_score': habit_impact.get(user_id, 0),
+                            'is_dirty': False,
+                        })
+                    else:
+                        # Another day's snapshot is history; keep the row's own (a new row has none)
+                        _, progress, active_habits, total_habits = row or (None, 0, 0, 0)
+                    values['productivity_score'] = AnalyticsService.calculate_productivity_score(
+                        values['tasks_completed'], values['tasks_created'], progress,
+                        active_habits, total_habits, values['focus_time']
+                    )
+                    if row is None:
+                        values.update(user_id=user_id, date=day)
+                        inserts.append(values)
+                    else:
+                        values['id'] = row[0]
+                        updates.append(values)
+
+        if updates:
+            # Rows are sent as one executemany per run of identical columns, so keep today's rows together
+            updates.sort(key=lambda row: sorted(row))
+            db.session.execute(update(UserAnalytics), updates)
+        # A live request may create today's (user_id, date) row after it was found missing; other days'
+        # rows only take the counters on a conflict
+        for columns in sorted({tuple(sorted(row)) for row in inserts}):
+            rows = [row for row in inserts if tuple(sorted(row)) == columns]
+            table = UserAnalytics.__table__
+            statement = UPSERTS[db.session.connection().dialect.name](table)
+            overwrite = [name for name in columns if name not in ('user_id', 'date')]
+            if 'is_dirty' not in columns:
+                overwrite = [name for name in overwrite if name in EVENT_COLUMNS]
+            db.session.execute(
+                statement.on_conflict_do_update(
+                    index_elements=['user_id', 'date'],
+                    set_={name: statement.excluded[name] for name in overwrite}
+                ),
+                rows
+            )
+        db.session.commit()
+
+        return {'users': len(user_ids), 'inserted': len(inserts), 'updated': len(updates)}
+
+    @staticmethod
+    def _elapsed_seconds(start, end):
+        """Dialect-specific number of seconds between two timestamp columns"""
+        if db.engine.dialect.name == 'sqlite':
+            return (func.julianday(end) - func.julianday(start)) * 86400.0
+        return func.extract('epoch', end - start)
+
+    @staticmethod
+    def _task_efficiency(user_ids):
+        """Average efficiency score per user, computed entirely in SQL"""
+        elapsed = BatchAnalyticsService._elapsed_seconds(Task.created_at, Task.completed_at)
+        expected = case(
+            *[(Task.priority == priority, seconds) for priority, seconds in EXPECTED_SECONDS.items()],
+            else_=EXPECTED_SECONDS['normal']
+        )
+        score = case(
+            (elapsed <= 0, literal(100.0)),
+            (expected * 100.0 / elapsed > 100, literal(100.0)),
+            else_=expected * 100.0 / elapsed
+        )
+        return {
+            user_id: float(value or 0)
+            for user_id, value in db.session.query(
+                Task.user_id, func.avg(score)
+            ).filter(
+                Task.user_id.in_(user_ids),
+                Task.completed == True,
+                Task.completed_at.isnot(None)
+            ).group_by(Task.user_id)
+        }
+
+    @staticmethod
+    def _habit_impact(user_ids):
+        """Habit impact per user from a single column-only scan of the chunk's habits"""
+        now = datetime.utcnow()
+        totals = defaultdict(lambda: [0.0, 0])
+        for user_id, current_streak, best_streak, created_at, frequency in db.session.query(
+            Habit.user_id, Habit.current_streak, Habit.best_streak, Habit.created_at, Habit.frequency
+        ).filter(Habit.user_id.in_(user_ids)):
+            consistency = (current_streak or 0) / max(best_streak or 0, 1)
+            longevity_factor = min((now - created_at).days / 30, 1) if created_at else 0
+            frequency_multiplier = 1.5 if frequency == 'daily' else 1.0
+            totals[user_id][0] += (consistency * 0.4 + longevity_factor * 0.3) * frequency_multiplier * 100
+            totals[user_id][1] += 1
+        return {user_id: min(total / count, 100) for user_id, (total, count) in totals.items()}
@@ -0,0 +1,40 @@
+import gzip
+from flask import request
+from config.settings import COMPRESSION_ENABLED, COMPRESSION_LEVEL, COMPRESSION_MIN_BYTES
+
+COMPRESSIBLE_TYPES = {
+    'application/json', 'text/html', 'text/plain', 'text/css', 'application/javascript', 'text/javascript'
+}
+
+
+def init_compression(app):
+    """Gzip textual responses for clients that accept it.
+
+    Streamed and file responses (server-sent events, audio) pass through
+    untouched. A strong ETag becomes weak once the body is re-encoded, which
+    If-None-Match still matches, so conditional requests keep answering 304.
+    """
+    if not COMPRESSION_ENABLED:
+        return
+
+    @app.after_request
+    def compress_response(response):
+        if (
+            response.status_code != 200
+            or response.direct_passthrough
+            or response.is_streamed
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_TYPES
+            or 'gzip' not in request.headers.get('Accept-Encoding', '').lower()
+        ):
+            return response
+        response.vary.add('Accept-Encoding')
+        data = response.get_data()
+        if len(data) < COMPRESSION_MIN_BYTES:
+            return response
+        response.set_data(gzip.compress(data, compresslevel=COMPRESSION_LEVEL))
+        response.headers['Content-Encoding'] = 'gzip'
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
@@ -0,0 +1,44 @@
+from models import Goal, Task, Habit
+from database import db
+from services.analytics import AnalyticsService
+from services.serializers import isoformat
+from services.user_cache import user_cache
+
+# Columns the dashboard renders for each list
+DASHBOARD_COLUMNS = {
+    'goals': (Goal, (Goal.id, Goal.title, Goal.progress)),
+    'tasks': (Task, (Task.id, Task.title, Task.priority, Task.completed)),
+    'habits': (Habit, (Habit.id, Habit.title, Habit.frequency, Habit.current_streak,
+                       Habit.best_streak, Habit.last_completed_at)),
+}
+ANALYTICS_FIELDS = ('productivity_score', 'tasks_completed', 'tasks_created', 'focus_time', 'active_habits')
+
+
+def _load_list(user_id, scope):
+    model, columns = DASHBOARD_COLUMNS[scope]
+    rows = db.session.query(*columns).filter(model.user_id == user_id).order_by(model.id.asc())
+    return [
+        {column.key: isoformat(value) if column.key.endswith('_at') else value
+         for column, value in zip(columns, row)}
+        for row in rows
+    ]
+
+
+class DashboardService:
+    @staticmethod
+    def get_dashboard(user_id):
+        """Everything the dashboard page shows, in one JSON-ready dict.
+
+        Today's analytics row is read (and recomputed only when missing or
+        dirty); goals, tasks, habits and insights come from the per-user cache,
+        so a warm dashboard costs the analytics lookup plus one version read.
+        """
+        analytics = AnalyticsService.get_daily_analytics(user_id)
+        data = {
+            'date': analytics.date.isoformat(),
+            'analytics': {field: getattr(analytics, field) for field in ANALYTICS_FIELDS},
+            'insights': AnalyticsService.get_user_insights(user_id),
+        }
+        for scope in DASHBOARD_COLUMNS:
+            data[scope] = user_cache.fetch(user_id, scope, 'dashboard', lambda scope=scope: _load_list(user_id, scope))
+        return data
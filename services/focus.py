@@ -0,0 +1,116 @@
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import insert
+from models import FocusSession
+from database import db
+from services.analytics import AnalyticsService
+from services.timezones import local_date
+
+MAX_SESSION_SECONDS = 24 * 60 * 60
+CLOCK_SKEW = timedelta(minutes=5)
+
+
+class FocusSessionError(ValueError):
+    pass
+
+
+def _parse_timestamp(value, field):
+    """ISO 8601 timestamp as naive UTC; values without an offset are taken as UTC"""
+    if not isinstance(value, str):
+        raise FocusSessionError(f'Missing required field: {field}')
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise FocusSessionError(f'Invalid timestamp for {field}')
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def _parse_session(item, now):
+    if not isinstance(item, dict):
+        raise FocusSessionError('Session must be an object')
+    client_id = item.get('client_id')
+    if not isinstance(client_id, str) or not client_id or len(client_id) > 64:
+        raise FocusSessionError('client_id must be a string of 1 to 64 characters')
+
+    started_at = _parse_timestamp(item.get('started_at'), 'started_at')
+    ended_at = _parse_timestamp(item.get('ended_at'), 'ended_at')
+    if ended_at < started_at:
+        raise FocusSessionError('ended_at is before started_at')
+    if ended_at > now + CLOCK_SKEW:
+        raise FocusSessionError('Session ends in the future')
+
+    elapsed = int((ended_at - started_at).total_seconds())
+    duration = item.get('duration_seconds', elapsed)
+    if not isinstance(duration, int) or isinstance(duration, bool) or duration < 0:
+        raise FocusSessionError('duration_seconds must be a non-negative integer')
+    if duration > min(elapsed, MAX_SESSION_SECONDS):
+        raise FocusSessionError('duration_seconds exceeds the session length')
+
+    return {
+        'client_id': client_id,
+        'started_at': started_at,
+        'ended_at': ended_at,
+        'duration_seconds': duration
+    }
+
+
+class FocusSessionService:
+    @staticmethod
+    def ingest(user_id, sessions):
+        """Store a batch of completed focus sessions and roll them into daily analytics.
+
+        Timers buffer finished sessions on the client and upload them in
+        batches, so retries after being offline are expected: sessions are keyed
+        by (user_id, client_id) and already-stored ones are reported as
+        duplicates instead of counted twice. New sessions go out as one bulk
+        INSERT, then each affected local day gets a single focus_time delta.
+        Invalid sessions are reported per item and skipped. The caller commits;
+        an IntegrityError there means a concurrent upload stored some of the
+        same sessions, and the batch can simply be replayed.
+        """
+        now = datetime.utcnow()
+        results = [None] * len(sessions)
+        rows = {}
+        for index, item in enumerate(sessions):
+            try:
+                row = _parse_session(item, now)
+            except FocusSessionError as e:
+                results[index] = {'index': index, 'status': 'error', 'error': str(e)}
+                continue
+            if row['client_id'] in rows:
+                results[index] = {'index': index, 'client_id': row['client_id'], 'status': 'duplicate'}
+                continue
+            rows[row['client_id']] = (index, row)
+
+        if rows:
+            stored = FocusSessionService._insert_new(user_id, rows)
+            for client_id, (index, row) in rows.items():
+                status = 'success' if client_id in stored else 'duplicate'
+                results[index] = {'index': index, 'client_id': client_id, 'status': status}
+            FocusSessionService._apply_analytics(user_id, [rows[c][1] for c in stored])
+        return results
+
+    @staticmethod
+    def _insert_new(user_id, rows):
+        """Insert sessions whose client_id is not stored yet; returns the inserted client_ids"""
+        existing = {c for (c,) in db.session.query(FocusSession.client_id).filter(
+            FocusSession.user_id == user_id,
+            FocusSession.client_id.in_(list(rows))
+        )}
+        new = [dict(row, user_id=user_id) for c, (_, row) in rows.items() if c not in existing]
+        if new:
+            db.session.execute(insert(FocusSession), new)
+        return {row['client_id'] for row in new}
+
+    @staticmethod
+    def _apply_analytics(user_id, rows):
+        """One focus_time delta per local day the new sessions started on"""
+        tz_name = AnalyticsService.get_user_timezone(user_id)
+        minutes_by_day = defaultdict(int)
+        for row in rows:
+            minutes_by_day[local_date(row['started_at'], tz_name)] += row['duration_seconds'] // 60
+        for day, minutes in minutes_by_day.items():
+            if minutes:
+                AnalyticsService.record_focus_time(user_id, minutes, day=day)
@@ -0,0 +1,155 @@
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import update, or_, exists, case
+from models import User, Habit, HabitLog
+from database import db
+from services.timezones import DEFAULT_TIMEZONE, local_today, local_date, day_bounds
+from services.user_cache import invalidate, invalidate_all
+
+
+def period_index(day, frequency):
+    """Ordinal of the streak period containing a local date.
+
+    Daily habits count calendar days; weekly habits count ISO weeks
+    (Monday to Sunday). Consecutive periods differ by exactly one.
+    """
+    ordinal = day.toordinal()
+    if frequency == 'weekly':
+        # date(1, 1, 1) is a Monday, so this buckets ordinals into ISO weeks
+        return (ordinal - 1) // 7
+    return ordinal
+
+
+def period_start(day, frequency):
+    """First local day of the streak period containing day"""
+    if frequency == 'weekly':
+        return day - timedelta(days=day.weekday())
+    return day
+
+
+def streak_after(current_streak, best_streak, last_period, period):
+    """Streak counters after a completion in period, given the last completed period"""
+    if last_period is not None and period <= last_period:
+        return current_streak, best_streak
+    if last_period is not None and period == last_period + 1:
+        current_streak += 1
+    else:
+        current_streak = 1
+    return current_streak, max(best_streak, current_streak)
+
+
+class HabitService:
+    @staticmethod
+    def current_streak(habit, tz_name, now=None):
+        """Streak as of now: zero once a whole period has passed without a check-in"""
+        if not habit.current_streak or habit.last_completed_at is None:
+            return 0
+        today = period_index(local_today(tz_name, now), habit.frequency)
+        last = period_index(local_date(habit.last_completed_at, tz_name), habit.frequency)
+        return habit.current_streak if last >= today - 1 else 0
+
+    @staticmethod
+    def check_in(habit, tz_name, now=None):
+        """Log a completion and advance the habit's streak in O(1).
+
+        Only the habit's own counters and last_completed_at are consulted, never
+        the log history. A second check-in within the same period is a no-op and
+        returns False. The caller commits.
+        """
+        now = now or datetime.utcnow()
+        period = period_index(local_date(now, tz_name), habit.frequency)
+        last_period = None
+        if habit.last_completed_at is not None:
+            last_period = period_index(local_date(habit.last_completed_at, tz_name), habit.frequency)
+            if period <= last_period:
+                return False
+
+        habit.current_streak, habit.best_streak = streak_after(
+            habit.current_streak or 0, habit.best_streak or 0, last_period, period
+        )
+        habit.last_completed_at = now
+        db.session.add(HabitLog(habit_id=habit.id, completed_at=now))
+        return True
+
+    @staticmethod
+    def expire_lapsed_streaks(user_id, tz_name, now=None):
+        """Reset current streaks that missed their previous period, in a single UPDATE"""
+        today = local_today(tz_name, now)
+        daily_cutoff, _ = day_bounds(today - timedelta(days=1), tz_name)
+        weekly_cutoff, _ = day_bounds(period_start(today, 'weekly') - timedelta(days=7), tz_name)
+        cutoff = case((Habit.frequency == 'weekly', weekly_cutoff), else_=daily_cutoff)
+        expired = db.session.execute(
+            update(Habit).where(
+                Habit.user_id == user_id,
+                Habit.current_streak > 0,
+                or_(Habit.last_completed_at.is_(None), Habit.last_completed_at < cutoff)
+            ).values(current_streak=0).execution_options(synchronize_session=False)
+        ).rowcount
+        if expired:
+            invalidate(user_id, 'habits')
+
+    @staticmethod
+    def rebuild_streaks(batch_size=1000, now=None):
+        """Recompute current and best streaks for every habit from HabitLog.
+
+        Makes one ordered pass over the log by (habit_id, completed_at), which
+        the ix_habit_log_habit_completed_at index serves directly, carrying only
+        the running state of the habit being scanned. Results are written with
+        bulk UPDATEs of batch_size rows; habits without any log rows are reset.
+        """
+        started = time.time()
+        now = now or datetime.utcnow()
+        rows = db.session.query(
+            HabitLog.habit_id, HabitLog.completed_at, Habit.frequency, User.timezone
+        ).join(Habit, HabitLog.habit_id == Habit.id).join(
+            User, Habit.user_id == User.id
+        ).filter(
+            HabitLog.completed_at.isnot(None)
+        ).order_by(HabitLog.habit_id, HabitLog.completed_at).yield_per(batch_size)
+
+        results = []
+        logs = 0
+        state = None
+
+        def finish(state):
+            habit_id, frequency, tz_name, current, best, last_period, last_at = state
+            today = period_index(local_today(tz_name, now), frequency)
+            results.append({
+                'id': habit_id,
+                'current_streak': current if last_period >= today - 1 else 0,
+                'best_streak': best,
+                'last_completed_at': last_at
+            })
+
+        for habit_id, completed_at, frequency, tz_name in rows:
+            logs += 1
+            tz_name = tz_name or DEFAULT_TIMEZONE
+            period = period_index(local_date(completed_at, tz_name), frequency)
+            if state is None or state[0] != habit_id:
+                if state is not None:
+                    finish(state)
+                state = (habit_id, frequency, tz_name, 1, 1, period, completed_at)
+                continue
+            current, best = streak_after(state[3], state[4], state[5], period)
+            state = (habit_id, frequency, tz_name, current, best, max(period, state[5]), completed_at)
+        if state is not None:
+            finish(state)
+
+        for i in range(0, len(results), batch_size):
+            db.session.execute(update(Habit), results[i:i + batch_size])
+
+        reset = db.session.execute(
+            update(Habit).where(
+                ~exists().where(HabitLog.habit_id == Habit.id)
+            ).values(current_streak=0, best_streak=0, last_completed_at=None)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        invalidate_all()
+        db.session.commit()
+
+        return {
+            'habits': len(results),
+            'reset': reset,
+            'logs': logs,
+            'seconds': round(time.time() - started, 2)
+        }
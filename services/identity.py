@@ -0,0 +1,213 @@
+import hashlib
+import threading
+import time
+from flask import has_request_context, session
+from flask_login import UserMixin, user_logged_in, user_logged_out
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from database import db
+from models import User, Goal, Task, Habit
+from services.cache import LRUCache
+from config.settings import IDENTITY_CACHE_ENABLED, IDENTITY_CACHE_SIZE, IDENTITY_CACHE_TTL
+
+SESSION_KEY = '_identity'
+
+
+def credential_stamp(password_hash):
+    """Short digest of a password hash; sessions issued under another stamp are logged out"""
+    return hashlib.sha256((password_hash or '').encode('utf-8')).hexdigest()[:16]
+
+
+class CachedUser(UserMixin):
+    """Detached, read-only stand-in for User as current_user.
+
+    Carries the columns requests and templates read. The goals, tasks and
+    habits lists are queried on access; only the profile page uses them.
+    """
+
+    def __init__(self, id, username, email, timezone, stamp):
+        self.id = id
+        self.username = username
+        self.email = email
+        self.timezone = timezone
+        self.stamp = stamp
+
+    @classmethod
+    def from_user(cls, user):
+        if isinstance(user, cls):
+            return user
+        return cls(user.id, user.username, user.email, user.timezone, credential_stamp(user.password_hash))
+
+    def to_dict(self):
+        return {'id': self.id, 'username': self.username, 'email': self.email,
+                'timezone': self.timezone, 'stamp': self.stamp}
+
+    @property
+    def goals(self):
+        return Goal.query.filter_by(user_id=self.id).all()
+
+    @property
+    def tasks(self):
+        return Task.query.filter_by(user_id=self.id).all()
+
+    @property
+    def habits(self):
+        return Habit.query.filter_by(user_id=self.id).all()
+
+    def __repr__(self):
+        return f'<CachedUser {self.id}>'
+
+
+class IdentityCache:
+    """Short-lived per-process cache of user identities for the Flask-Login user_loader.
+
+    An identity is found, in order, in this worker's LRU, in the signed
+    session cookie (written at login and whenever the user row is read), or
+    in the user table. Cached and session copies are trusted for at most
+    ttl seconds after they were read from the table, which bounds how long a
+    change made through another worker goes unseen. Changes committed in this
+    process evict at once and distrust older session copies. A session whose
+    credential stamp differs from the user's current password hash is
+    rejected, so changing the password logs out other sessions.
+    """
+
+    def __init__(self, maxsize=4096, ttl=60, enabled=True):
+        self.enabled = enabled
+        self.ttl = ttl
+        self.local = LRUCache(maxsize=maxsize, ttl=ttl)
+        self._emails = LRUCache(maxsize=maxsize, ttl=ttl)
+        self._changed = LRUCache(maxsize=maxsize, ttl=ttl)
+        self._cleared_at = 0
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'session_hits': 0, 'misses': 0, 'rejected': 0, 'evictions': 0}
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def get(self, user_id):
+        """Cached identity of a user, or None; never queries"""
+        return self.local.get(user_id) if self.enabled else None
+
+    def get_by_email(self, email):
+        user_id = self._emails.get(email) if self.enabled else None
+        identity = self.get(user_id) if user_id is not None else None
+        return identity if identity is not None and identity.email == email else None
+
+    def put(self, user, ttl=None):
+        """Cache a user (ORM row or identity) and return its identity"""
+        identity = CachedUser.from_user(user)
+        if self.enabled:
+            self.local.set(identity.id, identity, ttl)
+            self._emails.set(identity.email, identity.id, ttl)
+        return identity
+
+    def evict(self, user_id):
+        self.local.delete(user_id)
+        self._changed.set(user_id, time.time())
+        self._count('evictions')
+
+    def clear(self):
+        """Forget every identity, e.g. after the user table is recreated; older session copies are distrusted"""
+        self.local.clear()
+        self._emails.clear()
+        self._changed.clear()
+        self._cleared_at = time.time()
+
+    def _remember(self, identity):
+        session[SESSION_KEY] = dict(identity.to_dict(), checked_at=time.time())
+
+    def load(self, user_id):
+        """user_loader: the identity for a session's user id, or None to log the session out"""
+        if not self.enabled:
+            return db.session.get(User, user_id)
+        saved = session.get(SESSION_KEY) if has_request_context() else None
+        if saved is not None and saved.get('id') != user_id:
+            saved = None
+
+        identity = self.local.get(user_id)
+        if identity is not None:
+            return self._check(identity, saved, 'hits')
+
+        if saved is not None:
+            age = time.time() - saved['checked_at']
+            changed_at = self._changed.get(user_id)
+            trusted_after = max(changed_at or 0, self._cleared_at)
+            if age < self.ttl and saved['checked_at'] > trusted_after:
+                fields = {k: saved[k] for k in ('id', 'username', 'email', 'timezone', 'stamp')}
+                self._count('session_hits')
+                return self.put(CachedUser(**fields), ttl=self.ttl - age)
+
+        user = db.session.get(User, user_id)
+        if user is None:
+            return None
+        return self._check(self.put(user), saved, 'misses', fresh=True)
+
+    def _check(self, identity, saved, outcome, fresh=False):
+        if saved is not None and saved['stamp'] != identity.stamp:
+            session.pop(SESSION_KEY, None)
+            self._count('rejected')
+            return None
+        self._count(outcome)
+        if fresh or saved is None:
+            if has_request_context():
+                self._remember(identity)
+        return identity
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats['hits'] + stats['session_hits'] + stats['misses']
+        stats['entries'] = len(self.local)
+        stats['hit_rate'] = (stats['hits'] + stats['session_hits']) / lookups if lookups else 0
+        stats['enabled'] = self.enabled
+        return stats
+
+
+identity_cache = IdentityCache(maxsize=IDENTITY_CACHE_SIZE, ttl=IDENTITY_CACHE_TTL, enabled=IDENTITY_CACHE_ENABLED)
+
+
+def _collect_flush(session_, flush_context):
+    changed = session_.info.setdefault('identity_evictions', set())
+    for obj in session_.deleted:
+        if isinstance(obj, User):
+            changed.add(obj.id)
+    for obj in session_.dirty:
+        if isinstance(obj, User) and session_.is_modified(obj, include_collections=False):
+            changed.add(obj.id)
+
+
+def _evict_committed(session_):
+    changed = session_.info.pop('identity_evictions', None)
+    if not changed:
+        return
+    for user_id in changed:
+        identity_cache.evict(user_id)
+    # The request that made the change re-reads its own identity next time
+    if has_request_context():
+        saved = session.get(SESSION_KEY)
+        if saved is not None and saved.get('id') in changed:
+            session.pop(SESSION_KEY, None)
+
+
+def _discard_evictions(session_):
+    session_.info.pop('identity_evictions', None)
+
+
+def _logged_in(sender, user):
+    if identity_cache.enabled:
+        identity_cache._remember(identity_cache.put(user))
+
+
+def _logged_out(sender, user):
+    session.pop(SESSION_KEY, None)
+
+
+def init_identity_cache(app):
+    """Evict identities when user rows change and keep the session copy in step with login"""
+    if not event.contains(Session, 'after_flush', _collect_flush):
+        event.listen(Session, 'after_flush', _collect_flush)
+        event.listen(Session, 'after_commit', _evict_committed)
+        event.listen(Session, 'after_rollback', _discard_evictions)
+    user_logged_in.connect(_logged_in, app)
+    user_logged_out.connect(_logged_out, app)
@@ -0,0 +1,473 @@
+import functools
+import hmac
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from datetime import datetime
+from flask import g, has_request_context, jsonify, request, got_request_exception
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from config.settings import (
+    INSTRUMENTATION_ENABLED, INSTRUMENTATION_TOKEN, INSTRUMENTATION_LOG_REQUESTS,
+    SLOW_QUERY_MS, SLOW_QUERY_SAMPLES, PROFILER_SAMPLE_PERCENT, PROFILER_INTERVAL_MS, PROFILER_KEEP
+)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+MAX_STATEMENT_LENGTH = 500
+MAX_STACK_DEPTH = 64
+BACKGROUND = 'background'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+class MetricsRegistry:
+    """Thread-safe counters and histograms rendered in the Prometheus text format.
+
+    Values are per process: with several workers, each one is scraped (or
+    aggregated) separately, as with any Prometheus client without a push gateway.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._meta = {}
+        self._counters = {}
+        self._histograms = {}
+
+    def describe(self, name, kind, help_text):
+        self._meta[name] = (kind, help_text)
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                # Per-bucket counts, then sum and count
+                histogram = self._histograms[key] = [0] * len(DURATION_BUCKETS) + [0.0, 0]
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if value <= bound:
+                    histogram[i] += 1
+                    break
+            histogram[-2] += value
+            histogram[-1] += 1
+
+    def render(self):
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: list(value) for key, value in self._histograms.items()}
+
+        lines = []
+        for name, (kind, help_text) in sorted(self._meta.items()):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            if kind == 'counter':
+                for (metric, labels), value in sorted(counters.items()):
+                    if metric == name:
+                        lines.append(f'{name}{_format_labels(labels)} {value}')
+                continue
+            for (metric, labels), histogram in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(DURATION_BUCKETS, histogram):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{_format_labels(labels + (("le", bound),))} {cumulative}')
+                lines.append(f'{name}_bucket{_format_labels(labels + (("le", "+Inf"),))} {histogram[-1]}')
+                lines.append(f'{name}_sum{_format_labels(labels)} {round(histogram[-2], 6)}')
+                lines.append(f'{name}_count{_format_labels(labels)} {histogram[-1]}')
+        return '\n'.join(lines) + '\n'
+
+
+metrics = MetricsRegistry()
+metrics.describe('lifetune_http_requests_total', 'counter', 'HTTP requests by endpoint, method and status')
+metrics.describe('lifetune_http_request_duration_seconds', 'histogram', 'Wall time of HTTP requests')
+metrics.describe('lifetune_http_exceptions_total', 'counter', 'Unhandled exceptions raised by requests')
+metrics.describe('lifetune_db_queries_total', 'counter', 'SQL statements executed')
+metrics.describe('lifetune_db_query_seconds_total', 'counter', 'Time spent executing SQL statements')
+metrics.describe('lifetune_db_slow_queries_total', 'counter', f'SQL statements slower than {SLOW_QUERY_MS:g} ms')
+metrics.describe('lifetune_openai_request_duration_seconds', 'histogram', 'Latency of OpenAI API calls')
+metrics.describe('lifetune_openai_tokens_total', 'counter', 'OpenAI tokens used, by kind')
+metrics.describe('lifetune_span_duration_seconds', 'histogram', 'Wall time of instrumented service methods')
+metrics.describe('lifetune_profiled_requests_total', 'counter', 'Requests run under the sampling profiler')
+
+
+class RequestStats:
+    """What one request spent, accumulated on flask.g"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.slow_queries = 0
+        self.openai_calls = 0
+        self.openai_seconds = 0.0
+        self.tokens = 0
+        self.spans = {}
+
+    def add_span(self, name, seconds):
+        count, total = self.spans.get(name, (0, 0.0))
+        self.spans[name] = (count + 1, total + seconds)
+
+
+def _request_stats():
+    if has_request_context():
+        return g.get('instrumentation')
+    return None
+
+
+def log_event(event_name, **fields):
+    """Write one structured (JSON) log line"""
+    record = {'event': event_name, 'at': datetime.utcnow().isoformat() + 'Z'}
+    record.update(fields)
+    print(json.dumps(record, default=str, separators=(',', ':')))
+
+
+def _endpoint():
+    if has_request_context():
+        return request.endpoint or 'unmatched'
+    return BACKGROUND
+
+
+class SamplingProfiler:
+    """Samples the Python stacks of selected request threads from one background thread.
+
+    A request picked by should_profile() registers its thread; every interval
+    the sampler reads that thread's current frame and counts the folded stack
+    (root;...;leaf), the format flame graph tools read. The sampler thread only
+    runs while some request is being profiled.
+    """
+
+    def __init__(self, sample_percent=0.0, interval_ms=5.0, keep=20):
+        self.sample_percent = sample_percent
+        self.interval = interval_ms / 1000
+        self.profiles = deque(maxlen=keep)
+        self._targets = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._next_id = 1
+
+    def should_profile(self):
+        return self.sample_percent > 0 and random.random() * 100 < self.sample_percent
+
+    def start(self, thread_id):
+        with self._lock:
+            self._targets[thread_id] = Counter()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='profiler', daemon=True)
+                self._thread.start()
+
+    def stop(self, thread_id, **details):
+        """Stop sampling a thread and keep its profile; returns the profile"""
+        with self._lock:
+            stacks = self._targets.pop(thread_id, Counter())
+            profile_id = self._next_id
+            self._next_id += 1
+        profile = dict(details, id=profile_id, samples=sum(stacks.values()), stacks=stacks)
+        self.profiles.append(profile)
+        return profile
+
+    def get(self, profile_id):
+        return next((p for p in list(self.profiles) if p['id'] == profile_id), None)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._targets:
+                    self._thread = None
+                    return
+                targets = list(self._targets.items())
+            frames = sys._current_frames()
+            for thread_id, stacks in targets:
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    stacks[_folded_stack(frame)] += 1
+
+
+def _folded_stack(frame):
+    names = []
+    while frame is not None and len(names) < MAX_STACK_DEPTH:
+        code = frame.f_code
+        names.append(f'{os.path.basename(code.co_filename)}:{code.co_name}')
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+profiler = SamplingProfiler(PROFILER_SAMPLE_PERCENT, PROFILER_INTERVAL_MS, PROFILER_KEEP)
+slow_queries = deque(maxlen=SLOW_QUERY_SAMPLES)
+_enabled = False
+
+
+@contextmanager
+def span(name):
+    """Time a block as a named span, in the metrics and the current request's stats"""
+    if not _enabled:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        metrics.observe('lifetune_span_duration_seconds', elapsed, span=name)
+        stats = _request_stats()
+        if stats is not None:
+            stats.add_span(name, elapsed)
+
+
+def instrument_static_methods(cls, prefix=None):
+    """Wrap every static method of a service class in a span named Class.method"""
+    prefix = prefix or cls.__name__
+    for name, attribute in list(vars(cls).items()):
+        if not isinstance(attribute, staticmethod) or getattr(attribute.__func__, 'instrumented', False):
+            continue
+
+        def wrap(fn, span_name):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with span(span_name):
+                    return fn(*args, **kwargs)
+            wrapper.instrumented = True
+            return wrapper
+
+        setattr(cls, name, staticmethod(wrap(attribute.__func__, f'{prefix}.{name}')))
+
+
+class _OpenAICall:
+    def __init__(self):
+        self.usage = None
+
+    def record_usage(self, usage):
+        self.usage = usage
+
+
+@contextmanager
+def openai_call(operation, model):
+    """Measure one OpenAI API call; call record_usage() on the yielded object with the response usage"""
+    call = _OpenAICall()
+    if not _enabled:
+        yield call
+        return
+    started = time.perf_counter()
+    outcome = 'error'
+    try:
+        yield call
+        outcome = 'ok'
+    finally:
+        elapsed = time.perf_counter() - started
+        metrics.observe('lifetune_openai_request_duration_seconds', elapsed,
+                        operation=operation, model=model, outcome=outcome)
+        prompt_tokens = getattr(call.usage, 'prompt_tokens', 0) or 0
+        completion_tokens = getattr(call.usage, 'completion_tokens', 0) or 0
+        if prompt_tokens:
+            metrics.inc('lifetune_openai_tokens_total', prompt_tokens, model=model, kind='prompt')
+        if completion_tokens:
+            metrics.inc('lifetune_openai_tokens_total', completion_tokens, model=model, kind='completion')
+        stats = _request_stats()
+        if stats is not None:
+            stats.openai_calls += 1
+            stats.openai_seconds += elapsed
+            stats.tokens += prompt_tokens + completion_tokens
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._instrumentation_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, '_instrumentation_started', None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    endpoint = _endpoint()
+    metrics.inc('lifetune_db_queries_total', endpoint=endpoint)
+    metrics.inc('lifetune_db_query_seconds_total', elapsed, endpoint=endpoint)
+    stats = _request_stats()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_seconds += elapsed
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        # Statements only, never parameters, so samples carry no user data
+        sample = {
+            'statement': ' '.join(statement.split())[:MAX_STATEMENT_LENGTH],
+            'ms': round(elapsed * 1000, 2),
+            'endpoint': endpoint,
+            'at': datetime.utcnow().isoformat() + 'Z'
+        }
+        slow_queries.append(sample)
+        metrics.inc('lifetune_db_slow_queries_total', endpoint=endpoint)
+        if stats is not None:
+            stats.slow_queries += 1
+        log_event('slow_query', **sample)
+
+
+def _authorized():
+    """Bearer INSTRUMENTATION_TOKEN; without a token the endpoints are closed to everyone.
+
+    The client address is no guide: behind a reverse proxy every request
+    arrives from loopback.
+    """
+    if not INSTRUMENTATION_TOKEN:
+        return False
+    supplied = request.headers.get('Authorization', '')
+    return hmac.compare_digest(supplied.encode(), f'Bearer {INSTRUMENTATION_TOKEN}'.encode())
+
+
+def _forbidden():
+    return jsonify({'error': 'Forbidden'}), 403
+
+
+def token_required(view):
+    """Close an operator endpoint to requests without the instrumentation bearer token"""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if not _authorized():
+            return _forbidden()
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def _profile_summary(profile):
+    return {key: value for key, value in profile.items() if key != 'stacks'}
+
+
+def init_instrumentation(app, span_classes=()):
+    """Opt-in request instrumentation (INSTRUMENTATION_ENABLED).
+
+    Per request it records wall time, SQL statement count and time, OpenAI
+    latency and tokens and per-span timings, answers with a Server-Timing
+    header and writes one JSON log line. Process-wide metrics are served at
+    /metrics in the Prometheus text format. /api/instrumentation lists slow
+    statements and recent profiles and sets the share of requests run under the
+    sampling profiler. Static methods of span_classes are timed as spans. When
+    disabled nothing is registered and the helpers above are no-ops.
+    """
+    global _enabled
+    if not INSTRUMENTATION_ENABLED:
+        return
+    _enabled = True
+    if not INSTRUMENTATION_TOKEN:
+        print("Instrumentation enabled without INSTRUMENTATION_TOKEN; /metrics and /api/instrumentation are disabled")
+    for cls in span_classes:
+        instrument_static_methods(cls)
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+    @app.before_request
+    def start_instrumentation():
+        g.instrumentation = RequestStats()
+        if profiler.should_profile():
+            g.profiled = True
+            profiler.start(threading.get_ident())
+
+    @app.after_request
+    def finish_instrumentation(response):
+        stats = g.pop('instrumentation', None)
+        if stats is None:
+            return response
+        elapsed = time.perf_counter() - stats.started
+        endpoint = request.endpoint or 'unmatched'
+        metrics.inc('lifetune_http_requests_total', endpoint=endpoint, method=request.method,
+                    status=response.status_code)
+        metrics.observe('lifetune_http_request_duration_seconds', elapsed, endpoint=endpoint)
+
+        profile_id = None
+        if g.pop('profiled', False):
+            metrics.inc('lifetune_profiled_requests_total', endpoint=endpoint)
+            profile_id = profiler.stop(
+                threading.get_ident(), endpoint=endpoint, method=request.method, path=request.path,
+                duration_ms=round(elapsed * 1000, 2), at=datetime.utcnow().isoformat() + 'Z'
+            )['id']
+            response.headers['X-Profile-Id'] = str(profile_id)
+
+        response.headers['Server-Timing'] = ', '.join([
+            f'app;dur={elapsed * 1000:.1f}',
+            f'db;dur={stats.db_seconds * 1000:.1f};desc="{stats.queries} queries"',
+            f'openai;dur={stats.openai_seconds * 1000:.1f};desc="{stats.openai_calls} calls"',
+        ])
+        if INSTRUMENTATION_LOG_REQUESTS:
+            log_event(
+                'request', method=request.method, path=request.path, endpoint=endpoint,
+                status=response.status_code, duration_ms=round(elapsed * 1000, 2),
+                queries=stats.queries, db_ms=round(stats.db_seconds * 1000, 2),
+                slow_queries=stats.slow_queries, openai_calls=stats.openai_calls,
+                openai_ms=round(stats.openai_seconds * 1000, 2), tokens=stats.tokens,
+                spans={name: {'count': count, 'ms': round(total * 1000, 2)}
+                       for name, (count, total) in stats.spans.items()},
+                profile_id=profile_id
+            )
+        return response
+
+    def record_exception(sender, exception, **extra):
+        endpoint = request.endpoint or 'unmatched'
+        metrics.inc('lifetune_http_exceptions_total', endpoint=endpoint, exception=type(exception).__name__)
+        log_event('exception', method=request.method, path=request.path, endpoint=endpoint,
+                  exception=type(exception).__name__, message=str(exception)[:500])
+
+    got_request_exception.connect(record_exception, app, weak=False)
+
+    @app.route('/metrics', methods=['GET'])
+    def prometheus_metrics():
+        if not _authorized():
+            return _forbidden()
+        return metrics.render(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+    @app.route('/api/instrumentation', methods=['GET'])
+    def instrumentation_status():
+        if not _authorized():
+            return _forbidden()
+        return jsonify({
+            'profiler': {'sample_percent': profiler.sample_percent, 'interval_ms': profiler.interval * 1000},
+            'slow_query_ms': SLOW_QUERY_MS,
+            'slow_queries': list(slow_queries),
+            'profiles': [_profile_summary(p) for p in list(profiler.profiles)]
+        })
+
+    @app.route('/api/instrumentation/profiler', methods=['PUT'])
+    def set_profiler():
+        """Change the share of profiled requests at runtime, e.g. {"sample_percent": 5}"""
+        if not _authorized():
+            return _forbidden()
+        data = request.get_json(silent=True) or {}
+        try:
+            percent = float(data['sample_percent'])
+        except (KeyError, TypeError, ValueError):
+            return jsonify({'error': 'sample_percent must be a number'}), 400
+        if not 0 <= percent <= 100:
+            return jsonify({'error': 'sample_percent must be between 0 and 100'}), 400
+        profiler.sample_percent = percent
+        log_event('profiler_changed', sample_percent=percent)
+        return jsonify({'sample_percent': percent})
+
+    @app.route('/api/instrumentation/profiles/<int:profile_id>', methods=['GET'])
+    def get_profile(profile_id):
+        """A kept profile as JSON, or ?format=folded for flame graph tools"""
+        if not _authorized():
+            return _forbidden()
+        profile = profiler.get(profile_id)
+        if profile is None:
+            return jsonify({'error': 'Profile not found'}), 404
+        stacks = profile['stacks'].most_common()
+        if request.args.get('format') == 'folded':
+            body = ''.join(f'{stack} {count}\n' for stack, count in stacks)
+            return body, 200, {'Content-Type': 'text/plain; charset=utf-8'}
+        return jsonify(dict(_profile_summary(profile), stacks=[[stack, count] for stack, count in stacks]))
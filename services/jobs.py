@@ -0,0 +1,58 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+
+
+class BackgroundJobQueue:
+    """Thread pool that runs jobs inside an app context, deduplicated by key.
+
+    A job submitted while another job with the same key is queued or running is
+    dropped, so concurrent requests for the same work share one execution.
+    """
+
+    def __init__(self, max_workers=2, name='jobs'):
+        self.max_workers = max_workers
+        self.name = name
+        self._executor = None
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix=self.name
+            )
+        return self._executor
+
+    def is_pending(self, key):
+        with self._lock:
+            return key in self._pending
+
+    def submit(self, key, fn, *args, **kwargs):
+        """Queue fn(*args, **kwargs); returns False if the key is already pending"""
+        app = current_app._get_current_object()
+        with self._lock:
+            if key in self._pending:
+                return False
+            self._pending.add(key)
+            executor = self._get_executor()
+
+        def run():
+            try:
+                with app.app_context():
+                    return fn(*args, **kwargs)
+            except Exception as e:
+                print(f"Background job {key!r} failed: {str(e)}")
+            finally:
+                with self._lock:
+                    self._pending.discard(key)
+
+        executor.submit(run)
+        return True
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
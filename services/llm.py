@@ -0,0 +1,253 @@
+import asyncio
+import json
+import os
+import time
+from types import SimpleNamespace
+from config.settings import (
+    LLM_BACKEND, LLM_MODEL, LLM_CACHE_ENABLED, LLM_CACHE_BACKEND, LLM_CACHE_SIZE, LLM_CACHE_TTL
+)
+from services.llm_cache import LLMResponseCache, DatabaseCacheBackend, cache_key
+from services.instrumentation import openai_call
+
+
+class StubOpenAIClient:
+    """Offline stand-in for the OpenAI client.
+
+    Mirrors the ``chat.completions.create`` surface used by the app and returns
+    deterministic content, so insight generation and task suggestions can run
+    without network access or an API key.
+    """
+
+    STREAM_PIECE = 16  # Characters per streamed chunk
+
+    def __init__(self, delay=0):
+        self.delay = delay
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, model, messages, stream=False, **kwargs):
+        content = self._content(messages)
+        if stream:
+            return self._stream(model, content)
+        if self.delay:
+            time.sleep(self.delay)
+        return self._completion(model, content)
+
+    def _stream(self, model, content):
+        chunks = self._chunks(model, content)
+        for chunk in chunks:
+            if self.delay:
+                time.sleep(self.delay / len(chunks))
+            yield chunk
+
+    def _content(self, messages):
+        self.calls += 1
+        system = next((m['content'] for m in messages if m['role'] == 'system'), '')
+        if 'JSON array' in system:
+            return json.dumps([
+                {'title': f'Step {i}', 'description': f'Suggested step {i} towards the goal.'}
+                for i in range(1, 6)
+            ])
+        return (
+            "Your productivity has been steady this week.\n\n"
+            "Recommendations: Keep your focus sessions short and consistent."
+        )
+
+    def _completion(self, model, content):
+        message = SimpleNamespace(role='assistant', content=content)
+        return SimpleNamespace(
+            model=model,
+            choices=[SimpleNamespace(index=0, message=message, finish_reason='stop')],
+            usage=SimpleNamespace(prompt_tokens=0, completion_tokens=0, total_tokens=0)
+        )
+
+    def _chunks(self, model, content):
+        """Stream chunks as the API sends them: content deltas, then one with usage and no choices"""
+        chunks = [
+            SimpleNamespace(model=model, usage=None, choices=[
+                SimpleNamespace(index=0, delta=SimpleNamespace(content=content[i:i + self.STREAM_PIECE]),
+                                finish_reason=None)
+            ])
+            for i in range(0, len(content), self.STREAM_PIECE)
+        ]
+        chunks.append(SimpleNamespace(model=model, choices=[],
+                                      usage=SimpleNamespace(prompt_tokens=0, completion_tokens=0, total_tokens=0)))
+        return chunks
+
+
+class AsyncStubOpenAIClient(StubOpenAIClient):
+    """Offline stand-in for openai.AsyncOpenAI; waits without blocking the event loop"""
+
+    async def _create(self, model, messages, stream=False, **kwargs):
+        content = self._content(messages)
+        if stream:
+            return self._stream(model, content)
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        return self._completion(model, content)
+
+    async def _stream(self, model, content):
+        chunks = self._chunks(model, content)
+        for chunk in chunks:
+            if self.delay:
+                await asyncio.sleep(self.delay / len(chunks))
+            yield chunk
+
+
+_stub_client = None
+_client = None
+_async_client = None
+
+
+def openai_client():
+    """The OpenAI client, created on first use.
+
+    The openai package is imported here rather than at module level: it
+    accounts for about half of the app's import time, which every worker
+    would otherwise pay at boot. Reads OPENAI_API_KEY and OPENAI_BASE_URL.
+    """
+    global _client
+    if _client is None:
+        from openai import OpenAI
+        _client = OpenAI()
+    return _client
+
+
+def get_client():
+    """Return the configured chat completion client"""
+    global _stub_client
+    if LLM_BACKEND == 'stub':
+        if _stub_client is None:
+            _stub_client = StubOpenAIClient()
+        return _stub_client
+    return openai_client()
+
+
+def get_async_client():
+    """Return the configured async chat completion client.
+
+    Created on first use and bound to that event loop's connections; the ASGI
+    server runs one loop per worker process.
+    """
+    global _async_client
+    if _async_client is None:
+        if LLM_BACKEND == 'stub':
+            _async_client = AsyncStubOpenAIClient()
+        else:
+            from openai import AsyncOpenAI
+            _async_client = AsyncOpenAI()
+    return _async_client
+
+
+def _forget_clients():
+    """Forked workers build their own clients rather than share the parent's connections"""
+    global _client, _async_client
+    _client = _async_client = None
+
+
+os.register_at_fork(after_in_child=_forget_clients)
+
+
+response_cache = LLMResponseCache(
+    maxsize=LLM_CACHE_SIZE,
+    ttl=LLM_CACHE_TTL,
+    shared_backend=DatabaseCacheBackend(LLM_CACHE_TTL) if LLM_CACHE_BACKEND == 'database' else None
+)
+
+
+def _messages(system_prompt, user_content):
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_content}
+    ]
+
+
+def cached_completion(system_prompt, user_content, model=LLM_MODEL):
+    """Return (cache key, cached completion text or None); the key is None when caching is off"""
+    key = cache_key(model, system_prompt, user_content) if LLM_CACHE_ENABLED else None
+    return key, response_cache.get(key) if key else None
+
+
+def store_completion(key, content, model=LLM_MODEL):
+    if key and content:
+        response_cache.set(key, model, content)
+
+
+def chat_completion(system_prompt, user_content, model=LLM_MODEL):
+    """Return the completion text for a system/user prompt pair, served from cache when possible"""
+    key, cached = cached_completion(system_prompt, user_content, model)
+    if cached is not None:
+        return cached
+
+    with openai_call('chat', model) as call:
+        completion = get_client().chat.completions.create(
+            model=model,
+            messages=_messages(system_prompt, user_content)
+        )
+        call.record_usage(completion.usage)
+    content = completion.choices[0].message.content
+    store_completion(key, content, model)
+    return content
+
+
+async def async_chat_completion(system_prompt, user_content, model=LLM_MODEL):
+    """Uncached completion text from the async client.
+
+    The cache is consulted and filled by the caller (cached_completion,
+    store_completion), which may need a database session the event loop
+    must not block on.
+    """
+    with openai_call('chat', model) as call:
+        completion = await get_async_client().chat.completions.create(
+            model=model,
+            messages=_messages(system_prompt, user_content)
+        )
+        call.record_usage(completion.usage)
+    return completion.choices[0].message.content
+
+
+def _delta(chunk):
+    return chunk.choices[0].delta.content if chunk.choices else None
+
+
+def stream_chat_completion(system_prompt, user_content, model=LLM_MODEL):
+    """Yield the completion text in pieces as the API streams it; a cached completion comes whole"""
+    key, cached = cached_completion(system_prompt, user_content, model)
+    if cached is not None:
+        yield cached
+        return
+
+    pieces = []
+    with openai_call('chat_stream', model) as call:
+        stream = get_client().chat.completions.create(
+            model=model,
+            messages=_messages(system_prompt, user_content),
+            stream=True,
+            stream_options={'include_usage': True}
+        )
+        for chunk in stream:
+            if chunk.usage:
+                call.record_usage(chunk.usage)
+            piece = _delta(chunk)
+            if piece:
+                pieces.append(piece)
+                yield piece
+    # Only a completion that streamed to the end is cached
+    store_completion(key, ''.join(pieces), model)
+
+
+async def async_stream_chat_completion(system_prompt, user_content, model=LLM_MODEL):
+    """Async counterpart of stream_chat_completion, uncached like async_chat_completion"""
+    with openai_call('chat_stream', model) as call:
+        stream = await get_async_client().chat.completions.create(
+            model=model,
+            messages=_messages(system_prompt, user_content),
+            stream=True,
+            stream_options={'include_usage': True}
+        )
+        async for chunk in stream:
+            if chunk.usage:
+                call.record_usage(chunk.usage)
+            piece = _delta(chunk)
+            if piece:
+                yield piece
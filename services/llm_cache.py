@@ -0,0 +1,102 @@
+import hashlib
+import json
+import threading
+from datetime import datetime, timedelta
+from sqlalchemy.orm import Session
+from database import db
+from models import LLMCacheEntry
+from services.cache import LRUCache
+
+
+def cache_key(model, system_prompt, user_content):
+    """Content address of a completion request"""
+    payload = json.dumps([model, system_prompt, user_content], separators=(',', ':'), sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class DatabaseCacheBackend:
+    """Shared cache tier stored in the llm_cache_entry table.
+
+    Uses its own short-lived session so cache writes never commit the caller's
+    pending changes.
+    """
+
+    PRUNE_EVERY = 100
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._writes = 0
+
+    def get(self, key):
+        with Session(db.engine) as session:
+            entry = session.get(LLMCacheEntry, key)
+            if entry is None or entry.expires_at <= datetime.utcnow():
+                return None
+            return entry.response
+
+    def set(self, key, model, value):
+        now = datetime.utcnow()
+        with Session(db.engine) as session:
+            session.merge(LLMCacheEntry(
+                key=key,
+                model=model,
+                response=value,
+                created_at=now,
+                expires_at=now + timedelta(seconds=self.ttl)
+            ))
+            self._writes += 1
+            if self._writes % self.PRUNE_EVERY == 0:
+                session.query(LLMCacheEntry).filter(
+                    LLMCacheEntry.expires_at <= now
+                ).delete(synchronize_session=False)
+            session.commit()
+
+
+class LLMResponseCache:
+    """Two-tier cache for completion content: in-process LRU, then an optional shared backend"""
+
+    def __init__(self, maxsize=1024, ttl=86400, shared_backend=None):
+        self.local = LRUCache(maxsize=maxsize, ttl=ttl)
+        self.shared = shared_backend
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'shared_hits': 0, 'misses': 0, 'errors': 0}
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def get(self, key):
+        value = self.local.get(key)
+        if value is not None:
+            self._count('hits')
+            return value
+        if self.shared is not None:
+            try:
+                value = self.shared.get(key)
+            except Exception as e:
+                print(f"LLM cache backend error: {str(e)}")
+                self._count('errors')
+                value = None
+            if value is not None:
+                self.local.set(key, value)
+                self._count('shared_hits')
+                return value
+        self._count('misses')
+        return None
+
+    def set(self, key, model, value):
+        self.local.set(key, value)
+        if self.shared is not None:
+            try:
+                self.shared.set(key, model, value)
+            except Exception as e:
+                print(f"LLM cache backend error: {str(e)}")
+                self._count('errors')
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats['hits'] + stats['shared_hits'] + stats['misses']
+        stats['entries'] = len(self.local)
+        stats['hit_rate'] = (stats['hits'] + stats['shared_hits']) / lookups if lookups else 0
+        return stats
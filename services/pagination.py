@@ -0,0 +1,101 @@
+import base64
+import json
+from urllib.parse import urlencode
+from datetime import datetime, date
+from flask import request, jsonify
+from sqlalchemy.orm import load_only
+from config.settings import API_PAGE_SIZE_DEFAULT, API_PAGE_SIZE_MAX
+
+
+def encode_cursor(last_id):
+    return base64.urlsafe_b64encode(json.dumps({'id': last_id}).encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        return int(json.loads(base64.urlsafe_b64decode(padded))['id'])
+    except (ValueError, KeyError, TypeError):
+        raise ValueError('Invalid cursor')
+
+
+def parse_bool(value):
+    if value is None:
+        return None
+    if value.lower() in ('1', 'true', 'yes'):
+        return True
+    if value.lower() in ('0', 'false', 'no'):
+        return False
+    raise ValueError(f'Invalid boolean: {value}')
+
+
+def parse_date(value):
+    if value is None:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        raise ValueError('Invalid date format. Use YYYY-MM-DD')
+
+
+def parse_fields(default_fields, allowed_fields):
+    """Columns requested through ?fields=a,b (id is always included)"""
+    param = request.args.get('fields')
+    if not param:
+        return list(default_fields)
+    fields = [f.strip() for f in param.split(',') if f.strip()]
+    unknown = [f for f in fields if f not in allowed_fields]
+    if unknown:
+        raise ValueError(f'Unknown fields: {", ".join(unknown)}')
+    return ['id'] + [f for f in fields if f != 'id']
+
+
+def _serialize(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def paginated_response(query, model, default_fields, allowed_fields):
+    """Keyset-paginated, projected JSON list with ETag support"""
+    return conditional(paginated_list(query, model, default_fields, allowed_fields))
+
+
+def paginated_list(query, model, default_fields, allowed_fields):
+    """Keyset-paginated, projected JSON list response.
+
+    The body stays a plain JSON array; the cursor for the next page is sent in
+    the X-Next-Cursor header (and a Link rel="next" header) when more rows exist.
+    """
+    fields = parse_fields(default_fields, allowed_fields)
+    limit = request.args.get('limit', type=int) or API_PAGE_SIZE_DEFAULT
+    limit = max(1, min(limit, API_PAGE_SIZE_MAX))
+
+    cursor = request.args.get('cursor')
+    if cursor:
+        query = query.filter(model.id > decode_cursor(cursor))
+
+    rows = query.options(
+        load_only(*[getattr(model, f) for f in fields])
+    ).order_by(model.id.asc()).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].id)
+
+    response = jsonify([{f: _serialize(getattr(row, f)) for f in fields} for row in rows])
+    if next_cursor:
+        args = request.args.to_dict()
+        args['cursor'] = next_cursor
+        args['limit'] = str(limit)
+        response.headers['X-Next-Cursor'] = next_cursor
+        response.headers['Link'] = f'<{request.path}?{urlencode(args)}>; rel="next"'
+    return response
+
+
+def conditional(response):
+    """Attach a content ETag and answer If-None-Match with 304"""
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.add_etag()
+    return response.make_conditional(request)
@@ -0,0 +1,46 @@
+from flask import g, has_request_context, jsonify, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from config.settings import QUERY_BUDGET_DEFAULT, QUERY_BUDGETS, QUERY_BUDGET_STRICT
+
+
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context():
+        g.query_count = g.get('query_count', 0) + 1
+
+
+def get_query_count():
+    return g.get('query_count', 0)
+
+
+def init_query_budget(app):
+    """Count SQL statements per request and enforce per-endpoint budgets.
+
+    Every response carries X-Query-Count. A request over its endpoint's budget
+    is logged; with QUERY_BUDGET_STRICT it is answered with a 500 instead, which
+    is how tests/test_query_budget.py catches regressions.
+    """
+    if not event.contains(Engine, 'before_cursor_execute', _count_query):
+        event.listen(Engine, 'before_cursor_execute', _count_query)
+
+    @app.before_request
+    def reset_query_count():
+        g.query_count = 0
+
+    @app.after_request
+    def check_query_budget(response):
+        count = get_query_count()
+        budget = QUERY_BUDGETS.get(request.endpoint, QUERY_BUDGET_DEFAULT)
+        response.headers['X-Query-Count'] = str(count)
+        if count > budget:
+            print(f"Query budget exceeded for {request.endpoint}: {count} > {budget}")
+            if QUERY_BUDGET_STRICT:
+                response = jsonify({
+                    'error': 'Query budget exceeded',
+                    'endpoint': request.endpoint,
+                    'queries': count,
+                    'budget': budget
+                })
+                response.status_code = 500
+                response.headers['X-Query-Count'] = str(count)
+        return response
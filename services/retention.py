@@ -0,0 +1,292 @@
+import fcntl
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, date, timedelta
+from sqlalchemy import delete, update
+from models import UserAnalytics, AIInsight, Task, VoiceNote, TranscriptionJob
+from database import db
+from services.audio_storage import audio_storage
+from services.search import SearchService
+from services.user_cache import invalidate
+from config.settings import (
+    RETENTION_ANALYTICS_DAYS, RETENTION_INSIGHT_DAYS, RETENTION_COMPLETED_TASK_DAYS,
+    RETENTION_TRANSCRIPTION_DAYS, RETENTION_UPLOAD_TMP_HOURS, RETENTION_BATCH_SIZE,
+    RETENTION_PAUSE_MS, ARCHIVE_DIR
+)
+
+
+class ArchiveStore:
+    """Cold rows as gzip-compressed JSON Lines per (kind, user).
+
+    Each purge batch writes a complete segment file atomically (temporary file,
+    fsync, rename) before its rows are deleted, so a crash can only leave rows
+    both archived and live, never lost. compact() appends a user's segments to
+    their single archive file, also by atomic replace. gzip members concatenate,
+    so compaction copies bytes without recompressing. Readers dedupe by id.
+    """
+
+    def __init__(self, root=ARCHIVE_DIR):
+        self.root = root
+
+    def _file(self, kind, user_id):
+        return os.path.join(self.root, kind, f'{int(user_id)}.jsonl.gz')
+
+    def _segment_dir(self, kind, user_id):
+        return os.path.join(self.root, kind, str(int(user_id)))
+
+    def _segments(self, kind, user_id):
+        directory = self._segment_dir(kind, user_id)
+        try:
+            names = sorted(n for n in os.listdir(directory) if n.endswith('.jsonl.gz'))
+        except FileNotFoundError:
+            return []
+        return [os.path.join(directory, n) for n in names]
+
+    def write_segment(self, kind, user_id, rows):
+        directory = self._segment_dir(kind, user_id)
+        os.makedirs(directory, exist_ok=True)
+        with tempfile.NamedTemporaryFile('wb', dir=directory, suffix='.part', delete=False) as raw:
+            with gzip.GzipFile(fileobj=raw, mode='wb') as archive:
+                for row in rows:
+                    archive.write((json.dumps(row, separators=(',', ':')) + '\n').encode('utf-8'))
+            raw.flush()
+            os.fsync(raw.fileno())
+        # Time-ordered names keep segments in archive order
+        os.replace(raw.name, os.path.join(directory, f'{time.time_ns()}-{uuid.uuid4().hex[:8]}.jsonl.gz'))
+
+    def compact(self, kind, user_id):
+        segments = self._segments(kind, user_id)
+        if not segments:
+            return 0
+        target = self._file(kind, user_id)
+        with tempfile.NamedTemporaryFile('wb', dir=os.path.dirname(target), suffix='.part', delete=False) as raw:
+            for path in ([target] if os.path.exists(target) else []) + segments:
+                with open(path, 'rb') as source:
+                    shutil.copyfileobj(source, raw)
+            raw.flush()
+            os.fsync(raw.fileno())
+        os.replace(raw.name, target)
+        for path in segments:
+            os.unlink(path)
+        try:
+            os.rmdir(self._segment_dir(kind, user_id))
+        except OSError:
+            pass
+        return len(segments)
+
+    def read(self, kind, user_id):
+        """Archived rows of one user, oldest first, each id once"""
+        rows = {}
+        for path in [self._file(kind, user_id)] + self._segments(kind, user_id):
+            try:
+                with gzip.open(path, 'rt', encoding='utf-8') as archive:
+                    for line in archive:
+                        row = json.loads(line)
+                        rows[row['id']] = row
+            except FileNotFoundError:
+                continue
+        return list(rows.values())
+
+
+archive_store = ArchiveStore()
+
+
+def _jsonable(value):
+    return value.isoformat() if isinstance(value, (datetime, date)) else value
+
+
+def _tasks_deleted(rows):
+    ids = [row.id for row in rows]
+    db.session.execute(update(VoiceNote).where(VoiceNote.task_id.in_(ids)).values(task_id=None))
+    SearchService.remove_documents('task', ids)
+    for user_id in {row.user_id for row in rows}:
+        invalidate(user_id, 'tasks')
+
+
+def _insights_deleted(rows):
+    for user_id in {row.user_id for row in rows}:
+        invalidate(user_id, 'insights')
+
+
+# Archived kinds: (model, date column, retention days, extra criteria, hook before delete).
+# Completed tasks leave task_priority_rollup untouched, so trends keep their history.
+POLICIES = {
+    'analytics': (UserAnalytics, UserAnalytics.date, RETENTION_ANALYTICS_DAYS, (), None),
+    'insights': (AIInsight, AIInsight.created_at, RETENTION_INSIGHT_DAYS, (), _insights_deleted),
+    'tasks': (Task, Task.completed_at, RETENTION_COMPLETED_TASK_DAYS, (Task.completed.is_(True),), _tasks_deleted),
+}
+CLEANUPS = ('transcriptions', 'audio', 'uploads')
+
+
+@contextmanager
+def _purge_lock():
+    """One purge at a time per archive directory; segment names stay ordered and compaction exclusive"""
+    os.makedirs(archive_store.root, exist_ok=True)
+    with open(os.path.join(archive_store.root, '.purge.lock'), 'w') as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise RuntimeError('Another purge is already running')
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+class RetentionService:
+    @staticmethod
+    def cutoff(kind, now=None):
+        """Oldest value of the kind's date column that is kept, or None when the policy is off"""
+        _, column, days, _, _ = POLICIES[kind]
+        if not days:
+            return None
+        moment = (now or datetime.utcnow()) - timedelta(days=days)
+        return moment.date() if column.key == 'date' else moment
+
+    @staticmethod
+    def purge(kind, batch_size=RETENTION_BATCH_SIZE, max_batches=None, dry_run=False, now=None):
+        """Archive and delete a kind's expired rows in id-ordered batches of batch_size.
+
+        Every batch is its own short transaction: select the next rows past the
+        last id, write their archive segment, delete them by primary key and
+        commit, then pause RETENTION_PAUSE_MS so request traffic is not starved.
+        max_batches bounds a single run; the next run resumes where it stopped.
+        """
+        model, column, _, criteria, on_delete = POLICIES[kind]
+        stats = {'kind': kind, 'archived': 0, 'batches': 0}
+        cutoff = RetentionService.cutoff(kind, now)
+        if cutoff is None:
+            return stats
+
+        touched = set()
+        last_id = 0
+        while max_batches is None or stats['batches'] < max_batches:
+            rows = db.session.query(*model.__table__.columns).filter(
+                model.id > last_id, column < cutoff, *criteria
+            ).order_by(model.id).limit(batch_size).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+            stats['batches'] += 1
+            stats['archived'] += len(rows)
+            if dry_run:
+                continue
+
+            by_user = {}
+            for row in rows:
+                by_user.setdefault(row.user_id, []).append({k: _jsonable(v) for k, v in row._mapping.items()})
+            for user_id, items in by_user.items():
+                archive_store.write_segment(kind, user_id, items)
+                touched.add(user_id)
+            if on_delete:
+                on_delete(rows)
+            db.session.execute(delete(model).where(model.id.in_([row.id for row in rows])))
+            db.session.commit()
+            if RETENTION_PAUSE_MS:
+                time.sleep(RETENTION_PAUSE_MS / 1000)
+
+        for user_id in touched:
+            archive_store.compact(kind, user_id)
+        return stats
+
+    @staticmethod
+    def purge_transcriptions(batch_size=RETENTION_BATCH_SIZE, max_batches=None, dry_run=False, now=None):
+        """Delete old transcription jobs and the audio of those no voice note kept"""
+        stats = {'kind': 'transcriptions', 'deleted': 0, 'audio_deleted': 0, 'batches': 0}
+        if not RETENTION_TRANSCRIPTION_DAYS:
+            return stats
+        cutoff = (now or datetime.utcnow()) - timedelta(days=RETENTION_TRANSCRIPTION_DAYS)
+        last_id = 0
+        while max_batches is None or stats['batches'] < max_batches:
+            jobs = db.session.query(TranscriptionJob.id, TranscriptionJob.audio_path).filter(
+                TranscriptionJob.id > last_id, TranscriptionJob.created_at < cutoff
+            ).order_by(TranscriptionJob.id).limit(batch_size).all()
+            if not jobs:
+                break
+            last_id = jobs[-1].id
+            stats['batches'] += 1
+            stats['deleted'] += len(jobs)
+            paths = {job.audio_path for job in jobs}
+            kept = {path for (path,) in db.session.query(VoiceNote.audio_path).filter(VoiceNote.audio_path.in_(paths))}
+            if dry_run:
+                stats['audio_deleted'] += len(paths - kept)
+                continue
+            db.session.execute(delete(TranscriptionJob).where(TranscriptionJob.id.in_([job.id for job in jobs])))
+            db.session.commit()
+            # Files go only after the rows are gone, so a failed commit never loses referenced audio
+            for path in paths - kept:
+                audio_storage.delete(path)
+                stats['audio_deleted'] += 1
+            if RETENTION_PAUSE_MS:
+                time.sleep(RETENTION_PAUSE_MS / 1000)
+        return stats
+
+    @staticmethod
+    def purge_orphaned_audio(batch_size=RETENTION_BATCH_SIZE, dry_run=False):
+        """Delete stored audio that no voice note or transcription job references.
+
+        Only files older than the transcription retention window are considered,
+        so uploads whose job or voice note is still being written are left alone.
+        """
+        stats = {'kind': 'audio', 'deleted': 0}
+        if not RETENTION_TRANSCRIPTION_DAYS:
+            return stats
+        keys = list(audio_storage.iter_keys(older_than_seconds=RETENTION_TRANSCRIPTION_DAYS * 86400))
+        for i in range(0, len(keys), batch_size):
+            batch = keys[i:i + batch_size]
+            referenced = {path for (path,) in db.session.query(VoiceNote.audio_path).filter(
+                VoiceNote.audio_path.in_(batch))}
+            referenced |= {path for (path,) in db.session.query(TranscriptionJob.audio_path).filter(
+                TranscriptionJob.audio_path.in_(batch))}
+            for key in batch:
+                if key not in referenced:
+                    if not dry_run:
+                        audio_storage.delete(key)
+                    stats['deleted'] += 1
+        db.session.rollback()
+        return stats
+
+    @staticmethod
+    def purge_uploads(dry_run=False):
+        """Delete partial uploads abandoned in audio storage's temporary directory"""
+        stats = {'kind': 'uploads', 'deleted': 0}
+        if RETENTION_UPLOAD_TMP_HOURS and not dry_run:
+            stats['deleted'] = audio_storage.purge_stale_uploads(RETENTION_UPLOAD_TMP_HOURS * 3600)
+        return stats
+
+    @staticmethod
+    def run(kinds=None, batch_size=RETENTION_BATCH_SIZE, max_batches=None, dry_run=False, now=None):
+        """Apply the retention policies for kinds (default: all); returns per-kind stats"""
+        kinds = kinds or list(POLICIES) + list(CLEANUPS)
+        results = []
+        with _purge_lock():
+            for kind in kinds:
+                if kind in POLICIES:
+                    results.append(RetentionService.purge(kind, batch_size, max_batches, dry_run, now))
+                elif kind == 'transcriptions':
+                    results.append(RetentionService.purge_transcriptions(batch_size, max_batches, dry_run, now))
+                elif kind == 'audio':
+                    results.append(RetentionService.purge_orphaned_audio(batch_size, dry_run))
+                elif kind == 'uploads':
+                    results.append(RetentionService.purge_uploads(dry_run))
+                else:
+                    raise ValueError(f'Unknown retention kind: {kind}')
+        return results
+
+    @staticmethod
+    def get_archived(user_id, kind, after=None, before=None, limit=500):
+        """A user's archived rows of a kind whose date falls in [after, before), oldest first"""
+        _, column, _, _, _ = POLICIES[kind]
+        rows = archive_store.read(kind, user_id)
+        if after:
+            rows = [r for r in rows if r[column.key] and r[column.key][:10] >= after.date().isoformat()]
+        if before:
+            rows = [r for r in rows if r[column.key] and r[column.key][:10] < before.date().isoformat()]
+        rows.sort(key=lambda r: (r[column.key] or '', r['id']))
+        return rows[:limit]
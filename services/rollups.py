@@ -0,0 +1,172 @@
+from collections import defaultdict
+from datetime import datetime, timedelta
+from sqlalchemy import event, select, delete, func, inspect as sa_inspect
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+from models import User, Task, TaskPriorityRollup
+from database import db
+from services.timezones import DEFAULT_TIMEZONE, local_date
+
+PRIORITIES = ('urgent', 'important', 'normal')
+UPSERTS = {'sqlite': sqlite_insert, 'postgresql': pg_insert}
+
+
+def task_contribution(tz_name, created_at, priority, completed, sign=1):
+    """Rollup delta of one task: ((local creation day, priority), (created, completed))"""
+    day = local_date(created_at or datetime.utcnow(), tz_name)
+    return (day, priority or 'normal'), (sign, sign if completed else 0)
+
+
+def merge_deltas(contributions):
+    """Sum (key, (created, completed)) pairs, dropping keys that cancel out"""
+    totals = defaultdict(lambda: [0, 0])
+    for key, (created, completed) in contributions:
+        totals[key][0] += created
+        totals[key][1] += completed
+    return {key: tuple(value) for key, value in totals.items() if value != [0, 0]}
+
+
+class PriorityRollupService:
+    @staticmethod
+    def apply_deltas(connection, user_id, deltas):
+        """Add per-(day, priority) deltas with one INSERT ... ON CONFLICT DO UPDATE.
+
+        The increment happens in SQL, so concurrent writers never lose updates.
+        """
+        if not deltas:
+            return
+        upsert = UPSERTS[connection.dialect.name]
+        table = TaskPriorityRollup.__table__
+        statement = upsert(table)
+        statement = statement.on_conflict_do_update(
+            index_elements=['user_id', 'date', 'priority'],
+            set_={
+                'tasks_created': table.c.tasks_created + statement.excluded.tasks_created,
+                'tasks_completed': table.c.tasks_completed + statement.excluded.tasks_completed,
+            }
+        )
+        connection.execute(statement, [
+            {'user_id': user_id, 'date': day, 'priority': priority,
+             'tasks_created': created, 'tasks_completed': completed}
+            for (day, priority), (created, completed) in deltas.items()
+        ])
+
+    @staticmethod
+    def record(user_id, contributions):
+        """Apply task contributions in the session's transaction (bulk write paths)"""
+        PriorityRollupService.apply_deltas(db.session.connection(), user_id, merge_deltas(contributions))
+
+    @staticmethod
+    def record_created(user_id, tz_name, priorities, created_at=None):
+        """Account for freshly inserted, uncompleted tasks with the given priorities"""
+        PriorityRollupService.record(user_id, [
+            task_contribution(tz_name, created_at, priority, False) for priority in priorities
+        ])
+
+    @staticmethod
+    def get_series(user_id, start_date, end_date):
+        """Rollup rows in the window as (date, priority, created, completed), oldest first"""
+        return db.session.query(
+            TaskPriorityRollup.date, TaskPriorityRollup.priority,
+            TaskPriorityRollup.tasks_created, TaskPriorityRollup.tasks_completed
+        ).filter(
+            TaskPriorityRollup.user_id == user_id,
+            TaskPriorityRollup.date >= start_date,
+            TaskPriorityRollup.date <= end_date
+        ).order_by(TaskPriorityRollup.date.asc()).all()
+
+    @staticmethod
+    def rebuild(chunk_size=500):
+        """Recompute every rollup from the task table, in chunks of users.
+
+        Each chunk reads only (user_id, created_at, priority, completed) for
+        its users and buckets them by the owner's local creation day. Tasks
+        already archived by the retention job no longer count, so a rebuild
+        drops their history.
+        """
+        db.session.execute(delete(TaskPriorityRollup))
+        users = 0
+        last_id = 0
+        while True:
+            chunk = db.session.query(User.id, User.timezone).filter(
+                User.id > last_id
+            ).order_by(User.id).limit(chunk_size).all()
+            if not chunk:
+                break
+            zones = {user_id: tz_name or DEFAULT_TIMEZONE for user_id, tz_name in chunk}
+            contributions = defaultdict(list)
+            for user_id, created_at, priority, completed in db.session.query(
+                Task.user_id, Task.created_at, Task.priority, Task.completed
+            ).filter(Task.user_id.in_(list(zones))):
+                contributions[user_id].append(
+                    task_contribution(zones[user_id], created_at, priority, completed)
+                )
+            for user_id, items in contributions.items():
+                PriorityRollupService.record(user_id, items)
+            users += len(chunk)
+            last_id = chunk[-1][0]
+        db.session.commit()
+        return users
+
+
+def _committed(state, key):
+    """Attribute value as of the last load, before this flush's change"""
+    history = state.attrs[key].history
+    if history.deleted:
+        return history.deleted[0]
+    return state.attrs[key].value
+
+
+def _user_timezone(session, connection, user_id):
+    user = session.identity_map.get(sa_inspect(User).identity_key_from_primary_key((user_id,)))
+    if user is not None:
+        return user.timezone or DEFAULT_TIMEZONE
+    return connection.execute(select(User.timezone).where(User.id == user_id)).scalar() or DEFAULT_TIMEZONE
+
+
+def _sync_flush(session, flush_context):
+    """Keep rollups in step with ORM task writes, inside the same transaction"""
+    changes = defaultdict(list)
+    for task in session.new:
+        if isinstance(task, Task):
+            changes[task.user_id].append((task.created_at, task.priority, task.completed, 1))
+    for task in session.deleted:
+        if isinstance(task, Task):
+            state = sa_inspect(task)
+            changes[task.user_id].append(
+                (task.created_at, _committed(state, 'priority'), _committed(state, 'completed'), -1)
+            )
+    for task in session.dirty:
+        if not isinstance(task, Task):
+            continue
+        state = sa_inspect(task)
+        if not (state.attrs.priority.history.has_changes() or state.attrs.completed.history.has_changes()):
+            continue
+        changes[task.user_id].append(
+            (task.created_at, _committed(state, 'priority'), _committed(state, 'completed'), -1)
+        )
+        changes[task.user_id].append((task.created_at, task.priority, task.completed, 1))
+    if not changes:
+        return
+
+    connection = session.connection()
+    if connection.dialect.name not in UPSERTS:
+        return
+    for user_id, items in changes.items():
+        tz_name = _user_timezone(session, connection, user_id)
+        deltas = merge_deltas(
+            task_contribution(tz_name, created_at, priority, completed, sign)
+            for created_at, priority, completed, sign in items
+        )
+        PriorityRollupService.apply_deltas(connection, user_id, deltas)
+
+
+def init_priority_rollups(app):
+    """Maintain TaskPriorityRollup on every ORM task write.
+
+    Bulk Core statements bypass the unit of work and call
+    PriorityRollupService directly (see TaskBulkService and the goal create route).
+    """
+    if not event.contains(Session, 'after_flush', _sync_flush):
+        event.listen(Session, 'after_flush', _sync_flush)
@@ -0,0 +1,278 @@
+import re
+from sqlalchemy import (
+    MetaData, Table, Column, Integer, BigInteger, Text, Computed, Index,
+    event, insert, delete, select, literal, func, cast, text, inspect as sa_inspect
+)
+from sqlalchemy.dialects.postgresql import TSVECTOR, insert as pg_insert
+from sqlalchemy.orm import Session
+from models import Task, Goal, VoiceNote
+from database import db
+
+MAX_TERMS = 8
+EXCERPT_LENGTH = 160
+
+# Indexed models: type name -> (code, model, title column, body column).
+# A document id packs both: content_id * 4 + code.
+SOURCES = {
+    'task': (1, Task, Task.title, Task.description),
+    'goal': (2, Goal, Goal.title, Goal.description),
+    'voice_note': (3, VoiceNote, None, VoiceNote.transcription),
+}
+TYPE_CODES = {name: source[0] for name, source in SOURCES.items()}
+CODE_TYPES = {code: name for name, code in TYPE_CODES.items()}
+MODEL_TYPES = {source[1]: name for name, source in SOURCES.items()}
+
+
+def doc_id(content_type, content_id):
+    return content_id * 4 + TYPE_CODES[content_type]
+
+
+def parse_terms(query):
+    """Lowercased word tokens of a user query; anything else is dropped, so terms are safe to quote"""
+    return re.findall(r'\w+', (query or '').lower())[:MAX_TERMS]
+
+
+def _document(obj):
+    content_type = MODEL_TYPES[type(obj)]
+    _, _, title, body = SOURCES[content_type]
+    return {
+        'doc_id': doc_id(content_type, obj.id),
+        'user_id': obj.user_id,
+        'title': getattr(obj, title.key) if title is not None else '',
+        'body': getattr(obj, body.key) or ''
+    }
+
+
+def _source_select(content_type, *criteria):
+    """SELECT producing (doc_id, user_id, title, body) rows for one source"""
+    code, model, title, body = SOURCES[content_type]
+    return select(
+        (model.id * 4 + code).label('doc_id'),
+        model.user_id,
+        func.coalesce(title, '') if title is not None else literal(''),
+        func.coalesce(body, '')
+    ).where(*criteria)
+
+
+class SQLiteSearchBackend:
+    """FTS5 table keyed by rowid = doc_id, with a prefix index for typeahead"""
+
+    table_name = 'search_index'
+    metadata = MetaData()
+    table = Table(
+        'search_index', metadata,
+        Column('rowid', Integer), Column('title', Text), Column('body', Text), Column('owner', Text)
+    )
+
+    def create(self, connection):
+        connection.execute(text(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5("
+            "title, body, owner, tokenize='unicode61 remove_diacritics 2', prefix='2 3 4')"
+        ))
+        # Title matches outweigh body matches; owner only scopes the match
+        connection.execute(text(
+            "INSERT INTO search_index(search_index, rank) VALUES('rank', 'bm25(10.0, 1.0, 0.0)')"
+        ))
+
+    def drop(self, connection):
+        connection.execute(text('DROP TABLE IF EXISTS search_index'))
+
+    def upsert(self, connection, documents):
+        connection.execute(insert(self.table).prefix_with('OR REPLACE'), [
+            {'rowid': d['doc_id'], 'title': d['title'], 'body': d['body'], 'owner': f"u{d['user_id']}"}
+            for d in documents
+        ])
+
+    def remove(self, connection, doc_ids):
+        connection.execute(delete(self.table).where(self.table.c.rowid.in_(doc_ids)))
+
+    def index_select(self, connection, query):
+        doc, user_id, title, body = query.selected_columns
+        connection.execute(insert(self.table).prefix_with('OR REPLACE').from_select(
+            ['rowid', 'title', 'body', 'owner'],
+            query.with_only_columns(doc, title, body, literal('u') + cast(user_id, Text))
+        ))
+
+    def search(self, connection, user_id, terms, type_codes, limit):
+        # Every term is a prefix match, and owner: restricts the match to the user's documents
+        match = f'owner:u{int(user_id)} AND {{title body}}:(' + ' '.join(f'"{t}"*' for t in terms) + ')'
+        codes = ', '.join(str(int(c)) for c in type_codes)
+        return connection.execute(text(
+            'SELECT rowid, title, body FROM search_index '
+            f'WHERE search_index MATCH :match AND rowid % 4 IN ({codes}) '
+            'ORDER BY rank LIMIT :limit'
+        ), {'match': match, 'limit': limit}).all()
+
+
+class PostgresSearchBackend:
+    """Regular table with a generated, weighted tsvector column under a GIN index"""
+
+    table_name = 'search_document'
+    metadata = MetaData()
+    table = Table(
+        'search_document', metadata,
+        Column('doc_id', BigInteger, primary_key=True, autoincrement=False),
+        Column('user_id', Integer, nullable=False),
+        Column('title', Text),
+        Column('body', Text),
+        Column('tsv', TSVECTOR, Computed(
+            "setweight(to_tsvector('simple', coalesce(title, '')), 'A') || "
+            "setweight(to_tsvector('simple', coalesce(body, '')), 'B')",
+            persisted=True
+        )),
+        Index('ix_search_document_tsv', 'tsv', postgresql_using='gin'),
+        Index('ix_search_document_user_id', 'user_id'),
+    )
+
+    def create(self, connection):
+        self.metadata.create_all(connection)
+
+    def drop(self, connection):
+        self.metadata.drop_all(connection)
+
+    def _upsert_statement(self, statement):
+        return statement.on_conflict_do_update(
+            index_elements=['doc_id'],
+            set_={'user_id': statement.excluded.user_id, 'title': statement.excluded.title,
+                  'body': statement.excluded.body}
+        )
+
+    def upsert(self, connection, documents):
+        connection.execute(self._upsert_statement(pg_insert(self.table)), documents)
+
+    def remove(self, connection, doc_ids):
+        connection.execute(delete(self.table).where(self.table.c.doc_id.in_(doc_ids)))
+
+    def index_select(self, connection, query):
+        connection.execute(self._upsert_statement(
+            pg_insert(self.table).from_select(['doc_id', 'user_id', 'title', 'body'], query)
+        ))
+
+    def search(self, connection, user_id, terms, type_codes, limit):
+        tsquery = func.to_tsquery('simple', ' & '.join(f'{t}:*' for t in terms))
+        t = self.table
+        return connection.execute(
+            select(t.c.doc_id, t.c.title, t.c.body).where(
+                t.c.user_id == user_id,
+                t.c.tsv.op('@@')(tsquery),
+                (t.c.doc_id % 4).in_(type_codes)
+            ).order_by(func.ts_rank(t.c.tsv, tsquery).desc()).limit(limit)
+        ).all()
+
+
+BACKENDS = {
+    'sqlite': SQLiteSearchBackend(),
+    'postgresql': PostgresSearchBackend(),
+}
+
+
+def _backend(connection):
+    return BACKENDS.get(connection.dialect.name)
+
+
+class SearchService:
+    @staticmethod
+    def ensure_schema(connection):
+        """Create and fill the index if this database does not have it yet; returns True if created"""
+        backend = _backend(connection)
+        if backend is None:
+            return False
+        if sa_inspect(connection).has_table(backend.table_name):
+            return False
+        backend.create(connection)
+        for content_type in SOURCES:
+            backend.index_select(connection, _source_select(content_type))
+        return True
+
+    @staticmethod
+    def rebuild():
+        """Drop and refill the index from the source tables with one INSERT ... SELECT per type"""
+        with db.engine.begin() as connection:
+            backend = _backend(connection)
+            backend.drop(connection)
+            backend.create(connection)
+            for content_type in SOURCES:
+                backend.index_select(connection, _source_select(content_type))
+
+    @staticmethod
+    def index_documents(documents):
+        """Upsert documents ({doc_id, user_id, title, body}) in the session's transaction"""
+        if documents:
+            connection = db.session.connection()
+            _backend(connection).upsert(connection, documents)
+
+    @staticmethod
+    def index_where(content_type, *criteria):
+        """Index rows of one source selected by criteria, without loading them (bulk write paths)"""
+        connection = db.session.connection()
+        _backend(connection).index_select(connection, _source_select(content_type, *criteria))
+
+    @staticmethod
+    def remove_documents(content_type, content_ids):
+        if content_ids:
+            connection = db.session.connection()
+            _backend(connection).remove(connection, [doc_id(content_type, i) for i in content_ids])
+
+    @staticmethod
+    def search(user_id, query, types=None, limit=20):
+        """Ranked prefix search over the user's tasks, goals and voice notes"""
+        terms = parse_terms(query)
+        if not terms:
+            return []
+        type_codes = [TYPE_CODES[t] for t in (types or SOURCES)]
+        rows = _backend(db.session.connection()).search(
+            db.session.connection(), user_id, terms, type_codes, limit
+        )
+        results = []
+        for document_id, title, body in rows:
+            content_type = CODE_TYPES[document_id % 4]
+            results.append({
+                'type': content_type,
+                'id': document_id // 4,
+                'title': title or body[:60],
+                'excerpt': body[:EXCERPT_LENGTH]
+            })
+        return results
+
+
+def _indexed_change(obj):
+    """Whether a flushed object's title or body changed"""
+    _, _, title, body = SOURCES[MODEL_TYPES[type(obj)]]
+    state = sa_inspect(obj)
+    return any(
+        state.attrs[column.key].history.has_changes()
+        for column in (title, body) if column is not None
+    )
+
+
+def _sync_flush(session, flush_context):
+    """Keep the index in step with ORM writes, inside the same transaction"""
+    upserts = [
+        _document(obj) for obj in session.new if type(obj) in MODEL_TYPES
+    ] + [
+        _document(obj) for obj in session.dirty
+        if type(obj) in MODEL_TYPES and _indexed_change(obj)
+    ]
+    removed = [
+        doc_id(MODEL_TYPES[type(obj)], obj.id) for obj in session.deleted if type(obj) in MODEL_TYPES
+    ]
+    if not upserts and not removed:
+        return
+    connection = session.connection()
+    backend = _backend(connection)
+    if backend is None:
+        return
+    if upserts:
+        backend.upsert(connection, upserts)
+    if removed:
+        backend.remove(connection, removed)
+
+
+def init_search_index(app):
+    """Index task, goal and voice note writes made through the ORM.
+
+    Bulk Core statements bypass the unit of work and call SearchService
+    directly (see TaskBulkService and the goal create route).
+    """
+    if not event.contains(Session, 'after_flush', _sync_flush):
+        event.listen(Session, 'after_flush', _sync_flush)
@@ -0,0 +1,43 @@
+def isoformat(value):
+    return value.isoformat() if value else None
+
+
+def serialize_task(task):
+    """Task detail; expects task.goal to be eager-loaded (manage_task joins it in)"""
+    return {
+        'id': task.id,
+        'title': task.title,
+        'description': task.description,
+        'priority': task.priority,
+        'completed': task.completed,
+        'created_at': isoformat(task.created_at),
+        'due_date': isoformat(task.due_date),
+        'completed_at': isoformat(task.completed_at),
+        'goal_id': task.goal_id,
+        'goal_title': task.goal.title if task.goal_id and task.goal else None
+    }
+
+
+def serialize_goal_task(task):
+    return {
+        'id': task.id,
+        'title': task.title,
+        'description': task.description,
+        'priority': task.priority,
+        'completed': task.completed,
+        'due_date': isoformat(task.due_date)
+    }
+
+
+def serialize_goal(goal):
+    """Goal detail with its tasks; expects goal.tasks to be eager-loaded (manage_goal selects them in)"""
+    return {
+        'id': goal.id,
+        'title': goal.title,
+        'description': goal.description,
+        'progress': goal.progress,
+        'category': goal.category,
+        'created_at': isoformat(goal.created_at),
+        'target_date': isoformat(goal.target_date),
+        'tasks': [serialize_goal_task(task) for task in goal.tasks]
+    }
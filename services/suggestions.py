@@ -0,0 +1,145 @@
+import json
+from services.llm import stream_chat_completion
+
+SUGGEST_TASKS_PROMPT = "You are a goal planning assistant. Generate 5 specific, actionable tasks that will help achieve the goal. Format your response as a JSON array where each task has 'title' (short, action-oriented) and 'description' (detailed explanation) fields."
+
+SSE_HEADERS = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}  # No proxy buffering of the stream
+
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class TaskArrayParser:
+    """Incremental parser for a JSON array of objects arriving in pieces.
+
+    feed() returns the objects completed by each piece. Text before the first
+    '[' (a ```json fence, a preamble) is skipped, and brackets inside strings
+    are ignored, so only the objects' own braces are counted. Consumed text is
+    dropped, so the buffer holds at most one partial object.
+    """
+
+    def __init__(self):
+        self._buffer = ''
+        self._pos = 0
+        self._depth = 0
+        self._started = False
+        self._done = False
+        self._in_string = False
+        self._escaped = False
+        self._object_start = None
+
+    def feed(self, text):
+        self._buffer += text
+        items = []
+        while self._pos < len(self._buffer) and not self._done:
+            char = self._buffer[self._pos]
+            if not self._started:
+                if char == '[':
+                    self._started = True
+                    self._depth = 1
+            elif self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == '\\':
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in '[{':
+                if char == '{' and self._depth == 1:
+                    self._object_start = self._pos
+                self._depth += 1
+            elif char in ']}':
+                self._depth -= 1
+                if self._depth == 1 and char == '}' and self._object_start is not None:
+                    try:
+                        item = json.loads(self._buffer[self._object_start:self._pos + 1])
+                    except ValueError:
+                        item = None
+                    if isinstance(item, dict):
+                        items.append(item)
+                    self._object_start = None
+                elif self._depth == 0:
+                    self._done = True
+            self._pos += 1
+
+        keep = self._object_start if self._object_start is not None else self._pos
+        self._buffer = self._buffer[keep:]
+        self._pos -= keep
+        if self._object_start is not None:
+            self._object_start = 0
+        return items
+
+
+class SuggestionEvents:
+    """Server-sent events for a streamed suggestion: one 'task' event per task as soon as it is complete.
+
+    finish() ends the stream with 'done'. A reply the incremental parser got
+    no task from (say a '[' in a preamble before the fenced array) is parsed
+    whole there, as the non-streaming route would.
+    """
+
+    def __init__(self):
+        self.parser = TaskArrayParser()
+        self.pieces = []
+        self.count = 0
+
+    @property
+    def text(self):
+        return ''.join(self.pieces)
+
+    def _task(self, task):
+        self.count += 1
+        return sse_event('task', task)
+
+    def feed(self, piece):
+        self.pieces.append(piece)
+        return [self._task(task) for task in self.parser.feed(piece)]
+
+    def finish(self):
+        events = [] if self.count else [self._task(task) for task in TaskSuggestionService.parse(self.text)]
+        return events + [sse_event('done', {'count': self.count})]
+
+    @staticmethod
+    def error():
+        return sse_event('error', {'error': 'Failed to generate tasks'})
+
+
+class TaskSuggestionService:
+    """Prompt and response handling for LLM task suggestions, shared by the sync and async routes"""
+
+    @staticmethod
+    def user_content(data):
+        goal_title = data.get('title', '')
+        goal_description = data.get('description', '')
+        return f"Generate specific, actionable tasks for this goal: {goal_title}. Additional context: {goal_description}"
+
+    @staticmethod
+    def parse(text):
+        """The suggested tasks in a completion, as a list"""
+        tasks_str = text.strip()
+        # Handle cases where response might include markdown code blocks
+        if '```json' in tasks_str:
+            tasks_str = tasks_str.split('```json')[1].split('```')[0]
+        elif '```' in tasks_str:
+            tasks_str = tasks_str.split('```')[1].split('```')[0]
+
+        tasks = json.loads(tasks_str)
+        # Ensure response is an array
+        if not isinstance(tasks, list):
+            tasks = tasks.get('tasks', [])
+        return tasks
+
+    @staticmethod
+    def stream(data):
+        """Server-sent events for the suggested tasks, each sent as soon as the model has written it"""
+        events = SuggestionEvents()
+        try:
+            for piece in stream_chat_completion(SUGGEST_TASKS_PROMPT, TaskSuggestionService.user_content(data)):
+                yield from events.feed(piece)
+            yield from events.finish()
+        except Exception as e:
+            print(f"Error streaming tasks: {str(e)}")
+            yield events.error()
@@ -0,0 +1,247 @@
+from datetime import datetime
+from sqlalchemy import insert, update, delete
+from models import Task, Goal, VoiceNote
+from database import db
+from services.analytics import AnalyticsService
+from services.timezones import local_today, local_date
+from services.search import SearchService, doc_id
+from services.rollups import PriorityRollupService, task_contribution, PRIORITIES
+from services.user_cache import invalidate
+
+UPDATE_FIELDS = ('title', 'description', 'priority', 'due_date')
+TITLE_MAX_LENGTH = Task.__table__.c.title.type.length
+
+
+class BulkOperationError(ValueError):
+    pass
+
+
+def _parse_due_date(value):
+    if value in (None, ''):
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d')
+    except (TypeError, ValueError):
+        raise BulkOperationError('Invalid date format. Use YYYY-MM-DD')
+
+
+def _check_fields(fields):
+    """Reject a title, description or priority the task table would not accept, for creates and updates alike"""
+    if 'title' in fields:
+        if not isinstance(fields['title'], str) or not fields['title']:
+            raise BulkOperationError('Missing required field: title')
+        if len(fields['title']) > TITLE_MAX_LENGTH:
+            raise BulkOperationError(f'Title must be at most {TITLE_MAX_LENGTH} characters')
+    if fields.get('description') is not None and not isinstance(fields['description'], str):
+        raise BulkOperationError('Invalid description')
+    if 'priority' in fields and fields['priority'] not in PRIORITIES:
+        raise BulkOperationError(f"Invalid priority. Use one of: {', '.join(PRIORITIES)}")
+
+
+def _is_id(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+class TaskBulkService:
+    @staticmethod
+    def apply(user_id, operations):
+        """Apply a list of task operations for one user in a single transaction.
+
+        Each operation is a dict with an ``op`` of create, update, toggle or
+        delete (plus ``id`` for all but create). Existing tasks are loaded with
+        one query, creates go out as one bulk INSERT, updates and toggles as one
+        bulk UPDATE, deletes as one DELETE, and today's analytics get a single
+        delta for the whole batch. Invalid operations are reported per item and
+        skipped. The caller commits.
+        """
+        results = [None] * len(operations)
+        ids = {op.get('id') for op in operations
+               if isinstance(op, dict) and op.get('op') != 'create' and _is_id(op.get('id'))}
+
+        tasks = {}
+        if ids:
+            tasks = {
+                row.id: row for row in db.session.query(
+                    Task.id, Task.user_id, Task.completed, Task.completed_at, Task.created_at,
+                    Task.title, Task.description, Task.priority
+                ).filter(Task.id.in_(ids))
+            }
+
+        goal_ids = {op.get('goal_id') for op in operations if isinstance(op, dict) and _is_id(op.get('goal_id'))}
+        owned_goals = set()
+        if goal_ids:
+            owned_goals = {row[0] for row in db.session.query(Goal.id).filter(
+                Goal.id.in_(goal_ids), Goal.user_id == user_id
+            )}
+
+        # Working state per existing task, so repeated operations on one task compose
+        state = {}
+        deleted = set()
+        creates = []
+
+        for index, op in enumerate(operations):
+            try:
+                if not isinstance(op, dict):
+                    raise BulkOperationError('Operation must be an object')
+                kind = op.get('op')
+
+                if kind == 'create':
+                    row = {
+                        'title': op.get('title'),
+                        'description': op.get('description', ''),
+                        'priority': op.get('priority', 'normal'),
+                    }
+                    _check_fields(row)
+                    if op.get('goal_id') is not None and not _is_id(op['goal_id']):
+                        raise BulkOperationError('Invalid goal_id')
+                    if op.get('goal_id') and op['goal_id'] not in owned_goals:
+                        raise BulkOperationError('Goal not found')
+                    row.update(
+                        due_date=_parse_due_date(op.get('due_date')),
+                        goal_id=op.get('goal_id'),
+                        user_id=user_id
+                    )
+                    creates.append((index, row))
+                    continue
+
+                if kind not in ('update', 'toggle', 'delete'):
+                    raise BulkOperationError(f'Unknown operation: {kind}')
+                if not _is_id(op.get('id')):
+                    raise BulkOperationError('Invalid id')
+                task = tasks.get(op.get('id'))
+                if task is None or task.id in deleted:
+                    raise BulkOperationError('Task not found')
+                if task.user_id != user_id:
+                    raise BulkOperationError('Unauthorized')
+
+                current = state.setdefault(task.id, {
+                    'completed': task.completed,
+                    'completed_at': task.completed_at,
+                    'changes': {}
+                })
+                if kind == 'update':
+                    changes = {f: op[f] for f in UPDATE_FIELDS if f in op}
+                    if not changes:
+                        raise BulkOperationError('No fields to update')
+                    _check_fields(changes)
+                    if 'due_date' in changes:
+                        changes['due_date'] = _parse_due_date(changes['due_date'])
+                    current['changes'].update(changes)
+                elif kind == 'toggle':
+                    current['completed'] = not current['completed']
+                    current['completed_at'] = datetime.utcnow() if current['completed'] else None
+                    current['changes'].update(
+                        completed=current['completed'],
+                        completed_at=current['completed_at']
+                    )
+                else:
+                    deleted.add(task.id)
+                results[index] = {'index': index, 'op': kind, 'id': task.id, 'status': 'success'}
+            except BulkOperationError as e:
+                results[index] = {'index': index, 'op': op.get('op') if isinstance(op, dict) else None,
+                                  'status': 'error', 'error': str(e)}
+
+        if creates:
+            new_ids = TaskBulkService._insert_returning_ids([row for _, row in creates])
+            for (index, _), task_id in zip(creates, new_ids):
+                results[index] = {'index': index, 'op': 'create', 'id': task_id, 'status': 'success'}
+
+        updates = [
+            dict(current['changes'], id=task_id)
+            for task_id, current in state.items()
+            if current['changes'] and task_id not in deleted
+        ]
+        if updates:
+            # Rows are sent as one executemany per run of identical columns, so group them by columns
+            updates.sort(key=lambda row: sorted(row))
+            db.session.execute(update(Task), updates)
+
+        if deleted:
+            db.session.execute(
+                update(VoiceNote).where(VoiceNote.task_id.in_(deleted)).values(task_id=None)
+            )
+            db.session.execute(delete(Task).where(Task.id.in_(deleted)))
+
+        if creates or updates or deleted:
+            invalidate(user_id, 'tasks')
+        TaskBulkService._apply_search_index(user_id, tasks, state, deleted, creates, new_ids if creates else [])
+        TaskBulkService._apply_rollups(user_id, tasks, state, deleted, creates)
+        TaskBulkService._apply_analytics(user_id, tasks, state, deleted, len(creates))
+        return results
+
+    @staticmethod
+    def _insert_returning_ids(rows):
+        """Bulk INSERT the rows and return their new ids in parameter order"""
+        if db.engine.dialect.name == 'sqlite':
+            # SQLite has no insert sentinel, so asking for ordered RETURNING makes
+            # SQLAlchemy fall back to one INSERT per row. A single multi-row INSERT
+            # assigns ascending rowids in VALUES order, so sorting restores the order.
+            return sorted(db.session.execute(insert(Task).returning(Task.id), rows).scalars().all())
+        return db.session.execute(
+            insert(Task).returning(Task.id, sort_by_parameter_order=True), rows
+        ).scalars().all()
+
+    @staticmethod
+    def _apply_search_index(user_id, tasks, state, deleted, creates, new_ids):
+        """One upsert for created and retitled tasks and one delete for removed ones"""
+        documents = [
+            {'doc_id': doc_id('task', task_id), 'user_id': user_id,
+             'title': row['title'], 'body': row['description'] or ''}
+            for (_, row), task_id in zip(creates, new_ids)
+        ]
+        for task_id, current in state.items():
+            changes = current['changes']
+            if task_id in deleted or not ('title' in changes or 'description' in changes):
+                continue
+            task = tasks[task_id]
+            documents.append({
+                'doc_id': doc_id('task', task_id), 'user_id': user_id,
+                'title': changes.get('title', task.title),
+                'body': changes.get('description', task.description) or ''
+            })
+        SearchService.index_documents(documents)
+        SearchService.remove_documents('task', deleted)
+
+    @staticmethod
+    def _apply_rollups(user_id, tasks, state, deleted, creates):
+        """One priority rollup upsert for the batch: new tasks in, old versions of changed tasks out"""
+        tz_name = AnalyticsService.get_user_timezone(user_id)
+        created_at = datetime.utcnow()
+        contributions = [
+            task_contribution(tz_name, created_at, row['priority'], False) for _, row in creates
+        ]
+        for task_id, current in state.items():
+            task = tasks[task_id]
+            priority = current['changes'].get('priority', task.priority)
+            if task_id not in deleted and priority == task.priority and current['completed'] == task.completed:
+                continue
+            contributions.append(task_contribution(tz_name, task.created_at, task.priority, task.completed, -1))
+            if task_id not in deleted:
+                contributions.append(task_contribution(tz_name, task.created_at, priority, current['completed']))
+        PriorityRollupService.record(user_id, contributions)
+
+    @staticmethod
+    def _apply_analytics(user_id, tasks, state, deleted, created_count):
+        """One analytics delta for the whole batch: final minus initial counts for today"""
+        tz_name = AnalyticsService.get_user_timezone(user_id)
+        today = local_today(tz_name)
+
+        def completed_today(completed, completed_at):
+            return 1 if completed and completed_at and local_date(completed_at, tz_name) == today else 0
+
+        tasks_created = created_count
+        tasks_completed = 0
+        for task_id, current in state.items():
+            task = tasks[task_id]
+            before = completed_today(task.completed, task.completed_at)
+            if task_id in deleted:
+                tasks_completed -= before
+                if task.created_at and local_date(task.created_at, tz_name) == today:
+                    tasks_created -= 1
+            else:
+                tasks_completed += completed_today(current['completed'], current['completed_at']) - before
+
+        if tasks_created or tasks_completed:
+            AnalyticsService.apply_analytics_delta(
+                user_id, tasks_created=tasks_created, tasks_completed=tasks_completed
+            )
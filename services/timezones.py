@@ -0,0 +1,41 @@
+from datetime import datetime, time, timedelta, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+DEFAULT_TIMEZONE = 'UTC'
+
+
+def get_zone(name):
+    """ZoneInfo for an IANA name, falling back to UTC for unknown or empty names"""
+    try:
+        return ZoneInfo(name or DEFAULT_TIMEZONE)
+    except (ZoneInfoNotFoundError, ValueError):
+        return timezone.utc
+
+
+def is_valid_timezone(name):
+    try:
+        ZoneInfo(name)
+        return True
+    except (ZoneInfoNotFoundError, ValueError, TypeError):
+        return False
+
+
+def local_today(tz_name, now=None):
+    """The user's current local date"""
+    now = now or datetime.utcnow()
+    return local_date(now, tz_name)
+
+
+def local_date(value, tz_name):
+    """Local calendar date of a naive UTC timestamp as stored in the database"""
+    return value.replace(tzinfo=timezone.utc).astimezone(get_zone(tz_name)).date()
+
+
+def day_bounds(day, tz_name, days=1):
+    """Half-open [start, end) naive UTC range covering local days starting at day"""
+    zone = get_zone(tz_name)
+
+    def to_utc(d):
+        return datetime.combine(d, time.min, tzinfo=zone).astimezone(timezone.utc).replace(tzinfo=None)
+
+    return to_utc(day), to_utc(day + timedelta(days=days))
@@ -0,0 +1,173 @@
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import or_
+from models import TranscriptionJob
+from database import db
+from services.audio_storage import audio_storage
+from services.jobs import BackgroundJobQueue
+from services.instrumentation import openai_call
+from services.llm import openai_client
+from config.settings import (
+    TRANSCRIPTION_BACKEND, TRANSCRIPTION_MODEL, TRANSCRIPTION_WORKERS, TRANSCRIPTION_TIMEOUT,
+    TRANSCRIPTION_HEARTBEAT
+)
+
+
+class JobHeartbeat:
+    """Keeps heartbeat_at fresh on the jobs this process has queued or is running.
+
+    The job queue lives in one process, but a status poll can reach any of
+    them, so the poll cannot ask the queue whether the job is still alive.
+    The process holding a job stamps it every interval instead, and a pending
+    job whose stamp is older than TRANSCRIPTION_TIMEOUT has lost its worker.
+    The thread only runs while the process holds jobs.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._jobs = set()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def hold(self, job_id):
+        app = current_app._get_current_object()
+        with self._lock:
+            self._jobs.add(job_id)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, args=(app,), name='transcribe-heartbeat', daemon=True)
+                self._thread.start()
+
+    def release(self, job_id):
+        with self._lock:
+            self._jobs.discard(job_id)
+
+    def beat(self):
+        """Stamp the held jobs that are still pending; returns how many were held"""
+        with self._lock:
+            job_ids = list(self._jobs)
+        if job_ids:
+            TranscriptionJob.query.filter(
+                TranscriptionJob.id.in_(job_ids),
+                TranscriptionJob.status == 'pending'
+            ).update({'heartbeat_at': datetime.utcnow()}, synchronize_session=False)
+            db.session.commit()
+        return len(job_ids)
+
+    def _run(self, app):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._jobs:
+                    self._thread = None
+                    return
+            try:
+                with app.app_context():
+                    self.beat()
+            except Exception as e:
+                print(f"Error refreshing transcription heartbeats: {str(e)}")
+
+
+transcription_queue = BackgroundJobQueue(max_workers=TRANSCRIPTION_WORKERS, name='transcribe')
+heartbeat = JobHeartbeat(TRANSCRIPTION_HEARTBEAT)
+
+
+class OpenAITranscriber:
+    """Whisper through the OpenAI audio API; the file is streamed from storage"""
+
+    def __init__(self, model=TRANSCRIPTION_MODEL):
+        self.model = model
+
+    def transcribe(self, audio_path):
+        with audio_storage.open(audio_path) as audio, openai_call('transcription', self.model) as call:
+            result = openai_client().audio.transcriptions.create(
+                model=self.model,
+                file=(os.path.basename(audio_path), audio)
+            )
+            call.record_usage(getattr(result, 'usage', None))
+        return result.text
+
+
+class StubTranscriber:
+    """Offline stand-in that returns deterministic text without reading the audio"""
+
+    def __init__(self, delay=0):
+        self.delay = delay
+        self.calls = 0
+
+    def transcribe(self, audio_path):
+        if self.delay:
+            time.sleep(self.delay)
+        self.calls += 1
+        return f'Stub transcription of {audio_storage.size(audio_path)} bytes of audio'
+
+
+TRANSCRIBERS = {
+    'openai': OpenAITranscriber,
+    'stub': StubTranscriber,
+}
+
+_transcriber = None
+
+
+def get_transcriber():
+    """Return the configured transcription backend"""
+    global _transcriber
+    if _transcriber is None:
+        if TRANSCRIPTION_BACKEND not in TRANSCRIBERS:
+            raise ValueError(f'Unknown transcription backend: {TRANSCRIPTION_BACKEND}')
+        _transcriber = TRANSCRIBERS[TRANSCRIPTION_BACKEND]()
+    return _transcriber
+
+
+class TranscriptionService:
+    @staticmethod
+    def submit(user_id, audio_path):
+        """Record a job for stored audio and queue it; the caller's request returns immediately"""
+        job = TranscriptionJob(user_id=user_id, audio_path=audio_path, status='pending',
+                               heartbeat_at=datetime.utcnow())
+        db.session.add(job)
+        db.session.commit()
+        heartbeat.hold(job.id)
+        transcription_queue.submit(f'transcribe:{job.id}', TranscriptionService.run, job.id)
+        return job
+
+    @staticmethod
+    def run(job_id):
+        """Transcribe one job on a worker thread and store the outcome"""
+        try:
+            job = db.session.get(TranscriptionJob, job_id)
+            if job is None or job.status != 'pending':
+                return
+            try:
+                job.text = get_transcriber().transcribe(job.audio_path)
+                job.status = 'done'
+            except Exception as e:
+                print(f"Error transcribing audio for job {job_id}: {str(e)}")
+                job.status = 'failed'
+                job.error = str(e)[:255]
+            job.completed_at = datetime.utcnow()
+            db.session.commit()
+        finally:
+            heartbeat.release(job_id)
+
+    @staticmethod
+    def get_status(job):
+        """Job status, failing jobs whose worker stopped sending heartbeats before finishing"""
+        cutoff = datetime.utcnow() - timedelta(seconds=TRANSCRIPTION_TIMEOUT)
+        if job.status == 'pending' and (job.heartbeat_at or job.created_at) < cutoff:
+            # Conditional, so a heartbeat or result that lands meanwhile wins
+            TranscriptionJob.query.filter(
+                TranscriptionJob.id == job.id,
+                TranscriptionJob.status == 'pending',
+                or_(TranscriptionJob.heartbeat_at.is_(None), TranscriptionJob.heartbeat_at < cutoff)
+            ).update({
+                'status': 'failed',
+                'error': 'Transcription timed out',
+                'completed_at': datetime.utcnow()
+            }, synchronize_session=False)
+            db.session.commit()
+            db.session.refresh(job)
+        return job.status
@@ -0,0 +1,254 @@
+import hashlib
+import json
+import secrets
+import threading
+from datetime import datetime, timedelta
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event, select, delete, insert, update
+from sqlalchemy.orm import Session
+from database import db
+from models import Goal, Task, Habit, AIInsight, UserCacheVersion, UserPayloadCacheEntry
+from services.cache import LRUCache
+from services.pagination import conditional
+from services.rollups import UPSERTS
+from config.settings import USER_CACHE_ENABLED, USER_CACHE_BACKEND, USER_CACHE_SIZE, USER_CACHE_TTL
+
+SCOPES = ('goals', 'tasks', 'habits', 'insights')
+MODEL_SCOPES = {Goal: 'goals', Task: 'tasks', Habit: 'habits', AIInsight: 'insights'}
+EPOCH_USER = 0
+EPOCH_SCOPE = 'all'
+CACHED_HEADERS = ('X-Next-Cursor', 'Link')
+
+
+class DatabasePayloadBackend:
+    """Shared cache tier stored in the user_payload_cache_entry table.
+
+    Keys embed the version stamps, so entries never need invalidating, only
+    expiring. Uses its own short-lived session so cache writes never commit
+    the caller's pending changes.
+    """
+
+    PRUNE_EVERY = 100
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._writes = 0
+
+    def get(self, key):
+        with Session(db.engine) as session:
+            entry = session.get(UserPayloadCacheEntry, key)
+            if entry is None or entry.expires_at <= datetime.utcnow():
+                return None
+            return json.loads(entry.payload)
+
+    def set(self, key, user_id, value):
+        now = datetime.utcnow()
+        with Session(db.engine) as session:
+            session.merge(UserPayloadCacheEntry(
+                key=key,
+                user_id=user_id,
+                payload=json.dumps(value, separators=(',', ':')),
+                expires_at=now + timedelta(seconds=self.ttl)
+            ))
+            self._writes += 1
+            if self._writes % self.PRUNE_EVERY == 0:
+                session.execute(delete(UserPayloadCacheEntry).where(UserPayloadCacheEntry.expires_at <= now))
+            session.commit()
+
+
+class UserPayloadCache:
+    """Per-user payload cache keyed by version stamps that every write replaces.
+
+    Each (user, scope) has a random version stamp in user_cache_version,
+    replaced in the same transaction as any write to that scope. Lookups read
+    the user's stamps (one primary-key query per request) and build the key
+    from them, so once a write commits no worker can match a key from before
+    it, whatever its local cache holds. Stamps are random rather than counted
+    so a replaced stamp is never reissued. A missing stamp reads as 0, so code
+    that recreates the tables must call invalidate_all(), which gives the new
+    database a random epoch that no key cached from the old one contains.
+    """
+
+    def __init__(self, maxsize=2048, ttl=600, shared_backend=None, enabled=True):
+        self.enabled = enabled
+        self.local = LRUCache(maxsize=maxsize, ttl=ttl)
+        self.shared = shared_backend
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'shared_hits': 0, 'misses': 0, 'errors': 0}
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def versions(self, user_id):
+        """Version stamps of a user's scopes plus the global epoch, memoized per request"""
+        memo = g.setdefault('user_cache_versions', {}) if has_request_context() else {}
+        if user_id not in memo:
+            rows = db.session.execute(
+                select(UserCacheVersion.user_id, UserCacheVersion.scope, UserCacheVersion.version).where(
+                    UserCacheVersion.user_id.in_([user_id, EPOCH_USER])
+                )
+            ).all()
+            versions = {scope: version for owner, scope, version in rows if owner == user_id}
+            versions[EPOCH_SCOPE] = next((v for owner, _, v in rows if owner == EPOCH_USER), 0)
+            memo[user_id] = versions
+        return memo[user_id]
+
+    def key(self, user_id, scope, variant=''):
+        versions = self.versions(user_id)
+        raw = f'{user_id}:{scope}:{versions[EPOCH_SCOPE]}:{versions.get(scope, 0)}:{variant}'
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        value = self.local.get(key)
+        if value is not None:
+            self._count('hits')
+            return value
+        if self.shared is not None:
+            try:
+                value = self.shared.get(key)
+            except Exception as e:
+                print(f"User cache backend error: {str(e)}")
+                self._count('errors')
+                value = None
+            if value is not None:
+                self.local.set(key, value)
+                self._count('shared_hits')
+                return value
+        self._count('misses')
+        return None
+
+    def set(self, key, user_id, value):
+        self.local.set(key, value)
+        if self.shared is not None:
+            try:
+                self.shared.set(key, user_id, value)
+            except Exception as e:
+                print(f"User cache backend error: {str(e)}")
+                self._count('errors')
+
+    def fetch(self, user_id, scope, variant, build):
+        """Cached JSON-serializable value for (user, scope, variant), built on a miss"""
+        if not self.enabled:
+            return build()
+        key = self.key(user_id, scope, variant)
+        value = self.get(key)
+        if value is None:
+            value = build()
+            self.set(key, user_id, value)
+        return value
+
+    def response(self, user_id, scope, build):
+        """Conditional JSON response for a GET, keyed by its path and query string.
+
+        build() returns the uncached, unconditional response; only 200s are cached.
+        """
+        if not self.enabled:
+            return conditional(build())
+        key = self.key(user_id, scope, request.full_path)
+        cached = self.get(key)
+        if cached is not None:
+            return conditional(current_app.response_class(
+                cached['body'], mimetype='application/json', headers=cached['headers']
+            ))
+        response = build()
+        if response.status_code == 200:
+            self.set(key, user_id, {
+                'body': response.get_data(as_text=True),
+                'headers': {name: response.headers[name] for name in CACHED_HEADERS if name in response.headers}
+            })
+        return conditional(response)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats['hits'] + stats['shared_hits'] + stats['misses']
+        stats['entries'] = len(self.local)
+        stats['hit_rate'] = (stats['hits'] + stats['shared_hits']) / lookups if lookups else 0
+        return stats
+
+
+user_cache = UserPayloadCache(
+    maxsize=USER_CACHE_SIZE,
+    ttl=USER_CACHE_TTL,
+    shared_backend=DatabasePayloadBackend(USER_CACHE_TTL) if USER_CACHE_BACKEND == 'database' else None,
+    enabled=USER_CACHE_ENABLED
+)
+
+
+def invalidate(user_id, *scopes):
+    """Replace the user's version stamps for scopes when the current transaction commits.
+
+    ORM writes are picked up automatically; bulk Core statements call this.
+    """
+    pending = db.session.info.setdefault('user_cache_bumps', set())
+    pending.update((user_id, scope) for scope in scopes)
+
+
+def invalidate_all():
+    """Invalidate every user's cached payloads, for maintenance jobs that rewrite many users"""
+    invalidate(EPOCH_USER, EPOCH_SCOPE)
+
+
+def _collect_flush(session, flush_context):
+    pending = session.info.setdefault('user_cache_bumps', set())
+    for obj in list(session.new) + list(session.deleted):
+        scope = MODEL_SCOPES.get(type(obj))
+        if scope:
+            pending.add((obj.user_id, scope))
+    for obj in session.dirty:
+        scope = MODEL_SCOPES.get(type(obj))
+        if scope and session.is_modified(obj, include_collections=False):
+            pending.add((obj.user_id, scope))
+
+
+def _apply_bumps(session):
+    """Write new stamps for this transaction's changes just before it commits"""
+    session.flush()
+    pending = session.info.pop('user_cache_bumps', None)
+    if not pending:
+        return
+    connection = session.connection()
+    rows = [
+        {'user_id': user_id, 'scope': scope, 'version': secrets.randbits(62)}
+        for user_id, scope in sorted(pending)
+    ]
+    upsert = UPSERTS.get(connection.dialect.name)
+    if upsert is None:
+        _update_then_insert(connection, rows)
+    else:
+        statement = upsert(UserCacheVersion.__table__)
+        statement = statement.on_conflict_do_update(
+            index_elements=['user_id', 'scope'],
+            set_={'version': statement.excluded.version}
+        )
+        connection.execute(statement, rows)
+    if has_request_context():
+        g.pop('user_cache_versions', None)
+
+
+def _update_then_insert(connection, rows):
+    """Portable stamp write for dialects without ON CONFLICT: UPDATE each row, INSERT those that were missing"""
+    table = UserCacheVersion.__table__
+    missing = [
+        row for row in rows
+        if not connection.execute(
+            update(table)
+            .where(table.c.user_id == row['user_id'], table.c.scope == row['scope'])
+            .values(version=row['version'])
+        ).rowcount
+    ]
+    if missing:
+        connection.execute(insert(table), missing)
+
+
+def _discard_bumps(session):
+    session.info.pop('user_cache_bumps', None)
+
+
+def init_user_cache(app):
+    """Track writes to cached scopes on every session"""
+    if not event.contains(Session, 'after_flush', _collect_flush):
+        event.listen(Session, 'after_flush', _collect_flush)
+        event.listen(Session, 'before_commit', _apply_bumps)
+        event.listen(Session, 'after_rollback', _discard_bumps)
@@ -1,4 +1,8 @@
 document.addEventListener('DOMContentLoaded', function() {
+    const trendWindow = document.getElementById('trendWindow');
+    if (trendWindow) {
+        trendWindow.addEventListener('change', loadAnalytics);
+    }
     loadAnalytics();
     
     // Refresh data every 5 minutes
@@ -20,8 +24,14 @@ function resetAndReloadData() {
 
 function loadAnalytics() {
     Promise.all([
-        fetch('/api/analytics/insights').then(response => response.json()),
-        fetch('/api/analytics/trends').then(response => response.json())
+        fetch('/api/analytics/insights').then(response => {
+            // New insights are generated in the background; pick them up shortly
+            if (response.headers.get('X-Insights-Pending') === '1') {
+                setTimeout(refreshInsights, 5000);
+            }
+            return response.json();
+        }),
+        fetch(`/api/analytics/trends?${trendWindowParams()}`).then(response => response.json())
     ])
     .then(([insights, trends]) => {
         updateInsightsList(insights);
@@ -38,6 +48,29 @@ function loadAnalytics() {
     });
 }
 
+// Selected trend window, e.g. "days=90&bucket=week"
+function trendWindowParams() {
+    const trendWindow = document.getElementById('trendWindow');
+    const [days, bucket] = (trendWindow ? trendWindow.value : '30:day').split(':');
+    return new URLSearchParams({ days, bucket }).toString();
+}
+
+// Charts are redrawn on refresh, so release the canvas first
+function renderChart(canvas, config) {
+    const existing = Chart.getChart(canvas);
+    if (existing) {
+        existing.destroy();
+    }
+    return new Chart(canvas, config);
+}
+
+function refreshInsights() {
+    fetch('/api/analytics/insights')
+        .then(response => response.json())
+        .then(insights => updateInsightsList(insights))
+        .catch(error => console.error('Error refreshing insights:', error));
+}
+
 function updateInsightsList(insights) {
     const insightsList = document.getElementById('insightsList');
     if (!insights.length) {
@@ -92,7 +125,7 @@ function updateProductivityChart(data) {
     const productivityCtx = document.getElementById('productivityChart');
     if (!productivityCtx) return;
 
-    new Chart(productivityCtx, {
+    renderChart(productivityCtx, {
         type: 'line',
         data: {
             labels: data.productivity.dates,
@@ -131,7 +164,7 @@ function updateTaskCompletionChart(data) {
     const taskCtx = document.getElementById('taskCompletionChart');
     if (!taskCtx) return;
 
-    new Chart(taskCtx, {
+    renderChart(taskCtx, {
         type: 'bar',
         data: {
             labels: data.productivity.dates.slice(-7),
@@ -154,7 +187,7 @@ function updateHabitStreakChart(data) {
     const habitCtx = document.getElementById('habitStreakChart');
     if (!habitCtx) return;
 
-    new Chart(habitCtx, {
+    renderChart(habitCtx, {
         type: 'radar',
         data: {
             labels: ['Active Habits', 'Focus Time', 'Habit Impact'],
@@ -189,7 +222,7 @@ function updateAdvancedMetricsChart(data) {
     const metricsCtx = document.getElementById('advancedMetricsChart');
     if (!metricsCtx) return;
 
-    new Chart(metricsCtx, {
+    renderChart(metricsCtx, {
         type: 'line',
         data: {
             labels: data.productivity.dates,
@@ -231,7 +264,7 @@ function updatePredictionsChart(data) {
     const predictionsCtx = document.getElementById('predictionsChart');
     if (!predictionsCtx) return;
 
-    new Chart(predictionsCtx, {
+    renderChart(predictionsCtx, {
         type: 'line',
         data: {
             labels: data.productivity.dates,
@@ -1,11 +1,32 @@
 // Initialize dashboard components
 document.addEventListener("DOMContentLoaded", function () {
   updateGreeting();
-  initializeGoalsChart();
-  loadTasks();
-  loadHabits();
+  loadDashboard()
+    .then((data) => {
+      renderGoalsChart(data.goals);
+      renderTasks(data.tasks);
+      renderHabits(data.habits);
+    })
+    .catch((error) => {
+      console.error("Error loading dashboard:", error);
+      showError("Failed to load dashboard");
+    });
 });
 
+// Data rendered into the page, or one request for all of it when missing
+function loadDashboard() {
+  const inline = document.getElementById("dashboardData");
+  if (inline && inline.textContent.trim()) {
+    return Promise.resolve(JSON.parse(inline.textContent));
+  }
+  return fetch("/api/dashboard").then((response) => {
+    if (!response.ok) {
+      throw new Error(`HTTP error! status: ${response.status}`);
+    }
+    return response.json();
+  });
+}
+
 function updateGreeting() {
   const hour = new Date().getHours();
   const greeting = document.querySelector(".greeting");
@@ -25,50 +46,53 @@ function updateGreeting() {
   }
 }
 
-function initializeGoalsChart() {
+function renderGoalsChart(goals) {
   const ctx = document.getElementById("goalsChart");
   if (!ctx) return;
 
-  fetch("/api/goals")
-    .then((response) => response.json())
-    .then((goals) => {
-      new Chart(ctx, {
-        type: "bar",
-        data: {
-          labels: goals.map((goal) => goal.title),
-          datasets: [
-            {
-              label: "Progress",
-              data: goals.map((goal) => goal.progress),
-              backgroundColor: "rgba(var(--bs-info-rgb), 0.5)",
-              borderColor: "rgba(var(--bs-info-rgb), 1)",
-              borderWidth: 1,
-            },
-          ],
+  new Chart(ctx, {
+    type: "bar",
+    data: {
+      labels: goals.map((goal) => goal.title),
+      datasets: [
+        {
+          label: "Progress",
+          data: goals.map((goal) => goal.progress),
+          backgroundColor: "rgba(var(--bs-info-rgb), 0.5)",
+          borderColor: "rgba(var(--bs-info-rgb), 1)",
+          borderWidth: 1,
         },
-        options: {
-          responsive: true,
-          scales: {
-            y: {
-              beginAtZero: true,
-              max: 100,
-            },
-          },
+      ],
+    },
+    options: {
+      responsive: true,
+      scales: {
+        y: {
+          beginAtZero: true,
+          max: 100,
         },
-      });
-    });
+      },
+    },
+  });
 }
 
+// Called again after task changes (see tasks-common.js)
 function loadTasks() {
+  fetchAllPages("/api/tasks")
+    .then(renderTasks)
+    .catch(error => {
+      console.error('Error loading tasks:', error);
+      showError('Failed to load tasks');
+    });
+}
+
+function renderTasks(tasks) {
   const tasksList = document.getElementById("tasksList");
   if (!tasksList) return;
 
-  fetch("/api/tasks")
-    .then((response) => response.json())
-    .then((tasks) => {
-      tasksList.innerHTML = tasks
-        .map(
-          (task) => `
+  tasksList.innerHTML = tasks
+    .map(
+      (task) => `
                 <div class="task-item mb-2 d-flex align-items-center">
                     <div class="d-flex justify-content-between align-items-center flex-grow-1">
                         <div class="d-flex align-items-center flex-grow-1">
@@ -80,8 +104,8 @@ function loadTasks() {
                                 ? "text-muted text-decoration-line-through"
                                 : ""
                             }" onclick="showTaskDetails(${task.id}, event)" style="cursor: pointer;">${
-            task.title
-          }</span>
+        task.title
+      }</span>
                         </div>
                         <span class="badge ms-2 ${getPriorityBadgeClass(
                           task.priority
@@ -89,13 +113,8 @@ function loadTasks() {
                     </div>
                 </div>
             `
-        )
-        .join("");
-    })
-    .catch(error => {
-      console.error('Error loading tasks:', error);
-      showError('Failed to load tasks');
-    });
+    )
+    .join("");
 }
 
 function getPriorityBadgeClass(priority) {
@@ -109,16 +128,13 @@ function getPriorityBadgeClass(priority) {
   }
 }
 
-function loadHabits() {
+function renderHabits(habits) {
   const habitStreaks = document.getElementById("habitStreaks");
   if (!habitStreaks) return;
 
-  fetch("/api/habits")
-    .then((response) => response.json())
-    .then((habits) => {
-      habitStreaks.innerHTML = habits
-        .map(
-          (habit) => `
+  habitStreaks.innerHTML = habits
+    .map(
+      (habit) => `
                 <div class="habit-streak mb-3">
                     <div class="d-flex justify-content-between align-items-center mb-2">
                         <h6 class="mb-0">${habit.title}</h6>
@@ -135,7 +151,6 @@ function loadHabits() {
                     </div>
                 </div>
             `
-        )
-        .join("");
-    });
+    )
+    .join("");
 }
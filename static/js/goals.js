@@ -114,8 +114,7 @@ document.addEventListener("DOMContentLoaded", function () {
     });
 });
 function loadGoals() {
-  fetch("/api/goals")
-    .then((response) => response.json())
+  fetchAllPages("/api/goals")
     .then((goals) => {
       const goalsList = document.getElementById("goalsList");
       goalsList.innerHTML = goals
@@ -335,74 +334,146 @@ function getPriorityBadgeClass(priority) {
   }
 }
 
+function suggestionItemHtml(task) {
+  return `
+    <div class="list-group-item task-suggestion-item" data-priority="${task.priority || 'normal'}">
+      <div class="form-check d-flex align-items-center">
+        <input 
+          class="form-check-input me-2" 
+          type="checkbox" 
+          value="" 
+          id="task_${btoa(task.title)}"
+        >
+        <label class="form-check-label flex-grow-1" for="task_${btoa(task.title)}">
+          <div class="d-flex justify-content-between align-items-center">
+            <div class="fw-bold">${task.title}</div>
+            <span class="badge bg-${getPriorityBadgeClass(task.priority || 'normal')}">${task.priority || 'normal'}</span>
+          </div>
+          <small class="text-muted d-block">${task.description}</small>
+        </label>
+      </div>
+    </div>
+  `;
+}
+
+function renderSuggestedTasks(data) {
+  const suggestedTasks = document.getElementById("suggestedTasks");
+  const tasksList = document.getElementById("taskSuggestionsList");
+
+  if (!Array.isArray(data) || data.length === 0) {
+    tasksList.innerHTML = `
+      <div class="alert alert-warning">
+        No task suggestions available. Try adding more details to your goal.
+      </div>
+    `;
+    suggestedTasks.classList.remove("d-none");
+    return;
+  }
+
+  // Sort tasks by priority and timeline
+  const sortedTasks = data.sort((a, b) => {
+    const priorityOrder = { urgent: 0, high: 1, medium: 2, low: 3, normal: 4 };
+    return (priorityOrder[a.priority] || 4) - (priorityOrder[b.priority] || 4);
+  });
+
+  tasksList.innerHTML = sortedTasks.map(suggestionItemHtml).join("");
+  suggestedTasks.classList.remove("d-none");
+}
+
+// Reads the server-sent events of /api/goals/suggest-tasks/stream, calling onTask
+// for each task as it arrives. Resolves with the task count on 'done' and throws
+// if the stream fails or ends early, so the caller can fall back.
+async function streamSuggestedTasks(body, onTask) {
+  const response = await fetch("/api/goals/suggest-tasks/stream", {
+    method: "POST",
+    headers: {
+      "Content-Type": "application/json",
+      Accept: "text/event-stream",
+    },
+    body,
+  });
+  const contentType = response.headers.get("Content-Type") || "";
+  if (!response.ok || !response.body || !contentType.startsWith("text/event-stream")) {
+    throw new Error(`Streaming unavailable (status ${response.status})`);
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) {
+      throw new Error("Suggestion stream ended early");
+    }
+    buffer += decoder.decode(value, { stream: true });
+    let boundary;
+    while ((boundary = buffer.indexOf("\n\n")) !== -1) {
+      const block = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+      let event = "message";
+      let data = "";
+      block.split("\n").forEach((line) => {
+        if (line.startsWith("event:")) event = line.slice(6).trim();
+        else if (line.startsWith("data:")) data += line.slice(5).trim();
+      });
+      const payload = data ? JSON.parse(data) : {};
+      if (event === "task") {
+        onTask(payload);
+      } else if (event === "done") {
+        reader.cancel();
+        return payload.count;
+      } else if (event === "error") {
+        throw new Error(payload.error || "Failed to generate tasks");
+      }
+    }
+  }
+}
+
 async function suggestTasks(title, description) {
+  const target_date = document.getElementById("goalTargetDate").value;
+  const body = JSON.stringify({ 
+    title, 
+    description,
+    target_date,
+  });
+
+  const suggestedTasks = document.getElementById("suggestedTasks");
+  const tasksList = document.getElementById("taskSuggestionsList");
+  const streamed = [];
+  try {
+    await streamSuggestedTasks(body, (task) => {
+      if (streamed.length === 0) {
+        tasksList.innerHTML = "";
+        suggestedTasks.classList.remove("d-none");
+      }
+      streamed.push(task);
+      tasksList.insertAdjacentHTML("beforeend", suggestionItemHtml(task));
+    });
+    // Re-render once complete so the list ends up sorted like the non-streaming one
+    renderSuggestedTasks(streamed);
+    return;
+  } catch (error) {
+    console.warn("Streaming task suggestions failed, falling back:", error);
+  }
+
   try {
-    const target_date = document.getElementById("goalTargetDate").value;
     const response = await fetch("/api/goals/suggest-tasks", {
       method: "POST",
       headers: {
         "Content-Type": "application/json",
       },
-      body: JSON.stringify({ 
-        title, 
-        description,
-        target_date,
-      }),
+      body,
     });
 
     if (!response.ok) {
       throw new Error(`HTTP error! status: ${response.status}`);
     }
 
-    const data = await response.json();
-    const suggestedTasks = document.getElementById("suggestedTasks");
-    const tasksList = document.getElementById("taskSuggestionsList");
-
-    if (!Array.isArray(data) || data.length === 0) {
-      tasksList.innerHTML = `
-        <div class="alert alert-warning">
-          No task suggestions available. Try adding more details to your goal.
-        </div>
-      `;
-      suggestedTasks.classList.remove("d-none");
-      return;
-    }
-
-    // Sort tasks by priority and timeline
-    const sortedTasks = data.sort((a, b) => {
-      const priorityOrder = { urgent: 0, high: 1, medium: 2, low: 3, normal: 4 };
-      return (priorityOrder[a.priority] || 4) - (priorityOrder[b.priority] || 4);
-    });
-
-    tasksList.innerHTML = sortedTasks
-      .map(
-        (task) => `
-          <div class="list-group-item task-suggestion-item" data-priority="${task.priority || 'normal'}">
-            <div class="form-check d-flex align-items-center">
-              <input 
-                class="form-check-input me-2" 
-                type="checkbox" 
-                value="" 
-                id="task_${btoa(task.title)}"
-              >
-              <label class="form-check-label flex-grow-1" for="task_${btoa(task.title)}">
-                <div class="d-flex justify-content-between align-items-center">
-                  <div class="fw-bold">${task.title}</div>
-                  <span class="badge bg-${getPriorityBadgeClass(task.priority || 'normal')}">${task.priority || 'normal'}</span>
-                </div>
-                <small class="text-muted d-block">${task.description}</small>
-              </label>
-            </div>
-          </div>
-        `
-      )
-      .join("");
-
-    suggestedTasks.classList.remove("d-none");
+    renderSuggestedTasks(await response.json());
   } catch (error) {
     console.error("Error getting task suggestions:", error);
     const errorMessage = error.message || "An error occurred while generating tasks. Please try again.";
-    document.getElementById("taskSuggestionsList").innerHTML = `
+    tasksList.innerHTML = `
       <div class="alert alert-danger">
         ${errorMessage}
       </div>
@@ -410,46 +481,39 @@ async function suggestTasks(title, description) {
   }
 }
 
-function showTaskDetails(taskId) {
-    // Get the goal ID from the current modal
-    const goalDetailsContent = document.getElementById('goalDetailsContent');
-    const goalIdMatch = goalDetailsContent.innerHTML.match(/goal\.id\s*=\s*(\d+)/);
-    if (!goalIdMatch) return;
-    
-    const goalId = goalIdMatch[1];
-    
-    // Fetch goal details to get the specific task
-    fetch(`/api/goals/${goalId}`)
+function showTaskDetails(taskId, event) {
+    const taskElement = event ? event.currentTarget : null;
+    if (event) {
+        event.stopPropagation();
+    }
+
+    // Fetch just this task rather than the whole goal
+    fetch(`/api/tasks/${taskId}`)
         .then(response => response.json())
-        .then(goal => {
-            const task = goal.tasks.find(t => t.id === taskId);
-            if (!task) return;
-            
-            // Show task details in a popover or tooltip
-            const taskElement = document.querySelector(`[onclick="showTaskDetails(${taskId})"]`);
-            if (taskElement) {
-                const detailsHtml = `
-                    <div class="task-details-popup">
-                        <h6>${task.title}</h6>
-                        <p class="text-muted">${task.description || 'No description available'}</p>
-                        <div class="task-metadata">
-                            <span class="badge bg-${getPriorityBadgeClass(task.priority)}">${task.priority}</span>
-                            <small class="text-muted ms-2">Due: ${new Date(task.due_date).toLocaleDateString()}</small>
-                        </div>
+        .then(task => {
+            if (!task || task.error || !taskElement) return;
+
+            const detailsHtml = `
+                <div class="task-details-popup">
+                    <h6>${task.title}</h6>
+                    <p class="text-muted">${task.description || 'No description available'}</p>
+                    <div class="task-metadata">
+                        <span class="badge bg-${getPriorityBadgeClass(task.priority)}">${task.priority}</span>
+                        <small class="text-muted ms-2">Due: ${task.due_date ? new Date(task.due_date).toLocaleDateString() : 'No due date'}</small>
                     </div>
-                `;
-                
-                // Remove any existing popovers
-                const popover = bootstrap.Popover.getInstance(taskElement);
-                if (popover) popover.dispose();
-                
-                // Create new popover
-                new bootstrap.Popover(taskElement, {
-                    html: true,
-                    content: detailsHtml,
-                    trigger: 'focus',
-                    placement: 'auto'
-                }).show();
-            }
+                </div>
+            `;
+
+            // Remove any existing popovers
+            const popover = bootstrap.Popover.getInstance(taskElement);
+            if (popover) popover.dispose();
+
+            // Create new popover
+            new bootstrap.Popover(taskElement, {
+                html: true,
+                content: detailsHtml,
+                trigger: 'focus',
+                placement: 'auto'
+            }).show();
         });
-}
\ No newline at end of file
+}
@@ -30,17 +30,23 @@ document.addEventListener('DOMContentLoaded', function() {
 });
 
 function loadHabits() {
-    fetch('/api/habits')
-        .then(response => response.json())
+    fetchAllPages('/api/habits')
         .then(habits => {
             const habitsList = document.getElementById('habitsList');
-            habitsList.innerHTML = habits.map(habit => `
+            habitsList.innerHTML = habits.map(habit => {
+                const unit = habit.frequency === 'weekly' ? 'week' : 'day';
+                const done = isCheckedIn(habit);
+                return `
                 <div class="habit-streak mb-3">
                     <div class="d-flex justify-content-between align-items-center mb-2">
                         <h6 class="mb-0">${habit.title}</h6>
                         <div>
-                            <span class="badge bg-success me-2">${habit.current_streak} day streak</span>
-                            <span class="badge bg-info">Best: ${habit.best_streak} days</span>
+                            <span class="badge bg-success me-2">${habit.current_streak} ${unit} streak</span>
+                            <span class="badge bg-info me-2">Best: ${habit.best_streak} ${unit}s</span>
+                            <button class="btn btn-sm ${done ? 'btn-success' : 'btn-outline-success'}"
+                                    onclick="checkInHabit(${habit.id})" ${done ? 'disabled' : ''}>
+                                <i class="bi bi-check"></i> ${done ? 'Done' : 'Check in'}
+                            </button>
                         </div>
                     </div>
                     <div class="progress">
@@ -49,6 +55,29 @@ function loadHabits() {
                         </div>
                     </div>
                 </div>
-            `).join('');
+            `;
+            }).join('');
+        });
+}
+
+// Whether the habit was already checked in during the current day (or ISO week)
+function isCheckedIn(habit) {
+    if (!habit.last_completed_at) return false;
+    const last = new Date(habit.last_completed_at + 'Z');
+    const now = new Date();
+    if (habit.frequency === 'weekly') {
+        const weekStart = new Date(now.getFullYear(), now.getMonth(), now.getDate() - ((now.getDay() + 6) % 7));
+        return last >= weekStart;
+    }
+    return last.toDateString() === now.toDateString();
+}
+
+function checkInHabit(habitId) {
+    fetch(`/api/habits/${habitId}/check-in`, { method: 'POST' })
+        .then(response => response.json())
+        .then(data => {
+            if (data.status === 'success') {
+                loadHabits();
+            }
         });
 }
@@ -7,6 +7,8 @@ class PomodoroTimer {
         this.display = document.querySelector('#pomodoroTimer .display-4');
         this.startButton = document.getElementById('startTimer');
         this.resetButton = document.getElementById('resetTimer');
+        this.session = null;
+        this.uploads = new FocusSessionUploader();
         
         this.initialize();
     }
@@ -29,6 +31,10 @@ class PomodoroTimer {
 
     startTimer() {
         this.isRunning = true;
+        if (!this.session) {
+            this.session = { startedAt: new Date(), focusedMs: 0 };
+        }
+        this.session.resumedAt = Date.now();
         this.timer = setInterval(() => {
             if (this.seconds === 0) {
                 if (this.minutes === 0) {
@@ -45,12 +51,25 @@ class PomodoroTimer {
     }
 
     pauseTimer() {
+        if (this.isRunning && this.session) {
+            this.session.focusedMs += Date.now() - this.session.resumedAt;
+        }
         this.isRunning = false;
         clearInterval(this.timer);
     }
 
+    // Hand the finished (or abandoned) session to the uploader; nothing is sent while the timer ticks
+    finishSession() {
+        const session = this.session;
+        this.session = null;
+        if (session && session.focusedMs >= 60 * 1000) {
+            this.uploads.record(session.startedAt, new Date(), Math.floor(session.focusedMs / 1000));
+        }
+    }
+
     resetTimer() {
         this.pauseTimer();
+        this.finishSession();
         this.minutes = 25;
         this.seconds = 0;
         this.startButton.textContent = 'Start';
@@ -77,6 +96,89 @@ class PomodoroTimer {
     }
 }
 
+// Buffers finished focus sessions in localStorage and uploads them in batches.
+// Sessions carry a client_id, so re-sending after a failed or unconfirmed upload is safe.
+class FocusSessionUploader {
+    constructor() {
+        this.storageKey = 'lifetune.focusSessions';
+        this.batchSize = 100;
+        this.inFlight = false;
+
+        window.addEventListener('online', () => this.flush());
+        window.addEventListener('pagehide', () => this.beacon());
+        this.flush();
+    }
+
+    pending() {
+        try {
+            return JSON.parse(localStorage.getItem(this.storageKey)) || [];
+        } catch (e) {
+            return [];
+        }
+    }
+
+    save(sessions) {
+        localStorage.setItem(this.storageKey, JSON.stringify(sessions));
+    }
+
+    newClientId() {
+        if (window.crypto && crypto.randomUUID) {
+            return crypto.randomUUID();
+        }
+        return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+    }
+
+    record(startedAt, endedAt, durationSeconds) {
+        const sessions = this.pending();
+        sessions.push({
+            client_id: this.newClientId(),
+            started_at: startedAt.toISOString(),
+            ended_at: endedAt.toISOString(),
+            duration_seconds: durationSeconds
+        });
+        this.save(sessions);
+        this.flush();
+    }
+
+    async flush() {
+        if (this.inFlight || !navigator.onLine) return;
+        const batch = this.pending().slice(0, this.batchSize);
+        if (batch.length === 0) return;
+
+        this.inFlight = true;
+        try {
+            const response = await fetch('/api/focus-sessions', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ sessions: batch })
+            });
+            if (!response.ok) return;
+            // Stored, duplicate and rejected sessions are all settled; drop them from the buffer
+            const sent = new Set(batch.map(session => session.client_id));
+            this.save(this.pending().filter(session => !sent.has(session.client_id)));
+        } catch (error) {
+            console.error('Error uploading focus sessions:', error);
+            return;
+        } finally {
+            this.inFlight = false;
+        }
+        if (this.pending().length > 0) {
+            this.flush();
+        }
+    }
+
+    // Best effort on page unload; the buffer is kept until a normal upload confirms it
+    beacon() {
+        const batch = this.pending().slice(0, this.batchSize);
+        if (batch.length > 0 && navigator.sendBeacon) {
+            navigator.sendBeacon(
+                '/api/focus-sessions',
+                new Blob([JSON.stringify({ sessions: batch })], { type: 'application/json' })
+            );
+        }
+    }
+}
+
 // Initialize Pomodoro Timer when DOM is loaded
 document.addEventListener('DOMContentLoaded', () => {
     if (document.getElementById('pomodoroTimer')) {
@@ -1,5 +1,63 @@
 // Shared task functions for tasks and goals views
 
+// Fetch every page of a cursor-paginated list endpoint and return one array
+async function fetchAllPages(url) {
+    const items = [];
+    let cursor = null;
+    do {
+        const separator = url.includes('?') ? '&' : '?';
+        const pageUrl = cursor ? `${url}${separator}cursor=${encodeURIComponent(cursor)}` : url;
+        const response = await fetch(pageUrl);
+        if (!response.ok) {
+            throw new Error(`HTTP error! status: ${response.status}`);
+        }
+        items.push(...await response.json());
+        cursor = response.headers.get('X-Next-Cursor');
+    } while (cursor);
+    return items;
+}
+
+// Typeahead over /api/search: debounced, and stale responses are dropped
+function setupSearch(input, results, onSelect, types = '') {
+    let timer = null;
+    let controller = null;
+
+    input.addEventListener('input', () => {
+        clearTimeout(timer);
+        timer = setTimeout(async () => {
+            const query = input.value.trim();
+            if (controller) controller.abort();
+            if (!query) {
+                results.replaceChildren();
+                return;
+            }
+            controller = new AbortController();
+            try {
+                const params = new URLSearchParams({ q: query, limit: 8 });
+                if (types) params.set('types', types);
+                const response = await fetch(`/api/search?${params}`, { signal: controller.signal });
+                if (!response.ok) return;
+                const items = await response.json();
+                results.replaceChildren(...items.map(item => {
+                    const entry = document.createElement('button');
+                    entry.type = 'button';
+                    entry.className = 'list-group-item list-group-item-action';
+                    const label = document.createElement('span');
+                    label.className = 'badge bg-secondary me-2';
+                    label.textContent = item.type.replace('_', ' ');
+                    entry.append(label, item.title);
+                    entry.addEventListener('click', (event) => onSelect(item, event));
+                    return entry;
+                }));
+            } catch (error) {
+                if (error.name !== 'AbortError') {
+                    console.error('Error searching:', error);
+                }
+            }
+        }, 150);
+    });
+}
+
 function showTaskDetails(taskId, event) {
     if (event) {
         event.stopPropagation();
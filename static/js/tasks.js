@@ -1,6 +1,18 @@
 document.addEventListener('DOMContentLoaded', function() {
     loadTasks();
 
+    setupSearch(
+        document.getElementById('taskSearch'),
+        document.getElementById('taskSearchResults'),
+        (item, event) => {
+            if (item.type === 'task') {
+                showTaskDetails(item.id, event);
+            } else if (item.type === 'goal') {
+                window.location.href = '/goals';
+            }
+        }
+    );
+
     // Handle task filtering
     document.querySelectorAll('[data-filter]').forEach(button => {
         button.addEventListener('click', function() {
@@ -64,15 +76,9 @@ document.addEventListener('DOMContentLoaded', function() {
 });
 
 function loadTasks(filter = 'all') {
-    fetch('/api/tasks')
-        .then(response => response.json())
+    const query = filter === 'all' ? '' : `?completed=${filter === 'completed'}`;
+    fetchAllPages(`/api/tasks${query}`)
         .then(tasks => {
-            if (filter !== 'all') {
-                tasks = tasks.filter(task => 
-                    filter === 'completed' ? task.completed : !task.completed
-                );
-            }
-
             const tasksList = document.getElementById('tasksList');
             tasksList.innerHTML = tasks.map(task => `
                 <div class="task-item mb-2 d-flex align-items-center">
@@ -5,6 +5,7 @@ class VoiceAssistant {
         this.isListening = false;
         this.mediaRecorder = null;
         this.audioChunks = [];
+        this.lastTranscriptionId = null;  // Links a journal entry to its recording
         this.listeningAnimation = document.getElementById('listeningAnimation');
         this.voiceError = document.getElementById('voiceError');
         
@@ -40,6 +41,7 @@ class VoiceAssistant {
                 .join('');
             
             if (event.results[0].isFinal) {
+                this.lastTranscriptionId = null;
                 this.processVoiceCommand(transcript);
             }
             
@@ -73,7 +75,7 @@ class VoiceAssistant {
                     };
                     this.mediaRecorder.onstop = async () => {
                         console.log('Recording stopped, processing audio...');
-                        const audioBlob = new Blob(this.audioChunks, { type: 'audio/wav' });
+                        const audioBlob = new Blob(this.audioChunks, { type: this.mediaRecorder.mimeType || 'audio/webm' });
                         this.audioChunks = [];
                         await this.sendAudioToWhisper(audioBlob);
                     };
@@ -88,16 +90,18 @@ class VoiceAssistant {
         }
     }
 
+    audioFileName(mimeType) {
+        const subtype = (mimeType || '').split(';')[0].split('/')[1];
+        const extensions = { webm: 'webm', ogg: 'ogg', mp4: 'm4a', mpeg: 'mp3', wav: 'wav' };
+        return `audio.${extensions[subtype] || 'webm'}`;
+    }
+
     async sendAudioToWhisper(audioBlob) {
         try {
-            // Convert audio to correct format for Whisper
             const formData = new FormData();
-            // Ensure audio blob is in correct format
-            const audioFile = new File([audioBlob], 'audio.wav', {
-                type: 'audio/wav'
-            });
-            formData.append('audio', audioFile);
+            formData.append('audio', audioBlob, this.audioFileName(audioBlob.type));
 
+            // The upload is accepted right away; transcription runs in the background
             const response = await fetch('/api/transcribe', {
                 method: 'POST',
                 body: formData
@@ -107,16 +111,18 @@ class VoiceAssistant {
                 throw new Error(`HTTP error! status: ${response.status}`);
             }
 
-            const data = await response.json();
-            if (data.error) {
-                throw new Error(data.error);
+            const job = await response.json();
+            if (job.error) {
+                throw new Error(job.error);
             }
 
+            const data = await this.waitForTranscription(job.url);
             const transcript = data.text;
             if (!transcript) {
                 throw new Error('No transcription received');
             }
 
+            this.lastTranscriptionId = data.id;
             document.getElementById('voiceText').textContent = transcript;
             this.processVoiceCommand(transcript);
         } catch (error) {
@@ -135,6 +141,27 @@ class VoiceAssistant {
         }
     }
 
+    async waitForTranscription(url, timeoutMs = 60000) {
+        const deadline = Date.now() + timeoutMs;
+        let delay = 250;
+        while (Date.now() < deadline) {
+            await new Promise(resolve => setTimeout(resolve, delay));
+            const response = await fetch(url);
+            if (!response.ok) {
+                throw new Error(`HTTP error! status: ${response.status}`);
+            }
+            const data = await response.json();
+            if (data.status === 'done') {
+                return data;
+            }
+            if (data.status === 'failed') {
+                throw new Error(data.error || 'Transcription failed');
+            }
+            delay = Math.min(delay * 2, 2000);
+        }
+        throw new Error('Transcription timed out');
+    }
+
     toggleListening() {
         if (this.isListening) {
             this.stopListening();
@@ -185,7 +212,7 @@ class VoiceAssistant {
         else if (text.includes('add journal') || text.includes('create journal')) {
             const journalText = text.replace(/add journal|create journal/i, '').trim();
             if (journalText) {
-                this.saveVoiceNote(journalText, 'journal');
+                this.saveVoiceNote(journalText, 'journal', this.lastTranscriptionId);
                 this.speak('Journal entry saved');
             }
         }
@@ -193,8 +220,15 @@ class VoiceAssistant {
         else if (text.includes('list tasks') || text.includes('show tasks')) {
             this.listTasks();
         }
+        // Search command
+        else if (text.startsWith('search') || text.startsWith('find')) {
+            const query = text.replace(/^(search for|search|find)/i, '').trim();
+            if (query) {
+                this.search(query);
+            }
+        }
         else {
-            this.speak("I didn't understand that command. Try saying 'add task', 'create journal', or 'list tasks'.");
+            this.speak("I didn't understand that command. Try saying 'add task', 'create journal', 'list tasks' or 'search'.");
         }
     }
 
@@ -224,7 +258,7 @@ class VoiceAssistant {
         }
     }
 
-    async saveVoiceNote(transcription, noteType) {
+    async saveVoiceNote(transcription, noteType, transcriptionId) {
         try {
             const response = await fetch('/api/voice-notes', {
                 method: 'POST',
@@ -233,7 +267,8 @@ class VoiceAssistant {
                 },
                 body: JSON.stringify({
                     transcription: transcription,
-                    note_type: noteType
+                    note_type: noteType,
+                    transcription_id: transcriptionId
                 })
             });
             
@@ -248,7 +283,7 @@ class VoiceAssistant {
 
     async listTasks() {
         try {
-            const response = await fetch('/api/tasks');
+            const response = await fetch('/api/tasks?completed=false&fields=title&limit=50');
             const tasks = await response.json();
             
             if (tasks.length === 0) {
@@ -257,7 +292,6 @@ class VoiceAssistant {
             }
             
             const taskText = tasks
-                .filter(task => !task.completed)
                 .map(task => task.title)
                 .join(', ');
                 
@@ -268,6 +302,23 @@ class VoiceAssistant {
         }
     }
 
+    async search(query) {
+        try {
+            const response = await fetch(`/api/search?${new URLSearchParams({ q: query, limit: 5 })}`);
+            const results = await response.json();
+            
+            if (!response.ok || results.length === 0) {
+                this.speak(`I found nothing for ${query}.`);
+                return;
+            }
+            
+            this.speak(`I found: ${results.map(item => item.title).join(', ')}`);
+        } catch (error) {
+            console.error('Error searching:', error);
+            this.speak('Sorry, I could not search right now.');
+        }
+    }
+
     speak(text) {
         const utterance = new SpeechSynthesisUtterance(text);
         this.synthesis.speak(utterance);
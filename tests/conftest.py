@@ -0,0 +1,97 @@
+"""Shared fixtures: one app on a throwaway database with the stub LLM backend.
+
+Settings are read from the environment when config.settings is imported, so
+it is set here, before any test imports the app. Tests run on a fresh SQLite
+file unless TEST_DATABASE_URL points at another database (e.g. Postgres).
+Every test registers its own users, so tests share the app and its database.
+
+    python -m pytest -q
+"""
+import os
+import tempfile
+import pytest
+
+SCRATCH = tempfile.mkdtemp(prefix='lifetune-tests-')
+os.environ['LLM_BACKEND'] = 'stub'
+os.environ['DATABASE_URL'] = os.environ.get('TEST_DATABASE_URL') or f"sqlite:///{os.path.join(SCRATCH, 'test.db')}"
+os.environ['ARCHIVE_DIR'] = os.path.join(SCRATCH, 'archive')
+os.environ['AUDIO_STORAGE_DIR'] = os.path.join(SCRATCH, 'audio')
+os.environ['RETENTION_PAUSE_MS'] = '0'
+for name in ('DATABASE_REPLICA_URLS', 'INSTRUMENTATION_ENABLED', 'QUERY_BUDGET_STRICT'):
+    os.environ.pop(name, None)
+
+
+@pytest.fixture(scope='session')
+def app():
+    from app import create_app
+    from migrations import upgrade_schema
+    app = create_app()
+    with app.app_context():
+        upgrade_schema(log=lambda message: None)
+    return app
+
+
+@pytest.fixture(scope='session')
+def db(app):
+    from database import db
+    return db
+
+
+@pytest.fixture
+def register(app):
+    """Register a user and return a test client logged in as them"""
+    def register(name, password=None):
+        client = app.test_client()
+        response = client.post('/register', data={'username': name, 'email': f'{name}@example.com',
+                                                  'password': password or name})
+        assert response.status_code == 302, f'Registering {name} answered {response.status_code}'
+        return client
+    return register
+
+
+@pytest.fixture
+def user_id(app):
+    """The id of a registered user, by username"""
+    def user_id(name):
+        from models import User
+        with app.app_context():
+            return User.query.filter_by(email=f'{name}@example.com').one().id
+    return user_id
+
+
+@pytest.fixture
+def count_statements(app, db):
+    """Context manager recording the SQL statements run on the primary engine"""
+    from contextlib import contextmanager
+    from sqlalchemy import event
+
+    with app.app_context():
+        engine = db.engine
+
+    @contextmanager
+    def recording():
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(engine, 'before_cursor_execute', record)
+        try:
+            yield statements
+        finally:
+            event.remove(engine, 'before_cursor_execute', record)
+    return recording
+
+
+@pytest.fixture
+def scratch_app(tmp_path):
+    """An app on its own empty SQLite database, for tests that drop or recreate tables"""
+    from app import create_app
+    from migrations import upgrade_schema
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'scratch.db'}"})
+    with app.app_context():
+        upgrade_schema(log=lambda message: None)
+    yield app
+    from database import db
+    with app.app_context():
+        db.engine.dispose()
@@ -0,0 +1,90 @@
+"""Incremental analytics: AnalyticsService.apply_analytics_delta and the recompute that covers what it skips."""
+from datetime import datetime
+import pytest
+
+SNAPSHOT = {'goals_progress': 50.0, 'active_habits': 1, 'total_habits': 2}
+
+
+@pytest.fixture
+def today_row(app, db, register, user_id, request):
+    """A registered user and a factory for their analytics row for today"""
+    from models import UserAnalytics
+    from services.analytics import AnalyticsService
+
+    name = request.node.name.replace('[', '_').replace(']', '')
+    register(name)
+    uid = user_id(name)
+
+    def today_row(**columns):
+        with app.app_context():
+            today = AnalyticsService.get_user_today(uid)
+            UserAnalytics.query.filter_by(user_id=uid).delete()
+            if columns:
+                db.session.add(UserAnalytics(user_id=uid, date=today, **columns))
+            db.session.commit()
+        return uid
+    return today_row
+
+
+def stored(db, user_id):
+    from models import UserAnalytics
+    db.session.expire_all()
+    return UserAnalytics.query.filter_by(user_id=user_id).one_or_none()
+
+
+def test_delta_bumps_an_existing_row_and_rescores_it(app, db, today_row):
+    from services.analytics import AnalyticsService
+    uid = today_row(tasks_created=4, tasks_completed=1, focus_time=30, productivity_score=0.0, **SNAPSHOT)
+    with app.app_context():
+        loaded = stored(db, uid)
+        row = AnalyticsService.apply_analytics_delta(uid, tasks_created=2, tasks_completed=3, focus_time=90)
+        assert (row.tasks_created, row.tasks_completed, row.focus_time) == (6, 4, 120)
+
+        # The row the session had loaded is refreshed before commit, not left with the old counters
+        assert (loaded.tasks_created, loaded.tasks_completed, loaded.focus_time) == (6, 4, 120)
+        db.session.commit()
+        assert loaded.productivity_score == pytest.approx(
+            AnalyticsService.calculate_productivity_score(4, 6, 50.0, 1, 2, 120))
+        assert loaded.goals_progress == 50.0 and loaded.is_dirty is False
+
+
+def test_negative_deltas_stop_at_zero(app, db, today_row):
+    from services.analytics import AnalyticsService
+    uid = today_row(tasks_created=1, tasks_completed=None, focus_time=10, **SNAPSHOT)
+    with app.app_context():
+        row = AnalyticsService.apply_analytics_delta(uid, tasks_created=-3, tasks_completed=-1, focus_time=-5)
+        db.session.commit()
+        assert (row.tasks_created, row.tasks_completed, row.focus_time) == (0, 0, 5)
+        assert stored(db, uid).productivity_score == pytest.approx(
+            AnalyticsService.calculate_productivity_score(0, 0, 50.0, 1, 2, 5))
+
+
+@pytest.mark.parametrize('row', [None, {'is_dirty': True, 'tasks_created': 9, 'tasks_completed': 9}],
+                         ids=['missing', 'dirty'])
+def test_missing_or_dirty_row_is_left_for_the_recompute(app, db, today_row, row):
+    from models import Task
+    from services.analytics import AnalyticsService
+    uid = today_row(**row) if row else today_row()
+    with app.app_context():
+        now = datetime.utcnow()
+        db.session.add_all([
+            Task(user_id=uid, title='Done', priority='normal', created_at=now, completed=True, completed_at=now),
+            Task(user_id=uid, title='Open', priority='urgent', created_at=now),
+            Task(user_id=uid, title='Open too', priority='important', created_at=now),
+        ])
+        assert AnalyticsService.apply_analytics_delta(uid, tasks_created=3, tasks_completed=1) is None
+        db.session.commit()
+        before = stored(db, uid)
+        if row is None:
+            assert before is None
+        else:
+            assert (before.tasks_created, before.tasks_completed, before.is_dirty) == (9, 9, True)
+
+        analytics = AnalyticsService.get_daily_analytics(uid)
+        assert (analytics.tasks_created, analytics.tasks_completed, analytics.is_dirty) == (3, 1, False)
+        assert analytics.productivity_score == pytest.approx(AnalyticsService.calculate_productivity_score(
+            1, 3, analytics.goals_progress, analytics.active_habits, analytics.total_habits, analytics.focus_time))
+
+        # The recomputed row takes deltas again
+        assert AnalyticsService.apply_analytics_delta(uid, tasks_completed=1).tasks_completed == 2
+        db.session.commit()
@@ -0,0 +1,154 @@
+"""The ASGI entry point (asgi.py) and the WSGI bridge under it, driven with a fake receive/send."""
+import asyncio
+import json
+import sys
+import pytest
+from services.asgi_bridge import WSGIBridge
+
+
+def run(asgi_app, method='GET', path='/', body_chunks=(), headers=()):
+    """Messages the app sends for one HTTP request whose body arrives in body_chunks"""
+    incoming = [{'type': 'http.request', 'body': chunk, 'more_body': i < len(body_chunks) - 1}
+                for i, chunk in enumerate(body_chunks)] or [{'type': 'http.request', 'body': b''}]
+    sent = []
+
+    async def receive():
+        return incoming.pop(0) if incoming else {'type': 'http.disconnect'}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {'type': 'http', 'method': method, 'path': path, 'query_string': b'', 'root_path': '',
+             'http_version': '1.1', 'scheme': 'http', 'server': ('testserver', 80), 'client': ('127.0.0.1', 5000),
+             'headers': [(name.encode('latin-1'), value.encode('latin-1')) for name, value in headers]}
+    asyncio.run(asgi_app(scope, receive, send))
+    return sent
+
+
+def response(sent):
+    """(status, headers, body) of the messages an app sent"""
+    start, body = sent[0], sent[1:]
+    assert start['type'] == 'http.response.start' and all(m['type'] == 'http.response.body' for m in body)
+    assert body[-1].get('more_body', False) is False and all(m.get('more_body') for m in body[:-1])
+    headers = [(name.decode('latin-1'), value.decode('latin-1')) for name, value in start['headers']]
+    return start['status'], headers, b''.join(m['body'] for m in body)
+
+
+def bridged(wsgi_app):
+    return WSGIBridge(wsgi_app, threads=2)
+
+
+def test_plain_route_through_the_entry_point(app):
+    import asgi
+    status, headers, body = response(run(asgi.application, 'GET', '/login'))
+    assert status == 200 and b'<form' in body
+    assert ('content-type', 'text/html; charset=utf-8') in headers
+
+
+def test_server_headers_are_left_to_the_server():
+    def wsgi_app(environ, start_response):
+        start_response('200 OK', [('Content-Type', 'text/plain'), ('Date', 'Thu, 01 Jan 1970 00:00:00 GMT'),
+                                  ('Server', 'Werkzeug'), ('X-Kept', '1')])
+        return [b'ok']
+
+    _, headers, _ = response(run(bridged(wsgi_app)))
+    assert [name for name, _ in headers] == ['content-type', 'x-kept']
+
+
+def test_request_body_is_read_as_it_arrives():
+    def echo(environ, start_response):
+        start_response('200 OK', [('Content-Type', 'application/octet-stream')])
+        return [environ['wsgi.input'].read()]
+
+    chunks = [b'first ', b'second ', b'third']
+    status, _, body = response(run(bridged(echo), 'POST', '/upload', chunks))
+    assert status == 200 and body == b''.join(chunks)
+
+
+def test_response_body_is_sent_as_it_is_yielded():
+    def stream(environ, start_response):
+        start_response('200 OK', [('Content-Type', 'text/event-stream')])
+        for i in range(3):
+            yield f'data: {i}\n\n'.encode()
+
+    sent = run(bridged(stream))
+    assert [m['body'] for m in sent[1:]] == [b'data: 0\n\n', b'data: 1\n\n', b'data: 2\n\n', b'']
+
+
+def test_write_callable_is_sent_before_the_iterable():
+    def legacy(environ, start_response):
+        write = start_response('200 OK', [('Content-Type', 'text/plain')])
+        write(b'hello ')
+        write(bytearray(b'big '))
+        return [b'world']
+
+    status, _, body = response(run(bridged(legacy)))
+    assert status == 200 and body == b'hello big world'
+
+
+def test_error_before_the_body_replaces_the_status():
+    def failing(environ, start_response):
+        start_response('200 OK', [('Content-Type', 'text/plain')])
+        try:
+            raise ValueError('broken')
+        except ValueError:
+            start_response('500 Internal Server Error', [('Content-Type', 'text/plain')], sys.exc_info())
+        return [b'failed']
+
+    status, _, body = response(run(bridged(failing)))
+    assert (status, body) == (500, b'failed')
+
+
+def test_error_after_the_body_started_is_raised():
+    def failing(environ, start_response):
+        start_response('200 OK', [('Content-Type', 'text/plain')])
+        yield b'partial'
+        try:
+            raise ValueError('broken mid-stream')
+        except ValueError:
+            start_response('500 Internal Server Error', [], sys.exc_info())
+
+    with pytest.raises(ValueError, match='mid-stream'):
+        run(bridged(failing))
+
+
+def test_exception_in_a_flask_view_is_a_500():
+    from flask import Flask
+    broken = Flask('broken')
+
+    @broken.route('/')
+    def index():
+        raise RuntimeError('view failed')
+
+    status, _, _ = response(run(bridged(broken)))
+    assert status == 500
+
+
+def test_async_suggestions_need_a_login(app):
+    import asgi
+    status, headers, _ = response(run(asgi.application, 'POST', '/api/goals/suggest-tasks',
+                                      [b'{"title": "Run"}'], [('content-type', 'application/json')]))
+    assert status == 302 and dict(headers)['location'].startswith('/login')
+
+
+def test_async_suggestions_for_a_logged_in_user(app, register):
+    import asgi
+    client = register('asgi_suggest')
+    cookie = f"session={client.get_cookie('session').value}"
+    chunks = [b'{"title": "Run a marathon", ', b'"description": "in spring"}']
+    status, _, body = response(run(asgi.application, 'POST', '/api/goals/suggest-tasks', chunks,
+                                   [('content-type', 'application/json'), ('cookie', cookie)]))
+    assert status == 200 and json.loads(body) and all('title' in task for task in json.loads(body))
+
+
+def test_chunked_upload_without_a_content_length():
+    from flask import Flask, request
+    echo = Flask('echo')
+
+    @echo.route('/upload', methods=['POST'])
+    def upload():
+        return request.get_data()
+
+    status, _, body = response(run(bridged(echo), 'POST', '/upload', [b'a' * 70000, b'b' * 10],
+                                   [('content-type', 'application/octet-stream'), ('transfer-encoding', 'chunked')]))
+    assert status == 200 and body == b'a' * 70000 + b'b' * 10
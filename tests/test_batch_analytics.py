@@ -0,0 +1,96 @@
+"""The batch analytics recompute (`flask recompute-analytics`)."""
+from datetime import datetime, timedelta
+import pytest
+from werkzeug.security import generate_password_hash
+
+SNAPSHOT = {'goals_progress': 40.0, 'active_habits': 2, 'total_habits': 3, 'goal_completion_prediction': 55.0,
+            'task_efficiency_score': 70.0, 'habit_impact_score': 35.0}
+COLUMNS = ['productivity_score', 'tasks_created', 'tasks_completed', 'focus_time', 'is_dirty'] + list(SNAPSHOT)
+
+
+def analytics_rows(db, user_id):
+    from models import UserAnalytics
+    return {row.date: {name: getattr(row, name) for name in COLUMNS}
+            for row in UserAnalytics.query.filter_by(user_id=user_id)}
+
+
+@pytest.fixture
+def seeded(app, db, request):
+    """A user with two past days of history written while their goals and habits looked different"""
+    from models import User, Task, Goal, UserAnalytics
+    from services.analytics import AnalyticsService
+
+    now = datetime.utcnow()
+    today = now.date()
+    with app.app_context():
+        user = User(username=request.node.name, email=f'{request.node.name}@example.com',
+                    password_hash=generate_password_hash('batch'))
+        db.session.add(user)
+        db.session.flush()
+        db.session.add(Goal(user_id=user.id, title='Now almost done', progress=90.0, category='personal',
+                            target_date=now + timedelta(days=30)))
+        for days_ago in (1, 2):
+            moment = now - timedelta(days=days_ago)
+            db.session.add_all([
+                Task(user_id=user.id, title=f'Done {days_ago}', priority='normal', created_at=moment,
+                     completed=True, completed_at=moment),
+                Task(user_id=user.id, title=f'Open {days_ago}', priority='normal', created_at=moment),
+            ])
+            score = AnalyticsService.calculate_productivity_score(
+                1, 2, SNAPSHOT['goals_progress'], SNAPSHOT['active_habits'], SNAPSHOT['total_habits'], 0)
+            db.session.add(UserAnalytics(user_id=user.id, date=moment.date(), tasks_created=2, tasks_completed=1,
+                                         focus_time=0, productivity_score=score, is_dirty=False, **SNAPSHOT))
+        db.session.commit()
+        user_id = user.id
+        history = analytics_rows(db, user_id)
+    return user_id, today, history
+
+
+def test_backfill_leaves_past_days_unchanged(app, db, seeded):
+    from services.batch_analytics import BatchAnalyticsService
+    user_id, today, history = seeded
+    with app.app_context():
+        BatchAnalyticsService.recompute(start_date=today - timedelta(days=2), end_date=today, user_ids=[user_id])
+        rows = analytics_rows(db, user_id)
+    assert {day: rows[day] for day in history} == history
+    assert rows[today]['goals_progress'] == 90.0 and rows[today]['is_dirty'] is False
+
+
+def test_backfill_rebuilds_past_counters_only(app, db, seeded):
+    from models import UserAnalytics
+    from services.batch_analytics import BatchAnalyticsService
+    user_id, today, history = seeded
+    yesterday = today - timedelta(days=1)
+    with app.app_context():
+        UserAnalytics.query.filter_by(user_id=user_id, date=yesterday).update({'tasks_created': 7})
+        db.session.commit()
+        BatchAnalyticsService.recompute(start_date=yesterday, end_date=yesterday, user_ids=[user_id])
+        assert analytics_rows(db, user_id)[yesterday] == history[yesterday]
+
+
+def test_missing_past_day_gets_counters_without_todays_snapshot(app, db, seeded):
+    from models import UserAnalytics
+    from services.batch_analytics import BatchAnalyticsService
+    user_id, today, _ = seeded
+    yesterday = today - timedelta(days=1)
+    with app.app_context():
+        UserAnalytics.query.filter_by(user_id=user_id, date=yesterday).delete()
+        db.session.commit()
+        BatchAnalyticsService.recompute(start_date=yesterday, end_date=yesterday, user_ids=[user_id])
+        row = analytics_rows(db, user_id)[yesterday]
+    assert (row['tasks_created'], row['tasks_completed']) == (2, 1)
+    assert row['goals_progress'] == 0
+
+
+def test_default_day_is_the_users_local_today(app, db, seeded):
+    from models import User
+    from services.batch_analytics import BatchAnalyticsService
+    from services.timezones import local_today
+    user_id, _, history = seeded
+    with app.app_context():
+        db.session.get(User, user_id).timezone = 'Pacific/Kiritimati'
+        db.session.commit()
+        stats = BatchAnalyticsService.recompute(user_ids=[user_id])
+        rows = analytics_rows(db, user_id)
+    assert stats['days'] == 1
+    assert set(rows) - set(history) == {local_today('Pacific/Kiritimati')}
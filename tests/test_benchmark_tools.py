@@ -0,0 +1,46 @@
+"""The synthetic dataset generator and the load test's statistics."""
+from benchmarks.load_test import percentile, summarize, compare
+from benchmarks.synthetic import generate
+
+SCALE = dict(users=3, goals_per_user=2, tasks_per_goal=4, habits_per_user=2, voice_notes_per_user=3, days=14)
+
+
+def test_generate_is_sized_and_repeatable(app, db):
+    from models import Goal, Task, Habit, VoiceNote, TaskPriorityRollup
+
+    with app.app_context():
+        first = generate(db, prefix='synthetic_a', **SCALE)
+        second = generate(db, prefix='synthetic_b', **SCALE)
+
+        assert (first['users'], first['goals'], first['tasks'], first['habits'], first['voice_notes']) == (3, 6, 24, 6, 9)
+        for model, expected in [(Goal, first['goals']), (Task, first['tasks']), (Habit, first['habits']),
+                                (VoiceNote, first['voice_notes'])]:
+            assert model.query.filter(model.user_id.in_(first['user_ids'])).count() == expected
+        assert TaskPriorityRollup.query.filter(TaskPriorityRollup.user_id.in_(first['user_ids'])).count()
+
+        def titles(counts):
+            return [t for (t,) in db.session.query(Task.title).filter(
+                Task.user_id.in_(counts['user_ids'])).order_by(Task.id)]
+        assert titles(first) == titles(second)
+        assert first['habit_logs'] == second['habit_logs']
+
+
+def test_percentile_is_nearest_rank():
+    values = list(range(1, 101))
+    assert [percentile(values, pct) for pct in (50, 90, 95, 99)] == [50, 90, 95, 99]
+    assert percentile([7], 99) == 7
+    assert percentile([], 50) is None
+
+
+def test_summarize_reports_milliseconds_and_throughput():
+    summary = summarize([0.001, 0.002, 0.003, 0.004], errors=1, queries=[2, 4], elapsed=2.0, requests=10)
+    assert summary['samples'] == 4 and summary['errors'] == 1
+    assert (summary['p50_ms'], summary['max_ms'], summary['mean_ms']) == (2.0, 4.0, 2.5)
+    assert summary['queries_per_call'] == 3
+    assert summary['throughput_rps'] == 5.0
+
+
+def test_compare_counts_p95_regressions_over_tolerance():
+    baseline = {'results': {'a': {'p95_ms': 10.0}, 'b': {'p95_ms': 10.0}}}
+    results = {'results': {'a': {'p95_ms': 11.0}, 'b': {'p95_ms': 13.0}, 'new': {'p95_ms': 5.0}}}
+    assert compare(results, baseline, tolerance=0.2) == 1
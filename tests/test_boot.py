@@ -0,0 +1,44 @@
+"""The app factory: booting is side-effect free and safe to fork."""
+import json
+import os
+import subprocess
+import sys
+
+BOOT = '''
+import json, sys
+from app import create_app
+create_app()
+print(json.dumps({'openai': 'openai' in sys.modules}))
+'''
+
+
+def test_boot_neither_imports_openai_nor_opens_the_database(tmp_path):
+    path = tmp_path / 'boot.db'
+    env = dict(os.environ, DATABASE_URL=f'sqlite:///{path}')
+    output = subprocess.run([sys.executable, '-c', BOOT], env=env, check=True, capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    assert not json.loads(output.stdout.strip().splitlines()[-1])['openai']
+    assert not path.exists()
+
+
+def test_forked_workers_start_with_empty_pools(app, db, register, monkeypatch):
+    from services import llm
+
+    client = register('boot_fork')
+    assert client.get('/api/tasks').status_code == 200
+    with app.app_context():
+        engine = db.engine
+    monkeypatch.setattr(llm, '_client', object())  # Stands in for a client the parent created
+
+    children = []
+    for _ in range(2):
+        pid = os.fork()
+        if pid == 0:
+            ok = engine.pool.checkedin() == 0 and llm._client is None
+            ok = ok and all(client.get(url).status_code == 200 for url in ('/api/tasks', '/api/goals', '/'))
+            os._exit(0 if ok else 1)
+        children.append(pid)
+    for pid in children:
+        _, status = os.waitpid(pid, 0)
+        assert os.waitstatus_to_exitcode(status) == 0, 'a worker inherited connections or could not serve'
+    assert client.get('/api/tasks').status_code == 200
@@ -0,0 +1,91 @@
+"""The dashboard payload (GET /api/dashboard) and its copy inlined into the dashboard page."""
+import json
+import re
+from datetime import datetime, timedelta
+import pytest
+
+HOSTILE = '</script><script>alert("x")</script> <!-- & \' \u2028'
+# The separate requests dashboard.js made before /api/dashboard replaced them
+LISTS = {
+    'goals': '/api/goals?fields=title,progress',
+    'tasks': '/api/tasks',
+    'habits': '/api/habits',
+}
+
+
+@pytest.fixture
+def seeded(app, db, register, user_id, request):
+    """A client whose user has a few of everything the dashboard shows, some titled with markup"""
+    from models import Goal, Task, Habit, AIInsight
+    client = register(request.node.name)
+    uid = user_id(request.node.name)
+    now = datetime.utcnow()
+    with app.app_context():
+        goal = Goal(user_id=uid, title=HOSTILE, progress=40, category='personal', target_date=now + timedelta(days=9))
+        db.session.add_all([goal, Goal(user_id=uid, title='Read more', progress=0, category='learning',
+                                       target_date=now + timedelta(days=30))])
+        db.session.add_all([Task(user_id=uid, title=f'Task {i}', priority='urgent' if i % 2 else 'normal',
+                                 completed=i == 1, completed_at=now if i == 1 else None) for i in range(5)])
+        db.session.add(Task(user_id=uid, title=HOSTILE, priority='important'))
+        db.session.add_all([Habit(user_id=uid, title='Stretch', frequency='daily', current_streak=3, best_streak=5,
+                                  last_completed_at=now),
+                            Habit(user_id=uid, title=HOSTILE, frequency='weekly')])
+        db.session.add(AIInsight(user_id=uid, insight_type='productivity', content=HOSTILE, recommendations='<b>Rest</b>'))
+        db.session.commit()
+    return client
+
+
+def all_pages(client, url):
+    rows = []
+    url = f"{url}{'&' if '?' in url else '?'}limit=2"
+    while url:
+        response = client.get(url)
+        assert response.status_code == 200
+        rows += response.get_json()
+        link = response.headers.get('Link')
+        url = link and link[1:link.index('>')]
+    return rows
+
+
+def inlined(client):
+    html = client.get('/').get_data(as_text=True)
+    match = re.search(r'<script type="application/json" id="dashboardData">(.*?)</script>', html, re.S)
+    assert match, 'dashboard page has no inlined data'
+    return match.group(1)
+
+
+def test_payload_matches_the_endpoints_it_replaces(app, db, seeded, user_id, request):
+    from models import UserAnalytics
+    from services.analytics import AnalyticsService
+    payload = seeded.get('/api/dashboard').get_json()
+    for scope, url in LISTS.items():
+        assert payload[scope] == all_pages(seeded, url), scope
+    assert payload['insights'] == seeded.get('/api/analytics/insights').get_json()
+
+    uid = user_id(request.node.name)
+    with app.app_context():
+        row = UserAnalytics.query.filter_by(user_id=uid, date=AnalyticsService.get_user_today(uid)).one()
+        assert payload['date'] == row.date.isoformat()
+        assert payload['analytics'] == {field: getattr(row, field) for field in payload['analytics']}
+    assert (payload['analytics']['tasks_created'], payload['analytics']['tasks_completed']) == (6, 1)
+
+
+def test_payload_follows_writes(seeded):
+    before = seeded.get('/api/dashboard').get_json()
+    task_id = before['tasks'][0]['id']
+    seeded.post('/api/tasks/bulk', json={'operations': [
+        {'op': 'toggle', 'id': task_id}, {'op': 'create', 'title': 'Added later', 'priority': 'urgent'}
+    ]})
+    after = seeded.get('/api/dashboard').get_json()
+    assert after['tasks'] == all_pages(seeded, LISTS['tasks'])
+    assert after['tasks'][0]['completed'] is True and after['tasks'][-1]['title'] == 'Added later'
+    assert after['analytics']['tasks_completed'] == before['analytics']['tasks_completed'] + 1
+
+
+def test_inlined_data_is_escaped_and_equals_the_payload(seeded):
+    data = inlined(seeded)
+    # Nothing in the data can close the script element or open a comment or markup
+    assert not set('<>&\'') & set(data)
+    assert '\u2028' not in data  # A raw line separator ends a string in older JavaScript engines
+    assert json.loads(data) == seeded.get('/api/dashboard').get_json()
+    assert json.loads(data)['goals'][0]['title'] == HOSTILE
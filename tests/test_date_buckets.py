@@ -0,0 +1,84 @@
+"""Sargable, timezone-aware date bucketing.
+
+Tasks are seeded at random timestamps (clustered around midnight UTC) for
+users in several timezones. For every day in the window, half-open range
+counts and the batch job's per-day counts must equal a plain Python
+bucketing of the timestamps by local date, and for UTC users the legacy
+func.date() counts too.
+"""
+import random
+from collections import Counter
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import func
+
+TIMEZONES = ['UTC', 'America/Los_Angeles', 'Asia/Kolkata', 'Pacific/Auckland']
+DAYS = 10
+TASKS_PER_USER = 400
+
+
+@pytest.mark.parametrize('tz_name', TIMEZONES)
+def test_daily_counts_match_local_dates(app, db, tz_name):
+    from models import User, Task
+    from services.timezones import day_bounds, local_date
+    from services.batch_analytics import BatchAnalyticsService
+
+    rng = random.Random(7)
+    end_date = datetime.utcnow().date()
+    start_date = end_date - timedelta(days=DAYS - 1)
+
+    with app.app_context():
+        user = User(username=f'tz_{tz_name}', email=f'tz_{tz_name}@example.com', timezone=tz_name)
+        db.session.add(user)
+        db.session.flush()
+        stamps = []
+        for _ in range(TASKS_PER_USER):
+            day = start_date + timedelta(days=rng.randrange(-1, DAYS + 1))
+            # Half the tasks land within two hours of UTC midnight
+            offset = rng.uniform(-7200, 7200) if rng.random() < 0.5 else rng.uniform(0, 86400)
+            created = datetime.combine(day, datetime.min.time()) + timedelta(seconds=offset)
+            completed = created + timedelta(seconds=rng.uniform(0, 86400)) if rng.random() < 0.6 else None
+            stamps.append((created, completed))
+            db.session.add(Task(title='t', priority='normal', user_id=user.id,
+                                created_at=created, completed=completed is not None, completed_at=completed))
+        db.session.commit()
+        user_id = user.id
+
+        expected_created = Counter(local_date(c, tz_name) for c, _ in stamps)
+        expected_completed = Counter(local_date(d, tz_name) for _, d in stamps if d)
+        batch_created = BatchAnalyticsService._daily_task_counts(
+            [user_id], start_date, end_date, tz_name, Task.created_at
+        )
+        batch_completed = BatchAnalyticsService._daily_task_counts(
+            [user_id], start_date, end_date, tz_name, Task.completed_at, Task.completed == True
+        )
+
+        mismatches = []
+        day = start_date
+        while day <= end_date:
+            start, end = day_bounds(day, tz_name)
+            created = Task.query.filter(
+                Task.user_id == user_id, Task.created_at >= start, Task.created_at < end
+            ).count()
+            completed = Task.query.filter(
+                Task.user_id == user_id, Task.completed == True,
+                Task.completed_at >= start, Task.completed_at < end
+            ).count()
+            checks = [
+                ('range created', created, expected_created[day]),
+                ('range completed', completed, expected_completed[day]),
+                ('batch created', batch_created.get((user_id, day), 0), expected_created[day]),
+                ('batch completed', batch_completed.get((user_id, day), 0), expected_completed[day]),
+            ]
+            if tz_name == 'UTC':
+                checks += [
+                    ('legacy created', created, Task.query.filter(
+                        Task.user_id == user_id, func.date(Task.created_at) == day
+                    ).count()),
+                    ('legacy completed', completed, Task.query.filter(
+                        Task.user_id == user_id, Task.completed == True, func.date(Task.completed_at) == day
+                    ).count()),
+                ]
+            mismatches += [(day, name, actual, expected) for name, actual, expected in checks if actual != expected]
+            day += timedelta(days=1)
+    assert not mismatches
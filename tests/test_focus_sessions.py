@@ -0,0 +1,119 @@
+"""Focus session uploads (POST /api/focus-sessions) and the focus_time they add to daily analytics."""
+from datetime import timedelta
+import pytest
+
+
+@pytest.fixture
+def yesterday(app, db, register, user_id, request):
+    """(client, user id, session factory, stored focus_time, recomputed focus_time) for a user with a row for yesterday.
+
+    Sessions are placed yesterday so they never cross today's midnight or end in the future.
+    """
+    from models import UserAnalytics
+    from services.analytics import AnalyticsService
+    from services.timezones import day_bounds
+
+    client = register(request.node.name)
+    uid = user_id(request.node.name)
+    with app.app_context():
+        tz_name = AnalyticsService.get_user_timezone(uid)
+        day = AnalyticsService.get_user_today(uid) - timedelta(days=1)
+        day_start, _ = day_bounds(day, tz_name)
+        db.session.add(UserAnalytics(user_id=uid, date=day, focus_time=0))
+        db.session.commit()
+
+    def session(client_id, start_minute, minutes, **fields):
+        started_at = day_start + timedelta(hours=9, minutes=start_minute)
+        return dict({'client_id': client_id, 'started_at': started_at.isoformat() + 'Z',
+                     'ended_at': (started_at + timedelta(minutes=minutes)).isoformat() + 'Z'}, **fields)
+
+    def focus_time():
+        with app.app_context():
+            db.session.expire_all()
+            return UserAnalytics.query.filter_by(user_id=uid, date=day).one().focus_time
+
+    def recomputed():
+        """Focus minutes a full recompute would find for the day"""
+        with app.app_context():
+            return AnalyticsService.calculate_focus_time(uid, *day_bounds(day, tz_name))
+
+    return client, uid, session, focus_time, recomputed
+
+
+def test_duplicates_in_a_batch_and_across_retries_count_once(yesterday):
+    client, _, session, focus_time, recomputed = yesterday
+    batch = [session('a', 0, 25), session('b', 30, 25), session('a', 0, 25)]
+
+    body = client.post('/api/focus-sessions', json={'sessions': batch}).get_json()
+    assert (body['status'], body['accepted'], body['duplicates']) == ('success', 2, 1)
+    assert [r['status'] for r in body['results']] == ['success', 'success', 'duplicate']
+    assert focus_time() == 50
+
+    # The timer went offline before seeing the answer and uploads its buffer again, plus one new session
+    retry = client.post('/api/focus-sessions', json={'sessions': batch[:2] + [session('c', 60, 10)]}).get_json()
+    assert (retry['accepted'], retry['duplicates']) == (1, 2)
+    assert focus_time() == 60 == recomputed()
+
+
+def test_overlapping_sessions_count_their_focused_time(yesterday):
+    """Sessions from two devices may overlap; each counts its own focused time, as the recompute does"""
+    client, _, session, focus_time, recomputed = yesterday
+    body = client.post('/api/focus-sessions', json=[
+        session('phone', 0, 30, duration_seconds=25 * 60),
+        session('laptop', 10, 30),
+        session('paused', 50, 30, duration_seconds=20 * 60 + 59),
+        session('bogus', 90, 10, duration_seconds=11 * 60),
+    ]).get_json()
+    assert body['status'] == 'partial'
+    assert body['results'][3] == {'index': 3, 'status': 'error', 'error': 'duration_seconds exceeds the session length'}
+    assert focus_time() == 25 + 30 + 20 == recomputed()
+
+
+def test_upload_that_loses_a_race_is_replayed(app, db, yesterday, monkeypatch):
+    from sqlalchemy import insert
+    from sqlalchemy.orm import Session
+    from models import FocusSession
+    from services.focus import FocusSessionService
+    client, uid, session, focus_time, recomputed = yesterday
+    batch = [session('shared', 0, 25), session('mine', 30, 15)]
+    insert_new = FocusSessionService._insert_new
+    attempts = []
+
+    def racing(user_id, rows):
+        attempts.append(sorted(rows))
+        if len(attempts) == 1:
+            # Another upload of the same buffer commits 'shared' after this one looked for existing rows
+            with Session(db.engine) as other:
+                other.execute(insert(FocusSession), [dict(rows['shared'][1], user_id=user_id)])
+                other.commit()
+            db.session.execute(insert(FocusSession), [dict(row, user_id=user_id) for _, row in rows.values()])
+        return insert_new(user_id, rows)
+
+    monkeypatch.setattr(FocusSessionService, '_insert_new', staticmethod(racing))
+    body = client.post('/api/focus-sessions', json=batch).get_json()
+    assert len(attempts) == 2
+    assert [r['status'] for r in body['results']] == ['duplicate', 'success']
+    # Only this upload's new session is added here; the winner adds its own minutes
+    assert focus_time() == 15
+    assert recomputed() == 40
+    with app.app_context():
+        assert FocusSession.query.filter_by(user_id=uid).count() == 2
+
+
+def test_upload_that_keeps_conflicting_is_a_409(app, db, yesterday, monkeypatch):
+    from sqlalchemy import insert
+    from models import FocusSession
+    from services.focus import FocusSessionService
+    client, uid, session, focus_time, _ = yesterday
+
+    def conflicting(user_id, rows):
+        new = [dict(row, user_id=user_id) for _, row in rows.values()]
+        db.session.execute(insert(FocusSession), new + new)
+        return set(rows)
+
+    monkeypatch.setattr(FocusSessionService, '_insert_new', staticmethod(conflicting))
+    response = client.post('/api/focus-sessions', json=[session('again', 0, 25)])
+    assert response.status_code == 409
+    assert focus_time() == 0
+    with app.app_context():
+        assert FocusSession.query.filter_by(user_id=uid).count() == 0
@@ -0,0 +1,114 @@
+"""The cached user identity behind the Flask-Login user_loader.
+
+Two workers are simulated by giving each its own identity LRU.
+"""
+import re
+import time
+from types import SimpleNamespace
+import pytest
+from werkzeug.security import generate_password_hash
+from services.cache import LRUCache
+from services.identity import identity_cache
+
+USER_QUERY = re.compile(r'\bFROM "?user"?(\s|$)', re.IGNORECASE)
+URLS = ['/', '/api/tasks', '/api/goals', '/profile']
+
+
+@pytest.fixture
+def workers(monkeypatch):
+    """use(name) switches the identity cache to that worker's LRUs; new(name, ttl) replaces them"""
+    for name in ('local', '_changed', 'ttl', 'enabled'):
+        monkeypatch.setattr(identity_cache, name, getattr(identity_cache, name))
+    caches = {}
+
+    def new(worker, ttl=None):
+        ttl = ttl or identity_cache.ttl
+        caches[worker] = {'local': LRUCache(maxsize=64, ttl=ttl), '_changed': LRUCache(maxsize=64, ttl=ttl)}
+
+    def use(worker):
+        for name, cache in caches[worker].items():
+            setattr(identity_cache, name, cache)
+
+    new('A')
+    new('B')
+    use('A')
+    return SimpleNamespace(new=new, use=use)
+
+
+def login(app, workers, email, password):
+    workers.use('A')
+    client = app.test_client()
+    client.post('/login', data={'email': email, 'password': password})
+    return client
+
+
+def user_queries(statements):
+    return [s for s in statements if USER_QUERY.search(s)]
+
+
+@pytest.mark.parametrize('worker', ['A', 'B'])
+def test_warm_requests_do_not_read_the_user_table(register, workers, count_statements, worker):
+    client = register(f'identity_warm_{worker}')
+    workers.use(worker)
+    client.get('/api/tasks')
+    with count_statements() as statements:
+        for url in URLS:
+            assert client.get(url).status_code == 200, url
+    assert not user_queries(statements)
+
+
+def test_profile_change_shows_on_the_next_request(app, db, register, user_id, workers):
+    from models import User
+    client = register('identity_profile')
+    client.get('/profile')
+    with app.app_context():
+        db.session.get(User, user_id('identity_profile')).username = 'identity_renamed'
+        db.session.commit()
+    assert b'identity_renamed' in client.get('/profile').data
+
+
+def test_password_change_logs_out_other_sessions(app, db, register, user_id, workers):
+    from models import User
+    email = 'identity_password@example.com'
+    register('identity_password', password='identity')
+    local = login(app, workers, email, 'identity')
+    remote = login(app, workers, email, 'identity')
+    workers.use('B')
+    remote.get('/profile')
+
+    workers.use('A')
+    with app.app_context():
+        db.session.get(User, user_id('identity_password')).password_hash = generate_password_hash('changed')
+        db.session.commit()
+    assert local.get('/profile').status_code == 302, 'still logged in on the same worker'
+
+    identity_cache.ttl = 1
+    workers.new('B', ttl=1)
+    workers.use('B')
+    remote.get('/profile')
+    time.sleep(1.1)
+    assert remote.get('/profile').status_code == 302, 'still logged in on another worker after the TTL'
+
+    changed = login(app, workers, email, 'changed')
+    assert changed.get('/profile').status_code == 200
+
+
+def test_disabled_cache_queries_once_per_request(register, workers, count_statements):
+    client = register('identity_disabled')
+    identity_cache.enabled = False
+    with count_statements() as statements:
+        client.get('/api/tasks')
+    assert len(user_queries(statements)) == 1
+
+
+def test_reset_recreates_the_test_user(scratch_app, db):
+    from models import User
+    for name in ('identity_reset_a', 'identity_reset_b'):
+        # Each reset drops the user who asked for it, so every reset comes from a new user
+        client = scratch_app.test_client()
+        client.post('/register', data={'username': name, 'email': f'{name}@example.com', 'password': name})
+        assert client.post('/api/reset-data').status_code == 200
+        with scratch_app.app_context():
+            user = User.query.filter_by(email='test@example.com').one_or_none()
+            assert user is not None, 'the test user was not recreated'
+            assert db.session.get(User, identity_cache.get_by_email('test@example.com').id) is not None
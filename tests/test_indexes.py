@@ -0,0 +1,110 @@
+"""Every query issued by the analytics service and the JSON API uses an index.
+
+The endpoints are exercised while each SELECT is recorded, then every
+distinct statement is EXPLAINed. On SQLite a plan step of the form
+"SCAN <table>" fails, including a scan of a whole index ("SCAN t USING INDEX
+i"): only "SEARCH ... USING INDEX" steps read a bounded range. On Postgres
+sequential scans are disabled for the session, and a "Seq Scan" node or an
+index scan without an "Index Cond" fails.
+"""
+import re
+from datetime import datetime, timedelta
+from sqlalchemy import event, text
+
+# The only full scans allowed, by name: derived relations (subquery results,
+# already bounded by an indexed inner query), constant rows, and full-text
+# lookups, which SQLite reports as a MATCH-constrained virtual table scan.
+# A full scan a query needs on purpose is added here with its table name.
+INTENTIONAL_SCANS = [
+    r'SCAN anon_\d+$',
+    r'SCAN CONSTANT ROW$',
+    r'SCAN search_index VIRTUAL TABLE INDEX \d+:M',
+]
+ALLOWED_SCANS = re.compile('|'.join(f'(?:{pattern})' for pattern in INTENTIONAL_SCANS))
+URLS = ['/', '/api/goals', '/api/goals/{goal_id}', '/api/tasks', '/api/tasks/{task_id}', '/api/habits',
+        '/api/voice-notes', '/api/analytics/trends', '/api/analytics/insights', '/api/search?q=task']
+
+
+def seed(db, user_id):
+    from models import Goal, Task, Habit, UserAnalytics
+    now = datetime.utcnow()
+    for i in range(20):
+        goal = Goal(title=f'Goal {i}', target_date=now + timedelta(days=30), user_id=user_id)
+        db.session.add(goal)
+        db.session.flush()
+        for j in range(10):
+            db.session.add(Task(
+                title=f'Task {i}-{j}', priority=['urgent', 'important', 'normal'][j % 3],
+                created_at=now - timedelta(days=j), completed=j % 2 == 0,
+                completed_at=now - timedelta(hours=j) if j % 2 == 0 else None,
+                user_id=user_id, goal_id=goal.id
+            ))
+        db.session.add(Habit(title=f'Habit {i}', frequency='daily', current_streak=i % 4, best_streak=5,
+                             user_id=user_id))
+    for d in range(1, 8):
+        db.session.add(UserAnalytics(user_id=user_id, date=(now - timedelta(days=d)).date()))
+    db.session.commit()
+
+
+def full_scans(connection, dialect, statement, parameters):
+    """Plan steps of a statement that read a whole table or index"""
+    if dialect == 'sqlite':
+        rows = connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters).fetchall()
+        return [row[-1] for row in rows if row[-1].startswith('SCAN ') and not ALLOWED_SCANS.match(row[-1])]
+    steps = [row[0] for row in connection.exec_driver_sql(f'EXPLAIN {statement}', parameters).fetchall()]
+    scans = [s for s in steps if 'Seq Scan' in s]
+    # An index scan node reads a range only if an "Index Cond" line follows it before the next node
+    for i, step in enumerate(steps):
+        if 'Index Scan' in step or 'Index Only Scan' in step:
+            details = []
+            for following in steps[i + 1:]:
+                if '->' in following:
+                    break
+                details.append(following)
+            if not any('Index Cond' in line for line in details):
+                scans.append(step)
+    return scans
+
+
+def test_queries_use_indexes(app, db, register, user_id):
+    from models import Goal, Task
+    from services.analytics import AnalyticsService
+
+    client = register('explain')
+    uid = user_id('explain')
+    statements = {}
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT') and not executemany:
+            statements.setdefault(statement, parameters)
+
+    with app.app_context():
+        seed(db, uid)
+        goal_id = Goal.query.filter_by(user_id=uid).first().id
+        task_id = Task.query.filter_by(user_id=uid).first().id
+
+        event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            AnalyticsService.calculate_daily_analytics(uid)
+            AnalyticsService.get_productivity_trends(uid)
+            AnalyticsService.get_completion_rate_by_priority(uid)
+            AnalyticsService.get_user_insights(uid)
+            AnalyticsService.generate_insights(uid)
+            for url in URLS:
+                url = url.format(goal_id=goal_id, task_id=task_id)
+                assert client.get(url).status_code < 400, url
+            client.post(f'/api/tasks/{task_id}/toggle')
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+
+        dialect = db.engine.dialect.name
+        with db.engine.connect() as connection:
+            if dialect == 'postgresql':
+                connection.execute(text('SET enable_seqscan = off'))
+            unindexed = {
+                ' '.join(statement.split()): scans
+                for statement, parameters in statements.items()
+                if (scans := full_scans(connection, dialect, statement, parameters))
+            }
+    assert statements
+    assert not unindexed
@@ -0,0 +1,58 @@
+"""Background insight generation: AnalyticsService.request_insights and the job queue under it."""
+import threading
+from datetime import datetime, timedelta
+
+
+def test_repeated_requests_share_one_job(app, db, register, user_id, monkeypatch):
+    from models import AIInsight, UserAnalytics
+    from services.analytics import AnalyticsService, insight_queue
+
+    register('insights_once')
+    uid = user_id('insights_once')
+    with app.app_context():
+        db.session.add(UserAnalytics(user_id=uid, date=AnalyticsService.get_user_today(uid),
+                                     productivity_score=40.0, task_efficiency_score=80.0))
+        db.session.commit()
+
+    release = threading.Event()
+    runs = []
+    generate = AnalyticsService.generate_insights
+
+    def gated(user_id):
+        runs.append(user_id)
+        release.wait(timeout=10)
+        return generate(user_id)
+
+    monkeypatch.setattr(AnalyticsService, 'generate_insights', staticmethod(gated))
+    with app.app_context():
+        assert AnalyticsService.request_insights(uid) is True
+        assert AnalyticsService.request_insights(uid) is True
+        release.set()
+        insight_queue.shutdown(wait=True)
+
+        assert runs == [uid]
+        insights = AIInsight.query.filter_by(user_id=uid).all()
+        assert [i.insight_type for i in insights] == ['productivity']
+        assert 'Recommendations' not in insights[0].content and insights[0].recommendations
+
+        # Fresh insights exist now, so nothing else is queued
+        assert AnalyticsService.request_insights(uid) is False
+        assert not insight_queue.is_pending(('insights', uid))
+
+
+def test_stale_insights_are_regenerated(app, db, register, user_id, monkeypatch):
+    from models import AIInsight
+    from services.analytics import AnalyticsService, insight_queue
+    from config.settings import INSIGHT_REFRESH_MINUTES
+
+    register('insights_stale')
+    uid = user_id('insights_stale')
+    runs = []
+    monkeypatch.setattr(AnalyticsService, 'generate_insights', staticmethod(runs.append))
+    with app.app_context():
+        db.session.add(AIInsight(user_id=uid, insight_type='productivity', content='Old',
+                                 created_at=datetime.utcnow() - timedelta(minutes=INSIGHT_REFRESH_MINUTES + 1)))
+        db.session.commit()
+        assert AnalyticsService.request_insights(uid) is True
+        insight_queue.shutdown(wait=True)
+    assert runs == [uid]
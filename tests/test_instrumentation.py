@@ -0,0 +1,216 @@
+"""The instrumentation endpoints (/metrics, /api/instrumentation), their access, metrics, spans and profiler."""
+import json
+import re
+import threading
+import time
+import pytest
+from services import instrumentation
+
+
+@pytest.mark.parametrize('remote_addr', ['127.0.0.1', '::1', '203.0.113.7'])
+def test_closed_without_a_token(app, monkeypatch, remote_addr):
+    monkeypatch.setattr(instrumentation, 'INSTRUMENTATION_TOKEN', None)
+    with app.test_request_context('/metrics', environ_base={'REMOTE_ADDR': remote_addr}):
+        assert not instrumentation._authorized()
+
+
+@pytest.mark.parametrize('header, allowed', [
+    ('Bearer s3cret', True),
+    ('Bearer wrong', False),
+    ('s3cret', False),
+    (None, False),
+])
+def test_bearer_token(app, monkeypatch, header, allowed):
+    monkeypatch.setattr(instrumentation, 'INSTRUMENTATION_TOKEN', 's3cret')
+    headers = {'Authorization': header} if header else {}
+    with app.test_request_context('/metrics', headers=headers, environ_base={'REMOTE_ADDR': '127.0.0.1'}):
+        assert instrumentation._authorized() is allowed
+
+
+@pytest.mark.parametrize('url', ['/api/llm/cache-stats', '/api/identity-cache/stats', '/api/user-cache/stats'])
+def test_cache_stats_need_the_token(register, monkeypatch, url):
+    monkeypatch.setattr(instrumentation, 'INSTRUMENTATION_TOKEN', 's3cret')
+    client = register(f"stats_{url.split('/')[2].replace('-', '_')}")
+    assert client.get(url).status_code == 403
+    response = client.get(url, headers={'Authorization': 'Bearer s3cret'})
+    assert response.status_code == 200 and 'hits' in response.get_json()
+
+
+SAMPLE = re.compile(r'^(\w+)(?:\{(.*)\})? (\S+)$')
+LABEL = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+
+
+def parse_metrics(text):
+    """{(name, ((label, value), ...)): value} of the samples in a Prometheus text exposition"""
+    samples = {}
+    for line in text.splitlines():
+        if not line or line.startswith('#'):
+            continue
+        match = SAMPLE.match(line)
+        assert match, f'Malformed sample line: {line!r}'
+        name, labels, value = match.groups()
+        samples[(name, tuple(sorted(LABEL.findall(labels or ''))))] = float(value)
+    return samples
+
+
+def histograms(samples, name):
+    """{labels without le: ([(le, cumulative count)], sum, count)} of one histogram"""
+    found = {}
+    for (metric, labels), value in samples.items():
+        if metric == f'{name}_bucket':
+            key = tuple(label for label in labels if label[0] != 'le')
+            found.setdefault(key, [[], None, None])[0].append((dict(labels)['le'], value))
+    for key in found:
+        found[key][1] = samples[(f'{name}_sum', key)]
+        found[key][2] = samples[(f'{name}_count', key)]
+    return found
+
+
+def assert_consistent(histogram):
+    buckets, total, count = histogram
+    bounds = [le for le, _ in buckets]
+    assert bounds[-1] == '+Inf' and [float(b) for b in bounds[:-1]] == sorted(float(b) for b in bounds[:-1])
+    counts = [value for _, value in buckets]
+    assert counts == sorted(counts), 'buckets must be cumulative'
+    assert counts[-1] == count and total >= 0
+
+
+@pytest.fixture
+def instrumented(monkeypatch, tmp_path):
+    """A client of an app with instrumentation on (token s3cret); process-wide hooks are undone afterwards"""
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+    from app import create_app
+    from migrations import upgrade_schema
+    from database import db
+    from services.analytics import AnalyticsService
+
+    monkeypatch.setattr(instrumentation, 'INSTRUMENTATION_ENABLED', True)
+    monkeypatch.setattr(instrumentation, 'INSTRUMENTATION_TOKEN', 's3cret')
+    monkeypatch.setattr(instrumentation, '_enabled', False)
+    registry = instrumentation.MetricsRegistry()
+    registry._meta = dict(instrumentation.metrics._meta)
+    monkeypatch.setattr(instrumentation, 'metrics', registry)  # Counts start from zero for each test
+    monkeypatch.setattr(instrumentation.profiler, 'sample_percent', 0.0)
+    for name, attribute in list(vars(AnalyticsService).items()):
+        if isinstance(attribute, staticmethod):
+            monkeypatch.setattr(AnalyticsService, name, attribute)  # Restored unwrapped on teardown
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'instrumented.db'}"})
+    with app.app_context():
+        upgrade_schema(log=lambda message: None)
+    client = app.test_client()
+    assert client.post('/register', data={'username': 'metrics', 'email': 'metrics@example.com',
+                                          'password': 'metrics'}).status_code == 302
+    yield client
+    event.remove(Engine, 'before_cursor_execute', instrumentation._before_cursor_execute)
+    event.remove(Engine, 'after_cursor_execute', instrumentation._after_cursor_execute)
+    with app.app_context():
+        db.engine.dispose()
+
+
+TOKEN = {'Authorization': 'Bearer s3cret'}
+
+
+def test_metrics_endpoint_counts_requests(instrumented):
+    for _ in range(3):
+        assert instrumented.get('/api/tasks').status_code == 200
+    instrumented.get('/api/goals/999999')
+    assert instrumented.get('/metrics').status_code == 403
+
+    response = instrumented.get('/metrics', headers=TOKEN)
+    assert response.status_code == 200 and response.mimetype == 'text/plain'
+    text = response.get_data(as_text=True)
+    assert '# TYPE lifetune_http_requests_total counter' in text
+    assert '# TYPE lifetune_http_request_duration_seconds histogram' in text
+    samples = parse_metrics(text)
+
+    requests = {dict(labels)['endpoint']: value for (name, labels), value in samples.items()
+                if name == 'lifetune_http_requests_total' and dict(labels)['status'] == '200'}
+    assert requests['main.handle_tasks'] == 3
+    assert [dict(labels)['status'] for name, labels in samples
+            if name == 'lifetune_http_requests_total' and 'goal' in dict(labels)['endpoint']] == ['404']
+    assert samples[('lifetune_db_queries_total', (('endpoint', 'main.handle_tasks'),))] >= 3
+
+    durations = histograms(samples, 'lifetune_http_request_duration_seconds')
+    for labels, histogram in durations.items():
+        assert_consistent(histogram)
+        endpoint = dict(labels)['endpoint']
+        assert histogram[2] == sum(value for (name, l), value in samples.items()
+                                   if name == 'lifetune_http_requests_total' and dict(l)['endpoint'] == endpoint)
+    assert durations[(('endpoint', 'main.handle_tasks'),)][2] == 3
+
+
+def test_histogram_overflow_lands_in_inf():
+    registry = instrumentation.MetricsRegistry()
+    registry.describe('demo_seconds', 'histogram', 'Demo')
+    for value in (0.001, 0.2, 0.2, 31.0, 120.0):
+        registry.observe('demo_seconds', value, path='a"b\\c\nd')
+    samples = parse_metrics(registry.render())
+    (labels, histogram), = histograms(samples, 'demo_seconds').items()
+    assert labels == (('path', 'a\\"b\\\\c\\nd'),)
+    assert_consistent(histogram)
+    buckets = dict(histogram[0])
+    assert (buckets['0.005'], buckets['0.25'], buckets['30.0'], buckets['+Inf']) == (1, 3, 3, 5)
+    assert histogram[1] == pytest.approx(151.401)
+
+
+def test_service_methods_are_timed_as_spans(instrumented, capsys):
+    assert instrumented.get('/api/dashboard').status_code == 200
+    assert 'db;dur=' in instrumented.get('/api/dashboard').headers['Server-Timing']
+    log = [json.loads(line) for line in capsys.readouterr().out.splitlines() if line.startswith('{')]
+    request = [record for record in log if record['event'] == 'request'][-1]
+    assert request['path'] == '/api/dashboard' and request['queries'] > 0
+    assert request['spans']['AnalyticsService.get_daily_analytics']['count'] == 1
+
+    samples = parse_metrics(instrumented.get('/metrics', headers=TOKEN).get_data(as_text=True))
+    spans = histograms(samples, 'lifetune_span_duration_seconds')
+    daily = spans[(('span', 'AnalyticsService.get_daily_analytics'),)]
+    assert_consistent(daily)
+    assert daily[2] == 2
+
+
+def test_profiler_is_started_and_stopped_at_runtime(instrumented, monkeypatch):
+    profiler = instrumentation.profiler
+    monkeypatch.setattr(profiler, 'interval', 0.001)
+    assert instrumented.put('/api/instrumentation/profiler', json={'sample_percent': 100}).status_code == 403
+    for bad in ({'sample_percent': 101}, {'sample_percent': 'lots'}, {}):
+        assert instrumented.put('/api/instrumentation/profiler', json=bad, headers=TOKEN).status_code == 400
+    assert instrumented.put('/api/instrumentation/profiler', json={'sample_percent': 100},
+                            headers=TOKEN).get_json() == {'sample_percent': 100.0}
+
+    response = instrumented.get('/api/dashboard')
+    profile_id = int(response.headers['X-Profile-Id'])
+    status = instrumented.get('/api/instrumentation', headers=TOKEN).get_json()
+    assert status['profiler']['sample_percent'] == 100.0
+    summary = next(p for p in status['profiles'] if p['id'] == profile_id)
+    assert summary['path'] == '/api/dashboard' and 'stacks' not in summary
+
+    folded = instrumented.get(f'/api/instrumentation/profiles/{profile_id}?format=folded', headers=TOKEN)
+    for line in folded.get_data(as_text=True).splitlines():
+        stack, count = line.rsplit(' ', 1)
+        assert stack.split(';')[0] and int(count) > 0
+    assert instrumented.get('/api/instrumentation/profiles/0', headers=TOKEN).status_code == 404
+
+    instrumented.put('/api/instrumentation/profiler', json={'sample_percent': 0}, headers=TOKEN)
+    assert 'X-Profile-Id' not in instrumented.get('/api/dashboard').headers
+    for _ in range(100):
+        if profiler._thread is None:
+            break
+        time.sleep(0.01)
+    assert profiler._thread is None, 'the sampler thread stops once nothing is profiled'
+
+
+def test_profiler_samples_the_target_thread():
+    profiler = instrumentation.SamplingProfiler(interval_ms=1)
+
+    def busy_wait():
+        deadline = time.perf_counter() + 0.1
+        while time.perf_counter() < deadline:
+            pass
+
+    profiler.start(threading.get_ident())
+    busy_wait()
+    profile = profiler.stop(threading.get_ident(), path='/busy')
+    assert profile['samples'] > 0 and profile['path'] == '/busy'
+    assert any(stack.endswith('test_instrumentation.py:busy_wait') for stack in profile['stacks'])
@@ -0,0 +1,122 @@
+"""The LLM response cache: in-process LRU with TTL, the shared database tier, and chat_completion on top."""
+from datetime import datetime, timedelta
+import pytest
+
+SYSTEM = 'You are a helpful productivity coach.'
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    """A fresh stub client and an empty in-process cache for chat_completion"""
+    from services import llm
+    from services.llm_cache import LLMResponseCache
+    client = llm.StubOpenAIClient()
+    monkeypatch.setattr(llm, '_stub_client', client)
+    monkeypatch.setattr(llm, 'response_cache', LLMResponseCache(maxsize=16, ttl=60))
+    return client
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Controls the monotonic clock the LRU expiry reads; advance with clock.now += seconds"""
+    from services import cache
+
+    class Clock:
+        now = 1000.0
+    monkeypatch.setattr(cache.time, 'monotonic', lambda: Clock.now)
+    return Clock
+
+
+class BrokenBackend:
+    def get(self, key):
+        raise ConnectionError('cache unreachable')
+
+    def set(self, key, model, value):
+        raise ConnectionError('cache unreachable')
+
+
+def test_key_is_the_content_hash_of_the_request():
+    from services.llm_cache import cache_key
+    key = cache_key('gpt-4o', SYSTEM, 'Weekly data')
+    assert len(key) == 64 and int(key, 16) >= 0
+    assert key == cache_key('gpt-4o', SYSTEM, 'Weekly data')
+    assert len({key, cache_key('gpt-4o-mini', SYSTEM, 'Weekly data'), cache_key('gpt-4o', SYSTEM + ' ', 'Weekly data'),
+                cache_key('gpt-4o', SYSTEM, 'Weekly data.')}) == 4
+    # Structured content keys by value, not by the order it was built in
+    assert cache_key('gpt-4o', SYSTEM, {'a': 1, 'b': 2}) == cache_key('gpt-4o', SYSTEM, {'b': 2, 'a': 1})
+
+
+def test_second_identical_prompt_does_not_call_the_client(stub):
+    from services import llm
+    first = llm.chat_completion(SYSTEM, 'Weekly analytics data: {}')
+    assert llm.chat_completion(SYSTEM, 'Weekly analytics data: {}') == first
+    assert stub.calls == 1
+    llm.chat_completion(SYSTEM, 'Weekly analytics data: {"tasks": 1}')
+    assert stub.calls == 2
+    stats = llm.response_cache.stats()
+    assert (stats['hits'], stats['misses'], stats['entries']) == (1, 2, 2)
+
+
+def test_local_entries_expire_after_the_ttl(clock):
+    from services.llm_cache import LLMResponseCache
+    cache = LLMResponseCache(ttl=60)
+    cache.set('k', 'model', 'reply')
+    clock.now += 59
+    assert cache.get('k') == 'reply'
+    clock.now += 1
+    assert cache.get('k') is None and len(cache.local) == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+    from services.llm_cache import LLMResponseCache
+    cache = LLMResponseCache(maxsize=2, ttl=60)
+    cache.set('a', 'model', 'A')
+    cache.set('b', 'model', 'B')
+    assert cache.get('a') == 'A'
+    cache.set('c', 'model', 'C')
+    assert (cache.get('a'), cache.get('b'), cache.get('c')) == ('A', None, 'C')
+
+
+def test_shared_backend_serves_another_worker(app, stub):
+    from services import llm
+    from services.llm_cache import LLMResponseCache, DatabaseCacheBackend
+    shared = DatabaseCacheBackend(ttl=60)
+    first_worker = LLMResponseCache(ttl=60, shared_backend=shared)
+    second_worker = LLMResponseCache(ttl=60, shared_backend=shared)
+    with app.app_context():
+        llm.response_cache = first_worker
+        content = llm.chat_completion(SYSTEM, 'Shared between workers')
+        llm.response_cache = second_worker
+        assert llm.chat_completion(SYSTEM, 'Shared between workers') == content
+        assert llm.chat_completion(SYSTEM, 'Shared between workers') == content
+    assert stub.calls == 1
+    stats = second_worker.stats()
+    assert (stats['shared_hits'], stats['hits'], stats['misses']) == (1, 1, 0)
+
+
+def test_expired_shared_entries_miss_and_are_pruned(app, db):
+    from models import LLMCacheEntry
+    from services.llm_cache import DatabaseCacheBackend, cache_key
+    backend = DatabaseCacheBackend(ttl=60)
+    expired, fresh = cache_key('m', SYSTEM, 'expired'), cache_key('m', SYSTEM, 'fresh')
+    with app.app_context():
+        backend.set(expired, 'm', 'old reply')
+        LLMCacheEntry.query.filter_by(key=expired).update({'expires_at': datetime.utcnow() - timedelta(seconds=1)})
+        db.session.commit()
+        assert backend.get(expired) is None
+
+        backend.PRUNE_EVERY = 1
+        backend.set(fresh, 'm', 'new reply')
+        assert backend.get(fresh) == 'new reply'
+        assert db.session.get(LLMCacheEntry, expired) is None
+
+
+def test_backend_errors_fall_back_to_the_client(stub):
+    from services import llm
+    from services.llm_cache import LLMResponseCache
+    llm.response_cache = LLMResponseCache(ttl=60, shared_backend=BrokenBackend())
+    content = llm.chat_completion(SYSTEM, 'While the cache is down')
+    assert content and stub.calls == 1
+    # The local tier still works, so the repeat is not sent again
+    assert llm.chat_completion(SYSTEM, 'While the cache is down') == content and stub.calls == 1
+    assert llm.response_cache.stats()['errors'] == 2
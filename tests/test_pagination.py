@@ -0,0 +1,99 @@
+"""Keyset pagination, projection and ETags on the list endpoints (services/pagination.py)."""
+import base64
+import json
+from datetime import datetime
+from urllib.parse import urlsplit
+import pytest
+
+LISTS = ['/api/goals', '/api/tasks', '/api/habits', '/api/voice-notes']
+
+
+@pytest.fixture
+def tied_tasks(app, db, register, user_id, request):
+    """A client whose user has seven tasks that tie on every column but id, plus one that filters out"""
+    from models import Task
+    client = register(request.node.name)
+    uid = user_id(request.node.name)
+    moment = datetime(2026, 3, 1, 9, 30)
+    with app.app_context():
+        tasks = [Task(user_id=uid, title='Same', priority='urgent', created_at=moment) for _ in range(7)]
+        db.session.add_all(tasks + [Task(user_id=uid, title='Other', priority='normal', created_at=moment)])
+        db.session.commit()
+        return client, sorted(t.id for t in tasks)
+
+
+def pages(client, url):
+    """Follow the Link rel="next" headers from url; returns each page's rows"""
+    pages = []
+    while url:
+        response = client.get(url)
+        assert response.status_code == 200
+        pages.append(response.get_json())
+        link = response.headers.get('Link')
+        assert (link is None) == ('X-Next-Cursor' not in response.headers)
+        url = link and link[1:link.index('>')]
+    return pages
+
+
+def token(payload):
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip('=')
+
+
+@pytest.mark.parametrize('limit', [1, 3, 7])
+def test_pages_split_tied_rows_without_gaps_or_repeats(tied_tasks, limit):
+    client, ids = tied_tasks
+    result = pages(client, f'/api/tasks?priority=urgent&limit={limit}&fields=title')
+    assert [len(page) for page in result] == [limit] * (7 // limit) + ([7 % limit] if 7 % limit else [])
+    assert [row['id'] for page in result for row in page] == ids
+    assert all(set(row) == {'id', 'title'} for page in result for row in page)
+
+
+def test_next_link_keeps_the_filters(tied_tasks):
+    client, _ = tied_tasks
+    response = client.get('/api/tasks?priority=urgent&limit=3')
+    link = urlsplit(response.headers['Link'][1:response.headers['Link'].index('>')])
+    assert link.path == '/api/tasks' and 'priority=urgent' in link.query and 'limit=3' in link.query
+    assert response.headers['Link'].endswith('; rel="next"')
+
+
+def test_deleting_a_seen_row_does_not_shift_the_next_page(tied_tasks):
+    client, ids = tied_tasks
+    first = client.get('/api/tasks?priority=urgent&limit=3')
+    assert client.post('/api/tasks/bulk', json={'operations': [{'op': 'delete', 'id': ids[0]}]}).status_code == 200
+    cursor = first.headers['X-Next-Cursor']
+    second = client.get(f'/api/tasks?priority=urgent&limit=3&cursor={cursor}').get_json()
+    assert [row['id'] for row in second] == ids[3:6]
+
+
+BAD_CURSORS = ['not-a-cursor', token({'id': 'x'}), token({'offset': 3}), token([1]), token({'id': None}),
+               '%FF%FE', '====']
+
+
+@pytest.mark.parametrize('url', LISTS)
+def test_invalid_cursor_is_a_400(register, url):
+    client = register(f"pagination_cursor_{url.rsplit('/', 1)[-1]}")
+    for cursor in BAD_CURSORS:
+        response = client.get(f'{url}?cursor={cursor}')
+        assert (response.status_code, response.get_json()) == (400, {'error': 'Invalid cursor'}), cursor
+
+
+@pytest.mark.parametrize('url', LISTS)
+def test_unchanged_list_answers_if_none_match_with_304(register, url):
+    client = register(f"pagination_etag_{url.rsplit('/', 1)[-1]}")
+    first = client.get(url)
+    assert first.status_code == 200 and first.headers['ETag']
+    assert first.headers['Cache-Control'] == 'private, no-cache'
+
+    repeat = client.get(url, headers={'If-None-Match': first.headers['ETag']})
+    assert repeat.status_code == 304 and repeat.get_data() == b''
+    assert repeat.headers['ETag'] == first.headers['ETag']
+    assert client.get(url, headers={'If-None-Match': '"something-else"'}).status_code == 200
+
+
+def test_changed_list_gets_a_new_etag(register):
+    client = register('pagination_etag_changes')
+    before = client.get('/api/tasks')
+    client.post('/api/tasks/bulk', json={'operations': [{'op': 'create', 'title': 'New'}]})
+    after = client.get('/api/tasks', headers={'If-None-Match': before.headers['ETag']})
+    assert after.status_code == 200 and after.headers['ETag'] != before.headers['ETag']
+    assert [row['title'] for row in after.get_json()] == ['New']
@@ -0,0 +1,135 @@
+"""Per-priority task completion rollups and the trends endpoint.
+
+Random task writes for users in several timezones go through every write
+path (ORM adds, toggles, priority changes and deletes, the bulk task
+endpoint and goal creation with tasks). TaskPriorityRollup must then equal a
+recount of the task table, before and after a rebuild, and the trends
+endpoint must answer every window without reading the task table.
+"""
+import random
+import re
+from collections import Counter
+from datetime import datetime, timedelta
+import pytest
+from werkzeug.security import generate_password_hash
+
+TIMEZONES = ['UTC', 'America/Los_Angeles', 'Asia/Kolkata', 'Pacific/Auckland']
+PRIORITIES = ['urgent', 'important', 'normal']
+TASKS_PER_USER = 60
+DAYS = 90
+
+
+def recount(db, tz_by_user):
+    """Brute force: tasks created and completed per (user, local creation day, priority)"""
+    from models import Task
+    from services.timezones import local_date
+
+    counts = Counter()
+    for user_id, created_at, priority, completed in db.session.query(
+        Task.user_id, Task.created_at, Task.priority, Task.completed
+    ).filter(Task.user_id.in_(list(tz_by_user))):
+        key = (user_id, local_date(created_at, tz_by_user[user_id]), priority or 'normal')
+        counts[key + ('created',)] += 1
+        counts[key + ('completed',)] += 1 if completed else 0
+    return +counts
+
+
+def rollup_counts(db, tz_by_user):
+    from models import TaskPriorityRollup
+
+    counts = Counter()
+    for row in TaskPriorityRollup.query.filter(TaskPriorityRollup.user_id.in_(list(tz_by_user))):
+        counts[(row.user_id, row.date, row.priority, 'created')] += row.tasks_created
+        counts[(row.user_id, row.date, row.priority, 'completed')] += row.tasks_completed
+    return +counts
+
+
+@pytest.fixture(scope='module')
+def written(app, db):
+    """Users whose tasks went through every write path, and a client logged in as the first"""
+    from models import User, Task
+
+    rng = random.Random(15)
+    now = datetime.utcnow()
+    with app.app_context():
+        tz_by_user = {}
+        for i, tz_name in enumerate(TIMEZONES):
+            user = User(username=f'rollups_{i}', email=f'rollups_{i}@example.com', timezone=tz_name,
+                        password_hash=generate_password_hash('rollup'))
+            db.session.add(user)
+            db.session.flush()
+            tz_by_user[user.id] = tz_name
+        db.session.commit()
+
+        # ORM writes, including creation times near local midnight
+        for user_id in tz_by_user:
+            for j in range(TASKS_PER_USER):
+                created_at = now - timedelta(days=rng.randrange(DAYS), hours=rng.choice([0, 1, 11, 23]))
+                db.session.add(Task(title=f'Task {j}', priority=rng.choice(PRIORITIES),
+                                    user_id=user_id, created_at=created_at))
+        db.session.commit()
+        for task in Task.query.filter(Task.user_id.in_(list(tz_by_user))).all():
+            roll = rng.random()
+            if roll < 0.4:
+                task.completed = not task.completed
+                task.completed_at = now if task.completed else None
+            elif roll < 0.6:
+                task.priority = rng.choice(PRIORITIES)
+                task.completed = rng.random() < 0.5
+            elif roll < 0.7:
+                db.session.delete(task)
+        db.session.commit()
+        task_ids = [t.id for t in Task.query.filter_by(user_id=next(iter(tz_by_user))).limit(20)]
+
+    # Bulk and goal endpoints, for the first user
+    client = app.test_client()
+    client.post('/login', data={'email': 'rollups_0@example.com', 'password': 'rollup'})
+    operations = [{'op': 'create', 'title': f'Bulk {i}', 'priority': rng.choice(PRIORITIES)} for i in range(5)]
+    for task_id in task_ids:
+        kind = rng.choice(['toggle', 'update', 'delete'])
+        if kind == 'update':
+            operations.append({'op': 'update', 'id': task_id, 'priority': rng.choice(PRIORITIES)})
+        else:
+            operations.append({'op': kind, 'id': task_id})
+    operations.append({'op': 'toggle', 'id': task_ids[0]})
+    assert client.post('/api/tasks/bulk', json={'operations': operations}).status_code == 200
+    assert client.post('/api/goals', json={
+        'title': 'Rollup goal', 'description': '', 'category': 'personal',
+        'target_date': (now + timedelta(days=30)).strftime('%Y-%m-%d'),
+        'tasks': [{'title': f'Goal task {i}', 'priority': rng.choice(PRIORITIES)} for i in range(4)]
+    }).status_code == 200
+    return tz_by_user, client
+
+
+def test_rollup_matches_a_recount(app, db, written):
+    tz_by_user, _ = written
+    with app.app_context():
+        assert rollup_counts(db, tz_by_user) == recount(db, tz_by_user)
+
+
+def test_rebuild_matches_a_recount(app, db, written):
+    from services.rollups import PriorityRollupService
+    tz_by_user, _ = written
+    with app.app_context():
+        PriorityRollupService.rebuild(chunk_size=3)
+        assert rollup_counts(db, tz_by_user) == recount(db, tz_by_user)
+
+
+def test_trends_do_not_read_the_task_table(written, count_statements):
+    _, client = written
+    with count_statements() as statements:
+        for days, bucket in [(7, 'day'), (30, 'day'), (90, 'week'), (365, 'month')]:
+            assert client.get(f'/api/analytics/trends?days={days}&bucket={bucket}').status_code == 200
+    assert not [s for s in statements if re.search(r'\bFROM task\b', s)]
+
+
+def test_completion_rates_default_to_seven_days(app, written):
+    from services.analytics import AnalyticsService
+    tz_by_user, client = written
+    trends = client.get('/api/analytics/trends').get_json()
+    assert (trends['window']['days'], trends['window']['completion_rate_days']) == (30, 7)
+    with app.app_context():
+        expected = AnalyticsService.get_completion_rate_by_priority(next(iter(tz_by_user)), 7)
+    assert trends['completion_rates'] == expected
+    window = client.get('/api/analytics/trends?days=90').get_json()['window']
+    assert (window['days'], window['completion_rate_days']) == (90, 90)
@@ -0,0 +1,105 @@
+"""Per-endpoint SQL statement budgets.
+
+Every JSON endpoint runs against a small and a large dataset with
+QUERY_BUDGET_STRICT on. A request over its budget is answered with a 500,
+and an endpoint whose statement count grows with the amount of data has an
+N+1 load.
+"""
+from datetime import datetime, timedelta
+import pytest
+
+SCALES = {'small': (2, 3), 'large': (20, 30)}  # (goals, tasks per goal)
+REQUESTS = [
+    ('GET', '/', None),
+    ('GET', '/ (warm)', None),
+    ('GET', '/api/dashboard', None),
+    ('GET', '/api/goals', None),
+    ('GET', '/api/goals/{goal_id}', None),
+    ('GET', '/api/tasks', None),
+    ('GET', '/api/tasks/{task_id}', None),
+    ('GET', '/api/habits', None),
+    ('GET', '/api/voice-notes', None),
+    ('GET', '/api/analytics/trends', None),
+    ('GET', '/api/analytics/insights', None),
+    ('GET', '/api/search?q=task', None),
+    ('POST', '/api/tasks/{task_id}/toggle', None),
+    ('POST', '/api/tasks', lambda ids, n: {'title': 't', 'description': '', 'priority': 'normal',
+                                           'due_date': '2030-01-01'}),
+    ('POST', '/api/goals', lambda ids, n: {'title': 'g', 'description': '', 'category': 'personal',
+                                           'target_date': '2030-01-01',
+                                           'tasks': [{'title': f's{i}'} for i in range(n)]}),
+    ('POST', '/api/tasks/bulk', lambda ids, n: {'operations': (
+        [{'op': 'create', 'title': f'b{i}', 'goal_id': ids['goal_id']} for i in range(n)]
+        + [{'op': 'toggle', 'id': ids['task_id']}, {'op': 'update', 'id': ids['task_id'], 'title': 'u'},
+           {'op': 'update', 'id': ids['other_task_id'], 'priority': 'urgent'},
+           {'op': 'delete', 'id': ids['deleted_task_id']}]
+    )}),
+    ('POST', '/api/focus-sessions', lambda ids, n: {'sessions': [
+        {'client_id': f'f{i}', 'started_at': (datetime.utcnow() - timedelta(days=i % 3, minutes=26)).isoformat(),
+         'ended_at': (datetime.utcnow() - timedelta(days=i % 3, minutes=1)).isoformat()}
+        for i in range(n)
+    ]}),
+]
+
+
+def seed(db, user_id, goals, tasks_per_goal):
+    from models import Goal, Task, Habit, VoiceNote
+    now = datetime.utcnow()
+    for i in range(goals):
+        goal = Goal(title=f'Goal {i}', description='', category='personal',
+                    target_date=now + timedelta(days=30), user_id=user_id)
+        db.session.add(goal)
+        db.session.flush()
+        db.session.add_all([
+            Task(title=f'Task {i}-{j}', priority='normal', user_id=user_id, goal_id=goal.id,
+                 due_date=now, completed=j % 2 == 0, completed_at=now if j % 2 == 0 else None)
+            for j in range(tasks_per_goal)
+        ])
+        db.session.add(Habit(title=f'Habit {i}', frequency='daily', user_id=user_id))
+        db.session.add(VoiceNote(transcription=f'Note {i}', note_type='journal', user_id=user_id))
+    db.session.commit()
+
+
+def run_scale(app, db, client, user_id, goals, tasks_per_goal):
+    """{request label: (status, statement count)} for every request in REQUESTS"""
+    from models import Goal, Task
+    from services.analytics import insight_queue
+
+    with app.app_context():
+        seed(db, user_id, goals, tasks_per_goal)
+        goal_id = Goal.query.filter_by(user_id=user_id).first().id
+        task_ids = [t.id for t in Task.query.filter_by(user_id=user_id, goal_id=goal_id).limit(3)]
+    ids = dict(goal_id=goal_id, task_id=task_ids[0], other_task_id=task_ids[1], deleted_task_id=task_ids[2])
+
+    results = {}
+    for method, label, body in REQUESTS:
+        # Finish background insight jobs first; whether one is still running changes the count
+        insight_queue.shutdown()
+        url = label.split(' ')[0].format(**ids)
+        response = client.open(url, method=method, json=body(ids, tasks_per_goal) if body else None)
+        results[f'{method} {label}'] = (response.status_code, int(response.headers.get('X-Query-Count', -1)))
+    return results
+
+
+@pytest.fixture(scope='module')
+def statement_counts(app, db):
+    from models import User
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr('services.query_budget.QUERY_BUDGET_STRICT', True)
+        counts = {}
+        for name, scale in SCALES.items():
+            client = app.test_client()
+            client.post('/register', data={'username': f'budget_{name}', 'email': f'budget_{name}@example.com',
+                                           'password': 'budget'})
+            with app.app_context():
+                user_id = User.query.filter_by(email=f'budget_{name}@example.com').one().id
+            counts[name] = run_scale(app, db, client, user_id, *scale)
+    return counts
+
+
+@pytest.mark.parametrize('request_label', [f'{method} {label}' for method, label, _ in REQUESTS])
+def test_within_budget_at_any_size(statement_counts, request_label):
+    small_status, small = statement_counts['small'][request_label]
+    large_status, large = statement_counts['large'][request_label]
+    assert small_status < 500 and large_status < 500, 'over budget'
+    assert large <= small, f'{small} statements on the small dataset, {large} on the large one'
@@ -0,0 +1,128 @@
+"""Read-replica routing (database.RoutingSession) on local SQLite databases.
+
+The test database is the primary; a copy of it stands in for a replica,
+refreshed only when a test calls replicate(), so it lags like a real one.
+"""
+import sqlite3
+import time
+from types import SimpleNamespace
+import pytest
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+STICKY_SECONDS = 0.5
+READ_URLS = ['/api/tasks', '/api/goals', '/api/habits', '/api/analytics/trends?days=30']
+TASK = {'title': 'Replica check task', 'description': 'Written to the primary', 'due_date': '2030-01-01',
+        'priority': 'high'}
+
+
+@pytest.fixture(scope='module')
+def replicas(app, db, tmp_path_factory):
+    """An app reading from a lagging copy of the test database, with per-engine statement counts"""
+    from app import create_app
+    from database import replica_binds
+
+    primary_url = app.config['SQLALCHEMY_DATABASE_URI']
+    if make_url(primary_url).get_backend_name() != 'sqlite':
+        pytest.skip('The replica stand-in is a copy of a SQLite file')
+    primary_path = make_url(primary_url).database
+    replica_path = str(tmp_path_factory.mktemp('replica') / 'replica.db')
+
+    def replicate():
+        with sqlite3.connect(primary_path) as source, sqlite3.connect(replica_path) as target:
+            source.backup(target)
+
+    replicate()
+    routed = create_app({'SQLALCHEMY_BINDS': replica_binds([f'sqlite:///{replica_path}'])})
+    with routed.app_context():
+        engines = {'primary': db.engines[None], 'replica': db.engines['replica_0']}
+    statements = {name: [] for name in engines}
+    for name, engine in engines.items():
+        event.listen(engine, 'before_cursor_execute',
+                     lambda conn, cursor, statement, *args, name=name: statements[name].append(statement))
+
+    def request(client, method, url, **kwargs):
+        """The response, and how many statements it ran on each engine"""
+        for recorded in statements.values():
+            del recorded[:]
+        response = client.open(url, method=method, **kwargs)
+        assert response.status_code in (200, 201, 302), f'{method} {url} answered {response.status_code}'
+        return response, {name: len(recorded) for name, recorded in statements.items()}
+
+    def register(name):
+        """A client logged in as a new user, once the user has replicated and the sticky window ended"""
+        client = routed.test_client()
+        client.post('/register', data={'username': name, 'email': f'{name}@example.com', 'password': name})
+        replicate()
+        time.sleep(STICKY_SECONDS + 0.1)
+        return client
+
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr('database.REPLICA_STICKY_SECONDS', STICKY_SECONDS)
+        yield SimpleNamespace(app=routed, engines=engines, statements=statements, primary_path=primary_path,
+                              replicate=replicate, request=request, register=register)
+
+
+def test_primary_pool_uses_configured_size(app, replicas):
+    from database import engine_options
+    assert replicas.engines['primary'].pool.size() == engine_options(app.config['SQLALCHEMY_DATABASE_URI'])['pool_size']
+
+
+@pytest.mark.parametrize('url', READ_URLS)
+def test_get_reads_use_the_replica(replicas, url):
+    client = replicas.register(f"replica_get_{READ_URLS.index(url)}")
+    _, counts = replicas.request(client, 'GET', url)
+    assert counts['primary'] == 0 and counts['replica']
+
+
+def test_writes_use_the_primary(replicas):
+    client = replicas.register('replica_write')
+    _, counts = replicas.request(client, 'POST', '/api/tasks', json=TASK)
+    assert counts['replica'] == 0 and counts['primary']
+
+
+def test_reads_after_a_write_stay_on_the_primary_for_a_while(replicas):
+    alice, bob = replicas.register('replica_alice'), replicas.register('replica_bob')
+    replicas.request(alice, 'POST', '/api/tasks', json=TASK)
+
+    response, counts = replicas.request(alice, 'GET', '/api/tasks')
+    assert b'Replica check task' in response.data and counts['replica'] == 0, 'read right after a write'
+    _, counts = replicas.request(bob, 'GET', '/api/tasks')
+    assert counts['primary'] == 0 and counts['replica'], "kept on the primary by another user's write"
+
+    time.sleep(STICKY_SECONDS + 0.1)
+    response, counts = replicas.request(alice, 'GET', '/api/tasks')
+    assert counts['primary'] == 0 and b'Replica check task' not in response.data, 'lagging replica after the window'
+    replicas.replicate()
+    response, _ = replicas.request(alice, 'GET', '/api/tasks')
+    assert b'Replica check task' in response.data
+
+
+def test_analytics_recompute_reads_the_primary(replicas):
+    client = replicas.register('replica_recompute')
+    replicas.request(client, 'POST', '/api/tasks', json=TASK)
+    time.sleep(STICKY_SECONDS + 0.1)
+
+    replicas.request(client, 'GET', '/api/dashboard')
+    with sqlite3.connect(replicas.primary_path) as primary:
+        saved = primary.execute(
+            'SELECT a.tasks_created, a.is_dirty FROM user_analytics a JOIN user u ON u.id = a.user_id '
+            'WHERE u.email = ?', ('replica_recompute@example.com',)
+        ).fetchall()
+    assert saved == [(1, 0)], 'analytics saved from the lagging replica'
+
+
+def test_reads_outside_a_request_use_the_primary(replicas, db):
+    for recorded in replicas.statements.values():
+        del recorded[:]
+    with replicas.app.app_context():
+        db.session.execute(db.select(db.text('1')))
+        db.session.rollback()
+    assert not replicas.statements['replica'] and replicas.statements['primary']
+
+
+def test_without_replicas_reads_use_the_primary(register, count_statements):
+    client = register('replica_none')
+    with count_statements() as statements:
+        assert client.get('/api/tasks').status_code == 200
+    assert statements
@@ -0,0 +1,137 @@
+"""The retention job (`flask purge-data`).
+
+A user gets rows on both sides of every retention cutoff, old and recent
+transcription jobs with their audio, an unreferenced audio file and an
+abandoned upload; then the purge runs in small batches. Other tests only
+write recent rows, so everything expired here belongs to this user.
+"""
+import os
+import time
+from datetime import datetime, timedelta
+import pytest
+
+ROWS = 40
+BATCH_SIZE = 7
+
+
+@pytest.fixture(scope='module')
+def purge(app, db):
+    from models import User, Task, UserAnalytics, AIInsight, VoiceNote, TranscriptionJob
+    from services.audio_storage import audio_storage
+    from services.retention import RetentionService, POLICIES
+    from config.settings import (
+        RETENTION_ANALYTICS_DAYS, RETENTION_INSIGHT_DAYS, RETENTION_COMPLETED_TASK_DAYS,
+        RETENTION_TRANSCRIPTION_DAYS
+    )
+
+    client = app.test_client()
+    client.post('/register', data={'username': 'retention', 'email': 'retention@example.com',
+                                   'password': 'retention'})
+    now = datetime.utcnow()
+    with app.app_context():
+        user_id = User.query.filter_by(email='retention@example.com').one().id
+        for i in range(ROWS):
+            old = i % 2 == 0
+            age = timedelta(days=(RETENTION_ANALYTICS_DAYS + 1 + i) if old else i)
+            db.session.add(UserAnalytics(user_id=user_id, date=(now - age).date(), productivity_score=i))
+            created = now - timedelta(days=(RETENTION_INSIGHT_DAYS + 1 + i) if old else i)
+            db.session.add(AIInsight(user_id=user_id, insight_type='productivity',
+                                     content=f'Insight {i}', created_at=created))
+            completed_at = now - timedelta(days=(RETENTION_COMPLETED_TASK_DAYS + 1 + i) if old else i)
+            db.session.add(Task(user_id=user_id, title=f'Retention task {i}', priority='normal',
+                                completed=i % 4 != 3, completed_at=completed_at, created_at=completed_at))
+        db.session.flush()
+        expired = {}
+        for kind, (model, column, _, criteria, _) in POLICIES.items():
+            cutoff = RetentionService.cutoff(kind, now)
+            expired[kind] = {row.id for row in db.session.query(model.id).filter(
+                model.user_id == user_id, column < cutoff, *criteria)}
+        old_task = Task.query.filter(Task.id.in_(expired['tasks'])).first()
+        note = VoiceNote(user_id=user_id, transcription='About an old task', note_type='task', task_id=old_task.id)
+
+        old_job_time = now - timedelta(days=RETENTION_TRANSCRIPTION_DAYS + 1)
+        audio = {name: audio_storage.save_bytes(name.encode(), user_id)
+                 for name in ('kept', 'dropped', 'recent', 'orphan')}
+        note.audio_path = audio['kept']
+        db.session.add(note)
+        db.session.add_all([
+            TranscriptionJob(user_id=user_id, audio_path=audio['kept'], status='done', created_at=old_job_time),
+            TranscriptionJob(user_id=user_id, audio_path=audio['dropped'], status='failed', created_at=old_job_time),
+            TranscriptionJob(user_id=user_id, audio_path=audio['recent'], status='done', created_at=now),
+        ])
+        db.session.commit()
+        note_id = note.id
+        snapshots = {
+            'tasks': {t.id: t.title for t in Task.query.filter(Task.id.in_(expired['tasks']))},
+            'insights': {i.id: i.content for i in AIInsight.query.filter(AIInsight.id.in_(expired['insights']))},
+        }
+
+    stale_time = time.time() - (RETENTION_TRANSCRIPTION_DAYS + 1) * 86400
+    os.utime(audio_storage._path(audio['orphan']), (stale_time, stale_time))
+    upload = audio_storage.new_upload()
+    upload.close()
+    os.utime(upload.name, (stale_time, stale_time))
+
+    # Warm the cached task list so a stale answer would show
+    client.get('/api/tasks?limit=100')
+
+    with app.app_context():
+        dry_run = {s['kind']: s for s in RetentionService.run(batch_size=BATCH_SIZE, dry_run=True, now=now)}
+        results = {s['kind']: s for s in RetentionService.run(batch_size=BATCH_SIZE, now=now)}
+        again = RetentionService.run(batch_size=BATCH_SIZE, now=now)
+    return dict(client=client, user_id=user_id, expired=expired, snapshots=snapshots, note_id=note_id,
+                audio=audio, upload=upload.name, dry_run=dry_run, results=results, again=again)
+
+
+def test_dry_run_counts_what_would_be_purged(purge):
+    assert {kind: purge['dry_run'][kind]['archived'] for kind in purge['expired']} == \
+        {kind: len(ids) for kind, ids in purge['expired'].items()}
+
+
+def test_exactly_the_expired_rows_leave_the_live_tables(app, db, purge):
+    from services.retention import POLICIES
+    with app.app_context():
+        for kind, (model, _, _, _, _) in POLICIES.items():
+            assert purge['results'][kind]['archived'] == len(purge['expired'][kind])
+            live = {row.id for row in db.session.query(model.id).filter(model.user_id == purge['user_id'])}
+            assert not live & purge['expired'][kind], f'expired {kind} rows are still live'
+            assert len(live) == ROWS - len(purge['expired'][kind]), f'recent {kind} rows were purged'
+
+
+def test_archive_holds_each_purged_row_once_unchanged(purge):
+    from services.retention import POLICIES
+    for kind in POLICIES:
+        archived = purge['client'].get(f'/api/archive/{kind}?limit=5000').get_json()
+        ids = [row['id'] for row in archived]
+        assert len(ids) == len(set(ids)) and set(ids) == purge['expired'][kind]
+        field = {'tasks': 'title', 'insights': 'content'}.get(kind)
+        if field:
+            assert all(row[field] == purge['snapshots'][kind][row['id']] for row in archived)
+
+
+def test_voice_notes_of_archived_tasks_are_kept_unlinked(app, db, purge):
+    from models import VoiceNote
+    with app.app_context():
+        note = db.session.get(VoiceNote, purge['note_id'])
+        assert note is not None and note.task_id is None
+
+
+def test_audio_is_deleted_only_when_unreferenced(app, purge):
+    from models import TranscriptionJob
+    from services.audio_storage import audio_storage
+    exists = {name: os.path.exists(audio_storage._path(key)) for name, key in purge['audio'].items()}
+    assert exists == {'kept': True, 'dropped': False, 'recent': True, 'orphan': False}
+    assert not os.path.exists(purge['upload'])
+    with app.app_context():
+        assert TranscriptionJob.query.filter_by(user_id=purge['user_id']).count() == 1
+
+
+def test_archived_tasks_leave_cached_lists_and_search(purge):
+    client, expired = purge['client'], purge['expired']['tasks']
+    assert not {t['id'] for t in client.get('/api/tasks?limit=100').get_json()} & expired
+    found = client.get('/api/search?q=Retention&types=task&limit=50').get_json()
+    assert not [r for r in found if r.get('type') == 'task' and r['id'] in expired]
+
+
+def test_second_run_finds_nothing(purge):
+    assert not any(s.get('archived') or s.get('deleted') for s in purge['again'])
@@ -0,0 +1,133 @@
+"""Full-text search (GET /api/search): the index kept by the flush hooks and bulk paths, and rebuild()."""
+from datetime import datetime
+import pytest
+
+
+def hits(client, q, **params):
+    response = client.get('/api/search', query_string=dict(params, q=q))
+    assert response.status_code == 200
+    return [(r['type'], r['id']) for r in response.get_json()]
+
+
+@pytest.fixture
+def searcher(app, db, register, user_id, request):
+    """(client, user id) of a fresh user"""
+    client = register(request.node.name)
+    return client, user_id(request.node.name)
+
+
+def test_orm_writes_round_trip_through_the_flush_hooks(app, db, searcher):
+    from models import Task
+    from services.search import SearchService
+    client, uid = searcher
+    with app.app_context():
+        task = Task(user_id=uid, title='Quarterly xylophone report', description='Tune the marimbas', priority='normal')
+        db.session.add(task)
+        db.session.commit()
+        task_id = task.id
+        assert hits(client, 'xylo') == hits(client, 'marimba') == [('task', task_id)]
+        assert SearchService.search(uid, 'quarterly xylophone')[0] == {
+            'type': 'task', 'id': task_id, 'title': 'Quarterly xylophone report', 'excerpt': 'Tune the marimbas'}
+
+        task.title = 'Quarterly vibraphone report'
+        db.session.commit()
+        assert hits(client, 'xylo') == [] and hits(client, 'vibra') == [('task', task_id)]
+
+        task.description = None
+        db.session.commit()
+        assert hits(client, 'marimba') == [] and hits(client, 'vibra') == [('task', task_id)]
+
+        task.priority = 'urgent'  # Not an indexed column
+        db.session.commit()
+        assert hits(client, 'vibra') == [('task', task_id)]
+
+        db.session.delete(task)
+        db.session.commit()
+        assert hits(client, 'vibra') == []
+
+
+def test_api_writes_are_indexed(searcher):
+    client, _ = searcher
+    goal_id = client.post('/api/goals', json={
+        'title': 'Learn ocarina', 'description': 'Folk tunes', 'target_date': '2027-01-01', 'category': 'personal',
+        'tasks': [{'title': 'Buy an ocarina', 'description': 'Ceramic'}]
+    }).get_json()['goal_id']
+    note_id = client.post('/api/voice-notes', json={
+        'transcription': 'Remember to practise the ocarina scales', 'note_type': 'journal'
+    }).get_json()['id']
+
+    found = hits(client, 'ocarina')
+    assert ('goal', goal_id) in found and ('voice_note', note_id) in found and len(found) == 3
+    # Title matches rank above a match in the body only
+    assert found[-1] == ('voice_note', note_id)
+    assert hits(client, 'ocarina', types='voice_note') == [('voice_note', note_id)]
+    assert client.get('/api/search', query_string={'q': 'ocarina', 'types': 'songs'}).status_code == 400
+
+
+def test_bulk_writes_update_and_remove_documents(searcher):
+    client, _ = searcher
+    created = client.post('/api/tasks/bulk', json={'operations': [
+        {'op': 'create', 'title': 'Repair the harpsichord'}, {'op': 'create', 'title': 'Tune the harpsichord'}
+    ]}).get_json()['results']
+    repair, tune = (r['id'] for r in created)
+    assert sorted(hits(client, 'harpsi')) == [('task', repair), ('task', tune)]
+
+    client.post('/api/tasks/bulk', json={'operations': [
+        {'op': 'update', 'id': repair, 'title': 'Repair the clavichord', 'description': 'Strings'},
+        {'op': 'delete', 'id': tune},
+    ]})
+    assert hits(client, 'harpsi') == []
+    assert hits(client, 'clavi strings') == [('task', repair)]
+
+
+def test_remove_documents_drops_only_the_given_ids(app, db, searcher):
+    from models import Task
+    from services.search import SearchService
+    client, uid = searcher
+    with app.app_context():
+        tasks = [Task(user_id=uid, title=f'Bassoon reed {i}', priority='normal') for i in range(3)]
+        db.session.add_all(tasks)
+        db.session.commit()
+        ids = [t.id for t in tasks]
+        SearchService.remove_documents('task', ids[:2])
+        SearchService.remove_documents('goal', [ids[2]])  # Same id, other type: not this document
+        SearchService.remove_documents('task', [])
+        db.session.commit()
+    assert hits(client, 'bassoon') == [('task', ids[2])]
+
+
+def test_users_only_find_their_own_documents(app, db, register, user_id):
+    from models import Task
+    from services.search import SearchService
+    alice, bob = register('search_alice'), register('search_bob')
+    alice_id, bob_id = user_id('search_alice'), user_id('search_bob')
+    with app.app_context():
+        db.session.add_all([Task(user_id=alice_id, title='Secret glockenspiel plan', priority='normal'),
+                            Task(user_id=bob_id, title='Public glockenspiel plan', priority='normal')])
+        db.session.commit()
+        assert [r['title'] for r in SearchService.search(alice_id, 'glocken')] == ['Secret glockenspiel plan']
+    assert [t for t, _ in hits(bob, 'glocken')] == ['task'] and len(hits(bob, 'secret')) == 0
+    # Query syntax is dropped, so a column filter is just two more words
+    assert hits(bob, f'owner:u{alice_id} secret') == []
+    assert hits(bob, '"secret" OR glocken*') == []
+
+
+def test_rebuild_restores_an_index_that_drifted(app, db, searcher):
+    from sqlalchemy import update
+    from models import Task, Goal
+    from services.search import SearchService
+    client, uid = searcher
+    with app.app_context():
+        task = Task(user_id=uid, title='Oboe lesson', priority='normal')
+        goal = Goal(user_id=uid, title='Oboe recital', category='personal', target_date=datetime(2027, 1, 1))
+        db.session.add_all([task, goal])
+        db.session.commit()
+        task_id, goal_id = task.id, goal.id
+        # A Core UPDATE bypasses the flush hooks, so the index still has the old title
+        db.session.execute(update(Task).where(Task.id == task_id).values(title='Cello lesson'))
+        db.session.commit()
+        assert hits(client, 'cello') == []
+
+        SearchService.rebuild()
+    assert hits(client, 'cello') == [('task', task_id)]
+    assert hits(client, 'oboe') == [('goal', goal_id)]
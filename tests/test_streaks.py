@@ -0,0 +1,124 @@
+"""Habit streak engine.
+
+Random check-ins (with gaps, repeats within a period and timestamps near
+local midnight) are replayed through HabitService.check_in for daily and
+weekly habits in several timezones. A check-in must never read the log, and
+the incremental counters, rebuild_streaks and expire_lapsed_streaks must all
+agree with a brute-force recount of the log.
+"""
+import random
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import event
+
+TIMEZONES = ['UTC', 'America/Los_Angeles', 'Asia/Kolkata', 'Pacific/Auckland']
+HABITS_PER_USER = 6
+DAYS = 120
+
+
+def expected_streaks(stamps, frequency, tz_name, now):
+    """Brute force: longest and trailing runs of consecutive periods"""
+    from services.habits import period_index
+    from services.timezones import local_date, local_today
+
+    periods = sorted({period_index(local_date(s, tz_name), frequency) for s in stamps})
+    best = run = 0
+    previous = None
+    for period in periods:
+        run = run + 1 if previous is not None and period == previous + 1 else 1
+        best = max(best, run)
+        previous = period
+    today = period_index(local_today(tz_name, now), frequency)
+    current = run if periods and periods[-1] >= today - 1 else 0
+    return current, best
+
+
+@pytest.fixture(scope='module')
+def habits(app, db):
+    """(habit id, timezone) of habits with replayed check-ins, and the log reads check_in made"""
+    from models import User, Habit
+    from services.habits import HabitService
+
+    rng = random.Random(11)
+    now = datetime.utcnow()
+    with app.app_context():
+        habits = []
+        for i, tz_name in enumerate(TIMEZONES):
+            user = User(username=f'streaks_{i}', email=f'streaks_{i}@example.com', timezone=tz_name)
+            db.session.add(user)
+            db.session.flush()
+            for j in range(HABITS_PER_USER):
+                habit = Habit(title=f'h{j}', frequency='weekly' if j % 2 else 'daily', user_id=user.id)
+                db.session.add(habit)
+                habits.append((habit, tz_name))
+        db.session.commit()
+
+        log_reads = []
+
+        def watch(conn, cursor, statement, parameters, context, executemany):
+            if statement.lstrip().upper().startswith('SELECT') and 'habit_log' in statement:
+                log_reads.append(statement)
+
+        for habit, tz_name in habits:
+            density = rng.uniform(0.3, 0.95)
+            stamp = now - timedelta(days=DAYS)
+            while stamp < now:
+                if rng.random() < density:
+                    event.listen(db.engine, 'before_cursor_execute', watch)
+                    try:
+                        HabitService.check_in(habit, tz_name, now=stamp)
+                        db.session.flush()
+                    finally:
+                        event.remove(db.engine, 'before_cursor_execute', watch)
+                stamp += timedelta(hours=rng.choice([3, 11, 23, 24, 25, 49]))
+        db.session.commit()
+        return {'now': now, 'habits': [(habit.id, tz_name) for habit, tz_name in habits], 'log_reads': log_reads}
+
+
+def mismatches(db, habits, counters):
+    from models import Habit, HabitLog
+    found = []
+    for habit_id, tz_name in habits['habits']:
+        habit = db.session.get(Habit, habit_id)
+        stamps = [s for (s,) in db.session.query(HabitLog.completed_at).filter(HabitLog.habit_id == habit_id)]
+        expected = expected_streaks(stamps, habit.frequency, tz_name, habits['now'])
+        actual = counters(habit, tz_name)
+        if actual != expected:
+            found.append((habit_id, habit.frequency, tz_name, actual, expected))
+    return found
+
+
+def test_check_in_does_not_read_the_log(habits):
+    assert not habits['log_reads']
+
+
+def test_incremental_counters_match_the_log(app, db, habits):
+    from services.habits import HabitService
+    with app.app_context():
+        assert not mismatches(db, habits, lambda h, tz: (HabitService.current_streak(h, tz, habits['now']),
+                                                         h.best_streak))
+
+
+def test_rebuild_matches_the_log(app, db, habits):
+    from models import Habit
+    from services.habits import HabitService
+    with app.app_context():
+        ids = [habit_id for habit_id, _ in habits['habits']]
+        db.session.query(Habit).filter(Habit.id.in_(ids)).update(
+            {'current_streak': 0, 'best_streak': 0, 'last_completed_at': None}, synchronize_session=False
+        )
+        db.session.commit()
+        HabitService.rebuild_streaks(batch_size=7, now=habits['now'])
+        db.session.expire_all()
+        assert not mismatches(db, habits, lambda h, tz: (h.current_streak, h.best_streak))
+
+
+def test_expiry_matches_the_log(app, db, habits):
+    from models import Habit
+    from services.habits import HabitService
+    with app.app_context():
+        for habit_id, tz_name in habits['habits']:
+            HabitService.expire_lapsed_streaks(db.session.get(Habit, habit_id).user_id, tz_name, now=habits['now'])
+        db.session.commit()
+        db.session.expire_all()
+        assert not mismatches(db, habits, lambda h, tz: (h.current_streak, h.best_streak))
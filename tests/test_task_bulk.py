@@ -0,0 +1,99 @@
+"""Bulk task operations (POST /api/tasks/bulk)."""
+import pytest
+
+
+def test_operations_compose_and_report_per_item(register):
+    client = register('bulk_compose')
+    created = client.post('/api/tasks/bulk', json={'operations': [
+        {'op': 'create', 'title': 'First'}, {'op': 'create', 'title': 'Second'}
+    ]}).get_json()['results']
+    first, second = (r['id'] for r in created)
+
+    response = client.post('/api/tasks/bulk', json={'operations': [
+        {'op': 'toggle', 'id': first},
+        {'op': 'update', 'id': first, 'title': 'Renamed'},
+        {'op': 'toggle', 'id': first},
+        {'op': 'delete', 'id': second},
+        {'op': 'toggle', 'id': second},
+        {'op': 'explode', 'id': first},
+    ]})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['status'] == 'partial'
+    assert [r['status'] for r in body['results']] == ['success'] * 4 + ['error'] * 2
+    tasks = {t['id']: t for t in client.get('/api/tasks').get_json()}
+    assert tasks[first]['title'] == 'Renamed' and not tasks[first]['completed']
+    assert second not in tasks
+
+
+MALFORMED = [
+    {'op': 'toggle', 'id': [1]},
+    {'op': 'update', 'id': {'id': 1}, 'title': 'x'},
+    {'op': 'delete', 'id': True},
+    {'op': 'toggle', 'id': '1'},
+    {'op': 'toggle'},
+    {'op': 'create', 'title': 'x', 'goal_id': [1]},
+    {'op': 'create', 'title': 'x', 'goal_id': {'id': 1}},
+]
+
+
+@pytest.mark.parametrize('index', range(len(MALFORMED)))
+def test_malformed_ids_fail_only_their_operation(register, index):
+    client = register(f'bulk_ids_{index}')
+    operation = MALFORMED[index]
+    response = client.post('/api/tasks/bulk', json={'operations': [operation, {'op': 'create', 'title': 'Kept'}]})
+    assert response.status_code == 200
+    results = response.get_json()['results']
+    assert results[0]['status'] == 'error' and results[1]['status'] == 'success'
+
+    atomic = client.post('/api/tasks/bulk', json={'atomic': True, 'operations': [operation]})
+    assert atomic.status_code == 400
+
+
+INVALID_FIELDS = [
+    {'title': None},
+    {'title': ''},
+    {'title': 7},
+    {'title': 'x' * 101},
+    {'priority': 'whenever'},
+    {'priority': None},
+    {'description': ['not', 'text']},
+]
+
+
+@pytest.mark.parametrize('index', range(len(INVALID_FIELDS)))
+def test_invalid_update_fields_fail_only_their_operation(register, index):
+    client = register(f'bulk_fields_{index}')
+    task_id = client.post('/api/tasks/bulk', json={'operations': [
+        {'op': 'create', 'title': 'Original', 'priority': 'urgent'}
+    ]}).get_json()['results'][0]['id']
+    fields = INVALID_FIELDS[index]
+
+    response = client.post('/api/tasks/bulk', json={'operations': [
+        dict(fields, op='update', id=task_id),
+        {'op': 'create', 'title': 'Kept'},
+    ]})
+    assert response.status_code == 200
+    results = response.get_json()['results']
+    assert results[0]['status'] == 'error' and results[1]['status'] == 'success'
+    tasks = {t['id']: t for t in client.get('/api/tasks').get_json()}
+    assert (tasks[task_id]['title'], tasks[task_id]['priority']) == ('Original', 'urgent')
+
+    atomic = client.post('/api/tasks/bulk', json={'atomic': True, 'operations': [
+        {'op': 'update', 'id': task_id, 'title': 'Renamed'},
+        dict(fields, op='update', id=task_id),
+    ]})
+    assert atomic.status_code == 400
+    assert {t['id']: t['title'] for t in client.get('/api/tasks').get_json()}[task_id] == 'Original'
+
+
+@pytest.mark.parametrize('index', range(len(INVALID_FIELDS)))
+def test_invalid_create_fields_fail_only_their_operation(register, index):
+    client = register(f'bulk_create_fields_{index}')
+    response = client.post('/api/tasks/bulk', json={'operations': [
+        dict({'title': 'New'}, **INVALID_FIELDS[index], op='create'),
+        {'op': 'create', 'title': 'x' * 100, 'priority': 'important', 'description': None},
+    ]})
+    results = response.get_json()['results']
+    assert results[0]['status'] == 'error' and results[1]['status'] == 'success'
+    assert [t['title'] for t in client.get('/api/tasks').get_json()] == ['x' * 100]
@@ -0,0 +1,86 @@
+"""Streamed task suggestions (POST /api/goals/suggest-tasks/stream)."""
+import json
+import time
+import pytest
+
+TASKS = [
+    {'title': 'Buy shoes [size 42]', 'description': 'Try a few {brands} and "test" them \\ on a treadmill.'},
+    {'title': 'Plan runs', 'description': 'Three a week.', 'meta': {'weeks': [1, 2, 3]}},
+    {'title': 'Sign up', 'description': 'Pick a race — ideally in spring.'},
+]
+REPLIES = [
+    json.dumps(TASKS),
+    'Here you go:\n```json\n' + json.dumps(TASKS, indent=2) + '\n```',
+    '```\n' + json.dumps(TASKS) + '\n```\nGood luck!',
+]
+DELAY = 0.3  # Seconds the stub takes per completion
+
+
+def events(response, started):
+    """(event, data, seconds since started) for each server-sent event of a streamed response"""
+    buffer = ''
+    for chunk in response.response:
+        buffer += chunk.decode('utf-8') if isinstance(chunk, bytes) else chunk
+        while '\n\n' in buffer:
+            block, buffer = buffer.split('\n\n', 1)
+            fields = dict(line.split(': ', 1) for line in block.split('\n'))
+            yield fields['event'], json.loads(fields['data']), time.perf_counter() - started
+
+
+@pytest.mark.parametrize('reply', REPLIES)
+def test_parser_matches_parse_in_pieces_of_any_size(reply):
+    from services.suggestions import TaskArrayParser, TaskSuggestionService
+    expected = TaskSuggestionService.parse(reply)
+    for size in range(1, len(reply) + 1):
+        stream = TaskArrayParser()
+        parsed = []
+        for i in range(0, len(reply), size):
+            parsed += stream.feed(reply[i:i + size])
+        assert parsed == expected, f'pieces of {size}'
+
+
+@pytest.fixture
+def stream(request, register, monkeypatch):
+    """stream(title) posts a suggestion request and returns its events; .stub is the slow stub client"""
+    from services import llm
+    client = register(request.node.name)
+    stub = llm.StubOpenAIClient(delay=DELAY)
+    monkeypatch.setattr(llm, '_stub_client', stub)
+
+    def stream(title):
+        started = time.perf_counter()
+        response = client.post('/api/goals/suggest-tasks/stream', json={'title': title, 'description': 'check'})
+        assert response.status_code == 200 and response.mimetype == 'text/event-stream'
+        return list(events(response, started))
+    stream.stub = stub
+    return stream
+
+
+def test_first_task_arrives_before_the_completion_ends(stream):
+    received = stream('Run a marathon')
+    assert [name for name, _, _ in received] == ['task'] * 5 + ['done']
+    assert received[-1][1] == {'count': 5}
+    first, total = received[0][2], received[-1][2]
+    assert first < total / 2
+
+
+def test_repeat_is_answered_from_the_cache(stream):
+    tasks = [data for name, data, _ in stream('Write a novel') if name == 'task']
+    calls = stream.stub.calls
+    assert [data for name, data, _ in stream('Write a novel') if name == 'task'] == tasks
+    assert stream.stub.calls == calls
+
+
+def test_reply_with_a_bracketed_preamble_is_sent_whole(stream, monkeypatch):
+    monkeypatch.setattr(stream.stub, '_content',
+                        lambda messages: 'Here are [3] tasks:\n```json\n' + json.dumps(TASKS) + '\n```')
+    assert [data for name, data, _ in stream('Learn Spanish') if name == 'task'] == TASKS
+
+
+def test_failing_completion_ends_with_an_error_event(stream, monkeypatch):
+    def broken(messages):
+        raise RuntimeError('upstream unavailable')
+
+    monkeypatch.setattr(stream.stub, '_content', broken)
+    received = stream('Climb a mountain')
+    assert received and received[-1][0] == 'error'
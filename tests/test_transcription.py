@@ -0,0 +1,130 @@
+"""Voice transcription: streamed uploads (POST /api/transcribe), the job lifecycle and the worker timeout."""
+import io
+from datetime import datetime, timedelta
+import pytest
+
+
+def drain():
+    from services.transcription import transcription_queue
+    transcription_queue.shutdown(wait=True)
+
+
+@pytest.fixture
+def job_for(app, db, user_id):
+    """A pending job for a registered user, as left by some worker process"""
+    def job_for(name, **columns):
+        from models import TranscriptionJob
+        with app.app_context():
+            job = TranscriptionJob(user_id=user_id(name), audio_path='missing.webm', status='pending', **columns)
+            db.session.add(job)
+            db.session.commit()
+            return job.id
+    return job_for
+
+
+def test_raw_body_is_streamed_to_storage_and_transcribed(app, register):
+    from services.audio_storage import audio_storage
+    client = register('transcribe_raw')
+    audio = bytes(range(256)) * 1200
+
+    response = client.post('/api/transcribe', data=io.BytesIO(audio), content_type='audio/ogg')
+    assert response.status_code == 202
+    job = response.get_json()
+    assert job['status'] == 'pending' and response.headers['Location'] == job['url']
+
+    drain()
+    status = client.get(job['url']).get_json()
+    assert status == {'id': job['id'], 'status': 'done', 'text': f'Stub transcription of {len(audio)} bytes of audio'}
+    with app.app_context():
+        from models import TranscriptionJob
+        from database import db
+        stored = db.session.get(TranscriptionJob, job['id'])
+        assert stored.audio_path.endswith('.ogg') and stored.completed_at is not None
+        with audio_storage.open(stored.audio_path) as f:
+            assert f.read() == audio
+
+
+def test_multipart_upload_keeps_only_the_audio_part(register):
+    client = register('transcribe_multipart')
+    response = client.post('/api/transcribe', data={
+        'audio': (io.BytesIO(b'RIFF' + b'\0' * 60), 'memo.wav'),
+        'notes': (io.BytesIO(b'not audio'), 'notes.txt'),
+    }, content_type='multipart/form-data')
+    assert response.status_code == 202
+    drain()
+    assert client.get(response.get_json()['url']).get_json()['text'] == 'Stub transcription of 64 bytes of audio'
+
+
+@pytest.mark.parametrize('body, content_type, status', [
+    (b'', 'audio/webm', 400),
+    (b'hello', 'text/plain', 415),
+    ({'other': (io.BytesIO(b'x'), 'x.wav')}, 'multipart/form-data', 400),
+])
+def test_rejected_uploads(register, body, content_type, status):
+    client = register(f'transcribe_rejected_{status}_{content_type.replace("/", "_")}')
+    assert client.post('/api/transcribe', data=body, content_type=content_type).status_code == status
+
+
+def test_failed_transcription_is_reported(register, monkeypatch):
+    from services.transcription import get_transcriber
+    client = register('transcribe_failing')
+
+    def broken(audio_path):
+        raise RuntimeError('decoder exploded')
+
+    monkeypatch.setattr(get_transcriber(), 'transcribe', broken)
+    url = client.post('/api/transcribe', data=b'audio', content_type='audio/webm').get_json()['url']
+    drain()
+    assert client.get(url).get_json()['status'] == 'failed'
+    assert client.get(url).get_json()['error'] == 'decoder exploded'
+
+
+def test_jobs_are_held_until_their_worker_finishes(app, register):
+    from services.transcription import heartbeat
+    client = register('transcribe_held')
+    response = client.post('/api/transcribe', data=b'audio', content_type='audio/webm')
+    assert response.status_code == 202
+    drain()
+    with app.app_context():
+        assert heartbeat.beat() == 0
+
+
+def test_other_users_cannot_poll_a_job(register, job_for):
+    register('transcribe_owner')
+    intruder = register('transcribe_intruder')
+    assert intruder.get(f"/api/transcribe/{job_for('transcribe_owner')}").status_code == 403
+
+
+def test_job_without_recent_heartbeat_times_out(register, job_for):
+    from config.settings import TRANSCRIPTION_TIMEOUT
+    client = register('transcribe_stale')
+    stale = datetime.utcnow() - timedelta(seconds=TRANSCRIPTION_TIMEOUT + 5)
+    job_id = job_for('transcribe_stale', created_at=stale, heartbeat_at=stale)
+    assert client.get(f'/api/transcribe/{job_id}').get_json() == {
+        'id': job_id, 'status': 'failed', 'error': 'Transcription timed out'
+    }
+
+
+def test_job_another_worker_is_still_running_stays_pending(register, job_for):
+    """The job is old and unknown to this process's queue, but its worker's heartbeat is recent"""
+    from config.settings import TRANSCRIPTION_TIMEOUT
+    client = register('transcribe_elsewhere')
+    job_id = job_for('transcribe_elsewhere', created_at=datetime.utcnow() - timedelta(seconds=TRANSCRIPTION_TIMEOUT * 3),
+                     heartbeat_at=datetime.utcnow())
+    response = client.get(f'/api/transcribe/{job_id}')
+    assert response.get_json()['status'] == 'pending' and response.headers['Retry-After'] == '1'
+
+
+def test_heartbeat_keeps_held_jobs_alive(app, register, job_for):
+    from config.settings import TRANSCRIPTION_TIMEOUT
+    from services.transcription import heartbeat
+    client = register('transcribe_beating')
+    stale = datetime.utcnow() - timedelta(seconds=TRANSCRIPTION_TIMEOUT + 5)
+    job_id = job_for('transcribe_beating', created_at=stale, heartbeat_at=stale)
+    with app.app_context():
+        heartbeat.hold(job_id)
+        try:
+            assert heartbeat.beat() == 1
+        finally:
+            heartbeat.release(job_id)
+    assert client.get(f'/api/transcribe/{job_id}').get_json()['status'] == 'pending'
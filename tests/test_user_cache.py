@@ -0,0 +1,143 @@
+"""Staleness of the per-user payload cache.
+
+Two workers are simulated by giving each its own in-process LRU (version
+stamps and the optional shared tier live in the database, as they do across
+gunicorn workers). Both workers warm their caches, worker A performs a
+write, and then both workers' cached answers must equal a fresh uncached
+read. Each write path runs with and without the shared database tier, and
+with stamps written by upsert or by the portable UPDATE-then-INSERT path.
+"""
+from datetime import datetime, timedelta
+import pytest
+from services.cache import LRUCache
+from services.user_cache import user_cache, DatabasePayloadBackend
+
+READS = ['/api/goals', '/api/tasks', '/api/tasks?completed=false', '/api/habits', '/api/analytics/insights']
+
+
+def first_task_id(client):
+    return client.get('/api/tasks').get_json()[0]['id']
+
+
+def create_goal_with_tasks(client, app, user_id):
+    client.post('/api/goals', json={
+        'title': 'Cache goal', 'description': '', 'category': 'personal',
+        'target_date': (datetime.utcnow() + timedelta(days=30)).strftime('%Y-%m-%d'),
+        'tasks': [{'title': 'Goal step 1'}, {'title': 'Goal step 2'}]
+    })
+
+
+def add_insight(client, app, user_id):
+    from database import db
+    from models import AIInsight
+    with app.app_context():
+        db.session.add(AIInsight(user_id=user_id, insight_type='productivity', content='New insight'))
+        db.session.commit()
+
+
+def expire_streaks(client, app, user_id):
+    # A streak whose last check-in is long past is reset by the next dashboard recompute
+    from database import db
+    from models import Habit
+    from services.habits import HabitService
+    with app.app_context():
+        habit = Habit.query.filter_by(user_id=user_id).first()
+        habit.current_streak = 5
+        habit.last_completed_at = datetime.utcnow() - timedelta(days=10)
+        db.session.commit()
+        HabitService.expire_lapsed_streaks(user_id, 'UTC')
+        db.session.commit()
+
+
+WRITES = {
+    'create task': lambda client, app, user_id: client.post('/api/tasks', json={
+        'title': 'Cached', 'description': '', 'priority': 'normal', 'due_date': '2030-01-01'}),
+    'create goal with tasks': create_goal_with_tasks,
+    'toggle task': lambda client, app, user_id: client.post(f'/api/tasks/{first_task_id(client)}/toggle'),
+    'bulk tasks': lambda client, app, user_id: client.post('/api/tasks/bulk', json={'operations': [
+        {'op': 'create', 'title': 'Bulk'}, {'op': 'update', 'id': first_task_id(client), 'title': 'Renamed'}]}),
+    'create habit': lambda client, app, user_id: client.post('/api/habits', json={
+        'title': 'Stretch', 'description': '', 'frequency': 'daily'}),
+    'habit check-in': lambda client, app, user_id: client.post(
+        f"/api/habits/{client.get('/api/habits').get_json()[0]['id']}/check-in"),
+    'expire streaks': expire_streaks,
+    'new insight': add_insight,
+}
+
+
+@pytest.fixture(params=['memory', 'database'])
+def workers(request, monkeypatch):
+    """Two in-process LRUs standing in for two workers, over the given shared tier"""
+    shared = DatabasePayloadBackend(user_cache.local.ttl) if request.param == 'database' else None
+    monkeypatch.setattr(user_cache, 'shared', shared)
+    monkeypatch.setattr(user_cache, 'local', user_cache.local)
+    return {'A': LRUCache(maxsize=256), 'B': LRUCache(maxsize=256)}
+
+
+@pytest.fixture(params=['upsert', 'portable'])
+def stamps(request, monkeypatch):
+    if request.param == 'portable':
+        monkeypatch.setattr('services.user_cache.UPSERTS', {})
+    return request.param
+
+
+@pytest.mark.parametrize('write', list(WRITES))
+def test_no_worker_serves_stale_payloads(app, register, user_id, workers, stamps, write):
+    name = f"cache_{write.replace(' ', '_').replace('-', '_')}_{user_cache.shared is not None:d}_{stamps}"
+    client = register(name)
+    client.post('/api/tasks', json={'title': 'Seed', 'description': '', 'priority': 'normal',
+                                    'due_date': '2030-01-01'})
+    client.post('/api/habits', json={'title': 'Seed habit', 'description': '', 'frequency': 'daily'})
+
+    def read_all(worker):
+        user_cache.local = workers[worker]
+        return {url: client.get(url).get_data(as_text=True) for url in READS}
+
+    read_all('A')
+    read_all('B')
+    user_cache.local = workers['A']
+    WRITES[write](client, app, user_id(name))
+    user_cache.enabled = False
+    try:
+        expected = {url: client.get(url).get_data(as_text=True) for url in READS}
+    finally:
+        user_cache.enabled = True
+    for worker in ('B', 'A'):
+        assert read_all(worker) == expected, f'worker {worker}'
+
+
+def test_repeated_reads_are_served_from_the_cache(register, workers):
+    client = register(f'cache_hits_{user_cache.shared is not None:d}')
+    user_cache.local = workers['A']
+    for url in READS:
+        client.get(url)
+    before = user_cache.stats()['hits']
+    for url in READS:
+        client.get(url)
+    assert user_cache.stats()['hits'] - before == len(READS)
+    assert client.get('/api/tasks').headers['X-Query-Count'] == '1'
+
+
+def test_recreated_database_misses_the_cache(scratch_app, db):
+    from werkzeug.security import generate_password_hash
+    from models import User
+
+    def read_goals_as_test_user():
+        # The reset leaves the test user with no usable password, so give it one and log in
+        with scratch_app.app_context():
+            User.query.filter_by(email='test@example.com').one().password_hash = generate_password_hash('test')
+            db.session.commit()
+        client = scratch_app.test_client()
+        client.post('/login', data={'email': 'test@example.com', 'password': 'test'})
+        before = user_cache.stats()
+        assert client.get('/api/goals').status_code == 200
+        return client, {name: user_cache.stats()[name] - before[name] for name in ('hits', 'misses')}
+
+    client = scratch_app.test_client()
+    client.post('/register', data={'username': 'cache_reset', 'email': 'cache_reset@example.com',
+                                   'password': 'cache_reset'})
+    assert client.post('/api/reset-data').status_code == 200
+    client, _ = read_goals_as_test_user()
+    assert client.post('/api/reset-data').status_code == 200
+    _, counts = read_goals_as_test_user()
+    assert counts == {'hits': 0, 'misses': 1}